@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""비동기 서빙 모드: pipeline_server.py와 같은 /api 경로와 응답 형식을 asyncio(ASGI, uvicorn)로 제공
+
+    python async_server.py --host 0.0.0.0 --port 5000
+
+- 업로드(/api/filter, /api/process): 본문은 이벤트 루프에서 받고 파일 저장/해시/DB 기록은 스레드 풀에서 처리.
+  CLIP 판정은 상주 워커에 asyncio 소켓으로 요청 (워커를 쓸 수 없으면 asyncio 서브프로세스)
+- 진행 스트림(/api/tasks/<id>/events)과 상태 조회(/api/jobs/<id>)는 연결마다 스레드를 잡지 않으므로
+  대기 중인 폴링/SSE 연결이 수천 개여도 비용이 거의 없음. 작업 큐/스케줄러 잠금을 잡는 부분만 스레드에서 실행
+- health, metrics: 상주 워커 ping(워커마다 최대 2초)을 스레드에서 동시에 보내고 본문은 스레드에서 만듦
+- 나머지 경로(재구성 등록, 취소, 다운로드, 정리)는 짧은 요청이라 Flask 앱을 스레드 풀에서 그대로 실행
+- 작업 큐, GPU 스케줄러, 상주 워커, 결과 캐시는 pipeline_server.py의 것을 그대로 씀 (프로세스 안의 상태이므로 프로세스는 하나만)
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import pipeline_server as ps
+from worker_ipc import WorkerError
+
+WSGI_THREADS = 16  # Flask 경로를 실행할 스레드 수
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+# task_id -> 진행 스트림 구독자들의 asyncio.Event (ProgressHub.publish가 이벤트 루프로 깨움)
+_progress_waiters = {}
+# 필터 캐시 키 -> 진행 중인 CLIP 판정 Future (같은 이미지의 동시 업로드를 한 번의 호출로 합침)
+_clip_inflight = {}
+
+
+def _wake_progress(task_id):
+    for event in _progress_waiters.get(task_id, ()):
+        event.set()
+
+
+def error_response(message, status):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+async def run_clip_filter_subprocess(image_path):
+    """pipeline_server.run_clip_filter_subprocess()의 asyncio 버전"""
+    clip_runner = os.path.join(os.path.dirname(os.path.abspath(ps.__file__)), "clip_filter.py")
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            ps.CLIP_ENV, clip_runner, image_path,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=os.path.dirname(clip_runner))
+    except OSError as e:
+        print(f"[CLIP ERROR] {e}", file=sys.stderr)
+        return {"status": "error", "reasons": [f"CLIP 오류: {e}"]}
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), 60)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return {"status": "error", "reasons": ["CLIP 실행 시간 초과 (60초)"]}
+    if proc.returncode != 0:
+        stderr = stderr.decode("utf-8", errors="replace")
+        print(f"[CLIP ERROR] {stderr}", file=sys.stderr)
+        return {"status": "error", "reasons": [f"CLIP 실행 오류: {stderr.strip()}"]}
+    output = stdout.decode("utf-8", errors="replace").strip()
+    if not output:
+        return {"status": "error", "reasons": ["CLIP 출력 없음"]}
+    try:
+        return json.loads(output)
+    except json.JSONDecodeError:
+        return {"status": "error", "reasons": ["CLIP 결과 파싱 실패"]}
+
+
+async def run_clip_filter(image_paths):
+    """상주 CLIP 워커로 판정 (여러 장이면 한 배치). 워커를 쓸 수 없으면 단발 subprocess로 한 장씩"""
+    try:
+        if len(image_paths) == 1:
+            return [await ps.CLIP_WORKER.call_async({"op": "filter", "image_path": image_paths[0]}, timeout=60)]
+        return await ps.CLIP_WORKER.call_async({"op": "filter_batch", "image_paths": image_paths},
+                                               timeout=60 + 2 * len(image_paths))
+    except WorkerError as e:
+        print(f"[CLIP WORKER] {e} -> falling back to subprocess", file=sys.stderr)
+        return [await run_clip_filter_subprocess(p) for p in image_paths]
+
+
+async def filter_images(image_paths, image_hashes, task_ids):
+    """pipeline_server.filter_images()의 asyncio 버전: 사전 필터 -> 캐시 -> CLIP -> finish_filter"""
+    def lookup():
+        results = ps.prefilter_images(image_paths)
+        keys = {i: ps.filter_cache_key(image_hashes[i]) for i, result in enumerate(results) if result is None}
+        for i, key in keys.items():
+            results[i] = ps.RESULT_CACHE.get(key)
+        return results, keys
+
+    results, keys = await asyncio.to_thread(lookup)
+    pending = [i for i in keys if results[i] is None]
+    loop = asyncio.get_running_loop()
+    owned = {}  # 이 요청이 CLIP에 보낼 캐시 키 -> 이미지 번호 (나머지는 진행 중인 판정을 기다림)
+    for i in pending:
+        if keys[i] not in _clip_inflight:
+            _clip_inflight[keys[i]] = loop.create_future()
+            owned[keys[i]] = i
+    futures = {i: _clip_inflight[keys[i]] for i in pending}
+    if owned:
+        try:
+            with ps.timed("clip_filter", model=ps.CLIP_MODEL_NAME):
+                clip_results = await run_clip_filter([image_paths[i] for i in owned.values()])
+        except BaseException as e:
+            for key in owned:
+                _clip_inflight.pop(key).set_result({"status": "error", "reasons": [f"CLIP 오류: {e}"]})
+            raise
+        for key, clip_result in zip(owned, clip_results):
+            _clip_inflight.pop(key).set_result(clip_result)
+        await asyncio.to_thread(lambda: [ps.RESULT_CACHE.put(key, clip_result)
+                                         for key, clip_result in zip(owned, clip_results)
+                                         if ps._filter_cacheable(clip_result)])
+    for i, future in futures.items():
+        results[i] = await future
+    return await asyncio.to_thread(ps.finish_filter, results, task_ids)
+
+
+def save_upload(upload, task):
+    """스풀된 업로드 파일을 작업 디렉토리로 복사하고 task로 등록 (스레드 풀에서 실행). 반환: 이미지 해시"""
+    task_id, _, image_path = task
+    with ps.timed("upload_save", task_id):
+        upload.file.seek(0)
+        with open(image_path, "wb") as f:
+            shutil.copyfileobj(upload.file, f, UPLOAD_CHUNK_BYTES)
+    return ps.register_upload(task_id, image_path)
+
+
+def image_uploads(form):
+    return [item for item in form.getlist("image") if isinstance(item, UploadFile)]
+
+
+async def filter_image(request):
+    """/api/filter (pipeline_server.filter_image와 같은 응답)"""
+    async with request.form() as form:
+        files = image_uploads(form)
+        if not files:
+            return error_response("이미지 파일이 필요합니다", 400)
+        error = ps.upload_error([file.filename or '' for file in files])
+        if error:
+            return error_response(error, 400)
+
+        tasks = []
+        image_hashes = []
+        try:
+            for file in files:
+                task = await asyncio.to_thread(ps.new_task, file.filename)
+                tasks.append(task)
+                image_hashes.append(await asyncio.to_thread(save_upload, file, task))
+            task_ids = [task_id for task_id, _, _ in tasks]
+            started = time.monotonic()
+            filter_results = await filter_images([image_path for _, _, image_path in tasks], image_hashes, task_ids)
+            await asyncio.to_thread(ps.record_filter_results, task_ids, filter_results, time.monotonic() - started)
+        except Exception as e:
+            await asyncio.to_thread(ps.discard_tasks, tasks)
+            return error_response(str(e), 500)
+    return JSONResponse(ps.filter_response(task_ids, filter_results))
+
+
+async def process_image(request):
+    """/api/process (pipeline_server.process_image와 같은 응답)"""
+    async with request.form() as form:
+        files = image_uploads(form)
+        if not files:
+            return error_response("이미지 파일이 필요합니다", 400)
+        file = files[0]
+        error = ps.upload_error([file.filename or ''])
+        if error:
+            return error_response(error, 400)
+
+        task = await asyncio.to_thread(ps.new_task, file.filename)
+        task_id, _, image_path = task
+        try:
+            image_hash = await asyncio.to_thread(save_upload, file, task)
+            await asyncio.to_thread(ps.start_speculative_bg_removal, task_id, image_path, image_hash)
+            print(f"[INFO] Starting CLIP filtering for task {task_id}", file=sys.stderr)
+            started = time.monotonic()
+            filter_result = (await filter_images([image_path], [image_hash], [task_id]))[0]
+            await asyncio.to_thread(ps.record_filter_results, [task_id], [filter_result], time.monotonic() - started)
+            body, status = await asyncio.to_thread(ps.process_after_filter, task_id, filter_result)
+        except Exception as e:
+            await asyncio.to_thread(ps.discard_tasks, [task])
+            return error_response(str(e), 500)
+    return JSONResponse(body, status_code=status)
+
+
+async def job_status(request):
+    """/api/jobs/<job_id> (상태 폴링). 작업 큐/스케줄러 잠금과 예상 시작 시각 계산은 스레드에서"""
+    job_id = request.path_params["job_id"]
+
+    def lookup():
+        ps.JOB_QUEUE.touch(job_id)
+        job = ps.JOB_QUEUE.get(job_id)
+        return ps.job_response(job) if job else None
+
+    body = await asyncio.to_thread(lookup)
+    if body is None:
+        return error_response("작업을 찾을 수 없습니다", 404)
+    return JSONResponse(body)
+
+
+async def resident_worker_status():
+    """상주 워커별 status(). ping이 워커마다 최대 2초 걸리므로 스레드에서 동시에"""
+    workers = ps.resident_workers()
+    statuses = await asyncio.gather(*(asyncio.to_thread(w.status) for w in workers.values()))
+    return dict(zip(workers, statuses))
+
+
+async def health(request):
+    """/api/health"""
+    status = await resident_worker_status()
+    return JSONResponse(await asyncio.to_thread(ps.health_body, {"clip": status["clip"]}))
+
+
+async def metrics(request):
+    """/api/metrics (pipeline_server.metrics와 같은 형식)"""
+    task_id = request.query_params.get("task_id")
+    if task_id:
+        timings = await asyncio.to_thread(ps.TASK_TIMINGS.get, task_id)
+        if timings is None:
+            return error_response("작업을 찾을 수 없습니다", 404)
+        return JSONResponse({"task_id": task_id, **timings})
+    status = await resident_worker_status()
+    if request.query_params.get("format") == "json":
+        try:
+            limit = int(request.query_params.get("limit", 100))
+        except ValueError:
+            limit = 100
+        return JSONResponse(await asyncio.to_thread(ps.metrics_json, limit, status))
+    return PlainTextResponse(await asyncio.to_thread(ps.metrics_text, status), media_type=ps.METRICS_MIMETYPE)
+
+
+async def task_events(request):
+    """/api/tasks/<task_id>/events (SSE). 이벤트를 기다리는 동안 스레드를 잡지 않음"""
+    task_id = request.path_params["task_id"]
+    if await asyncio.to_thread(ps.TASK_INDEX.get, task_id) is None:
+        return error_response("작업을 찾을 수 없습니다", 404)
+    last_id = ps.last_event_id(request.headers.get("Last-Event-ID") or request.query_params.get("last_event_id"))
+
+    async def generate():
+        after_id = last_id
+        wake = asyncio.Event()
+        _progress_waiters.setdefault(task_id, set()).add(wake)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                # 스트림이 열려 있는 동안은 클라이언트가 작업을 지켜보는 중 (끊기고 폴링도 없으면 CLIENT_ABANDON_* 뒤 작업을 취소)
+                await asyncio.to_thread(ps.JOB_QUEUE.touch_task, task_id)
+                wake.clear()
+                events = ps.PROGRESS.wait(task_id, after_id, timeout=0)
+                if not events:
+                    try:
+                        await asyncio.wait_for(wake.wait(), ps.PROGRESS_KEEPALIVE_SECONDS)
+                        continue
+                    except asyncio.TimeoutError:
+                        pass
+                    if await asyncio.to_thread(ps.progress_stream_over, task_id):
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                for event in events:
+                    after_id = event["id"]
+                    yield ps.sse_message(event)
+                if events[-1]["stage"] in ps.TERMINAL_STAGES:
+                    return
+        finally:
+            waiters = _progress_waiters.get(task_id)
+            if waiters is not None:
+                waiters.discard(wake)
+                if not waiters:
+                    del _progress_waiters[task_id]
+
+    return StreamingResponse(generate(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def create_app(start_services=True):
+    """ASGI 앱. start_services: 시작할 때 상주 워커와 작업 큐를 띄움 (pipeline_server.start_background_services)"""
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        loop = asyncio.get_running_loop()
+        # 작업 스레드에서 기록된 진행 이벤트를 구독 중인 스트림에만 전달
+        def wake(task_id):
+            if task_id in _progress_waiters:
+                loop.call_soon_threadsafe(_wake_progress, task_id)
+
+        ps.PROGRESS.add_listener(wake)
+        if start_services:
+            await asyncio.to_thread(ps.start_background_services)
+        try:
+            yield
+        finally:
+            # 루프가 닫힌 뒤에는 publish에서 call_soon_threadsafe가 실패하므로 떼어 냄
+            ps.PROGRESS.remove_listener(wake)
+
+    routes = [
+        Route("/api/filter", filter_image, methods=["POST"]),
+        Route("/api/process", process_image, methods=["POST"]),
+        Route("/api/jobs/{job_id}", job_status, methods=["GET"]),
+        Route("/api/tasks/{task_id}/events", task_events, methods=["GET"]),
+        Route("/api/health", health, methods=["GET"]),
+        Route("/api/metrics", metrics, methods=["GET"]),
+        # 나머지 /api 경로는 Flask 앱 그대로
+        Mount("/", app=WSGIMiddleware(ps.app, workers=WSGI_THREADS)),
+    ]
+    return Starlette(
+        routes=routes,
+        middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+        lifespan=lifespan
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="파이프라인 서버 비동기 서빙 모드 (uvicorn)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
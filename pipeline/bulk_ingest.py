@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""디렉토리 일괄 처리: 폴더 안의 이미지를 한 번에 CLIP 필터링하고 통과한 이미지를 병렬로 3D 재구성
+
+pipeline_server.py의 filter_images / run_reconstruction을 그대로 사용하므로 사전 필터, 결과 캐시,
+상주 워커가 서버와 똑같이 동작합니다. 진행 상황은 OUTPUT_DIR/manifest.json에 기록되며,
+중간에 죽어도 같은 명령을 다시 실행하면 끝난 이미지는 건너뛰고 이어서 처리합니다.
+
+    python bulk_ingest.py /data/shoot_0412 /data/shoot_0412_meshes --model fast --concurrency 2
+
+결과: OUTPUT_DIR/meshes/<입력 상대 경로>_<model>.glb, 러너 로그 등 중간 파일은 OUTPUT_DIR/work/<이미지 해시>/
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+MANIFEST_NAME = "manifest.json"
+
+# 항목 상태
+PENDING = "pending"          # 아직 필터링 전
+ACCEPTED = "accepted"        # 필터 통과, 재구성 대기
+REJECTED = "rejected"        # 필터에서 반려 (재구성하지 않음)
+FILTER_ERROR = "filter_error"
+RECONSTRUCTING = "reconstructing"
+DONE = "done"
+FAILED = "failed"
+
+
+class Manifest:
+    """입력 상대 경로별 판정/결과 기록. 바뀔 때마다 임시 파일에 쓰고 교체해 중간에 죽어도 깨지지 않음"""
+
+    def __init__(self, path, input_dir, model):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"input_dir": input_dir, "model": model, "created_at": time.time(), "items": {}}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+            self.data["input_dir"] = input_dir
+            self.data["model"] = model
+
+    @property
+    def items(self):
+        return self.data["items"]
+
+    def update(self, rel_path, **fields):
+        with self._lock:
+            self.items.setdefault(rel_path, {}).update(fields, updated_at=time.time())
+            self._save_locked()
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        counts = {}
+        for item in self.items.values():
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        self.data["summary"] = counts
+        self.data["updated_at"] = time.time()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+
+def find_images(input_dir, allowed_file):
+    """input_dir 아래 이미지의 상대 경로 (정렬, 숨김 디렉토리 제외)"""
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if allowed_file(name):
+                found.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return found
+
+
+def plan(manifest, rel_paths, hashes, model, retry_failed):
+    """이어서 할 일 정리: (필터링할 경로, 재구성할 경로)
+
+    이미지 내용(해시)이 그대로이고 이미 판정/완료된 항목은 건너뜀.
+    재구성 도중 죽은 항목은 다시 재구성하고, 실패한 항목은 retry_failed일 때만 다시 시도
+    """
+    to_filter, to_reconstruct = [], []
+    for rel_path in rel_paths:
+        item = manifest.items.get(rel_path)
+        if item is None or item.get("image_hash") != hashes[rel_path]:
+            manifest.items[rel_path] = {"status": PENDING, "image_hash": hashes[rel_path]}
+            to_filter.append(rel_path)
+            continue
+        status = item["status"]
+        if status in (PENDING, FILTER_ERROR):
+            to_filter.append(rel_path)
+        elif status == DONE and item.get("model") == model and os.path.exists(item.get("mesh_path", "")):
+            continue
+        elif status == FAILED and not retry_failed and item.get("model") == model:
+            continue
+        elif status != REJECTED:
+            to_reconstruct.append(rel_path)
+    manifest.save()
+    return to_filter, to_reconstruct
+
+
+def run_filter(ps, manifest, input_dir, rel_paths, batch_size):
+    """batch_size개씩 묶어 filter_images로 판정. 반환: 통과한 경로"""
+    accepted = []
+    for start in range(0, len(rel_paths), batch_size):
+        batch = rel_paths[start:start + batch_size]
+        started = time.monotonic()
+        results = ps.filter_images([os.path.join(input_dir, p) for p in batch],
+                                   [manifest.items[p]["image_hash"] for p in batch])
+        for rel_path, result in zip(batch, results):
+            status = result.get("status")
+            if status == "accept":
+                accepted.append(rel_path)
+                item_status = ACCEPTED
+            else:
+                item_status = FILTER_ERROR if status == "error" else REJECTED
+            manifest.update(rel_path, status=item_status, filter=result)
+        print(f"[BULK] Filtered {min(start + batch_size, len(rel_paths))}/{len(rel_paths)} "
+              f"({time.monotonic() - started:.1f}s for {len(batch)})", file=sys.stderr)
+    return accepted
+
+
+def mesh_destination(output_dir, rel_path, model):
+    stem = os.path.splitext(rel_path)[0]
+    return os.path.join(output_dir, "meshes", f"{stem}_{model}.glb")
+
+
+def run_reconstructions(ps, manifest, input_dir, output_dir, rel_paths, model, concurrency):
+    """서버와 같은 GpuScheduler로 장치 용량 안에서, 동시에 최대 concurrency개씩 재구성"""
+    from scheduler import GpuScheduler
+    from result_cache import link_or_copy
+
+    scheduler = GpuScheduler(ps.GPU_DEVICES)
+    cond = threading.Condition()
+    pending = [{"job_id": p, "model": model, "created_at": time.time()} for p in rel_paths]
+    finished = {"done": 0, "failed": 0}
+
+    def reconstruct(rel_path, device):
+        image_hash = manifest.items[rel_path]["image_hash"]
+        work_dir = os.path.join(output_dir, "work", image_hash[:16], f"{model}_output")
+        os.makedirs(work_dir, exist_ok=True)
+        manifest.update(rel_path, status=RECONSTRUCTING, model=model, device=device, error=None)
+        started = time.monotonic()
+        image_path = os.path.join(input_dir, rel_path)
+        # 배경 제거 결과는 입력 폴더 대신 작업 디렉토리에 저장 (모델을 바꿔 다시 실행해도 재사용)
+        get_rgba = lambda: ps.remove_background(image_path, os.path.dirname(work_dir), image_hash)
+        try:
+            result = ps.run_reconstruction(model, image_path, work_dir, device=device, get_rgba=get_rgba)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        seconds = time.monotonic() - started
+        mesh_path = result.get("mesh_path")
+        if result.get("success") and mesh_path and os.path.exists(mesh_path):
+            destination = mesh_destination(output_dir, rel_path, model)
+            link_or_copy(mesh_path, destination)
+            manifest.update(rel_path, status=DONE, mesh_path=destination, seconds=seconds,
+                            cached=result.get("cached", False))
+            return True
+        manifest.update(rel_path, status=FAILED, seconds=seconds,
+                        error=result.get("error", "생성된 3D 모델 파일을 찾을 수 없습니다"))
+        return False
+
+    def worker():
+        while True:
+            with cond:
+                while True:
+                    if not pending:
+                        return
+                    job, device = scheduler.pick(pending)
+                    if job is not None:
+                        pending.remove(job)
+                        break
+                    cond.wait(timeout=5)
+            ok = False
+            try:
+                ok = reconstruct(job["job_id"], device)
+            finally:
+                scheduler.release(job["job_id"])
+                with cond:
+                    finished["done" if ok else "failed"] += 1
+                    done_count = finished["done"] + finished["failed"]
+                    cond.notify_all()
+            print(f"[BULK] {done_count}/{len(rel_paths)} {'done' if ok else 'FAILED'}: {job['job_id']}",
+                  file=sys.stderr)
+
+    threads = [threading.Thread(target=worker, name=f"bulk-{i}", daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description="디렉토리 일괄 CLIP 필터링 + 3D 재구성 (중단 후 이어서 실행 가능)")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--model", choices=["fast", "quality"], default="fast")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="동시 재구성 수 (기본: GPU_DEVICES의 슬롯 합계, 장치 메모리 한도는 항상 적용)")
+    parser.add_argument("--batch-size", type=int, default=64, help="CLIP 배치 크기 (배치마다 manifest 저장)")
+    parser.add_argument("--retry-failed", action="store_true", help="이전 실행에서 실패한 재구성도 다시 시도")
+    parser.add_argument("--filter-only", action="store_true", help="판정만 기록하고 재구성하지 않음")
+    parser.add_argument("--run-dir", help="이 실행의 상주 워커 소켓/로그 디렉토리 (기본: 임시 디렉토리, "
+                                         "실행 중인 서버의 워커와 겹치지 않도록 분리)")
+    args = parser.parse_args()
+
+    input_dir = os.path.abspath(args.input_dir)
+    output_dir = os.path.abspath(args.output_dir)
+    if not os.path.isdir(input_dir):
+        parser.error(f"입력 디렉토리가 없습니다: {input_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+    os.environ["PIPELINE_RUN_DIR"] = (args.run_dir or os.environ.get("PIPELINE_RUN_DIR")
+                                      or tempfile.mkdtemp(prefix="bulk-ingest-"))
+
+    # 서버 모듈은 import 시점에 RUN_DIR로 워커를 구성하므로 환경 변수를 정한 뒤에 불러옴
+    import pipeline_server as ps
+    from result_cache import hash_file
+
+    print(f"[BULK] Worker sockets/logs: {ps.RUN_DIR}", file=sys.stderr)
+    ps.CLIP_WORKER.start()  # 해시 계산 중에 CLIP 모델 로딩
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
+    try:
+        rel_paths = find_images(input_dir, ps.allowed_file)
+        manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME), input_dir, args.model)
+        hashes = {p: hash_file(os.path.join(input_dir, p)) for p in rel_paths}
+        to_filter, to_reconstruct = plan(manifest, rel_paths, hashes, args.model, args.retry_failed)
+        print(f"[BULK] {len(rel_paths)} image(s): {len(to_filter)} to filter, "
+              f"{len(to_reconstruct)} to resume reconstruction", file=sys.stderr)
+
+        to_reconstruct += run_filter(ps, manifest, input_dir, to_filter, args.batch_size)
+        if to_reconstruct and not args.filter_only:
+            concurrency = args.concurrency or sum(d.get("slots", 1) for d in ps.GPU_DEVICES)
+            run_reconstructions(ps, manifest, input_dir, output_dir, to_reconstruct, args.model, max(1, concurrency))
+    finally:
+        ps.CLIP_WORKER.stop()
+        for worker in list(ps._resident_workers.values()):
+            worker.stop()
+
+    summary = manifest.data.get("summary", {})
+    print(f"[BULK] Finished: {json.dumps(summary, ensure_ascii=False)} -> {manifest.path}", file=sys.stderr)
+    sys.exit(1 if summary.get(FAILED) or summary.get(FILTER_ERROR) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""재구성 작업 취소: 취소 토큰과 프로세스 트리 종료
+
+- CancelToken: 작업마다 하나. cancel()을 부르면 등록된 콜백(러너 프로세스 종료, 워커 연결 끊기 등)을 실행
+- Cancelled: 취소된 작업의 실행 경로를 빠져나올 때 쓰는 예외. asyncio.CancelledError처럼 BaseException을
+  상속해 러너 호출부의 `except Exception` 오류 처리(실패 결과로 바꾸기, 단발 실행으로 대체)에 걸리지 않음
+
+서버와 러너 관리 코드(worker_ipc.py, progress.py)에서 함께 쓰므로 표준 라이브러리만 사용합니다.
+"""
+
+import os
+import signal
+import sys
+import threading
+
+
+class Cancelled(BaseException):
+    """작업이 취소됨"""
+
+
+class CancelToken:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks = {}
+        self._next_id = 0
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def raise_if_cancelled(self):
+        if self._cancelled:
+            raise Cancelled()
+
+    def on_cancel(self, callback):
+        """취소 시 호출할 콜백 등록 (이미 취소됐으면 바로 호출). 반환: 등록 해제 함수"""
+        with self._lock:
+            if not self._cancelled:
+                callback_id = self._next_id
+                self._next_id += 1
+                self._callbacks[callback_id] = callback
+                return lambda: self._callbacks.pop(callback_id, None)
+        callback()
+        return lambda: None
+
+    def cancel(self):
+        """취소 표시 후 등록된 콜백 실행. 처음 취소했으면 참"""
+        with self._lock:
+            if self._cancelled:
+                return False
+            self._cancelled = True
+            callbacks, self._callbacks = list(self._callbacks.values()), {}
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[CANCEL] Cancel callback failed: {e}", file=sys.stderr)
+        return True
+
+
+def _descendants(pid):
+    """pid의 모든 자손 프로세스 (/proc 기준, 다른 세션으로 빠져나간 자식까지)"""
+    found = []
+    stack = [pid]
+    while stack:
+        parent = stack.pop()
+        try:
+            tasks = os.listdir(f"/proc/{parent}/task")
+        except OSError:
+            continue
+        for tid in tasks:
+            try:
+                with open(f"/proc/{parent}/task/{tid}/children") as f:
+                    children = [int(c) for c in f.read().split()]
+            except OSError:
+                continue
+            found.extend(children)
+            stack.extend(children)
+    return found
+
+
+def kill_process_tree(pid):
+    """프로세스와 그 자손을 모두 SIGKILL로 종료 (GPU 메모리를 바로 돌려받기 위해 정리 시간 없이 종료)
+
+    러너는 start_new_session=True로 띄우므로 프로세스 그룹째 종료하고, 그룹을 바꾼 자손도 따로 종료
+    """
+    descendants = _descendants(pid)
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    for child in [pid] + descendants:
+        try:
+            os.kill(child, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
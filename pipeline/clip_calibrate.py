@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""CLIP 필터 오프라인 보정: 라벨 붙은 이미지 모음으로 프롬프트 집합과 사람/풍경 임계값 조합을 한 번에 평가
+
+1) embed: 이미지를 한 번만 인코딩해 CACHE_DIR/images.npy (float32 [N, 차원], memmap)에 저장
+   정답 카테고리는 이미지가 들어 있는 맨 위 폴더 이름 앞의 숫자 (예: corpus/2_person/a.jpg -> 2)
+   다시 실행하면 경로/크기/수정 시각이 같은 이미지는 기존 행을 그대로 쓰고 새 이미지만 인코딩
+2) score: 프롬프트 집합(clip_prompts.PROMPTS_MAP 형식)마다 카테고리 텍스트 임베딩을 만들고, 이미지 임베딩과의
+   행렬곱 한 번으로 모든 집합의 확률을 구한 뒤 임계값 격자별 혼동 행렬을 bincount로 집계
+   문장 임베딩은 CACHE_DIR/sentences.npy에 캐시되어 처음 보는 문장만 텍스트 인코더로 계산
+   (모든 문장이 캐시에 있으면 CLIP 모델을 로드하지 않음)
+
+    python clip_calibrate.py embed /data/clip_labeled /data/clip_calib
+    python clip_calibrate.py score /data/clip_calib --prompts variants.json --leave-one-out \
+        --thresholds 0.05:0.5:0.01 --output calib.json
+
+variants.json: 프롬프트 집합 목록 또는 {이름: 프롬프트 집합} ({"0": [문장, ...], ..., "5": [...]})
+결과: 조합별 카테고리 정확도, accept/reject 기준 오반려율(false reject)과 오통과율(false accept),
+현재 설정(PROMPTS_MAP, HUMAN_THRESHOLD)과 상위 조합의 카테고리별 혼동 행렬
+판정 규칙은 clip_prompts.category_of와 같음. 서버는 GPU에서 fp16으로 계산하므로 경계 근처 판정은 드물게 다를 수 있음
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from clip_prompts import PROMPTS_MAP, ACCEPT_CATEGORY, HUMAN_CATEGORY, HUMAN_THRESHOLD
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+LOGIT_SCALE = 100.0  # clip_filter.image_probs와 같은 softmax 온도
+CHUNK_ELEMENTS = 8 * 1024 ** 2  # 한 번에 만드는 [이미지, 프롬프트 집합, 카테고리] logits 원소 수 (float32 32MB)
+SORT_KEYS = ("accuracy", "verdict_accuracy", "false_reject_rate", "false_accept_rate")
+
+_clip_filter = None
+
+
+def load_clip_filter():
+    """CLIP 모델은 인코딩이 필요할 때만 로드 (import 시 모델을 올림)"""
+    global _clip_filter
+    if _clip_filter is None:
+        import clip_filter
+        _clip_filter = clip_filter
+    return _clip_filter
+
+
+def save_npy(path, array):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def save_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+# --- embed ---
+
+def list_corpus(corpus_dir):
+    """(상대 경로, 카테고리) 목록. 숫자로 시작하지 않는 맨 위 폴더는 건너뜀"""
+    items = []
+    for top in sorted(os.listdir(corpus_dir)):
+        match = re.match(r"\d+", top)
+        top_path = os.path.join(corpus_dir, top)
+        if not os.path.isdir(top_path):
+            continue
+        if match is None:
+            print(f"[CALIB] Skipping {top}/: folder name must start with a category number", file=sys.stderr)
+            continue
+        label = int(match.group())
+        if label not in PROMPTS_MAP:
+            print(f"[CALIB] Skipping {top}/: unknown category {label}", file=sys.stderr)
+            continue
+        for root, dirs, files in os.walk(top_path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    items.append((os.path.relpath(os.path.join(root, name), corpus_dir), label))
+    return items
+
+
+def embed_corpus(corpus_dir, cache_dir, batch_size=64):
+    """corpus_dir 이미지를 인코딩해 cache_dir/images.npy, labels.npy, corpus.json에 저장. 반환: corpus.json 내용"""
+    from PIL import Image
+
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, "corpus.json")
+    images_path = os.path.join(cache_dir, "images.npy")
+    clip_filter = load_clip_filter()
+    encoder = {"model": clip_filter.MODEL_NAME, "device": clip_filter.device,
+               "cpu_mode": clip_filter.CPU_MODE if clip_filter.device == "cpu" else None}
+
+    # 같은 인코더로 만든 이전 캐시에서 바뀌지 않은 이미지의 행을 재사용
+    previous, previous_rows = {}, None
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            old_meta = json.load(f)
+        if old_meta.get("encoder") == encoder:
+            previous_rows = np.load(images_path, mmap_mode="r")
+            previous = {(i["path"], i["size"], i["mtime_ns"]): row for row, i in enumerate(old_meta["images"])}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    images, sources, pending = [], [], []
+    for rel_path, label in list_corpus(corpus_dir):
+        st = os.stat(os.path.join(corpus_dir, rel_path))
+        key = (rel_path, st.st_size, st.st_mtime_ns)
+        images.append({"path": rel_path, "label": label, "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+        sources.append(previous.get(key))
+    if not images:
+        raise ValueError(f"라벨 폴더(예: 5_accept/)에 이미지가 없습니다: {corpus_dir}")
+
+    dim = clip_filter.model.visual.output_dim
+    tmp = f"{images_path}.{os.getpid()}.tmp"
+    matrix = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(len(images), dim))
+    reused = 0
+    for row, source in enumerate(sources):
+        if source is not None:
+            matrix[row] = previous_rows[source]
+            reused += 1
+        else:
+            pending.append(row)
+
+    skipped = []
+    started = time.time()
+    for start in range(0, len(pending), batch_size):
+        rows, inputs = [], []
+        for row in pending[start:start + batch_size]:
+            try:
+                image = Image.open(os.path.join(corpus_dir, images[row]["path"])).convert("RGB")
+                inputs.append(clip_filter.preprocess(image))
+                rows.append(row)
+            except Exception as e:
+                print(f"[CALIB] Skipping {images[row]['path']}: {e}", file=sys.stderr)
+                skipped.append(row)
+        if inputs:
+            _, features = clip_filter.image_probs(clip_filter.torch.stack(inputs), return_features=True)
+            matrix[rows] = features
+        done = min(start + batch_size, len(pending))
+        print(f"[CALIB] Embedded {done}/{len(pending)} new images ({time.time() - started:.1f}s)", file=sys.stderr)
+    matrix.flush()
+    del matrix
+
+    keep = np.setdiff1d(np.arange(len(images)), skipped)
+    if skipped:
+        # 읽지 못한 이미지는 행째 뺌 (다음 실행에서 다시 시도)
+        kept = np.load(tmp, mmap_mode="r")[keep]
+        os.remove(tmp)
+        save_npy(images_path, kept)
+    else:
+        os.replace(tmp, images_path)
+    images = [images[i] for i in keep]
+    save_npy(os.path.join(cache_dir, "labels.npy"), np.array([i["label"] for i in images], dtype=np.int64))
+    meta = {"corpus_dir": os.path.abspath(corpus_dir), "encoder": encoder, "dim": dim, "created_at": time.time(),
+            "images": images}
+    save_json(meta_path, meta)
+    print(f"[CALIB] {len(images)} images ({reused} reused, {len(pending) - len(skipped)} encoded, "
+          f"{len(skipped)} skipped) -> {images_path}", file=sys.stderr)
+    return meta
+
+
+# --- 프롬프트 집합 ---
+
+def normalize_prompt_map(prompt_map):
+    """JSON의 문자열 키를 카테고리 번호로 바꾸고 PROMPTS_MAP과 같은 카테고리가 모두 있는지 확인"""
+    normalized = {int(k): list(v) for k, v in prompt_map.items()}
+    if sorted(normalized) != sorted(PROMPTS_MAP):
+        raise ValueError(f"카테고리 {sorted(PROMPTS_MAP)}가 모두 필요합니다 (받은 값: {sorted(normalized)})")
+    if not all(normalized.values()):
+        raise ValueError("문장이 없는 카테고리가 있습니다")
+    return normalized
+
+
+def load_prompt_sets(path):
+    """variants JSON -> [(이름, 프롬프트 집합)]"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return [(str(name), normalize_prompt_map(m)) for name, m in data.items()]
+    return [(f"variant-{i}", normalize_prompt_map(m)) for i, m in enumerate(data)]
+
+
+def leave_one_out(prompt_map):
+    """문장을 하나씩 뺀 변형들 (문장이 하나뿐인 카테고리는 건너뜀)"""
+    variants = []
+    for category, sentences in prompt_map.items():
+        if len(sentences) < 2:
+            continue
+        for i, sentence in enumerate(sentences):
+            variant = dict(prompt_map)
+            variant[category] = sentences[:i] + sentences[i + 1:]
+            variants.append((f"drop {category}[{i}]: {sentence}", variant))
+    return variants
+
+
+class SentenceCache:
+    """문장 -> 정규화된 텍스트 임베딩 (cache_dir/sentences.npy + sentences.json, 인코더가 바뀌면 버림)"""
+
+    def __init__(self, cache_dir, encoder):
+        self.vectors_path = os.path.join(cache_dir, "sentences.npy")
+        self.index_path = os.path.join(cache_dir, "sentences.json")
+        self.encoder = encoder
+        self.sentences = []
+        self.vectors = None
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("encoder") == encoder:
+                self.vectors = np.load(self.vectors_path, mmap_mode="r")
+                self.sentences = index["sentences"][:len(self.vectors)]
+        except (OSError, ValueError, KeyError):
+            pass
+        self.rows = {s: i for i, s in enumerate(self.sentences)}
+
+    def ensure(self, sentences, batch_size=256):
+        """캐시에 없는 문장만 텍스트 인코더로 계산해 추가. 반환: 새로 인코딩한 문장 수"""
+        missing = sorted(set(sentences) - self.rows.keys())
+        if not missing:
+            return 0
+        clip_filter = load_clip_filter()
+        if clip_filter.MODEL_NAME != self.encoder["model"]:
+            raise ValueError(f"이미지 임베딩 모델({self.encoder['model']})과 CLIP 모델({clip_filter.MODEL_NAME})이 다릅니다")
+        torch = clip_filter.torch
+        encoded = []
+        with torch.no_grad():
+            for start in range(0, len(missing), batch_size):
+                tokens = clip_filter.clip.tokenize(missing[start:start + batch_size]).to(clip_filter.device)
+                features = clip_filter.model.encode_text(tokens).float()
+                encoded.append((features / features.norm(dim=-1, keepdim=True)).cpu().numpy())
+        new_vectors = np.concatenate(encoded)
+        self.vectors = new_vectors if self.vectors is None else np.concatenate([self.vectors, new_vectors])
+        self.sentences += missing
+        self.rows = {s: i for i, s in enumerate(self.sentences)}
+        save_npy(self.vectors_path, self.vectors)
+        save_json(self.index_path, {"encoder": self.encoder, "sentences": self.sentences})
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+        return len(missing)
+
+    def text_matrix(self, prompt_sets):
+        """프롬프트 집합들 -> [집합 수, 카테고리 수, 차원] (clip_filter.encode_prompts처럼 문장 평균을 정규화)"""
+        vectors = np.asarray(self.vectors, dtype=np.float32)
+        categories = sorted(PROMPTS_MAP)
+        text = np.empty((len(prompt_sets), len(categories), vectors.shape[1]), dtype=np.float32)
+        for v, (_, prompt_map) in enumerate(prompt_sets):
+            for c, category in enumerate(categories):
+                mean = vectors[[self.rows[s] for s in prompt_map[category]]].mean(axis=0)
+                text[v, c] = mean / np.linalg.norm(mean)
+        return text
+
+
+# --- score ---
+
+def parse_thresholds(text):
+    """"0.1,0.2" 또는 "시작:끝:간격"(끝 포함) -> 정렬된 임계값 배열 (현재 HUMAN_THRESHOLD는 항상 포함)"""
+    values = {HUMAN_THRESHOLD}
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            start, stop, step = (float(x) for x in part.split(":"))
+            count = int(round((stop - start) / step)) + 1
+            values.update(round(start + i * step, 6) for i in range(count))
+        else:
+            values.add(float(part))
+    return np.array(sorted(values), dtype=np.float32)
+
+
+def confusion_counts(images, labels, text, thresholds):
+    """모든 (임계값, 프롬프트 집합) 조합의 혼동 행렬 [임계값 수, 집합 수, 정답, 예측]
+
+    images: 정규화된 이미지 임베딩 [N, 차원] (memmap 가능), labels: [N] (카테고리 인덱스)
+    text: [집합 수, 카테고리 수, 차원], thresholds: 오름차순
+    logits를 [N, 집합 청크, 카테고리]씩 만들어 메모리를 CHUNK_ELEMENTS 안으로 유지
+    """
+    n, (v_total, c, d) = len(images), text.shape
+    h = len(thresholds)
+    images = np.asarray(images, dtype=np.float32)
+    counts = np.zeros((h, v_total, c, c), dtype=np.int64)
+    step = max(1, CHUNK_ELEMENTS // max(1, n * c))
+    for v0 in range(0, v_total, step):
+        chunk = text[v0:v0 + step]
+        v = len(chunk)
+        logits = (images @ (LOGIT_SCALE * chunk.reshape(-1, d)).T).reshape(n, v, c)
+        best = logits.argmax(axis=-1)
+        # softmax의 사람/풍경 확률만 필요: 1 / sum(exp(logit - logit_human)) (넘치면 inf -> 확률 0)
+        with np.errstate(over="ignore"):
+            human_prob = 1.0 / np.exp(logits - logits[..., HUMAN_CATEGORY:HUMAN_CATEGORY + 1]).sum(axis=-1)
+        del logits
+        # 조합마다 (집합, 정답, 최댓값 카테고리) 칸 번호. 임계값 규칙이 없을 때의 혼동 행렬은 bincount 한 번
+        cells = (((np.arange(v) * c)[None, :] + labels[:, None]) * c + best).ravel()
+        cell_count = v * c * c
+        base = np.bincount(cells, minlength=cell_count)
+        # 임계값 인덱스 < k(= 확률보다 작은 임계값 수)에서 예측이 사람/풍경으로 바뀜: k별로 모아 뒤에서부터 누적
+        flips = best.ravel() != HUMAN_CATEGORY
+        k = np.searchsorted(thresholds, human_prob.ravel()[flips])
+        moved = np.bincount(k * cell_count + cells[flips], minlength=(h + 1) * cell_count)
+        moved = moved.reshape(h + 1, cell_count)[::-1].cumsum(axis=0)[::-1][1:].reshape(h, v, c, c)
+        chunk_counts = base.reshape(1, v, c, c) - moved
+        chunk_counts[..., HUMAN_CATEGORY] += moved.sum(axis=-1)
+        counts[:, v0:v0 + v] = chunk_counts
+    return counts
+
+
+def summarize(counts):
+    """혼동 행렬 [..., 정답, 예측] -> 지표 배열 dict (앞쪽 축 유지)"""
+    accept = sorted(PROMPTS_MAP).index(ACCEPT_CATEGORY)
+    total = counts.sum(axis=(-2, -1))
+    correct = np.trace(counts, axis1=-2, axis2=-1)
+    accept_total = counts[..., accept, :].sum(axis=-1)
+    true_accept = counts[..., accept, accept]
+    false_reject = accept_total - true_accept
+    false_accept = counts[..., :, accept].sum(axis=-1) - true_accept
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "accuracy": correct / total,
+            "verdict_accuracy": 1 - (false_reject + false_accept) / total,
+            "false_reject_rate": np.where(accept_total > 0, false_reject / accept_total, 0.0),
+            "false_accept_rate": np.where(total > accept_total, false_accept / (total - accept_total), 0.0),
+        }
+
+
+def detail(name, prompt_map, threshold, confusion, include_prompts=False):
+    """조합 하나의 지표와 카테고리별 정확도/혼동 행렬"""
+    metrics = summarize(confusion)
+    per_category = {}
+    for i, category in enumerate(sorted(PROMPTS_MAP)):
+        actual, predicted = int(confusion[i].sum()), int(confusion[:, i].sum())
+        per_category[str(category)] = {
+            "images": actual,
+            "recall": float(confusion[i, i] / actual) if actual else None,
+            "precision": float(confusion[i, i] / predicted) if predicted else None,
+        }
+    entry = {"prompts": name, "threshold": float(threshold), **{k: float(v) for k, v in metrics.items()},
+             "per_category": per_category, "confusion": confusion.tolist()}
+    if include_prompts:
+        entry["prompt_map"] = {str(k): v for k, v in prompt_map.items()}
+    return entry
+
+
+def score(cache_dir, prompt_sets, thresholds, sort_key="accuracy", top=10, full_grid=False):
+    """캐시된 이미지 임베딩으로 프롬프트 집합 x 임계값 조합을 채점. prompt_sets[0]은 현재 설정"""
+    with open(os.path.join(cache_dir, "corpus.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    images = np.load(os.path.join(cache_dir, "images.npy"), mmap_mode="r")
+    labels = np.load(os.path.join(cache_dir, "labels.npy"))
+    categories = sorted(PROMPTS_MAP)
+    labels = np.searchsorted(categories, labels)  # 카테고리 번호 -> 행렬 인덱스
+
+    timings = {}
+    started = time.perf_counter()
+    sentences = SentenceCache(cache_dir, meta["encoder"])
+    encoded = sentences.ensure({s for _, m in prompt_sets for group in m.values() for s in group})
+    text = sentences.text_matrix(prompt_sets)
+    timings["text_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    counts = confusion_counts(images, labels, text, thresholds)
+    metrics = summarize(counts)  # 각 [임계값 수, 집합 수]
+    timings["score_seconds"] = time.perf_counter() - started
+
+    # 정렬: 정확도 계열은 높을수록, 오류율은 낮을수록 좋음 (같으면 오반려율이 낮은 쪽)
+    primary = metrics[sort_key] if sort_key.endswith("accuracy") else -metrics[sort_key]
+    order = np.lexsort((metrics["false_reject_rate"].ravel(), -primary.ravel()))
+    baseline_t = int(np.searchsorted(thresholds, np.float32(HUMAN_THRESHOLD)))
+    report = {
+        "cache_dir": os.path.abspath(cache_dir),
+        "encoder": meta["encoder"],
+        "images": len(labels),
+        "images_per_category": {str(c): int((labels == i).sum()) for i, c in enumerate(categories)},
+        "prompt_sets": len(prompt_sets),
+        "thresholds": [float(t) for t in thresholds],
+        "combinations": counts.shape[0] * counts.shape[1],
+        "sentences_encoded": encoded,
+        **timings,
+        "sort": sort_key,
+        "baseline": detail(prompt_sets[0][0], prompt_sets[0][1], thresholds[baseline_t], counts[baseline_t, 0]),
+        # 현재 프롬프트에서 임계값만 바꿨을 때
+        "baseline_thresholds": [
+            {"threshold": float(t), **{k: float(v[i, 0]) for k, v in metrics.items()}}
+            for i, t in enumerate(thresholds)
+        ],
+        "best": [],
+    }
+    for flat in order[:top]:
+        t, v = np.unravel_index(flat, counts.shape[:2])
+        name, prompt_map = prompt_sets[v]
+        report["best"].append(detail(name, prompt_map, thresholds[t], counts[t, v], include_prompts=True))
+    if full_grid:
+        report["grid"] = [
+            {"prompts": prompt_sets[v][0], "threshold": float(thresholds[t]),
+             **{k: float(metric[t, v]) for k, metric in metrics.items()}}
+            for t in range(len(thresholds)) for v in range(len(prompt_sets))
+        ]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLIP 필터 프롬프트/임계값 오프라인 보정")
+    commands = parser.add_subparsers(dest="command", required=True)
+    embed = commands.add_parser("embed", help="라벨 폴더의 이미지를 인코딩해 캐시에 저장")
+    embed.add_argument("corpus_dir", help="<카테고리 번호>[_이름]/ 폴더 아래 이미지 (예: 5_accept/, 2_person/)")
+    embed.add_argument("cache_dir")
+    embed.add_argument("--batch-size", type=int, default=64)
+    scorer = commands.add_parser("score", help="프롬프트 집합 x 임계값 조합 채점")
+    scorer.add_argument("cache_dir")
+    scorer.add_argument("--prompts", help="프롬프트 집합 JSON (목록 또는 {이름: 집합})")
+    scorer.add_argument("--leave-one-out", action="store_true", help="현재 PROMPTS_MAP에서 문장을 하나씩 뺀 변형도 채점")
+    scorer.add_argument("--thresholds", default="0.05:0.5:0.01",
+                        help="사람/풍경 반려 임계값 (쉼표 목록 또는 시작:끝:간격, 1이면 규칙 끔)")
+    scorer.add_argument("--sort", choices=SORT_KEYS, default="accuracy")
+    scorer.add_argument("--top", type=int, default=10)
+    scorer.add_argument("--full-grid", action="store_true", help="모든 조합의 지표를 결과에 포함")
+    scorer.add_argument("--output", help="결과 JSON 경로 (없으면 stdout)")
+    args = parser.parse_args()
+
+    if args.command == "embed":
+        embed_corpus(args.corpus_dir, args.cache_dir, args.batch_size)
+        return
+
+    prompt_sets = [("current", {k: list(v) for k, v in PROMPTS_MAP.items()})]
+    if args.leave_one_out:
+        prompt_sets += leave_one_out(prompt_sets[0][1])
+    if args.prompts:
+        prompt_sets += load_prompt_sets(args.prompts)
+    report = score(args.cache_dir, prompt_sets, parse_thresholds(args.thresholds), args.sort, args.top,
+                   args.full_grid)
+
+    print(f"[CALIB] {report['combinations']} combinations ({report['prompt_sets']} prompt sets x "
+          f"{len(report['thresholds'])} thresholds) over {report['images']} images in "
+          f"{report['score_seconds']:.2f}s (text {report['text_seconds']:.2f}s)", file=sys.stderr)
+    for label, entry in [("current", report["baseline"])] + [("best", b) for b in report["best"][:1]]:
+        print(f"[CALIB]   {label}: {entry['prompts']} @ {entry['threshold']:.2f} -> accuracy {entry['accuracy']:.1%}, "
+              f"false reject {entry['false_reject_rate']:.1%}, false accept {entry['false_accept_rate']:.1%}",
+              file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
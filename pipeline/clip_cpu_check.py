@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""CPU CLIP 추론 모드 검증: fp32 대비 판정 일치 여부와 지연 시간 비교
+
+참조 이미지 디렉토리의 모든 이미지를 fp32 / quantized / onnx 이미지 인코더로 판정해
+accept/reject와 카테고리(사람/풍경 probs[2] > 0.20 규칙 포함)가 fp32와 같은지 확인하고,
+배치 크기와 스레드 수별 이미지당 지연 시간을 잽니다. 판정이 하나라도 다르면 종료 코드 1.
+
+    python clip_cpu_check.py /data/clip_reference --modes fp32,quantized,onnx --threads 1,4 --output cpu_check.json
+
+검증이 끝나면 CLIP 워커 환경 변수로 적용: CLIP_CPU_MODE=quantized CLIP_CPU_THREADS=4
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import time
+
+# GPU가 있어도 CPU 경로를 측정하고, 기준 모델은 항상 fp32로 로드
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+os.environ["CLIP_CPU_MODE"] = "fp32"
+
+import torch
+from PIL import Image
+
+import clip_filter
+
+HUMAN_CATEGORY = clip_filter.HUMAN_CATEGORY
+HUMAN_THRESHOLD = clip_filter.HUMAN_THRESHOLD
+
+
+def load_images(reference_dir):
+    paths, inputs = [], []
+    for root, _, files in os.walk(reference_dir):
+        for name in sorted(files):
+            if name.lower().endswith((".png", ".jpg", ".jpeg")):
+                path = os.path.join(root, name)
+                try:
+                    inputs.append(clip_filter.preprocess(Image.open(path).convert("RGB")))
+                except Exception as e:
+                    print(f"[CHECK] Skipping {path}: {e}", file=sys.stderr)
+                    continue
+                paths.append(os.path.relpath(path, reference_dir))
+    return paths, inputs
+
+
+def all_probs(encoder, inputs, batch_size):
+    return [p for start in range(0, len(inputs), batch_size)
+            for p in clip_filter.image_probs(torch.stack(inputs[start:start + batch_size]), encoder)]
+
+
+def measure_latency(encoder, inputs, batch_size, repeat):
+    """배치 단위로 repeat번 돌려 이미지당 지연 시간(ms) 중앙값/p95"""
+    batch = torch.stack((inputs * batch_size)[:batch_size])
+    clip_filter.image_probs(batch, encoder)  # 워밍업
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        clip_filter.image_probs(batch, encoder)
+        samples.append((time.perf_counter() - started) * 1000 / batch_size)
+    samples.sort()
+    return {
+        "per_image_ms_p50": statistics.median(samples),
+        "per_image_ms_p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "images_per_s": 1000 / statistics.median(samples),
+    }
+
+
+def compare(paths, baseline, probs):
+    """fp32 판정과 다른 이미지 목록과 확률 차이"""
+    mismatches = []
+    max_diff = 0.0
+    for path, base, other in zip(paths, baseline, probs):
+        max_diff = max(max_diff, float(abs(base - other).max()))
+        base_cat, other_cat = clip_filter.category_of(base), clip_filter.category_of(other)
+        if base_cat != other_cat:
+            mismatches.append({
+                "image": path,
+                "fp32": {"category": base_cat, "status": clip_filter.classify_probs(base)["status"],
+                         "human_prob": float(base[HUMAN_CATEGORY])},
+                "mode": {"category": other_cat, "status": clip_filter.classify_probs(other)["status"],
+                         "human_prob": float(other[HUMAN_CATEGORY])},
+            })
+    statuses = [(clip_filter.classify_probs(b)["status"], clip_filter.classify_probs(o)["status"])
+                for b, o in zip(baseline, probs)]
+    human = [(b[HUMAN_CATEGORY] > HUMAN_THRESHOLD, o[HUMAN_CATEGORY] > HUMAN_THRESHOLD)
+             for b, o in zip(baseline, probs)]
+    return {
+        "images": len(paths),
+        "status_agreement": sum(a == b for a, b in statuses) / len(paths),
+        "category_agreement": 1 - len(mismatches) / len(paths),
+        "human_override_agreement": sum(a == b for a, b in human) / len(paths),
+        "human_override_fp32_count": sum(a for a, _ in human),
+        "max_prob_diff": max_diff,
+        # 경계 근처(probs[2]가 0.20 ± 0.02)의 이미지 수: 양자화 오차로 뒤집히기 쉬운 구간
+        "near_human_threshold": sum(abs(b[HUMAN_CATEGORY] - HUMAN_THRESHOLD) < 0.02 for b in baseline),
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU CLIP 추론 모드 정확도/지연 시간 비교")
+    parser.add_argument("reference_dir")
+    parser.add_argument("--modes", default="fp32,quantized,onnx")
+    parser.add_argument("--threads", default=str(clip_filter.CPU_THREADS), help="intra-op 스레드 수 (쉼표로 여러 개)")
+    parser.add_argument("--batch-sizes", default="1,8,16")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="결과 JSON 경로 (없으면 stdout)")
+    args = parser.parse_args()
+
+    paths, inputs = load_images(args.reference_dir)
+    if not paths:
+        parser.error(f"이미지가 없습니다: {args.reference_dir}")
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    thread_counts = [int(t) for t in args.threads.split(",")]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    baseline_encoder = clip_filter.build_image_encoder("fp32")
+    baseline = all_probs(baseline_encoder, inputs, max(batch_sizes))
+    report = {
+        "model": clip_filter.MODEL_NAME,
+        "reference_dir": os.path.abspath(args.reference_dir),
+        "torch": torch.__version__,
+        "interop_threads": clip_filter.CPU_INTEROP_THREADS,
+        "modes": {},
+    }
+    ok = True
+    for mode in modes:
+        if mode == "onnx" and importlib.util.find_spec("onnxruntime") is None:
+            print("[CHECK] Skipping onnx: onnxruntime is not installed", file=sys.stderr)
+            continue
+        print(f"[CHECK] {mode}...", file=sys.stderr)
+        encoder = baseline_encoder if mode == "fp32" else clip_filter.build_image_encoder(mode, keep_original=True)
+        accuracy = compare(paths, baseline, all_probs(encoder, inputs, max(batch_sizes)))
+        ok = ok and not accuracy["mismatches"]
+        latency = {}
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            for batch_size in batch_sizes:
+                latency[f"threads={threads},batch={batch_size}"] = measure_latency(encoder, inputs, batch_size,
+                                                                                 args.repeat)
+        torch.set_num_threads(clip_filter.CPU_THREADS)
+        report["modes"][mode] = {"accuracy": accuracy, "latency": latency}
+        print(f"[CHECK]   verdict agreement {accuracy['status_agreement']:.1%}, "
+              f"category agreement {accuracy['category_agreement']:.1%}, "
+              f"{len(accuracy['mismatches'])} mismatch(es)", file=sys.stderr)
+
+    # fp32 대비 속도 (같은 스레드/배치 조건끼리)
+    if "fp32" in report["modes"]:
+        base_latency = report["modes"]["fp32"]["latency"]
+        for mode, entry in report["modes"].items():
+            entry["speedup_vs_fp32"] = {
+                key: base_latency[key]["per_image_ms_p50"] / value["per_image_ms_p50"]
+                for key, value in entry["latency"].items()
+            }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,39 @@
 import torch
 import clip
 from PIL import Image
+import hashlib
+import json
+import numpy as np
 import os
+import queue
+import sys
+import threading
+import time
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess = clip.load("ViT-B/32", device=device)
-
-PROMPTS_MAP = {
-    0: [
-        "An incomplete image that is only partially loaded.",
-        "A photo covered by a large solid color block.",
-        "A corrupted file with rendering errors.",
-        "Glitch art with digital artifacts."
-    ],
-    1: [
-        "A very blurry photo where details are unrecognizable.",
-        "Severe pixelation due to low resolution.",
-        "Out of focus photography."
-    ],
-    2: [
-        "A photo containing a human being, person, or people.",
-        "A human figure in the frame.",
-        "A man, woman, or child.",
-        "A portrait or full body shot of a person.",
-        "A panoramic landscape of nature or city."
-    ],
-    3: [
-        "A transparent glass or water.",
-        "A reflective mirror surface.",
-        "An image where the object is cut off by the frame."
-    ],
-    4: [
-        "A background with a brick wall, stone fence, or house siding.",
-        "Windows, doors, or architectural details behind the object.",
-        "Dense bushes, hedges, or trees directly behind the object.",
-        "A busy chaotic scene with urban clutter."
-    ],
-    5: [
-        "A product photo isolated on a plain white or solid color background.",
-        "A studio shot with a solid smooth wall.",
-        "A minimalist photo with a black or dark background.",
-        "A high quality 3D render or cartoon character.",
-        "A single object on a large open grass lawn.",
-        "An object sitting on an empty floor or pavement.",
-        "Delicious food photography."
-    ]
-}
+from clip_prompts import PROMPTS_MAP, ACCEPT_CATEGORY, HUMAN_CATEGORY, HUMAN_THRESHOLD, category_of
+
+_LOAD_STARTED = time.time()  # 모델/프롬프트 임베딩 로딩 시간 측정 (상주 워커 ping 응답에 포함)
+MODEL_NAME = "ViT-B/32"
+# 서버가 정해 넘긴 장치 (필터 결과 캐시 키에 포함). 직접 실행하면 GPU가 있으면 cuda
+device = os.environ.get("CLIP_DEVICE") or ("cuda" if torch.cuda.is_available() else "cpu")
+
+# GPU가 없을 때의 이미지 인코더 실행 방식 (clip_cpu_check.py로 fp32와 판정 일치 여부를 확인한 뒤 바꿀 것)
+# - fp32: 기본 PyTorch 모델
+# - quantized: 이미지 인코더의 Linear 층을 int8 동적 양자화
+# - onnx: 이미지 인코더를 ONNX로 내보내 ONNX Runtime으로 실행 (onnxruntime 필요, 없으면 fp32)
+CPU_MODE = os.environ.get("CLIP_CPU_MODE", "fp32")
+CPU_THREADS = int(os.environ.get("CLIP_CPU_THREADS", 0)) or len(os.sched_getaffinity(0))
+CPU_INTEROP_THREADS = int(os.environ.get("CLIP_CPU_INTEROP_THREADS", 1))  # 요청은 MicroBatcher가 한 줄로 모아 처리
+ONNX_PATH = os.environ.get(
+    "CLIP_ONNX_PATH",
+    os.path.expanduser(f"~/.cache/clip/{MODEL_NAME.replace('/', '-')}-visual.onnx")
+)
+
+if device == "cpu":
+    # 스레드 수는 첫 연산 전에 정해야 함 (inter-op은 이후 변경 불가)
+    torch.set_num_threads(CPU_THREADS)
+    torch.set_num_interop_threads(CPU_INTEROP_THREADS)
+model, preprocess = clip.load(MODEL_NAME, device=device)
 
 # --- 프론트엔드 노출용 레이블 및 사유 ---
 RESULTS_INFO = {
@@ -58,49 +46,228 @@ RESULTS_INFO = {
 }
 
 
-# 텍스트 임베딩 미리 계산
-with torch.no_grad():
-    encoded_prompts = {}
-    for idx, sentences in PROMPTS_MAP.items():
-        tokens = clip.tokenize(sentences).to(device)
-        features = model.encode_text(tokens)
-        features /= features.norm(dim=-1, keepdim=True)
-        encoded_prompts[idx] = features.mean(dim=0) / features.mean(dim=0).norm()
-    FINAL_TEXT_FEATURES = torch.stack([v for v in encoded_prompts.values()])
+# 카테고리별 텍스트 임베딩 캐시 (프롬프트/모델이 바뀌면 키가 달라져 자동으로 다시 계산)
+TEXT_FEATURES_CACHE_DIR = os.environ.get("CLIP_TEXT_CACHE_DIR", os.path.expanduser("~/.cache/clip"))
 
-def run_clip_filter(image_path):
+
+def encode_prompts():
+    """카테고리별 문장 임베딩의 평균 (정규화) -> [카테고리 수, 차원]"""
+    with torch.no_grad():
+        encoded_prompts = {}
+        for idx, sentences in PROMPTS_MAP.items():
+            tokens = clip.tokenize(sentences).to(device)
+            features = model.encode_text(tokens)
+            features /= features.norm(dim=-1, keepdim=True)
+            encoded_prompts[idx] = features.mean(dim=0) / features.mean(dim=0).norm()
+        return torch.stack([v for v in encoded_prompts.values()])
+
+
+def text_features_path():
+    """프롬프트 집합 + 모델 이름 + 연산 dtype 해시로 정한 캐시 파일 경로"""
+    raw = json.dumps([MODEL_NAME, str(model.dtype), sorted(PROMPTS_MAP.items())], ensure_ascii=False)
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(TEXT_FEATURES_CACHE_DIR, f"text_features-{digest}.npy")
+
+
+def load_text_features():
+    """캐시된 텍스트 임베딩을 memmap으로 읽고, 없으면 텍스트 인코더로 계산해 저장"""
+    path = text_features_path()
+    try:
+        cached = np.load(path, mmap_mode="r")
+        return torch.tensor(cached, dtype=model.dtype, device=device)
+    except (OSError, ValueError):
+        pass
+    features = encode_prompts()
     try:
-        image_pil = Image.open(image_path).convert("RGB")
-        image_input = preprocess(image_pil).unsqueeze(0).to(device)
-
-        with torch.no_grad():
-            image_features = model.encode_image(image_input)
-            image_features /= image_features.norm(dim=-1, keepdim=True)
-            similarity = (100.0 * image_features @ FINAL_TEXT_FEATURES.T).softmax(dim=-1)
-            probs = similarity.cpu().numpy()[0]
-
-        if probs[2] > 0.20:
-            best_idx = 2
-        else:
-            best_idx = int(probs.argmax())
-
-        verdict, reason, guide, label = RESULTS_INFO[best_idx]
-        status = "accept" if best_idx == 5 else "reject"
-        return {
-            "status": status,
-            "reason": reason,
-            "guide": guide
-        }
-    except Exception as e:
-        return {"status": "error", "reason": str(e)}
+        os.makedirs(TEXT_FEATURES_CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, features.float().cpu().numpy())
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[CLIP] Could not cache text features: {e}", file=sys.stderr)
+    return features
+
+
+FINAL_TEXT_FEATURES = load_text_features()
+
+
+def export_onnx(path=ONNX_PATH):
+    """fp32 이미지 인코더를 ONNX로 내보냄 (배치 크기 가변)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    size = model.visual.input_resolution
+    with torch.no_grad():
+        torch.onnx.export(
+            model.visual, torch.randn(1, 3, size, size, dtype=model.dtype), tmp,
+            input_names=["image"], output_names=["features"],
+            dynamic_axes={"image": {0: "batch"}, "features": {0: "batch"}},
+            opset_version=17
+        )
+    os.replace(tmp, path)
+
+
+def build_image_encoder(mode, keep_original=False):
+    """전처리된 이미지 텐서 -> 이미지 특징 함수. mode는 CPU에서만 적용 (GPU는 항상 기본 모델)
+
+    keep_original: 양자화할 때 원래 fp32 모델을 남겨 둠 (비교용)
+    """
+    if device != "cpu" or mode == "fp32":
+        return model.encode_image
+    if mode == "quantized":
+        # 텍스트 임베딩은 이미 fp32로 계산했으므로 이미지 인코더만 양자화
+        visual = torch.ao.quantization.quantize_dynamic(
+            model.visual, {torch.nn.Linear}, dtype=torch.qint8, inplace=not keep_original)
+        return lambda image: visual(image.type(model.dtype))
+    if mode == "onnx":
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            print("[CLIP] onnxruntime is not installed, using fp32 encoder", file=sys.stderr)
+            return model.encode_image
+        if not os.path.exists(ONNX_PATH):
+            export_onnx(ONNX_PATH)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = CPU_THREADS
+        options.inter_op_num_threads = CPU_INTEROP_THREADS
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(ONNX_PATH, options, providers=["CPUExecutionProvider"])
+        return lambda image: torch.from_numpy(session.run(None, {"image": image.numpy()})[0])
+    raise ValueError(f"알 수 없는 CPU 모드: {mode}")
+
+
+IMAGE_ENCODER = build_image_encoder(CPU_MODE)
+
+
+def image_probs(image_input, encoder=None, return_features=False):
+    """전처리된 이미지 배치 -> 카테고리 확률 (numpy, [N, 카테고리 수])
+
+    return_features: 정규화된 이미지 임베딩(numpy float32, [N, 차원])도 함께 반환
+    """
+    with torch.no_grad():
+        image_features = (encoder or IMAGE_ENCODER)(image_input.to(device))
+        image_features /= image_features.norm(dim=-1, keepdim=True)
+        similarity = (100.0 * image_features @ FINAL_TEXT_FEATURES.T).softmax(dim=-1)
+    if return_features:
+        return similarity.cpu().numpy(), image_features.float().cpu().numpy()
+    return similarity.cpu().numpy()
+
+
+def classify_probs(probs):
+    """카테고리 확률 -> 프론트엔드용 판정"""
+    best_idx = category_of(probs)
+
+    verdict, reason, guide, label = RESULTS_INFO[best_idx]
+    status = "accept" if best_idx == ACCEPT_CATEGORY else "reject"
+    return {
+        "status": status,
+        "reason": reason,
+        "guide": guide
+    }
+
+
+def run_clip_filter_batch(image_paths):
+    """여러 이미지를 쌓아서 encode_image 한 번으로 판정 (입력 순서대로 결과 리스트 반환)"""
+    results = [None] * len(image_paths)
+    inputs, indices = [], []
+    for i, image_path in enumerate(image_paths):
+        try:
+            image_pil = Image.open(image_path).convert("RGB")
+            inputs.append(preprocess(image_pil))
+            indices.append(i)
+        except Exception as e:
+            results[i] = {"status": "error", "reason": str(e)}
+
+    if inputs:
+        try:
+            probs_batch, features_batch = image_probs(torch.stack(inputs), return_features=True)
+            for i, probs, features in zip(indices, probs_batch, features_batch):
+                results[i] = classify_probs(probs)
+                # 서버가 거의 같은 이미지의 기존 결과를 찾는 데 사용 (응답에서는 제외됨)
+                results[i]["embedding"] = [round(float(x), 5) for x in features]
+        except Exception as e:
+            for i in indices:
+                results[i] = {"status": "error", "reason": str(e)}
+    return results
+
+
+def run_clip_filter(image_path):
+    return run_clip_filter_batch([image_path])[0]
+
+
+class MicroBatcher:
+    """동시에 들어온 요청을 window 동안 모아 run_clip_filter_batch 한 번으로 처리 (최대 max_batch장)"""
+
+    def __init__(self, window_ms=10, max_batch=16):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        threading.Thread(target=self._loop, name="clip-batcher", daemon=True).start()
+
+    def submit_many(self, image_paths):
+        slots = [{"image_path": p, "done": threading.Event()} for p in image_paths]
+        for slot in slots:
+            self._queue.put(slot)
+        for slot in slots:
+            slot["done"].wait()
+        return [slot["result"] for slot in slots]
+
+    def submit(self, image_path):
+        return self.submit_many([image_path])[0]
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                results = run_clip_filter_batch([slot["image_path"] for slot in batch])
+            except Exception as e:
+                results = [{"status": "error", "reason": str(e)}] * len(batch)
+            for slot, result in zip(batch, results):
+                slot["result"] = result
+                slot["done"].set()
+
+
+def make_request_handler(batcher):
+    """상주 워커 모드 요청 처리 (단일/다중 이미지 모두 같은 배치 경로를 탐)"""
+    def handle_request(req):
+        op = req.get("op")
+        if op == "filter":
+            return batcher.submit(req["image_path"])
+        if op == "filter_batch":
+            return batcher.submit_many(req["image_paths"])
+        raise ValueError(f"알 수 없는 요청: {op}")
+    return handle_request
 
 
 if __name__ == "__main__":
-    import sys
-    import json
-    if len(sys.argv) != 2:
-        print(json.dumps({"status": "error", "reason": "Usage: clip_filter.py <image_path>"}))
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image_path", nargs="?")
+    # 상주 워커 모드: 모델과 텍스트 임베딩을 한 번만 로드하고 소켓으로 요청을 받음
+    parser.add_argument("--serve", metavar="SOCKET_PATH")
+    parser.add_argument("--batch-window-ms", type=float, default=10)
+    parser.add_argument("--max-batch", type=int, default=16)
+    args = parser.parse_args()
+
+    if args.serve:
+        from worker_ipc import serve
+        batcher = MicroBatcher(window_ms=args.batch_window_ms, max_batch=args.max_batch)
+        info = {"load_seconds": time.time() - _LOAD_STARTED, "device": device}
+        if device == "cpu":
+            info.update(cpu_mode=CPU_MODE, threads=CPU_THREADS, interop_threads=CPU_INTEROP_THREADS)
+        serve(args.serve, make_request_handler(batcher), info=info)
+        sys.exit(0)
+    if not args.image_path:
+        print(json.dumps({"status": "error", "reason": "Usage: clip_filter.py <image_path> | --serve <socket_path>"}))
         sys.exit(1)
-    image_path = sys.argv[1]
-    result = run_clip_filter(image_path)
-    print(json.dumps(result, ensure_ascii=False))
\ No newline at end of file
+    result = run_clip_filter(args.image_path)
+    print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,58 @@
+"""CLIP 필터의 카테고리별 프롬프트와 판정 규칙
+
+clip_filter.py(모델 로드)와 clip_calibrate.py(오프라인 보정, 모델 없이 채점 가능)가 함께 사용하므로
+torch/clip을 import하지 않습니다.
+"""
+
+PROMPTS_MAP = {
+    0: [
+        "An incomplete image that is only partially loaded.",
+        "A photo covered by a large solid color block.",
+        "A corrupted file with rendering errors.",
+        "Glitch art with digital artifacts."
+    ],
+    1: [
+        "A very blurry photo where details are unrecognizable.",
+        "Severe pixelation due to low resolution.",
+        "Out of focus photography."
+    ],
+    2: [
+        "A photo containing a human being, person, or people.",
+        "A human figure in the frame.",
+        "A man, woman, or child.",
+        "A portrait or full body shot of a person.",
+        "A panoramic landscape of nature or city."
+    ],
+    3: [
+        "A transparent glass or water.",
+        "A reflective mirror surface.",
+        "An image where the object is cut off by the frame."
+    ],
+    4: [
+        "A background with a brick wall, stone fence, or house siding.",
+        "Windows, doors, or architectural details behind the object.",
+        "Dense bushes, hedges, or trees directly behind the object.",
+        "A busy chaotic scene with urban clutter."
+    ],
+    5: [
+        "A product photo isolated on a plain white or solid color background.",
+        "A studio shot with a solid smooth wall.",
+        "A minimalist photo with a black or dark background.",
+        "A high quality 3D render or cartoon character.",
+        "A single object on a large open grass lawn.",
+        "An object sitting on an empty floor or pavement.",
+        "Delicious food photography."
+    ]
+}
+
+ACCEPT_CATEGORY = 5  # 합격 (나머지는 반려 사유)
+# 사람/풍경은 최댓값이 아니어도 확률이 이 값을 넘으면 반려 (clip_calibrate.py로 조정)
+HUMAN_CATEGORY = 2
+HUMAN_THRESHOLD = 0.20
+
+
+def category_of(probs, human_threshold=HUMAN_THRESHOLD):
+    """판정 카테고리 (사람/풍경은 확률이 human_threshold만 넘어도 반려)"""
+    if probs[HUMAN_CATEGORY] > human_threshold:
+        return HUMAN_CATEGORY
+    return int(probs.argmax())
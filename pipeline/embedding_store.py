@@ -0,0 +1,193 @@
+"""CLIP 이미지 임베딩 저장소: 완료된 재구성 결과와 연결된 임베딩으로 거의 같은 업로드를 찾음
+
+- 필터링 시 task의 임베딩을 pending으로 기록하고, 재구성이 끝나면 (task, model) 행으로 확정
+- 벡터는 store_dir/vectors.f32 (float32 [capacity, dim] memmap), 행 정보는 SQLite에 저장
+- 검색은 정규화된 벡터의 내적(코사인 유사도)을 청크 단위 행렬곱으로 계산 (10^6개까지 전수 검색)
+  float16으로 저장하면 크기는 절반이지만 검색 때마다 float32로 바꾸는 비용이 행렬곱보다 커서 float32로 저장
+- task가 삭제되면 행을 지우지 않고 표시만 해 두고(tombstone) 검색에서 제외
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    row INTEGER PRIMARY KEY,
+    task_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    alive INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vectors_task ON vectors (task_id);
+CREATE TABLE IF NOT EXISTS pending (
+    task_id TEXT PRIMARY KEY,
+    vector BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+SEARCH_CHUNK_ROWS = 65536  # 한 번에 곱하는 행 수 (memmap에서 청크 단위로 읽음)
+
+
+def normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class EmbeddingStore:
+    def __init__(self, store_dir, initial_capacity=4096):
+        self.store_dir = store_dir
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        os.makedirs(store_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(store_dir, "embeddings.sqlite3"),
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+        # 벡터 파일에 쓴 뒤 행을 기록하므로 행 수까지만 유효 (그 뒤는 기록 도중 죽은 자리)
+        self._count = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vectors").fetchone()[0]
+        self._matrix = None
+        self._alive = np.zeros(0, dtype=bool)
+        if self.dim is not None:
+            self._open_matrix(max(self._count, initial_capacity))
+            for (alive_row,) in self._conn.execute("SELECT row FROM vectors WHERE alive = 1"):
+                self._alive[alive_row] = True
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.store_dir, "vectors.f32")
+
+    def _open_matrix(self, min_capacity):
+        """벡터 파일을 min_capacity 행 이상으로 늘려 memmap으로 엶 (늘릴 때는 두 배씩)"""
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = size // row_bytes
+        if capacity < min_capacity:
+            capacity = max(min_capacity, capacity * 2, self.initial_capacity)
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+
+    def _ensure_dim(self, dim):
+        if self.dim is None:
+            self.dim = dim
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(dim),))
+            self._open_matrix(self.initial_capacity)
+        elif dim != self.dim:
+            raise ValueError(f"임베딩 차원이 다릅니다: {dim} (저장소: {self.dim})")
+
+    def stage(self, task_id, vector):
+        """필터링한 task의 임베딩 기록 (재구성이 끝나면 commit()으로 검색 대상에 추가)"""
+        vector = normalize(vector)
+        with self._lock:
+            self._ensure_dim(len(vector))
+            self._conn.execute("INSERT OR REPLACE INTO pending (task_id, vector, created_at) VALUES (?, ?, ?)",
+                               (task_id, vector.tobytes(), time.time()))
+
+    def commit(self, task_id, model):
+        """task의 pending 임베딩을 (task, model) 결과로 확정. 반환: 추가했으면 참"""
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM pending WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                return False
+            vector = np.frombuffer(row[0], dtype=np.float32)
+            if len(vector) != self.dim:
+                return False
+            if self._count >= len(self._matrix):
+                self._open_matrix(self._count + 1)
+            new_row = self._count
+            self._matrix[new_row] = vector
+            self._matrix.flush()
+            with self._conn:
+                self._conn.execute("BEGIN")
+                old_rows = [r for (r,) in self._conn.execute(
+                    "SELECT row FROM vectors WHERE task_id = ? AND model = ? AND alive = 1", (task_id, model))]
+                self._conn.execute("UPDATE vectors SET alive = 0 WHERE task_id = ? AND model = ?", (task_id, model))
+                self._conn.execute("INSERT INTO vectors (row, task_id, model, alive, created_at) VALUES (?, ?, ?, 1, ?)",
+                                   (new_row, task_id, model, time.time()))
+            self._alive[old_rows] = False
+            self._alive[new_row] = True
+            self._count += 1
+            return True
+
+    def remove(self, task_id):
+        """task 삭제 시 호출: pending 임베딩과 검색 대상 행 제거"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                rows = [r for (r,) in self._conn.execute(
+                    "SELECT row FROM vectors WHERE task_id = ? AND alive = 1", (task_id,))]
+                self._conn.execute("UPDATE vectors SET alive = 0 WHERE task_id = ?", (task_id,))
+                self._conn.execute("DELETE FROM pending WHERE task_id = ?", (task_id,))
+            self._alive[rows] = False
+
+    def search(self, queries, k=3, threshold=0.0):
+        """queries([N, dim])마다 유사도가 threshold 이상인 상위 k개 결과 [{"task_id", "model", "similarity"}, ...]"""
+        queries = np.stack([normalize(q) for q in queries]) if len(queries) else np.zeros((0, 0), np.float32)
+        results = [[] for _ in range(len(queries))]
+        with self._lock:
+            if self.dim is None or self._count == 0 or not len(queries) or queries.shape[1] != self.dim:
+                return results
+            best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+            best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+            for start in range(0, self._count, SEARCH_CHUNK_ROWS):
+                end = min(start + SEARCH_CHUNK_ROWS, self._count)
+                alive = self._alive[start:end]
+                if not alive.any():
+                    continue
+                scores = queries @ self._matrix[start:end].T
+                scores[:, ~alive] = -np.inf
+                # 청크별 상위 k개만 남겨 지금까지의 상위 k개와 합침
+                top = min(k, end - start)
+                idx = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+                best_scores = np.concatenate([best_scores, np.take_along_axis(scores, idx, axis=1)], axis=1)
+                best_rows = np.concatenate([best_rows, idx + start], axis=1)
+                if best_scores.shape[1] > k:
+                    keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                    best_rows = np.take_along_axis(best_rows, keep, axis=1)
+            hits = {}
+            for i in range(len(queries)):
+                order = np.argsort(-best_scores[i])
+                for j in order:
+                    if best_scores[i, j] >= threshold:
+                        hits.setdefault(int(best_rows[i, j]), []).append((i, float(best_scores[i, j])))
+            if not hits:
+                return results
+            placeholders = ", ".join("?" for _ in hits)
+            rows = {r: (task_id, model) for r, task_id, model in self._conn.execute(
+                f"SELECT row, task_id, model FROM vectors WHERE row IN ({placeholders})", tuple(hits))}
+        for row, matches in hits.items():
+            if row not in rows:
+                continue
+            task_id, model = rows[row]
+            for i, score in matches:
+                results[i].append({"task_id": task_id, "model": model, "similarity": round(min(score, 1.0), 4)})
+        for entry in results:
+            entry.sort(key=lambda hit: -hit["similarity"])
+        return results
+
+    def stats(self):
+        with self._lock:
+            pending = self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+            return {
+                "vectors": int(self._alive[:self._count].sum()),
+                "rows": self._count,
+                "pending": pending,
+                "dim": self.dim,
+                "bytes": self._count * (self.dim or 0) * 4
+            }
@@ -0,0 +1,287 @@
+"""재구성 작업 큐: 요청은 job id를 바로 돌려받고, 스케줄러가 자원이 허락하는 작업부터 실행
+
+작업 상태는 jobs_dir에 작업별 JSON으로 저장되어 서버가 재시작되어도 유지되며,
+실행 중에 서버가 내려간 작업은 재시작 시 다시 대기열에 넣습니다.
+run_job이 {"requeue": True}를 돌려준 작업(원격 워커가 작업 도중 죽은 경우 등)도 다른 장치에서 다시 실행하도록 대기열로 돌립니다.
+취소(cancel)된 작업은 바로 cancelled로 기록하고 스케줄러 슬롯을 반납하며, 실행 중이면 취소 토큰으로 러너를 멈춥니다.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+from cancellation import CancelToken, Cancelled
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class JobQueue:
+    def __init__(self, jobs_dir, run_job, scheduler, on_cancel=None, on_error=None, abandon_after=None,
+                 abandon_running_after=None):
+        """run_job(job, cancel) -> dict: "success"가 참이면 done, "requeue"가 참이면 다시 대기, 아니면 "error"와 함께 failed
+
+        scheduler: 실행 순서와 장치를 정하는 GpuScheduler (job["device"]에 배정된 장치가 담겨 전달됨)
+        cancel: 작업의 CancelToken. 취소되면 run_job은 러너를 멈추고 돌아오면 되며, 반환값은 무시됨
+        on_cancel(job): 작업이 취소된 직후 호출 (task 상태 기록 등)
+        on_error(job): run_job이 예외로 끝나 failed로 기록된 직후 호출 (run_job이 남기지 못한 task 상태/진행 이벤트 기록)
+        abandon_after: touch()로 한 번이라도 조회된 대기 중 작업이 이 시간(초) 동안 다시 조회되지 않으면
+            클라이언트가 떠난 것으로 보고 취소 (None이면 사용 안 함)
+        abandon_running_after: 실행 중인 작업에 쓸 모드별 시간 {model: 초}. 없는 모드는 실행이 시작되면
+            자동 취소하지 않음 (이미 GPU 시간을 쓴 작업을 잠깐의 폴링 공백으로 버리지 않도록)
+        """
+        self.jobs_dir = jobs_dir
+        self.run_job = run_job
+        self.scheduler = scheduler
+        self.on_cancel = on_cancel
+        self.on_error = on_error
+        self.abandon_after = abandon_after
+        self.abandon_running_after = abandon_running_after or {}
+        self._jobs = {}
+        self._pending = []
+        self._tokens = {}  # 실행 중인 job_id -> CancelToken
+        self._last_seen = {}  # 클라이언트가 마지막으로 조회한 시각 (monotonic)
+        self._cond = threading.Condition()
+        self._dispatcher = None
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._load()
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        tmp = self._path(job["job_id"]) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp, self._path(job["job_id"]))
+
+    def _load(self):
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[JOBS] Skipping unreadable job file {name}: {e}", file=sys.stderr)
+                continue
+            if job["status"] == RUNNING:
+                # 실행 도중 서버가 종료된 작업은 처음부터 다시 실행
+                job["status"] = QUEUED
+                job["started_at"] = None
+                job["restarts"] = job.get("restarts", 0) + 1
+                self._save(job)
+            self._jobs[job["job_id"]] = job
+        self._pending = sorted(
+            (j["job_id"] for j in self._jobs.values() if j["status"] == QUEUED),
+            key=lambda job_id: self._jobs[job_id]["created_at"]
+        )
+        if self._pending:
+            print(f"[JOBS] Restored {len(self._pending)} queued job(s)", file=sys.stderr)
+
+    def start(self):
+        """디스패처 스레드 시작 (여러 번 호출해도 한 번만 시작)"""
+        with self._cond:
+            if self._dispatcher is not None:
+                return
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+            self._dispatcher.start()
+            if self._abandon_windows():
+                threading.Thread(target=self._abandon_loop, name="job-abandon-watch", daemon=True).start()
+
+    def wake(self):
+        """실행할 수 있는 장치가 늘었을 때(원격 워커 등록 등) 디스패처가 바로 다시 배정하도록 깨움"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def submit(self, task_id, model, params=None):
+        """작업 등록. 같은 task/model 작업이 이미 대기 중이거나 실행 중이면 그 작업을 돌려줌"""
+        with self._cond:
+            for job in self._jobs.values():
+                if job["task_id"] == task_id and job["model"] == model and job["status"] in ACTIVE_STATUSES:
+                    return self._view_locked(job)
+            job = {
+                "job_id": str(uuid.uuid4()),
+                "task_id": task_id,
+                "model": model,
+                "params": params or {},
+                "status": QUEUED,
+                "device": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+            self._jobs[job["job_id"]] = job
+            self._pending.append(job["job_id"])
+            self._save(job)
+            self._cond.notify()
+            return self._view_locked(job)
+
+    def get(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return self._view_locked(job) if job else None
+
+    def _view_locked(self, job):
+        view = dict(job)
+        view["position"] = 0
+        view["expected_start"] = job["started_at"]
+        if job["status"] == QUEUED:
+            pending = [self._jobs[job_id] for job_id in self._pending]
+            order = [j["job_id"] for j in self.scheduler.order(pending)]
+            view["position"] = order.index(job["job_id"]) + 1
+            view["expected_start"] = self.scheduler.estimate_start_times(pending).get(job["job_id"])
+        return view
+
+    def has_active(self, task_id):
+        """이 task의 작업이 대기 중이거나 실행 중인지"""
+        with self._cond:
+            return any(j["task_id"] == task_id and j["status"] in ACTIVE_STATUSES for j in self._jobs.values())
+
+    def touch(self, job_id):
+        """클라이언트가 작업을 지켜보고 있음을 기록 (상태 조회, 진행 스트림 등)"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] in ACTIVE_STATUSES:
+                self._last_seen[job_id] = time.monotonic()
+
+    def touch_task(self, task_id):
+        """이 task의 대기 중/실행 중 작업을 모두 touch()"""
+        with self._cond:
+            now = time.monotonic()
+            for job in self._jobs.values():
+                if job["task_id"] == task_id and job["status"] in ACTIVE_STATUSES:
+                    self._last_seen[job["job_id"]] = now
+
+    def cancel(self, job_id, reason="작업이 취소되었습니다"):
+        """대기 중이거나 실행 중인 작업 취소. 반환: (취소했으면 참, 작업 상태) — 없는 작업이면 (False, None)
+
+        실행 중인 작업은 러너가 실제로 멈추기를 기다리지 않고 바로 cancelled로 기록하고 슬롯을 반납함
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False, None
+            if job["status"] not in ACTIVE_STATUSES:
+                return False, self._view_locked(job)
+            if job["status"] == QUEUED:
+                self._pending.remove(job_id)
+            token = self._tokens.pop(job_id, None)
+            job["status"] = CANCELLED
+            job["finished_at"] = time.time()
+            job["error"] = reason
+            self._last_seen.pop(job_id, None)
+            self._save(job)
+            self.scheduler.release(job_id)
+            self._cond.notify_all()
+            view = self._view_locked(job)
+        print(f"[JOBS] Cancelled {job_id} ({reason})", file=sys.stderr)
+        if token is not None:
+            token.cancel()
+        if self.on_cancel is not None:
+            self.on_cancel(dict(job))
+        return True, view
+
+    def stats(self):
+        with self._cond:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                job, device = self.scheduler.pick([self._jobs[job_id] for job_id in self._pending])
+                while job is None:
+                    # 새 작업 등록이나 작업 종료 시 깨어남 (aging 반영을 위해 주기적으로도 재확인)
+                    self._cond.wait(timeout=5)
+                    job, device = self.scheduler.pick([self._jobs[job_id] for job_id in self._pending])
+                self._pending.remove(job["job_id"])
+                job["status"] = RUNNING
+                job["device"] = device
+                job["started_at"] = time.time()
+                token = self._tokens[job["job_id"]] = CancelToken()
+                self._save(job)
+            threading.Thread(target=self._run, args=(job, token), name=f"job-{job['job_id'][:8]}",
+                             daemon=True).start()
+
+    def _abandon_windows(self):
+        return [w for w in (self.abandon_after, *self.abandon_running_after.values()) if w]
+
+    def _abandon_window(self, job):
+        """작업이 조회 없이 버틸 수 있는 시간(초). None이면 자동 취소하지 않음"""
+        if job["status"] == QUEUED:
+            return self.abandon_after
+        return self.abandon_running_after.get(job["model"])
+
+    def abandoned_jobs(self, now=None):
+        """클라이언트가 떠난 것으로 보이는 작업들 [(job_id, 기준 시간)]"""
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            found = []
+            for job_id, seen in self._last_seen.items():
+                window = self._abandon_window(self._jobs[job_id])
+                if window and now - seen > window:
+                    found.append((job_id, window))
+            return found
+
+    def _abandon_loop(self):
+        while True:
+            time.sleep(min(5, *self._abandon_windows()))
+            for job_id, window in self.abandoned_jobs():
+                self.cancel(job_id, reason=f"클라이언트 연결이 {window}초 동안 없어 취소되었습니다")
+
+    def _run(self, job, token):
+        raised = False
+        try:
+            result = self.run_job(dict(job), token)
+        except Cancelled:
+            result = {"success": False, "error": job.get("error") or "작업이 취소되었습니다"}
+        except Exception as e:
+            traceback.print_exc()
+            raised = True
+            result = {"success": False, "error": str(e)}
+        finally:
+            self.scheduler.release(job["job_id"])
+
+        with self._cond:
+            self._tokens.pop(job["job_id"], None)
+            self._last_seen.pop(job["job_id"], None)
+            if job["status"] == CANCELLED:
+                # 취소 시점에 이미 기록됨
+                return
+            if result.get("requeue"):
+                # 대기열 맨 뒤가 아니라 처음 등록 시각 기준으로 우선순위가 정해지므로 먼저 기다린 만큼 앞쪽에 섬
+                job["status"] = QUEUED
+                job["device"] = None
+                job["started_at"] = None
+                job["restarts"] = job.get("restarts", 0) + 1
+                self._pending.append(job["job_id"])
+                self._save(job)
+                self._cond.notify_all()
+                print(f"[JOBS] Requeued {job['job_id']} ({result.get('error')})", file=sys.stderr)
+                return
+            job["finished_at"] = time.time()
+            if result.get("success"):
+                job["status"] = DONE
+                job["result"] = result
+            else:
+                job["status"] = FAILED
+                job["result"] = result
+                job["error"] = result.get("error", "알 수 없는 오류")
+            self._save(job)
+            self._cond.notify_all()
+            failed = dict(job) if raised else None
+        if failed is not None and self.on_error is not None:
+            self.on_error(failed)
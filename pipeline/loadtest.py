@@ -0,0 +1,630 @@
+#!/usr/bin/env python3
+"""파이프라인 서버 부하 테스트 / 벤치마크
+
+실제 HTTP 엔드포인트(/api/filter, /api/process, /api/reconstruct, /api/jobs, /api/download, /api/cleanup)를
+동시에 호출하고 시나리오별 p50/p95/p99 지연 시간, 초당 요청 수, 오류율, 최대 RSS를 JSON으로 기록합니다.
+
+기본으로는 stub_runners.py를 러너로 쓰는 서버를 임시 디렉토리에 띄우므로 GPU 없이 실행됩니다.
+--url을 주면 이미 떠 있는 서버(실제 모델)를 대상으로 측정합니다.
+--remote-workers N을 주면 서버는 로컬 GPU 없이 stub 러너를 쓰는 원격 재구성 워커(reconstruction_worker.py) N개에
+작업을 나눠 보내고, --kill-worker-after로 실행 도중 워커 하나를 죽여 작업이 다른 워커에서 끝나는지 확인할 수 있습니다.
+
+    python loadtest.py --scenarios filter,process --concurrency 1,8 --requests 100 --output bench.json
+    python loadtest.py --compare bench_before.json --output bench_after.json
+    python loadtest.py --scenarios reconstruct --concurrency 4 --remote-workers 3 --kill-worker-after 5
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import zlib
+
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+STUB_RUNNER = os.path.join(PIPELINE_DIR, "stub_runners.py")
+
+# 시나리오: 흐름(flow)별 비중
+SCENARIOS = {
+    "filter": {"filter": 1.0},
+    "process": {"process": 1.0},
+    "reconstruct": {"reconstruct_fast": 0.8, "reconstruct_quality": 0.2},
+    "mixed": {"filter": 0.5, "process": 0.3, "reconstruct_fast": 0.15, "reconstruct_quality": 0.05},
+}
+JOB_POLL_SECONDS = 0.2
+JOB_TIMEOUT_SECONDS = 1800
+
+
+# ---------- 테스트 이미지 ----------
+
+def make_base_images(count, size=512, seed=0):
+    """프리필터를 통과하는 노이즈 PNG (numpy 없이 생성)"""
+    from PIL import Image
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        img = Image.frombytes("RGB", (size, size), bytes(rng.getrandbits(8) for _ in range(size * size * 3)))
+        buf = io.BytesIO()
+        img.save(buf, "PNG", compress_level=1)
+        images.append(buf.getvalue())
+    return images
+
+
+def unique_png(base):
+    """IHDR 뒤에 tEXt 청크를 끼워 넣어 내용 해시만 다른 같은 이미지를 만듦 (결과 캐시 적중 방지)"""
+    data = b"Comment\0" + uuid.uuid4().hex.encode("ascii")
+    chunk = len(data).to_bytes(4, "big") + b"tEXt" + data + zlib.crc32(b"tEXt" + data).to_bytes(4, "big")
+    ihdr_end = 8 + 8 + 13 + 4
+    return base[:ihdr_end] + chunk + base[ihdr_end:]
+
+
+# ---------- HTTP ----------
+
+def http(method, url, body=None, headers=None, timeout=120):
+    """(status, body bytes). 네트워크 오류는 status 0"""
+    req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except (urllib.error.URLError, OSError) as e:
+        return 0, str(e).encode("utf-8")
+
+
+def multipart(field, filename, content, content_type="image/png"):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    """동작(op)별 지연 시간과 오류 수집"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, op, seconds, ok):
+        with self._lock:
+            entry = self.samples.setdefault(op, {"latencies": [], "errors": 0})
+            entry["latencies"].append(seconds)
+            entry["errors"] += int(not ok)
+
+    def summary(self):
+        ops = {}
+        with self._lock:
+            for op, entry in sorted(self.samples.items()):
+                values = sorted(entry["latencies"])
+                count = len(values)
+                ops[op] = {
+                    "count": count,
+                    "errors": entry["errors"],
+                    "error_rate": entry["errors"] / count if count else 0.0,
+                    "p50_ms": percentile(values, 50) * 1000,
+                    "p95_ms": percentile(values, 95) * 1000,
+                    "p99_ms": percentile(values, 99) * 1000,
+                    "mean_ms": sum(values) / count * 1000,
+                    "max_ms": values[-1] * 1000,
+                }
+        return ops
+
+
+# ---------- 흐름 ----------
+
+class Client:
+    def __init__(self, base_url, recorder, images, duplicate_rate):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.images = images
+        self.duplicate_rate = duplicate_rate
+
+    def call(self, op, method, path, body=None, headers=None, ok_statuses=(200, 202)):
+        started = time.monotonic()
+        status, data = http(method, self.base_url + path, body, headers)
+        ok = status in ok_statuses
+        self.recorder.record(op, time.monotonic() - started, ok)
+        try:
+            payload = json.loads(data) if data and data[:1] in (b"{", b"[") else None
+        except ValueError:
+            payload = None
+        return ok, status, payload, data
+
+    def image(self):
+        base = random.choice(self.images)
+        # duplicate_rate 비율만큼은 같은 바이트를 다시 보내 캐시 적중 경로를 측정
+        return base if random.random() < self.duplicate_rate else unique_png(base)
+
+    def upload(self, op, path):
+        body, headers = multipart("image", "bench.png", self.image())
+        return self.call(op, "POST", path, body, headers)
+
+    def wait_job(self, job_id):
+        deadline = time.monotonic() + JOB_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            ok, _, job, _ = self.call("job_status", "GET", f"/api/jobs/{job_id}", ok_statuses=(200,))
+            if ok and job["status"] in ("done", "failed"):
+                return job["status"] == "done"
+            time.sleep(JOB_POLL_SECONDS)
+        return False
+
+    def finish(self, task_id, job_ok):
+        """다운로드 + 정리. 반환: 다운로드 성공 여부"""
+        downloaded = False
+        if job_ok:
+            downloaded, _, _, data = self.call("download", "GET", f"/api/download/{task_id}", ok_statuses=(200,))
+            downloaded = downloaded and len(data) > 0
+        self.call("cleanup", "DELETE", f"/api/cleanup/{task_id}", ok_statuses=(200,))
+        return downloaded
+
+    def flow_filter(self):
+        ok, _, payload, _ = self.upload("filter", "/api/filter")
+        if ok:
+            self.call("cleanup", "DELETE", f"/api/cleanup/{payload['task_id']}", ok_statuses=(200,))
+        return ok
+
+    def flow_process(self):
+        ok, status, payload, _ = self.upload("process", "/api/process")
+        if not ok:
+            return False
+        if status != 202:
+            # 필터에서 반려된 경우: 정상 응답이지만 재구성은 하지 않음
+            self.call("cleanup", "DELETE", f"/api/cleanup/{payload['task_id']}", ok_statuses=(200,))
+            return True
+        return self.finish(payload["task_id"], self.wait_job(payload["job_id"]))
+
+    def flow_reconstruct(self, model):
+        ok, _, payload, _ = self.upload("filter", "/api/filter")
+        if not ok:
+            return False
+        task_id = payload["task_id"]
+        body = json.dumps({"model": model}).encode("utf-8")
+        ok, _, job, _ = self.call("reconstruct", "POST", f"/api/reconstruct/{task_id}", body,
+                                  {"Content-Type": "application/json"})
+        if not ok:
+            self.call("cleanup", "DELETE", f"/api/cleanup/{task_id}", ok_statuses=(200,))
+            return False
+        return self.finish(task_id, self.wait_job(job["job_id"]))
+
+    def run_flow(self, flow):
+        started = time.monotonic()
+        if flow == "filter":
+            ok = self.flow_filter()
+        elif flow == "process":
+            ok = self.flow_process()
+        else:
+            ok = self.flow_reconstruct(flow.split("_", 1)[1])
+        self.recorder.record(f"{flow}_e2e", time.monotonic() - started, ok)
+        return ok
+
+
+# ---------- 메모리 ----------
+
+def process_tree_rss(root_pid):
+    """root_pid와 모든 자손 프로세스의 RSS 합 (Linux /proc 기준, 읽을 수 없으면 None)"""
+    total, pending, seen = 0, [root_pid], set()
+    while pending:
+        pid = pending.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for tid in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{tid}/children") as f:
+                    pending.extend(int(c) for c in f.read().split())
+        except (OSError, ValueError):
+            if pid == root_pid:
+                return None
+    return total
+
+
+class RssSampler:
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.is_set():
+            rss = process_tree_rss(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# ---------- 실행 ----------
+
+def run_scenario(base_url, name, concurrency, total_requests, duration, images, duplicate_rate, server_pid):
+    mix = SCENARIOS[name]
+    flows, weights = list(mix), list(mix.values())
+    recorder = Recorder()
+    client = Client(base_url, recorder, images, duplicate_rate)
+    counter = {"started": 0, "failed": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration if duration else None
+
+    def worker():
+        while True:
+            with lock:
+                if total_requests and counter["started"] >= total_requests:
+                    return
+                if deadline and time.monotonic() >= deadline:
+                    return
+                counter["started"] += 1
+            ok = client.run_flow(random.choices(flows, weights)[0])
+            if not ok:
+                with lock:
+                    counter["failed"] += 1
+
+    sampler = RssSampler(server_pid) if server_pid else None
+    started = time.monotonic()
+    if sampler:
+        sampler.__enter__()
+    try:
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        if sampler:
+            sampler.__exit__()
+    elapsed = time.monotonic() - started
+
+    operations = recorder.summary()
+    http_ops = {op: s for op, s in operations.items() if not op.endswith("_e2e")}
+    http_requests = sum(s["count"] for s in http_ops.values())
+    http_errors = sum(s["errors"] for s in http_ops.values())
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "flows": counter["started"],
+        "flow_errors": counter["failed"],
+        "flow_error_rate": counter["failed"] / counter["started"] if counter["started"] else 0.0,
+        "duration_s": elapsed,
+        "flows_per_s": counter["started"] / elapsed if elapsed else 0.0,
+        "http_requests": http_requests,
+        "http_errors": http_errors,
+        "http_error_rate": http_errors / http_requests if http_requests else 0.0,
+        "rps": http_requests / elapsed if elapsed else 0.0,
+        "peak_rss_bytes": {
+            "server": sampler.peak if sampler else None,
+            "client": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        },
+        "operations": operations,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def patch_stub_runners(ps):
+    """pipeline_server의 러너 경로를 stub_runners.py로 바꿈 (서버와 원격 워커 공통)"""
+    ps.SPAR3D_ENV = ps.TRELLIS_ENV = sys.executable
+    ps.SPAR3D_SCRIPT = ps.SPAR3D_WORKER_SCRIPT = ps.TRELLIS_RUNNER = ps.REMOVER_SCRIPT = STUB_RUNNER
+    ps.SPAR3D_DIR = ps.TRELLIS_DIR = ps.SERVICE_DIR
+
+
+def run_stub_server(port, async_mode=False):
+    """stub_runners.py를 러너로 쓰는 pipeline_server를 이 프로세스에서 실행 (PIPELINE_SERVICE_DIR 필요)
+
+    async_mode: Flask 개발 서버 대신 async_server.py(uvicorn)로 서빙
+    """
+    sys.path.insert(0, PIPELINE_DIR)
+    import pipeline_server as ps
+    from worker_ipc import ResidentWorker
+
+    ps.CLIP_WORKER = ResidentWorker(
+        "clip", [sys.executable, STUB_RUNNER, "--serve", os.path.join(ps.RUN_DIR, "clip.sock")],
+        socket_path=os.path.join(ps.RUN_DIR, "clip.sock"),
+        cwd=PIPELINE_DIR,
+        log_path=os.path.join(ps.RUN_DIR, "clip_worker.log"),
+        on_ready=ps.record_worker_startup
+    )
+    patch_stub_runners(ps)
+    # 드라이버가 terminate()로 멈추므로 SIGTERM에서도 atexit(워커 종료)가 실행되게 함
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if async_mode:
+        import uvicorn
+        import async_server
+        uvicorn.run(async_server.create_app(), host="127.0.0.1", port=port, log_level="warning")
+        return
+    ps.start_background_services()
+    ps.app.run(host="127.0.0.1", port=port, threaded=True, debug=False)
+
+
+def run_stub_worker(server_url, port, worker_id, state_dir):
+    """stub_runners.py를 러너로 쓰는 원격 재구성 워커를 이 프로세스에서 실행"""
+    sys.path.insert(0, PIPELINE_DIR)
+    import reconstruction_worker
+
+    reconstruction_worker.main(["--server", server_url, "--host", "127.0.0.1", "--port", port,
+                                "--advertise-url", f"http://127.0.0.1:{port}", "--worker-id", worker_id,
+                                "--state-dir", state_dir, "--memory-gb", "32", "--slots", "2"],
+                               configure=patch_stub_runners)
+
+
+def stub_env(args, **extra):
+    env = dict(os.environ, **extra)
+    for name, value in (("STUB_LOAD_MS", args.load_ms), ("STUB_CLIP_MS", args.clip_ms),
+                        ("STUB_SPAR3D_MS", args.spar3d_ms), ("STUB_TRELLIS_MS", args.trellis_ms),
+                        ("STUB_MEMORY_MB", args.memory_mb), ("STUB_GLB_KB", args.glb_kb),
+                        ("STUB_ACCEPT_RATE", args.accept_rate), ("STUB_FAILURE_RATE", args.failure_rate),
+                        ("STUB_CRASH_RATE", args.crash_rate), ("STUB_TEXTURE_LIMIT", args.texture_limit)):
+        env[name] = str(value)
+    if args.trellis_script:
+        env["PIPELINE_TRELLIS_IN_PROCESS"] = "0"
+    return env
+
+
+def start_stub_server(args):
+    service_dir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    extra = {"PIPELINE_SERVICE_DIR": service_dir}
+    if getattr(args, "remote_workers", 0):
+        extra["PIPELINE_GPU_DEVICES"] = "[]"  # 재구성은 모두 원격 워커에서
+    env = stub_env(args, **extra)
+    port = free_port()
+    log = open(os.path.join(service_dir, "server.log"), "wb")
+    cmd = [sys.executable, os.path.abspath(__file__), "--stub-server", str(port)]
+    if getattr(args, "async_server", False):
+        cmd.append("--async-server")
+    proc = subprocess.Popen(cmd, cwd=PIPELINE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        status, body = http("GET", base_url + "/api/health", timeout=2)
+        if status == 200 and json.loads(body)["workers"]["clip"]["ready"]:
+            return proc, base_url, service_dir
+        if proc.poll() is not None:
+            break
+        time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError(f"stub 서버를 시작하지 못했습니다 (로그: {service_dir}/server.log)")
+
+
+def start_stub_workers(args, base_url, service_dir):
+    """원격 재구성 워커 args.remote_workers개를 띄우고 모두 등록될 때까지 대기. 반환: 워커 프로세스 목록"""
+    procs = []
+    for i in range(args.remote_workers):
+        worker_id = f"stub-{i}"
+        state_dir = os.path.join(service_dir, "workers", worker_id)
+        os.makedirs(state_dir, exist_ok=True)
+        log = open(os.path.join(state_dir, "worker.log"), "wb")
+        cmd = [sys.executable, os.path.abspath(__file__), "--stub-worker", base_url, str(free_port()), worker_id,
+               state_dir]
+        # 워커 프로세스 트리째 죽일 수 있도록 세션을 분리
+        procs.append(subprocess.Popen(cmd, cwd=PIPELINE_DIR, env=stub_env(args), stdout=log,
+                                      stderr=subprocess.STDOUT, start_new_session=True))
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        status, body = http("GET", base_url + "/api/workers", timeout=2)
+        if status == 200 and len(json.loads(body)["workers"]) >= len(procs):
+            return procs
+        time.sleep(0.5)
+    stop_processes(procs)
+    raise RuntimeError(f"원격 워커가 등록되지 않았습니다 (로그: {service_dir}/workers/*/worker.log)")
+
+
+def kill_worker_later(proc, delay, record):
+    """delay초 뒤 워커와 그 상주 러너를 모두 SIGKILL (호스트가 갑자기 죽은 상황)"""
+    from cancellation import kill_process_tree
+
+    def run():
+        time.sleep(delay)
+        kill_process_tree(proc.pid)
+        record["killed_worker_at"] = time.time()
+        print(f"[BENCH] Killed remote worker (pid {proc.pid})", file=sys.stderr)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def stop_processes(procs):
+    for proc in procs:
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PIPELINE_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(baseline, current, threshold):
+    """같은 (시나리오, 동시성) 결과끼리 e2e p95와 rps 비교. 반환: 회귀 목록"""
+    before = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"{'scenario':<24}{'metric':<28}{'before':>12}{'after':>12}{'change':>10}")
+    for result in current["results"]:
+        key = (result["scenario"], result["concurrency"])
+        old = before.get(key)
+        if old is None:
+            continue
+        label = f"{key[0]}@c{key[1]}"
+        rows = [("rps", old["rps"], result["rps"], False)]
+        for op, stats in result["operations"].items():
+            if op.endswith("_e2e") and op in old["operations"]:
+                rows.append((f"{op} p95_ms", old["operations"][op]["p95_ms"], stats["p95_ms"], True))
+        rows.append(("http_error_rate", old["http_error_rate"], result["http_error_rate"], True))
+        for metric, a, b, lower_is_better in rows:
+            change = (b - a) / a if a else 0.0
+            worse = change > threshold if lower_is_better else change < -threshold
+            flag = "  <-- regression" if worse else ""
+            print(f"{label:<24}{metric:<28}{a:>12.3f}{b:>12.3f}{change:>+10.1%}{flag}")
+            if worse:
+                regressions.append({"scenario": label, "metric": metric, "before": a, "after": b})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="파이프라인 서버 부하 테스트")
+    parser.add_argument("--url", help="측정할 서버 주소 (없으면 stub 러너 서버를 임시로 띄움)")
+    parser.add_argument("--server-pid", type=int, help="--url 서버의 PID (최대 RSS 측정용)")
+    parser.add_argument("--scenarios", default="filter,process,reconstruct,mixed",
+                        help=f"쉼표로 구분 ({', '.join(SCENARIOS)})")
+    parser.add_argument("--concurrency", default="1,8", help="동시 클라이언트 수 (쉼표로 여러 개)")
+    parser.add_argument("--requests", type=int, default=50, help="시나리오별 흐름(flow) 수")
+    parser.add_argument("--duration", type=float, default=0, help="시나리오별 최대 시간(초, 0이면 제한 없음)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="같은 이미지를 다시 보내는 비율")
+    parser.add_argument("--image-pool", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="결과 JSON 경로 (없으면 stdout)")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="이전 결과와 비교")
+    parser.add_argument("--regression-threshold", type=float, default=0.2)
+    stub = parser.add_argument_group("stub 러너 설정 (--url 없을 때)")
+    stub.add_argument("--load-ms", type=float, default=500)
+    stub.add_argument("--clip-ms", type=float, default=20)
+    stub.add_argument("--spar3d-ms", type=float, default=500)
+    stub.add_argument("--trellis-ms", type=float, default=2000)
+    stub.add_argument("--memory-mb", type=float, default=64)
+    stub.add_argument("--glb-kb", type=float, default=512)
+    stub.add_argument("--accept-rate", type=float, default=0.8)
+    stub.add_argument("--failure-rate", type=float, default=0.0)
+    stub.add_argument("--crash-rate", type=float, default=0.0)
+    stub.add_argument("--texture-limit", type=float, default=0,
+                      help="이보다 큰 텍스처 설정은 OOM으로 실패 (OOM fallback 사다리 확인용, 0이면 제한 없음)")
+    stub.add_argument("--trellis-script", action="store_true",
+                      help="Trellis를 기본 경로(상주 워커) 대신 작업마다 trellis2_run.py로 실행하는 경로로 측정")
+    stub.add_argument("--async-server", action="store_true", help="stub 서버를 비동기 서빙 모드(async_server.py)로 실행")
+    stub.add_argument("--remote-workers", type=int, default=0,
+                      help="재구성을 원격 워커 N개(각각 별도 프로세스)에서 실행 (0이면 서버 안에서 실행)")
+    stub.add_argument("--kill-worker-after", type=float, metavar="SECONDS",
+                      help="측정 시작 후 이 시간(초)이 지나면 원격 워커 하나를 프로세스 트리째 종료")
+    parser.add_argument("--stub-server", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    parser.add_argument("--stub-worker", nargs=4, metavar=("SERVER_URL", "PORT", "WORKER_ID", "STATE_DIR"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stub_server:
+        run_stub_server(args.stub_server, args.async_server)
+        return
+    if args.stub_worker:
+        run_stub_worker(*args.stub_worker)
+        return
+    if args.kill_worker_after is not None and not args.remote_workers:
+        parser.error("--kill-worker-after에는 --remote-workers가 필요합니다")
+
+    random.seed(args.seed)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"알 수 없는 시나리오: {unknown}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    proc = None
+    worker_procs = []
+    if args.url:
+        base_url, server_pid = args.url, args.server_pid
+    else:
+        proc, base_url, service_dir = start_stub_server(args)
+        server_pid = proc.pid
+        print(f"[BENCH] Stub server at {base_url} (state: {service_dir})", file=sys.stderr)
+        if args.remote_workers:
+            try:
+                worker_procs = start_stub_workers(args, base_url, service_dir)
+            except RuntimeError:
+                stop_processes([proc])
+                raise
+            print(f"[BENCH] {len(worker_procs)} remote worker(s) registered", file=sys.stderr)
+
+    images = make_base_images(args.image_pool, seed=args.seed)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "target": args.url or "stub",
+            "stub": None if args.url else {
+                k: getattr(args, k) for k in ("load_ms", "clip_ms", "spar3d_ms", "trellis_ms", "memory_mb",
+                                               "glb_kb", "accept_rate", "failure_rate", "crash_rate",
+                                               "texture_limit", "trellis_script", "async_server", "remote_workers",
+                                               "kill_worker_after")
+            },
+            "requests": args.requests,
+            "duration": args.duration,
+            "duplicate_rate": args.duplicate_rate,
+        },
+        "results": [],
+    }
+    if worker_procs and args.kill_worker_after is not None:
+        kill_worker_later(worker_procs[0], args.kill_worker_after, report["meta"])
+    try:
+        for name in scenarios:
+            for concurrency in levels:
+                print(f"[BENCH] {name} @ concurrency {concurrency}...", file=sys.stderr)
+                result = run_scenario(base_url, name, concurrency, args.requests, args.duration,
+                                      images, args.duplicate_rate, server_pid)
+                report["results"].append(result)
+                print(f"[BENCH]   {result['flows']} flows in {result['duration_s']:.1f}s, "
+                      f"{result['rps']:.1f} req/s, flow errors {result['flow_error_rate']:.1%}", file=sys.stderr)
+    finally:
+        if worker_procs:
+            status, body = http("GET", base_url + "/api/workers", timeout=5)
+            if status == 200:
+                report["meta"]["remote_workers_at_end"] = json.loads(body)["workers"]
+        stop_processes(worker_procs + ([proc] if proc is not None else []))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.regression_threshold)
+        if regressions:
+            sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""재구성 결과(mesh.glb)의 LOD(level of detail) 변형 생성: 면 수 축소 + 텍스처 축소/WebP 압축 + 정점 양자화
+
+- 단계별 목표 면 수/텍스처 크기는 LOD_LEVELS (원본보다 크게 만들지는 않음). "full"은 원본 그대로
+- 면 수 축소: fast_simplification(quadric)으로 줄인 뒤 collapse 기록을 되짚어 UV를 새 정점으로 옮김.
+  UV 경계(seam)에서 나뉜 정점은 열린 경계로 보고 고정해 텍스처가 갈라지지 않게 함
+- 텍스처: LOD 크기로 줄여 WebP(EXT_texture_webp)로 저장
+- 정점 양자화(KHR_mesh_quantization): 위치 int16, 법선 int8, UV uint16으로 바꾸고 역양자화 변환은 노드에 둠.
+  gltfpack이 있으면(LOD_GLTFPACK 또는 PATH) 대신 gltfpack -cc로 양자화 + meshopt 압축
+  (three.js GLTFLoader/drei useGLTF가 두 확장 모두 지원)
+"""
+
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+LOD_LEVELS = {
+    "high": {"faces": 100_000, "texture": 1024},
+    "medium": {"faces": 25_000, "texture": 512},
+    "low": {"faces": 5_000, "texture": 256},
+}
+LOD_NAMES = ("full",) + tuple(LOD_LEVELS)
+GLTFPACK = os.environ.get("LOD_GLTFPACK") or shutil.which("gltfpack")
+
+GLB_MAGIC = 0x46546C67
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+COMPONENT_DTYPES = {5120: np.int8, 5121: np.uint8, 5122: np.int16, 5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4}
+
+
+def lod_params(level):
+    """캐시 키에 넣을 LOD 설정 (설정이 바뀌면 다시 만듦)"""
+    return dict(LOD_LEVELS[level], webp=True, gltfpack=bool(GLTFPACK))
+
+
+def decimate(mesh, target_faces):
+    """면 수를 target_faces 근처로 줄인 새 Trimesh (UV 유지). 이미 작으면 그대로"""
+    import fast_simplification
+    import trimesh
+
+    if len(mesh.faces) <= target_faces:
+        return mesh
+    points = np.asarray(mesh.vertices, dtype=np.float64)
+    faces = np.asarray(mesh.faces, dtype=np.int32)
+    _, _, collapses = fast_simplification.simplify(points, faces, target_count=target_faces,
+                                                   preserve_border=True, return_collapses=True)
+    new_points, new_faces, mapping = fast_simplification.replay_simplification(points, faces, collapses)
+    visual = mesh.visual
+    uv = getattr(visual, "uv", None)
+    material = getattr(visual, "material", None)
+    if uv is None:
+        # 정점/면 색상은 정점 수가 바뀌어 옮길 수 없으므로 재질만 유지
+        visual = trimesh.visual.TextureVisuals(material=material.copy()) if material is not None else None
+        return trimesh.Trimesh(new_points, new_faces, visual=visual, process=False)
+    # 합쳐진 정점마다 살아남은 쪽(collapse의 i0)의 UV를 씀
+    survivors = np.ones(len(points), dtype=bool)
+    survivors[np.asarray(collapses, dtype=np.int64)[:, 1]] = False
+    keep = survivors & (mapping >= 0)
+    new_uv = np.zeros((len(new_points), 2), dtype=np.float64)
+    new_uv[mapping[keep]] = np.asarray(uv)[keep]
+    return trimesh.Trimesh(new_points, new_faces, process=False,
+                           visual=trimesh.visual.TextureVisuals(uv=new_uv, material=material.copy()))
+
+
+def _resize_textures(material, max_size):
+    """재질의 텍스처 이미지를 긴 변 max_size 이하로 축소"""
+    for name in ("baseColorTexture", "metallicRoughnessTexture", "normalTexture", "emissiveTexture",
+                 "occlusionTexture", "image"):
+        image = getattr(material, name, None)
+        if isinstance(image, Image.Image) and max(image.size) > max_size:
+            image = image.copy()
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+            setattr(material, name, image)
+
+
+def _read_glb(data):
+    magic, _, _ = struct.unpack_from("<III", data, 0)
+    if magic != GLB_MAGIC:
+        raise ValueError("GLB 파일이 아닙니다")
+    offset, gltf, binary = 12, None, b""
+    while offset < len(data):
+        length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8:offset + 8 + length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk)
+        elif chunk_type == CHUNK_BIN:
+            binary = bytes(chunk)
+        offset += 8 + length
+    return gltf, binary
+
+
+def _write_glb(gltf, binary):
+    text = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    text += b" " * (-len(text) % 4)
+    binary += b"\0" * (-len(binary) % 4)
+    total = 12 + 8 + len(text) + (8 + len(binary) if binary else 0)
+    out = struct.pack("<III", GLB_MAGIC, 2, total) + struct.pack("<II", len(text), CHUNK_JSON) + text
+    if binary:
+        out += struct.pack("<II", len(binary), CHUNK_BIN) + binary
+    return out
+
+
+def _read_accessor(gltf, binary, index):
+    accessor = gltf["accessors"][index]
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    dtype = np.dtype(COMPONENT_DTYPES[accessor["componentType"]])
+    width = TYPE_SIZES[accessor["type"]]
+    start = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+    stride = view.get("byteStride") or dtype.itemsize * width
+    rows = np.ndarray((accessor["count"], width), dtype=dtype, buffer=binary, offset=start, strides=(stride, dtype.itemsize))
+    return np.array(rows)
+
+
+def quantize_glb(data):
+    """trimesh가 내보낸 GLB를 KHR_mesh_quantization 형식으로 다시 씀 (위치 int16, 법선 int8, UV uint16, 인덱스 uint16)
+
+    위치는 메시별 경계 상자로 정규화하고, 메시를 쓰는 노드 아래에 역양자화 행렬을 가진 자식 노드를 두어 원래 좌표로 되돌림
+    """
+    gltf, binary = _read_glb(data)
+    if any("targets" in prim for mesh in gltf.get("meshes", []) for prim in mesh["primitives"]):
+        return data  # 모프 타깃은 양자화하지 않음 (재구성 결과에는 없음)
+    chunks, views = [], []
+    size = 0
+
+    def add_view(array, stride=None, target=None):
+        nonlocal size
+        raw = np.ascontiguousarray(array).tobytes()
+        pad = -size % 4
+        chunks.append(b"\0" * pad + raw)
+        size += pad
+        view = {"buffer": 0, "byteOffset": size, "byteLength": len(raw)}
+        if stride:
+            view["byteStride"] = stride
+        if target:
+            view["target"] = target
+        views.append(view)
+        size += len(raw)
+        return len(views) - 1
+
+    # 이미지 등 그대로 둘 bufferView를 먼저 새 버퍼로 옮김 (정점/인덱스 accessor가 쓰던 것은 아래에서 새로 씀)
+    geometry_views = {gltf["accessors"][a]["bufferView"]
+                      for mesh in gltf.get("meshes", []) for prim in mesh["primitives"]
+                      for a in list(prim["attributes"].values()) + ([prim["indices"]] if "indices" in prim else [])}
+    view_map = {}
+    for i, view in enumerate(gltf.get("bufferViews", [])):
+        if i in geometry_views:
+            continue
+        start = view.get("byteOffset", 0)
+        view_map[i] = add_view(np.frombuffer(binary[start:start + view["byteLength"]], dtype=np.uint8),
+                               stride=view.get("byteStride"), target=view.get("target"))
+    for image in gltf.get("images", []):
+        if "bufferView" in image:
+            image["bufferView"] = view_map[image["bufferView"]]
+
+    accessors = []
+    dequant = {}  # mesh 번호 -> 역양자화 행렬 (열 우선 4x4)
+    for mesh_index, mesh in enumerate(gltf.get("meshes", [])):
+        positions = [_read_accessor(gltf, binary, p["attributes"]["POSITION"]).astype(np.float64)
+                     for p in mesh["primitives"]]
+        lo = np.min([p.min(axis=0) for p in positions], axis=0)
+        hi = np.max([p.max(axis=0) for p in positions], axis=0)
+        scale = float(max((hi - lo).max(), 1e-12)) / 2
+        center = (lo + hi) / 2
+        dequant[mesh_index] = [scale, 0, 0, 0, 0, scale, 0, 0, 0, 0, scale, 0, *center.tolist(), 1]
+        for prim, position in zip(mesh["primitives"], positions):
+            attributes = {}
+            q = np.round((position - center) / scale * 32767).clip(-32767, 32767).astype(np.int16)
+            padded = np.zeros((len(q), 4), dtype=np.int16)
+            padded[:, :3] = q
+            accessors.append({"bufferView": add_view(padded, stride=8, target=34962), "componentType": 5122,
+                              "normalized": True, "count": len(q), "type": "VEC3",
+                              "min": q.min(axis=0).tolist(), "max": q.max(axis=0).tolist()})
+            attributes["POSITION"] = len(accessors) - 1
+            for name, index in prim["attributes"].items():
+                if name == "POSITION":
+                    continue
+                values = _read_accessor(gltf, binary, index)
+                source = gltf["accessors"][index]
+                if name == "NORMAL" and source["componentType"] == 5126:
+                    n = np.round(values * 127).clip(-127, 127).astype(np.int8)
+                    padded = np.zeros((len(n), 4), dtype=np.int8)
+                    padded[:, :3] = n
+                    accessors.append({"bufferView": add_view(padded, stride=4, target=34962), "componentType": 5120,
+                                      "normalized": True, "count": len(n), "type": "VEC3"})
+                elif (name.startswith("TEXCOORD_") and source["componentType"] == 5126
+                      and values.min() >= 0 and values.max() <= 1):
+                    t = np.round(values * 65535).astype(np.uint16)
+                    accessors.append({"bufferView": add_view(t, target=34962), "componentType": 5123,
+                                      "normalized": True, "count": len(t), "type": "VEC2"})
+                else:
+                    stride = values.itemsize * values.shape[1]
+                    if stride % 4:
+                        padded = np.zeros((len(values), values.shape[1] + (-stride % 4) // values.itemsize),
+                                          dtype=values.dtype)
+                        padded[:, :values.shape[1]] = values
+                        values, stride = padded, padded.itemsize * padded.shape[1]
+                    accessor = {k: v for k, v in source.items() if k not in ("bufferView", "byteOffset")}
+                    accessor["bufferView"] = add_view(values, stride=stride, target=34962)
+                    accessors.append(accessor)
+                attributes[name] = len(accessors) - 1
+            prim["attributes"] = attributes
+            if "indices" in prim:
+                indices = _read_accessor(gltf, binary, prim["indices"]).reshape(-1)
+                dtype, component = (np.uint16, 5123) if len(position) <= 65535 else (np.uint32, 5125)
+                accessors.append({"bufferView": add_view(indices.astype(dtype), target=34963),
+                                  "componentType": component, "count": len(indices), "type": "SCALAR"})
+                prim["indices"] = len(accessors) - 1
+
+    # 메시를 자식 노드로 내려 역양자화 행렬을 붙임 (원래 노드의 자식에게는 영향 없음)
+    nodes = gltf.get("nodes", [])
+    for node in list(nodes):
+        if "mesh" in node:
+            mesh_index = node.pop("mesh")
+            nodes.append({"mesh": mesh_index, "matrix": dequant[mesh_index]})
+            node.setdefault("children", []).append(len(nodes) - 1)
+    gltf["accessors"] = accessors
+    gltf["bufferViews"] = views
+    gltf["buffers"] = [{"byteLength": size}]
+    for extension_list in ("extensionsUsed", "extensionsRequired"):
+        gltf[extension_list] = sorted(set(gltf.get(extension_list, [])) | {"KHR_mesh_quantization"})
+    return _write_glb(gltf, b"".join(chunks))
+
+
+def _gltfpack(data):
+    """gltfpack으로 양자화 + meshopt 압축. 실패하면 None"""
+    with tempfile.TemporaryDirectory(prefix="lod-") as tmp:
+        source, packed = os.path.join(tmp, "in.glb"), os.path.join(tmp, "out.glb")
+        try:
+            with open(source, "wb") as f:
+                f.write(data)
+            subprocess.run([GLTFPACK, "-i", source, "-o", packed, "-cc"], check=True, capture_output=True, timeout=300)
+            with open(packed, "rb") as f:
+                return f.read()
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"[LOD] gltfpack failed, using built-in quantization: {e}", file=sys.stderr)
+            return None
+
+
+def build_lod(mesh_path, level, output_path):
+    """mesh_path의 level 단계 LOD를 output_path에 저장. 반환: {"success", "path", "faces", "bytes"} 또는 실패 사유"""
+    import trimesh
+
+    settings = LOD_LEVELS[level]
+    try:
+        scene = trimesh.load(mesh_path, force="scene", process=False)
+        scene.metadata.clear()  # 불러온 파일 경로가 extras로 내보내지지 않게
+        meshes = {name: g for name, g in scene.geometry.items() if isinstance(g, trimesh.Trimesh)}
+        total_faces = sum(len(g.faces) for g in meshes.values()) or 1
+        faces = 0
+        for name, geometry in meshes.items():
+            # 목표 면 수는 원래 면 수 비율대로 나눔
+            geometry = decimate(geometry, max(4, settings["faces"] * len(geometry.faces) // total_faces))
+            material = getattr(geometry.visual, "material", None)
+            if material is not None:
+                _resize_textures(material, settings["texture"])
+            scene.geometry[name] = geometry
+            faces += len(geometry.faces)
+        data = scene.export(file_type="glb", extension_webp=True, include_normals=True)
+        packed = _gltfpack(data) if GLTFPACK else None
+        data = packed if packed is not None else quantize_glb(data)
+        # 디렉토리는 호출하는 쪽에서 만듦 (만드는 동안 task가 지워졌으면 되살리지 않고 실패)
+        tmp = f"{output_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, output_path)
+    except Exception as e:
+        return {"success": False, "error": f"{type(e).__name__}: {e}"}
+    return {"success": True, "path": output_path, "level": level, "faces": faces, "bytes": len(data)}
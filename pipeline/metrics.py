@@ -0,0 +1,224 @@
+"""파이프라인 서버 지표: 단계별 지연 시간 히스토그램, 카운터, 작업(task)별 단계 시간
+
+/api/metrics에서 Prometheus 텍스트 형식으로 내보냅니다. prometheus_client 없이 표준 라이브러리만 사용합니다.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# 업로드 저장(ms 단위)부터 Trellis 추론(수십 분)까지 한 히스토그램에 담을 수 있는 구간
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+MEMORY_BUCKETS = tuple(gb * 1024 ** 3 for gb in (0.5, 1, 2, 4, 8, 12, 16, 24, 32, 48, 64, 80))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.label_names = tuple(label_names)
+        self._series = {}  # label 값 튜플 -> {"counts": [...], "sum": float, "count": int}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def summary(self):
+        """{label 값: {"count", "sum", "mean"}} (JSON 응답용)"""
+        with self._lock:
+            return {
+                "/".join(key) or "_": {
+                    "count": s["count"],
+                    "sum": s["sum"],
+                    "mean": s["sum"] / s["count"] if s["count"] else 0.0
+                }
+                for key, s in self._series.items()
+            }
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = list(zip(self.label_names, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    le = labels + [("le", _format_value(float(bound)))]
+                    lines.append(f"{self.name}_bucket{_format_labels(le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series['sum'])}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {series['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(list(zip(self.label_names, key)))} {_format_value(value)}")
+        return lines
+
+
+def render_gauges(gauges):
+    """gauges: [(name, help, [(labels dict, value), ...]), ...] -> Prometheus 텍스트 줄
+
+    이름이 _total로 끝나면 스크레이프 시점에 읽어 온 누적 값이므로 counter로 내보냄
+    """
+    lines = []
+    for name, help_text, samples in gauges:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+        for labels, value in samples:
+            if value is None:
+                continue
+            lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return lines
+
+
+class TaskTimings:
+    """작업(task)별 단계 시간 기록. 최근 max_tasks개만 유지"""
+
+    def __init__(self, max_tasks=1000):
+        self.max_tasks = max_tasks
+        self._tasks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, task_id, stage=None, seconds=None, **data):
+        """단계 시간(stage, seconds)을 더하거나 기타 값(data)을 기록"""
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                entry = self._tasks[task_id] = {"stages": {}, "updated_at": None}
+            self._tasks.move_to_end(task_id)
+            if stage is not None and seconds is not None:
+                # 같은 단계가 여러 번 실행되면 (재시도, 다른 모델로 재구성) 합산
+                entry["stages"][stage] = entry["stages"].get(stage, 0.0) + seconds
+            entry.update(data)
+            entry["updated_at"] = time.time()
+            while len(self._tasks) > self.max_tasks:
+                self._tasks.popitem(last=False)
+
+    def get(self, task_id):
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            return {"stages": dict(entry["stages"]), **{k: v for k, v in entry.items() if k != "stages"}} if entry else None
+
+    def snapshot(self, limit=100):
+        with self._lock:
+            task_ids = list(self._tasks)[-limit:]
+        return {task_id: self.get(task_id) for task_id in reversed(task_ids)}
+
+
+class StageClock:
+    """러너가 보고하는 단계 시작 이벤트로 단계별 소요 시간을 계산
+
+    다음 단계가 시작되거나 finish()가 호출되면 이전 단계를 on_stage(stage, seconds)로 넘김
+    """
+
+    def __init__(self, on_stage, clock=time.monotonic):
+        self.on_stage = on_stage
+        self.clock = clock
+        self._stage = None
+        self._started = None
+        self._lock = threading.Lock()
+
+    def enter(self, stage):
+        with self._lock:
+            now = self.clock()
+            previous, started = self._stage, self._started
+            self._stage, self._started = stage, now
+        if previous is not None:
+            self.on_stage(previous, now - started)
+
+    @property
+    def stage(self):
+        return self._stage
+
+    def rename(self, stage):
+        """진행 중인 단계의 이름만 바꿈 (시작 시각 유지)"""
+        with self._lock:
+            self._stage = stage
+
+    def finish(self):
+        self.enter(None)
+
+    def discard(self):
+        """진행 중인 단계를 기록하지 않고 버림"""
+        with self._lock:
+            self._stage, self._started = None, None
+
+
+class DirectorySizeProbe:
+    """디렉토리 전체 크기 (스크레이프마다 전체를 훑지 않도록 ttl 동안 재사용)"""
+
+    def __init__(self, path, ttl_seconds=60):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._value = None
+        self._measured_at = 0.0
+        self._lock = threading.Lock()
+
+    def _measure(self):
+        total = 0
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass  # 측정 중 삭제된 파일
+        return total
+
+    def bytes(self):
+        with self._lock:
+            if self._value is None or time.monotonic() - self._measured_at > self.ttl_seconds:
+                self._value = self._measure()
+                self._measured_at = time.monotonic()
+            return self._value
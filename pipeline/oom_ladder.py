@@ -0,0 +1,78 @@
+"""GPU 메모리 부족(OOM) 시 설정을 한 단계씩 낮춰 다시 시도하는 fallback 사다리
+
+사다리는 설정 dict의 목록이고 앞쪽일수록 품질이 높은(메모리를 많이 쓰는) 설정입니다.
+러너(run_spar3d.py, run_trellis.py)는 run_ladder()로 첫 단계부터 실행하고, OOM이면 캐시를 비운 뒤 다음 단계로 넘어갑니다.
+어느 단계에서 성공했는지는 결과의 "oom_fallback"으로 서버에 보고되어 /api/metrics에서 단계별 횟수로 집계되므로,
+대부분 첫 단계에서 성공하면 기본값(첫 단계)을 더 올려도 됩니다.
+
+러너 환경에서도 import 되므로 표준 라이브러리만 사용합니다.
+"""
+
+import gc
+import sys
+
+from progress import report_progress, peak_memory
+
+# SPAR3D (model.run_image 인자). remesh_option "none"이면 remesh를 건너뜀
+SPAR3D_LADDER = (
+    {"texture_resolution": 2048, "remesh_option": "triangle", "target_count": 100000},
+    {"texture_resolution": 1024, "remesh_option": "triangle", "target_count": 50000},
+    {"texture_resolution": 1024, "remesh_option": "none", "target_count": 50000},
+    {"texture_resolution": 512, "remesh_option": "none", "target_count": 25000},
+)
+# Trellis (추론 결과는 유지하고 simplify -> to_glb 단계만 다시 실행하므로 simplify_target은 줄어드는 순서여야 함)
+TRELLIS_LADDER = (
+    {"simplify_target": 16777216, "decimation_target": 1000000, "texture_size": 4096, "remesh": True},
+    {"simplify_target": 8388608, "decimation_target": 500000, "texture_size": 2048, "remesh": False},
+    {"simplify_target": 4194304, "decimation_target": 250000, "texture_size": 1024, "remesh": False},
+)
+
+OOM_MARKERS = ("out of memory", "OutOfMemoryError", "CUBLAS_STATUS_ALLOC_FAILED", "std::bad_alloc")
+
+
+def is_oom_text(text):
+    """로그/에러 메시지가 메모리 부족으로 인한 실패인지"""
+    lowered = text.lower()
+    return any(marker.lower() in lowered for marker in OOM_MARKERS)
+
+
+def is_oom(exc):
+    """torch.cuda.OutOfMemoryError, CUDA/cuBLAS 할당 실패, 호스트 MemoryError"""
+    return isinstance(exc, MemoryError) or type(exc).__name__ == "OutOfMemoryError" or is_oom_text(str(exc))
+
+
+def free_device_memory():
+    """실패한 시도가 잡고 있던 텐서를 해제 (torch를 쓰지 않는 프로세스에서는 gc만)"""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def run_ladder(ladder, attempt):
+    """ladder의 설정을 차례로 attempt(settings)에 넘겨 실행. OOM이면 다음 단계로, 그 외 예외는 그대로 전파
+
+    반환: (attempt 결과, {"rung", "rungs", "settings", "attempts"}) — rung은 성공한 단계(0부터),
+    attempts는 OOM으로 실패한 단계별 {"rung", "settings", "error", "peak_memory"}
+    마지막 단계까지 OOM이면 마지막 예외를 다시 발생 (보고서는 예외의 oom_fallback 속성)
+    """
+    if not ladder:
+        raise ValueError("OOM fallback 사다리가 비어 있습니다")
+    attempts = []
+    for rung, settings in enumerate(ladder):
+        settings = dict(settings)
+        try:
+            result = attempt(settings)
+        except Exception as e:
+            if not is_oom(e):
+                raise
+            attempts.append({"rung": rung, "settings": settings, "error": str(e)[:200], "peak_memory": peak_memory()})
+            if rung == len(ladder) - 1:
+                e.oom_fallback = {"rung": None, "rungs": len(ladder), "settings": None, "attempts": attempts}
+                raise
+        else:
+            return result, {"rung": rung, "rungs": len(ladder), "settings": settings, "attempts": attempts}
+        # except 블록을 벗어난 뒤에 해제해야 traceback이 잡고 있던 텐서까지 풀림
+        free_device_memory()
+        print(f"[OOM] Out of memory with {settings} -> retrying with {dict(ladder[rung + 1])}", file=sys.stderr)
+        report_progress("oom_retry", rung=rung + 1, settings=dict(ladder[rung + 1]))
@@ -1,6 +1,6 @@
 """통합 파이프라인 서버: CLIP 필터링 + SPAR3D 3D 재구성"""
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 import os
 import sys
@@ -9,20 +9,177 @@ import json
 import uuid
 from werkzeug.utils import secure_filename
 import shutil
+import hashlib
+import ipaddress
+import atexit
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from worker_ipc import ResidentWorker, WorkerError
+from cancellation import Cancelled
+import prefilter
+import clip_prompts
+import lod
+from progress import ProgressHub, TERMINAL_STAGES, stream_subprocess, read_log_tail
+from oom_ladder import SPAR3D_LADDER, TRELLIS_LADDER, is_oom_text
+from result_cache import ResultCache, hash_file, link_or_copy
+from task_index import TaskIndex
+from embedding_store import EmbeddingStore
+from workspace_gc import WorkspaceReaper, DEFAULT_TTL_SECONDS
+from job_queue import JobQueue
+from scheduler import GpuScheduler
+from remote_workers import (WorkerRegistry, WorkerLost, WORKER_TOKEN_HEADER, is_remote_device, run_remote,
+                            token_matches)
+from metrics import (Histogram, Counter, TaskTimings, StageClock, DirectorySizeProbe, render_gauges,
+                     MEMORY_BUCKETS)
 
 app = Flask(__name__)
 CORS(app)
 
-CLIP_ENV = "/workspace/tobigs/pipeline_service/clip-env/bin/python"
-SPAR3D_ENV = "/workspace/tobigs/sangwoo/miniconda3/envs/sangwoo-spar3d/bin/python"
-SPAR3D_SCRIPT = "/workspace/tobigs/sangwoo/stable-point-aware-3d/run.py"
-SPAR3D_DIR = "/workspace/tobigs/sangwoo/stable-point-aware-3d"
-TRELLIS_ENV = "/workspace/tobigs/miniconda3/envs/trellis311/bin/python"
-TRELLIS_SCRIPT = "/workspace/tobigs/pipeline_service/run_trellis.py"
-WORKSPACE_DIR = "/workspace/tobigs/pipeline_service/workspace"
+# 호스트마다 다른 설치 경로는 PIPELINE_<이름> 환경 변수로 바꿀 수 있음 (원격 재구성 워커 호스트 등)
+CLIP_ENV = os.environ.get("PIPELINE_CLIP_ENV", "/workspace/tobigs/pipeline_service/clip-env/bin/python")
+SPAR3D_ENV = os.environ.get("PIPELINE_SPAR3D_ENV",
+                            "/workspace/tobigs/sangwoo/miniconda3/envs/sangwoo-spar3d/bin/python")
+SPAR3D_DIR = os.environ.get("PIPELINE_SPAR3D_DIR", "/workspace/tobigs/sangwoo/stable-point-aware-3d")
+SPAR3D_SCRIPT = os.path.join(SPAR3D_DIR, "run.py")
+SPAR3D_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_spar3d.py")  # 상주 모드 지원
+USE_RESIDENT_SPAR3D = True
+# 배경 제거: 공용 상주 워커(SPAR3D_ENV)에서 한 번 실행하고 RGBA 결과를 SPAR3D와 Trellis에 함께 넘김
+REMOVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_remover.py")
+REMOVER_MODE = "base"  # transparent_background 모드 (결과 파일/캐시 키에 포함)
+USE_SHARED_REMOVER = True
+# /api/process: CLIP 판정과 동시에 배경 제거를 미리 실행 (배경 제거 워커가 준비되어 있을 때만)
+SPECULATIVE_BG_REMOVAL = True
+TRELLIS_ENV = os.environ.get("PIPELINE_TRELLIS_ENV", "/workspace/tobigs/miniconda3/envs/trellis311/bin/python")
+TRELLIS_DIR = os.environ.get("PIPELINE_TRELLIS_DIR", "/workspace/tobigs/TRELLIS.2")
+HF_HOME = os.environ.get("HF_HOME", "/workspace/tobigs/.hf_cache")
+TRELLIS_RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_trellis.py")
+# Trellis를 run_trellis.py 안에서 직접 실행 (상주 워커, OOM fallback, 단계별 진행).
+# PIPELINE_TRELLIS_IN_PROCESS=0이면 TRELLIS.2의 trellis2_run.py를 작업마다 그대로 실행
+TRELLIS_IN_PROCESS = os.environ.get("PIPELINE_TRELLIS_IN_PROCESS", "1") != "0"
+USE_RESIDENT_TRELLIS = TRELLIS_IN_PROCESS
+# 서버 상태를 저장하는 디렉토리 (부하 테스트 등에서 PIPELINE_SERVICE_DIR로 분리 가능)
+SERVICE_DIR = os.environ.get("PIPELINE_SERVICE_DIR", "/workspace/tobigs/pipeline_service")
+WORKSPACE_DIR = os.path.join(SERVICE_DIR, "workspace")
+# 상주 워커 소켓/로그 (서버와 같은 SERVICE_DIR을 쓰는 bulk_ingest.py 등은 PIPELINE_RUN_DIR로 분리)
+RUN_DIR = os.environ.get("PIPELINE_RUN_DIR", os.path.join(SERVICE_DIR, "run"))
+CACHE_DIR = os.path.join(SERVICE_DIR, "cache")  # 이미지 해시 기반 결과 캐시
+CACHE_MAX_BYTES = 20 * 1024 ** 3
+JOBS_DIR = os.path.join(SERVICE_DIR, "jobs")  # 재구성 작업 상태 (재시작 후에도 유지)
+EMBEDDINGS_DIR = os.path.join(SERVICE_DIR, "embeddings")  # 완료된 결과의 CLIP 임베딩 (거의 같은 업로드 탐지)
+SIMILAR_MESH_THRESHOLD = 0.95  # 이 코사인 유사도 이상이면 필터 응답에 기존 결과를 재사용 후보로 포함
+SIMILAR_MESH_LIMIT = 3
+# 작업 디렉토리 정리: 단계별 보관 기간(초)과 전체 디스크 한도 (workspace_gc.py 참고)
+WORKSPACE_TTL_SECONDS = dict(DEFAULT_TTL_SECONDS)
+WORKSPACE_QUOTA_BYTES = 50 * 1024 ** 3
+WORKSPACE_GC_INTERVAL_SECONDS = 300
+# 재구성에 쓸 이 호스트의 GPU 장치 (메모리 GB, 동시 실행 슬롯). 모드별 사용량과 장치당 동시 실행 수
+# (상주 워커가 모드별로 하나라 모드마다 1개)는 scheduler.MODE_PROFILES 참고
+# PIPELINE_GPU_DEVICES(JSON)로 바꿀 수 있고, "[]"이면 원격 재구성 워커에만 작업을 보냄
+GPU_DEVICES = json.loads(os.environ.get("PIPELINE_GPU_DEVICES") or '[{"id": "0", "memory_gb": 32, "slots": 2}]')
+# 원격 재구성 워커 (reconstruction_worker.py): heartbeat 간격/만료 시간, 등록 토큰, 워커가 죽은 작업의 재시도 횟수
+WORKER_HEARTBEAT_SECONDS = 5
+WORKER_TIMEOUT_SECONDS = 20
+WORKER_AUTH_TOKEN = os.environ.get("PIPELINE_WORKER_TOKEN")
+JOB_MAX_REQUEUES = 3
+CLIP_MODEL_NAME = "ViT-B/32"
+# CLIP 판정 방식 (필터 결과 캐시 키에 포함). 시작 시 한 번 정하고 CLIP_DEVICE 환경 변수로 CLIP 워커/단발 실행에
+# 넘기므로 실행 중에 바뀌지 않음. 로컬 GPU가 없는 서버(PIPELINE_GPU_DEVICES='[]')는 CPU, cpu_mode는 CPU에서만 의미 있음
+CLIP_DEVICE = os.environ.get("PIPELINE_CLIP_DEVICE") or ("cuda" if GPU_DEVICES else "cpu")
+CLIP_INFERENCE = {"device": CLIP_DEVICE,
+                  "cpu_mode": os.environ.get("CLIP_CPU_MODE", "fp32") if CLIP_DEVICE == "cpu" else None}
+# 재구성 설정의 OOM fallback 사다리 (oom_ladder.py): 첫 단계부터 실행하고 메모리가 부족하면 다음 단계로
+# 단계별 성공 횟수는 /api/metrics의 pipeline_oom_fallback_total. 호스트마다 PIPELINE_*_OOM_LADDER(JSON)로 바꿀 수 있음
+SPAR3D_OOM_LADDER = json.loads(os.environ.get("PIPELINE_SPAR3D_OOM_LADDER") or json.dumps(SPAR3D_LADDER))
+TRELLIS_OOM_LADDER = json.loads(os.environ.get("PIPELINE_TRELLIS_OOM_LADDER") or json.dumps(TRELLIS_LADDER))
+CLIP_BATCH_WINDOW_MS = 10  # 동시 업로드를 한 배치로 묶는 대기 시간
+CLIP_MAX_BATCH = 16
+PROGRESS_KEEPALIVE_SECONDS = 15  # SSE 연결 유지용 주석 전송 간격 (프록시 idle timeout 방지)
+# 상태 조회/진행 스트림으로 지켜보던 클라이언트가 이 시간(초) 동안 돌아오지 않으면 아직 시작 전인 작업을 취소 (0이면 사용 안 함)
+CLIENT_ABANDON_SECONDS = float(os.environ.get("PIPELINE_CLIENT_ABANDON_SECONDS") or 60)
+# 실행 중인 작업의 모드별 기준 시간 (JSON). 진행 스트림은 PROGRESS_KEEPALIVE_SECONDS마다, 프론트엔드 폴링은 몇 초마다
+# 조회하므로 그보다 충분히 길게 두고, GPU를 오래 쓰는 quality는 더 길게. "{}"이면 실행 중에는 취소하지 않음
+CLIENT_ABANDON_RUNNING_SECONDS = json.loads(os.environ.get("PIPELINE_CLIENT_ABANDON_RUNNING_SECONDS")
+                                            or json.dumps({"fast": 120, "quality": 300}))
+# 재구성이 끝나면 LOD 변형(lod.LOD_LEVELS)을 백그라운드에서 미리 만듦 (끄면 첫 ?lod= 다운로드 때 만듦)
+PREBUILD_LODS = True
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
 os.makedirs(WORKSPACE_DIR, exist_ok=True)
+os.makedirs(RUN_DIR, exist_ok=True)
+
+RESULT_CACHE = ResultCache(CACHE_DIR, CACHE_MAX_BYTES)
+TASK_INDEX = TaskIndex(os.path.join(WORKSPACE_DIR, "tasks.sqlite3"))
+EMBEDDING_STORE = EmbeddingStore(EMBEDDINGS_DIR)
+# 재구성 등록과 작업 디렉토리 삭제(GC, cleanup)가 겹치지 않도록 잡는 잠금
+TASKS_LOCK = threading.RLock()
+PROGRESS = ProgressHub()
+
+# 지표 (/api/metrics)
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds", "Latency of pipeline stages (upload_save, prefilter, clip_filter, similar_search, "
+    "background_removal_speculative, queue_wait, spawn, model_load, background_removal, inference, remesh, "
+    "glb_export, oom_retry, reconstruction, lod_build)",
+    label_names=("stage", "model"))
+JOB_PEAK_MEMORY = Histogram(
+    "pipeline_job_peak_memory_bytes", "Peak memory of reconstruction runs reported by the runner",
+    buckets=MEMORY_BUCKETS, label_names=("model", "kind"))
+STAGE_PEAK_MEMORY = Histogram(
+    "pipeline_stage_peak_memory_bytes", "Peak memory of each runner stage (inference, remesh, glb_export, ...)",
+    buckets=MEMORY_BUCKETS, label_names=("model", "stage", "kind"))
+OOM_FALLBACKS = Counter(
+    "pipeline_oom_fallback_total",
+    "Reconstruction runs by the OOM fallback rung that succeeded (0 = first settings, exhausted = every rung ran out)",
+    ("model", "rung"))
+JOBS_FINISHED = Counter("pipeline_jobs_finished_total", "Finished reconstruction jobs", ("model", "status"))
+FILTER_RESULTS = Counter("pipeline_filter_results_total", "Filter verdicts", ("status",))
+SPECULATION_RESULTS = Counter(
+    "pipeline_speculative_bg_removal_total",
+    "Speculative background removals by outcome (used, cancelled, wasted, failed, skipped)", ("outcome",))
+TASK_TIMINGS = TaskTimings()
+WORKSPACE_SIZE = DirectorySizeProbe(WORKSPACE_DIR)
+
+def observe_stage(stage, seconds, task_id=None, model=""):
+    STAGE_SECONDS.observe(seconds, stage=stage, model=model)
+    if task_id:
+        TASK_TIMINGS.record(task_id, stage, seconds)
+
+@contextmanager
+def timed(stage, task_id=None, model=""):
+    """with 블록의 소요 시간을 단계 히스토그램과 task별 기록에 남김"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.monotonic() - started, task_id, model)
+
+def record_worker_startup(name, seconds, pong):
+    """상주 워커 기동 시간: 프로세스 시작~모델 로딩 전(spawn)과 모델 로딩(model_load)으로 나눠 기록"""
+    model = name.split("-")[0]
+    if name == "clip" and pong.get("device") != CLIP_DEVICE:
+        print(f"[WARN] CLIP worker runs on {pong.get('device')}, expected {CLIP_DEVICE}", file=sys.stderr)
+    load_seconds = pong.get("load_seconds")
+    if load_seconds is None:
+        observe_stage("spawn", seconds, model=model)
+        return
+    observe_stage("spawn", max(0.0, seconds - load_seconds), model=model)
+    observe_stage("model_load", load_seconds, model=model)
+
+# 상주 CLIP 워커: 모델과 프롬프트 임베딩을 한 번만 로드 (CLIP_ENV에서 별도 프로세스로 실행)
+CLIP_WORKER = ResidentWorker(
+    "clip",
+    [CLIP_ENV, os.path.join(os.path.dirname(os.path.abspath(__file__)), "clip_filter.py"),
+     "--serve", os.path.join(RUN_DIR, "clip.sock"),
+     "--batch-window-ms", str(CLIP_BATCH_WINDOW_MS), "--max-batch", str(CLIP_MAX_BATCH)],
+    socket_path=os.path.join(RUN_DIR, "clip.sock"),
+    cwd=os.path.dirname(os.path.abspath(__file__)),
+    env={**os.environ, "CLIP_DEVICE": CLIP_DEVICE},
+    log_path=os.path.join(RUN_DIR, "clip_worker.log"),
+    startup_timeout=180,
+    on_ready=record_worker_startup
+)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -36,7 +193,8 @@ def run_clip_filter_subprocess(image_path):
             capture_output=True,
             text=True,
             timeout=60,
-            cwd=os.path.dirname(__file__)
+            cwd=os.path.dirname(__file__),
+            env={**os.environ, "CLIP_DEVICE": CLIP_DEVICE}
         )
         if result.returncode != 0:
             print(f"[CLIP ERROR] {result.stderr}", file=sys.stderr)
@@ -53,43 +211,345 @@ def run_clip_filter_subprocess(image_path):
         print(f"[CLIP ERROR] {str(e)}", file=sys.stderr)
         return {"status": "error", "reasons": [f"CLIP 오류: {str(e)}"]}
 
-def run_spar3d(image_path, output_dir):
-    """SPAR3D 3D 재구성 실행 (Fast 모드)"""
+def run_clip_filter_worker(image_path):
+    """상주 CLIP 워커로 필터링 (워커를 띄울 수 없으면 단발 subprocess로 대체)"""
+    try:
+        return CLIP_WORKER.call({"op": "filter", "image_path": image_path}, timeout=60)
+    except WorkerError as e:
+        print(f"[CLIP WORKER] {e} -> falling back to subprocess", file=sys.stderr)
+        return run_clip_filter_subprocess(image_path)
+
+def run_clip_filter_batch_worker(image_paths):
+    """여러 이미지를 상주 CLIP 워커에서 배치로 필터링 (입력 순서대로 결과 리스트)"""
+    try:
+        return CLIP_WORKER.call({"op": "filter_batch", "image_paths": image_paths},
+                                timeout=60 + 2 * len(image_paths))
+    except WorkerError as e:
+        print(f"[CLIP WORKER] {e} -> falling back to subprocess", file=sys.stderr)
+        return [run_clip_filter_subprocess(p) for p in image_paths]
+
+def _filter_cacheable(result):
+    return result.get("status") in ("accept", "reject")
+
+def similar_meshes(hits):
+    """임베딩 검색 결과 중 결과 파일이 아직 남아 있는 것 (다운로드: /api/download/<task_id>?model=<model>)"""
+    found = []
+    for hit in hits:
+        mesh_path = TASK_INDEX.mesh_path(hit["task_id"], hit["model"])
+        if mesh_path and os.path.exists(mesh_path):
+            found.append(hit)
+    return found
+
+# 프롬프트/판정 규칙이 바뀌면 이전 판정을 쓰지 않도록 캐시 키에 넣는 해시
+CLIP_PROMPTS_HASH = hashlib.sha256(json.dumps(
+    [clip_prompts.PROMPTS_MAP, clip_prompts.ACCEPT_CATEGORY, clip_prompts.HUMAN_CATEGORY],
+    sort_keys=True).encode("utf-8")).hexdigest()
+
+def filter_cache_key(image_hash):
+    """필터 판정 캐시 키: 모델, 프롬프트, 사람 판정 임계값, 추론 방식(GPU/CPU 모드), 사전 필터 임계값이 같을 때만 재사용"""
+    return RESULT_CACHE.make_key(image_hash, "filter", {
+        "model": CLIP_MODEL_NAME,
+        "prompts": CLIP_PROMPTS_HASH,
+        "human_threshold": clip_prompts.HUMAN_THRESHOLD,
+        "inference": CLIP_INFERENCE,
+        "prefilter": prefilter.settings()
+    })
+
+def prefilter_images(image_paths):
+    """사전 필터 결과 목록 (사전 필터를 통과한 이미지는 None -> 캐시/CLIP으로 판정)"""
+    with timed("prefilter"):
+        return [prefilter.prefilter_image(p) for p in image_paths]
+
+def finish_filter(results, task_ids=None):
+    """판정 결과 마무리: 임베딩으로 거의 같은 이미지의 기존 결과를 찾아 similar_meshes에 담고 판정 집계
+
+    task_ids를 주면 재구성이 끝났을 때 검색 대상이 되도록 임베딩을 기록함
+    """
+    # 캐시/합류한 결과는 다른 요청과 공유하므로 복사본에서 내부 필드를 뺌
+    embedded = [(i, result["embedding"]) for i, result in enumerate(results) if result.get("embedding")]
+    results = [{k: v for k, v in result.items() if k not in ("files", "embedding")} for result in results]
+    if embedded:
+        with timed("similar_search"):
+            matches = EMBEDDING_STORE.search([e for _, e in embedded], k=SIMILAR_MESH_LIMIT,
+                                             threshold=SIMILAR_MESH_THRESHOLD)
+        for (i, embedding), hits in zip(embedded, matches):
+            results[i]["similar_meshes"] = similar_meshes(hits)
+            if task_ids:
+                EMBEDDING_STORE.stage(task_ids[i], embedding)
+    for result in results:
+        FILTER_RESULTS.inc(status=result.get("status"))
+    return results
+
+def filter_images(image_paths, image_hashes=None, task_ids=None):
+    """사전 필터 -> 캐시 -> CLIP 순서로 필터링. 앞 단계에서 결정된 이미지는 CLIP을 거치지 않음 (마무리는 finish_filter)"""
+    image_hashes = image_hashes or [hash_file(p) for p in image_paths]
+    results = prefilter_images(image_paths)
+    keys = {i: filter_cache_key(image_hashes[i]) for i, result in enumerate(results) if result is None}
+    if len(keys) == 1:
+        # 단일 이미지: 동시에 들어온 같은 이미지 요청은 하나의 CLIP 호출로 합침
+        i, key = next(iter(keys.items()))
+        def compute():
+            with timed("clip_filter", model=CLIP_MODEL_NAME):
+                return run_clip_filter_worker(image_paths[i])
+        results[i], source = RESULT_CACHE.get_or_compute(key, compute, cacheable=_filter_cacheable, timeout=120)
+        if results[i] is None:
+            # 합류한 판정이 실패했거나 시간 초과
+            results[i] = {"status": "error", "reasons": ["CLIP 판정 대기 시간 초과" if source == "timeout"
+                                                         else "CLIP 판정 실패"]}
+    elif keys:
+        for i, key in keys.items():
+            results[i] = RESULT_CACHE.get(key)
+        pending = [i for i in keys if results[i] is None]
+        if pending:
+            with timed("clip_filter", model=CLIP_MODEL_NAME):
+                clip_results = run_clip_filter_batch_worker([image_paths[i] for i in pending])
+            for i, clip_result in zip(pending, clip_results):
+                results[i] = clip_result
+                if _filter_cacheable(clip_result):
+                    RESULT_CACHE.put(keys[i], clip_result)
+    return finish_filter(results, task_ids)
+
+def spar3d_env(device):
+    """SPAR3D 실행 환경 변수 (단발 실행과 상주 워커 공통)"""
+    env = os.environ.copy()
+    env["PYTHONPATH"] = SPAR3D_DIR
+    env["CUDA_VISIBLE_DEVICES"] = device
+    env["HF_HOME"] = HF_HOME
+    env["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True,max_split_size_mb:128"
+    
+    # HuggingFace 토큰 설정
+    hf_token = os.environ.get("HF_TOKEN") or os.environ.get("HUGGINGFACE_HUB_TOKEN")
+    if hf_token:
+        env["HF_TOKEN"] = hf_token
+        env["HUGGINGFACE_HUB_TOKEN"] = hf_token
+    return env
+
+def trellis_env(device):
+    """Trellis 실행 환경 변수 (단발 실행과 상주 워커 공통, 나머지는 run_trellis.py에서 설정)"""
+    env = os.environ.copy()
+    env["CUDA_VISIBLE_DEVICES"] = device
+    env["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
+    env["ATTN_BACKEND"] = "xformers"
+    env["HF_HOME"] = HF_HOME
+    env["TRELLIS_DIR"] = TRELLIS_DIR
+    return env
+
+_resident_workers = {}
+_resident_workers_lock = threading.Lock()
+
+def get_resident_worker(kind, device):
+    """GPU별 상주 워커 (spar3d: 모델, trellis: 파이프라인, remover: 배경 제거기를 메모리에 유지)"""
+    with _resident_workers_lock:
+        worker = _resident_workers.get((kind, device))
+        if worker is None:
+            socket_path = os.path.join(RUN_DIR, f"{kind}-{device}.sock")
+            if kind == "spar3d":
+                cmd = [SPAR3D_ENV, SPAR3D_WORKER_SCRIPT, "--serve", socket_path, "--device", "cuda"]
+                cwd, env = SPAR3D_DIR, spar3d_env(device)
+            elif kind == "remover":
+                cmd = [SPAR3D_ENV, REMOVER_SCRIPT, "--serve", socket_path, "--mode", REMOVER_MODE, "--device", "cuda"]
+                cwd, env = SPAR3D_DIR, spar3d_env(device)
+            else:
+                cmd = [TRELLIS_ENV, TRELLIS_RUNNER, "--serve", socket_path]
+                cwd, env = TRELLIS_DIR, trellis_env(device)
+            worker = ResidentWorker(
+                f"{kind}-{device}", cmd,
+                socket_path=socket_path,
+                cwd=cwd,
+                env=env,
+                log_path=os.path.join(RUN_DIR, f"{kind}_worker-{device}.log"),
+                startup_timeout=600 if kind == "trellis" else 300,
+                on_ready=record_worker_startup
+            )
+            worker.watch()
+            _resident_workers[(kind, device)] = worker
+        return worker
+
+def remover_worker():
+    """공용 배경 제거 워커 (첫 번째 GPU에 하나)"""
+    return get_resident_worker("remover", GPU_DEVICES[0]["id"])
+
+def remove_background(image_path, output_dir=None, image_hash=None):
+    """배경 제거 단계: RGBA 결과를 output_dir(기본: 입력 이미지 옆)의 rgba_<해시>_<모드>.png로 저장하고 경로를 돌려줌
+
+    같은 이미지+모드의 결과는 결과 캐시로 task 사이에서도 재사용하고, 같은 이미지의 동시 요청은 하나로 합침.
+    배경 제거 워커를 쓸 수 없으면 None (러너가 직접 배경 제거)
+    """
+    if not USE_SHARED_REMOVER or not GPU_DEVICES:
+        return None
+    image_hash = image_hash or hash_file(image_path)
+    rgba_path = os.path.join(output_dir or os.path.dirname(image_path), f"rgba_{image_hash[:16]}_{REMOVER_MODE}.png")
+    if os.path.exists(rgba_path):
+        return rgba_path
+
+    def compute():
+        try:
+            return remover_worker().call({"op": "remove_background", "image_path": image_path,
+                                          "output_path": rgba_path}, timeout=300)
+        except WorkerError as e:
+            return {"success": False, "error": str(e)}
+
+    key = RESULT_CACHE.make_key(image_hash, "background_removal", {"mode": REMOVER_MODE})
+    result, source = RESULT_CACHE.get_or_compute(
+        key, compute,
+        cacheable=lambda r: r.get("success") and os.path.exists(r.get("output_path", "")),
+        files_of=lambda r: {"rgba.png": r["output_path"]},
+        timeout=360
+    )
+    if not result or not result.get("success"):
+        print(f"[REMOVER] Background removal failed: {(result or {}).get('error')}", file=sys.stderr)
+        return None
+    if source != "computed":
+        src = result.get("files", {}).get("rgba.png") or result.get("output_path")
+        if not src or not os.path.exists(src):
+            return None
+        link_or_copy(src, rgba_path)
+    return rgba_path
+
+# 배경 제거 선행 실행: task_id -> {"future", "cancelled"}
+_speculations = {}
+_speculations_lock = threading.Lock()
+SPECULATION_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bg-speculation")
+
+def start_speculative_bg_removal(task_id, image_path, image_hash=None):
+    """CLIP 판정을 기다리는 동안 배경 제거 단계를 미리 실행 (결과는 remove_background()와 같은 파일/캐시)
+
+    판정 응답을 늦추지 않도록 백그라운드에서 실행하고, 워커를 새로 띄우지는 않음 (모델 로딩 비용이 더 큼)
+    """
+    if not (SPECULATIVE_BG_REMOVAL and USE_SHARED_REMOVER and GPU_DEVICES):
+        return
+    with _resident_workers_lock:
+        worker = _resident_workers.get(("remover", GPU_DEVICES[0]["id"]))
+    if worker is None or not worker.is_ready():
+        SPECULATION_RESULTS.inc(outcome="skipped")
+        return
+    cancelled = threading.Event()
+
+    def run():
+        if cancelled.is_set():
+            return None
+        started = time.monotonic()
+        rgba_path = remove_background(image_path, image_hash=image_hash)
+        if rgba_path is None:
+            SPECULATION_RESULTS.inc(outcome="failed")
+            return None
+        observe_stage("background_removal_speculative", time.monotonic() - started, task_id)
+        if cancelled.is_set():
+            # 실행 중에 반려된 경우 (결과는 캐시에 남아 같은 이미지가 다시 오면 재사용)
+            SPECULATION_RESULTS.inc(outcome="wasted")
+            return None
+        return rgba_path
+
+    with _speculations_lock:
+        _speculations[task_id] = {"future": SPECULATION_POOL.submit(run), "cancelled": cancelled}
+
+def cancel_speculative_bg_removal(task_id):
+    """반려/정리된 task의 선행 배경 제거 취소 (아직 시작 전이면 실행하지 않음)"""
+    with _speculations_lock:
+        entry = _speculations.pop(task_id, None)
+    if entry is None:
+        return
+    entry["cancelled"].set()
+    if entry["future"].cancel():
+        SPECULATION_RESULTS.inc(outcome="cancelled")
+
+def take_speculative_rgba(task_id, timeout=300):
+    """재구성 시작 시 선행 배경 제거 결과(RGBA 경로)를 가져옴. 아직 실행 중이면 새로 하는 대신 기다림"""
+    with _speculations_lock:
+        entry = _speculations.pop(task_id, None)
+    if entry is None:
+        return None
+    try:
+        rgba_path = entry["future"].result(timeout=timeout)
+    except Exception:
+        rgba_path = None
+    if rgba_path and os.path.exists(rgba_path):
+        SPECULATION_RESULTS.inc(outcome="used")
+        return rgba_path
+    return None
+
+def run_spar3d(image_path, output_dir, ladder=None, device="0", on_progress=None, rgba_path=None, cancel=None):
+    """SPAR3D 3D 재구성 실행 (Fast 모드). 상주 워커를 우선 쓰고, 워커를 쓸 수 없으면 단발 실행
+
+    ladder: OOM fallback 설정 목록 (기본값 SPAR3D_OOM_LADDER)
+    on_progress: 러너가 보고하는 단계 이벤트({"stage": ...})를 받는 콜백
+    rgba_path: 배경 제거 단계의 결과 (상주 워커에서만 사용, 단발 실행은 배경 제거부터 다시 함)
+    cancel: 작업의 CancelToken (취소되면 러너를 종료하고 Cancelled 발생)
+    """
+    ladder = ladder or SPAR3D_OOM_LADDER
+    mesh_path = os.path.join(output_dir, "0", "mesh.glb")
+    if USE_RESIDENT_SPAR3D:
+        try:
+            print(f"[INFO] Starting SPAR3D (Fast mode, resident worker on GPU {device})...", file=sys.stderr)
+            result = get_resident_worker("spar3d", device).call({
+                "op": "reconstruct",
+                "image_path": image_path,
+                "mesh_path": mesh_path,
+                "ladder": ladder,
+                "rgba_path": rgba_path
+            }, timeout=600, on_event=on_progress, cancel=cancel)
+            if result.get("success") and os.path.exists(mesh_path):
+                return {"success": True, "mesh_path": mesh_path, "peak_memory": result.get("peak_memory"),
+                        "oom_fallback": result.get("oom_fallback")}
+            return {"success": False, "error": f"SPAR3D 실행 오류: {str(result.get('error'))[:300]}",
+                    "peak_memory": result.get("peak_memory"), "oom_fallback": result.get("oom_fallback")}
+        except WorkerError as e:
+            if e.in_flight:
+                # 워커가 아직 GPU를 쓰고 있을 수 있으므로 단발 실행으로 모델을 하나 더 올리지 않음
+                return {"success": False, "error": f"SPAR3D 실행 오류: {e}"}
+            print(f"[SPAR3D WORKER] {e} -> falling back to one-shot run", file=sys.stderr)
+    return run_spar3d_subprocess(image_path, output_dir, ladder, device, on_progress, cancel)
+
+def run_spar3d_subprocess(image_path, output_dir, ladder=None, device="0", on_progress=None, cancel=None):
+    """SPAR3D 단발 실행. run.py는 설정 하나만 받으므로 OOM으로 실패하면 사다리의 다음 설정으로 다시 실행"""
+    ladder = ladder or SPAR3D_OOM_LADDER
+    attempts = []
+    for rung, settings in enumerate(ladder):
+        result = run_spar3d_once(image_path, output_dir, settings, device, on_progress, cancel)
+        if result.get("success") or not result.pop("oom", False):
+            break
+        attempts.append({"rung": rung, "settings": settings, "error": result["error"][-200:]})
+        if rung + 1 < len(ladder):
+            print(f"[OOM] SPAR3D out of memory with {settings} -> retrying with {ladder[rung + 1]}", file=sys.stderr)
+            if on_progress is not None:
+                on_progress({"stage": "oom_retry", "rung": rung + 1, "settings": ladder[rung + 1]})
+    else:
+        rung = settings = None
+    result["oom_fallback"] = {"rung": rung, "rungs": len(ladder), "settings": settings, "attempts": attempts}
+    return result
+
+def run_spar3d_once(image_path, output_dir, settings, device="0", on_progress=None, cancel=None):
+    """SPAR3D_SCRIPT를 별도 프로세스로 한 번 실행 (출력은 output_dir/spar3d.log). 메모리 부족이면 결과에 "oom": True"""
+    os.makedirs(output_dir, exist_ok=True)
+    log_path = os.path.join(output_dir, "spar3d.log")
     try:
         cmd = [
             SPAR3D_ENV, SPAR3D_SCRIPT, image_path,
             "--output-dir", output_dir,
-            "--texture-resolution", "1024",
-            "--remesh_option", "triangle",
-            "--reduction_count_type", "vertex",
-            "--target_count", "50000",
+            "--texture-resolution", str(settings["texture_resolution"]),
+            "--remesh_option", settings.get("remesh_option", "triangle"),
+            "--reduction_count_type", settings.get("reduction_count_type", "vertex"),
+            "--target_count", str(settings["target_count"]),
             "--device", "cuda"
         ]
         
-        env = os.environ.copy()
-        env["PYTHONPATH"] = SPAR3D_DIR
-        env["HF_HOME"] = "/workspace/tobigs/.hf_cache"
-        env["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True,max_split_size_mb:128"
-        
-        # HuggingFace 토큰 설정
-        hf_token = os.environ.get("HF_TOKEN") or os.environ.get("HUGGINGFACE_HUB_TOKEN")
-        env["HF_TOKEN"] = hf_token
-        env["HUGGINGFACE_HUB_TOKEN"] = hf_token
+        env = spar3d_env(device)
         
         print(f"[INFO] Starting SPAR3D (Fast mode)...", file=sys.stderr)
         
-        result = subprocess.run(
+        returncode = stream_subprocess(
             cmd,
-            capture_output=True,
-            text=True,
+            log_path,
+            on_progress=on_progress,
             timeout=600,
+            cancel=cancel,
             cwd=SPAR3D_DIR,
             env=env
         )
+        output = read_log_tail(log_path, limit=4000)
         
-        print(f"[DEBUG] SPAR3D stdout: {result.stdout[:500]}", file=sys.stderr)
-        print(f"[DEBUG] SPAR3D stderr: {result.stderr[:500]}", file=sys.stderr)
-        print(f"[DEBUG] SPAR3D returncode: {result.returncode}", file=sys.stderr)
+        print(f"[DEBUG] SPAR3D output: {output[-500:]}", file=sys.stderr)
+        print(f"[DEBUG] SPAR3D returncode: {returncode} (log: {log_path})", file=sys.stderr)
         
         # 파일 생성 여부로 성공 판단 (run.py는 output_dir/0/mesh.glb 형식으로 저장)
         mesh_path = os.path.join(output_dir, "0", "mesh.glb")
@@ -98,11 +558,13 @@ def run_spar3d(image_path, output_dir):
             return {"success": True, "mesh_path": mesh_path}
         
         # 파일이 없으면 실제 에러 확인
-        if result.returncode != 0:
-            if "GatedRepoError" in result.stderr or "401 Client Error" in result.stderr:
+        if returncode != 0:
+            if "GatedRepoError" in output or "401 Client Error" in output:
                 return {"success": False, "error": "SPAR3D 모델 필요 (Hugging Face 로그인 필요)"}
-            if "Traceback" in result.stderr or "Error" in result.stderr:
-                return {"success": False, "error": f"SPAR3D 실행 오류: {result.stderr[:300]}"}
+            if is_oom_text(output):
+                return {"success": False, "oom": True, "error": f"SPAR3D 메모리 부족: {output[-300:]}"}
+            if "Traceback" in output or "Error" in output:
+                return {"success": False, "error": f"SPAR3D 실행 오류: {output[-300:]}"}
         
         return {"success": False, "error": "3D 모델 파일이 생성되지 않았습니다"}
         
@@ -111,303 +573,923 @@ def run_spar3d(image_path, output_dir):
     except Exception as e:
         return {"success": False, "error": f"SPAR3D 오류: {str(e)}"}
 
-def run_trellis(image_path, output_dir):
-    """Trellis 3D 재구성 실행 (Quality 모드)"""
-    try:
-        trellis_runner = os.path.join(os.path.dirname(__file__), "run_trellis.py")
-        # 실제 Trellis 작업 디렉토리(/workspace/tobigs/TRELLIS.2)로 변경
-        trellis_workdir = "/workspace/tobigs/TRELLIS.2"
-        if not os.path.exists(trellis_workdir):
-            return {"success": False, "error": "Trellis not installed. Please use Fast mode (SPAR3D) instead."}
+def run_trellis(image_path, output_dir, ladder=None, device="0", on_progress=None, rgba_path=None, cancel=None):
+    """Trellis 3D 재구성 실행 (Quality 모드). 상주 워커를 우선 쓰고, 워커를 쓸 수 없으면 단발 실행
 
-        cmd = [
-            TRELLIS_ENV,
-            trellis_runner,
-            "--input", image_path,
-            "--output_dir", output_dir
-        ]
+    ladder: GLB 변환의 OOM fallback 설정 목록 (기본값 TRELLIS_OOM_LADDER)
+    rgba_path: 배경 제거 단계의 결과 (있으면 Trellis 전처리의 배경 제거를 건너뜀)
+    """
+    ladder = ladder or TRELLIS_OOM_LADDER
+    if not os.path.exists(TRELLIS_DIR):
+        return {"success": False, "error": "Trellis not installed. Please use Fast mode (SPAR3D) instead."}
 
-        # GPU 환경 변수 설정
-        env = os.environ.copy()
-        env["CUDA_VISIBLE_DEVICES"] = "0"
-        env["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
-        env["ATTN_BACKEND"] = "xformers"
-        # HuggingFace 토큰 전달 (환경 변수에서 가져오기)
-        if "HF_TOKEN" in os.environ:
-            env["HF_TOKEN"] = os.environ["HF_TOKEN"]
-        if "HUGGINGFACE_HUB_TOKEN" in os.environ:
-            env["HUGGINGFACE_HUB_TOKEN"] = os.environ["HUGGINGFACE_HUB_TOKEN"]
-
-        print(f"[INFO] Starting Trellis (Quality mode)...", file=sys.stderr)
-        print(f"[DEBUG] Command: {' '.join(cmd)}", file=sys.stderr)
-        print(f"[DEBUG] CWD: {trellis_workdir}", file=sys.stderr)
-        print(f"[DEBUG] Image: {image_path}", file=sys.stderr)
-        print(f"[DEBUG] Output: {output_dir}", file=sys.stderr)
+    if USE_RESIDENT_TRELLIS:
+        try:
+            print(f"[INFO] Starting Trellis (Quality mode, resident worker on GPU {device})...", file=sys.stderr)
+            result = get_resident_worker("trellis", device).call({
+                "op": "reconstruct",
+                "image_path": image_path,
+                "output_dir": output_dir,
+                "ladder": ladder,
+                "rgba_path": rgba_path
+            }, timeout=1800, on_event=on_progress, cancel=cancel)
+            if not result.get("success"):
+                return {"success": False, "error": f"Trellis 실행 오류: {str(result.get('error'))[:200]}",
+                        "peak_memory": result.get("peak_memory"), "oom_fallback": result.get("oom_fallback")}
+            return result
+        except WorkerError as e:
+            if e.in_flight:
+                return {"success": False, "error": f"Trellis 실행 오류: {e}"}
+            print(f"[TRELLIS WORKER] {e} -> falling back to one-shot run", file=sys.stderr)
+    return run_trellis_subprocess(image_path, output_dir, ladder, device, on_progress, rgba_path, cancel)
 
-        result = subprocess.run(
+def run_trellis_subprocess(image_path, output_dir, ladder=None, device="0", on_progress=None, rgba_path=None,
+                           cancel=None):
+    """Trellis 단발 실행: run_trellis.py가 추론과 GLB 변환까지 수행하고 결과 JSON 파일을 남김.
+    TRELLIS_IN_PROCESS가 꺼져 있으면 trellis2_run.py로 처리하므로 ladder/rgba_path는 적용되지 않음"""
+    os.makedirs(output_dir, exist_ok=True)
+    result_file = os.path.join(output_dir, "result.json")
+    log_path = os.path.join(output_dir, "trellis.log")
+    cmd = [
+        TRELLIS_ENV,
+        TRELLIS_RUNNER,
+        "--input", image_path,
+        "--output_dir", output_dir,
+        "--result_file", result_file
+    ]
+    if TRELLIS_IN_PROCESS:
+        cmd += ["--ladder", json.dumps(ladder or TRELLIS_OOM_LADDER)]
+        if rgba_path:
+            cmd += ["--rgba", rgba_path]
+    else:
+        cmd.append("--script")
+
+    print(f"[INFO] Starting Trellis (Quality mode)...", file=sys.stderr)
+    print(f"[DEBUG] Command: {' '.join(cmd)}", file=sys.stderr)
+    try:
+        returncode = stream_subprocess(
             cmd,
-            capture_output=True,
-            text=True,
+            log_path,
+            on_progress=on_progress,
             timeout=1800,  # 30분 타임아웃 (Trellis는 시간이 오래 걸림)
-            cwd=trellis_workdir,
-            env=env
+            cancel=cancel,
+            cwd=TRELLIS_DIR,
+            env=trellis_env(device)
         )
-        
-        print(f"[DEBUG] Trellis return code: {result.returncode}", file=sys.stderr)
-        print(f"[DEBUG] Trellis stdout: {result.stdout[:500]}", file=sys.stderr)
-        print(f"[DEBUG] Trellis stderr: {result.stderr[:500]}", file=sys.stderr)
-        
-        if result.returncode != 0:
-            error_msg = result.stderr.strip() if result.stderr else "알 수 없는 오류"
-            print(f"[TRELLIS ERROR] {error_msg}", file=sys.stderr)
-            return {"success": False, "error": f"Trellis 실행 오류: {error_msg[:200]}"}
-        
-        # Parse JSON output
-        try:
-            output = result.stdout.strip()
-            # stdout의 마지막 줄에서 JSON 찾기 (로그와 섞여있을 수 있음)
-            lines = output.split('\n')
-            json_line = None
-            for line in reversed(lines):
-                line = line.strip()
-                if line.startswith('{') and line.endswith('}'):
-                    json_line = line
-                    break
-            
-            if json_line:
-                trellis_result = json.loads(json_line)
-                if not trellis_result.get("success"):
-                    return {"success": False, "error": trellis_result.get("error", "Trellis 실행 실패")}
-                return trellis_result
-            else:
-                # JSON을 찾을 수 없으면 mesh.glb 파일 존재 확인
-                mesh_path = os.path.join(output_dir, "mesh.glb")
-                if os.path.exists(mesh_path):
-                    return {"success": True, "mesh_path": mesh_path}
-                return {"success": False, "error": "Trellis 결과를 찾을 수 없습니다"}
-                
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] JSON decode error: {e}", file=sys.stderr)
-            mesh_path = os.path.join(output_dir, "mesh.glb")
-            if os.path.exists(mesh_path):
-                return {"success": True, "mesh_path": mesh_path}
-            return {"success": False, "error": f"Trellis 결과 파싱 실패: {str(e)}"}
-        
     except subprocess.TimeoutExpired:
         return {"success": False, "error": "Trellis 실행 시간 초과 (30분)"}
     except Exception as e:
         print(f"[TRELLIS ERROR] {str(e)}", file=sys.stderr)
         return {"success": False, "error": f"Trellis 오류: {str(e)}"}
 
+    print(f"[DEBUG] Trellis return code: {returncode} (log: {log_path})", file=sys.stderr)
+    try:
+        with open(result_file, encoding="utf-8") as f:
+            trellis_result = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        log_tail = read_log_tail(log_path, limit=200)
+        print(f"[TRELLIS ERROR] No result file ({e}): {log_tail}", file=sys.stderr)
+        return {"success": False, "error": f"Trellis 실행 오류: {log_tail or '알 수 없는 오류'}"}
+
+    if not trellis_result.get("success"):
+        return {"success": False, "error": f"Trellis 실행 오류: {str(trellis_result.get('error'))[:200]}",
+                "peak_memory": trellis_result.get("peak_memory"), "oom_fallback": trellis_result.get("oom_fallback")}
+    return trellis_result
+
+def run_remote_reconstruction(device, model_type, image_path, mesh_path, on_progress=None, rgba_path=None,
+                              cancel=None):
+    """원격 재구성 워커에서 실행: 입력 이미지를 올리고 진행 이벤트를 받아 넘기고 결과 GLB를 mesh_path로 받음
+
+    워커가 등록 해제됐거나 작업 도중 죽으면 WorkerLost (작업은 다른 장치에서 다시 실행)
+    """
+    worker = REMOTE_WORKERS.get(device)
+    if worker is None:
+        raise WorkerLost(f"{device} 워커의 등록이 해제되었습니다")
+    print(f"[INFO] Dispatching {model_type} reconstruction to {worker['worker_id']} ({worker['url']})",
+          file=sys.stderr)
+    try:
+        result = run_remote(worker, model_type, image_path, mesh_path, rgba_path=rgba_path, on_progress=on_progress,
+                            cancel=cancel, registry=REMOTE_WORKERS, auth_token=WORKER_AUTH_TOKEN,
+                            timeout=1800 if model_type == "quality" else 600, idle_timeout=WORKER_TIMEOUT_SECONDS)
+    except WorkerLost as e:
+        if e.unreachable:
+            # heartbeat 만료를 기다리지 않고 바로 배정 대상에서 뺌 (살아 있으면 다음 heartbeat에서 다시 등록)
+            REMOTE_WORKERS.remove(worker["worker_id"], reason=str(e))
+        raise
+    if not result.get("success"):
+        return {"success": False, "error": str(result.get("error"))[:300], "peak_memory": result.get("peak_memory"),
+                "oom_fallback": result.get("oom_fallback")}
+    return result
+
+def run_reconstruction(model_type, image_path, output_dir, device="0", on_progress=None, get_rgba=None,
+                       cancel=None):
+    """캐시를 거쳐 3D 재구성 실행. 같은 이미지+파라미터의 결과가 있으면 mesh.glb를 바로 재사용
+
+    device: 이 호스트의 GPU id, 또는 스케줄러가 배정한 원격 워커 장치("worker:<id>")
+    get_rgba: 배경 제거 단계를 실행해 RGBA 경로(또는 None)를 돌려주는 함수. 캐시에 결과가 없고
+    러너가 RGBA를 쓸 때만 호출 (trellis2_run.py, SPAR3D 단발 실행은 배경 제거부터 직접 함)
+    """
+    if is_remote_device(device):
+        uses_rgba = True
+    elif model_type == 'quality':
+        uses_rgba = TRELLIS_IN_PROCESS
+    else:
+        uses_rgba = USE_RESIDENT_SPAR3D
+    rgba = lambda: get_rgba() if get_rgba is not None and uses_rgba else None
+    if model_type == 'quality':
+        params = {"ladder": TRELLIS_OOM_LADDER}
+        mesh_rel = "mesh.glb"
+        runner = lambda: run_trellis(image_path, output_dir, device=device, on_progress=on_progress,
+                                     rgba_path=rgba(), cancel=cancel, **params)
+    else:  # fast (기본값)
+        params = {"ladder": SPAR3D_OOM_LADDER}
+        mesh_rel = os.path.join("0", "mesh.glb")
+        runner = lambda: run_spar3d(image_path, output_dir, device=device, on_progress=on_progress,
+                                    rgba_path=rgba(), cancel=cancel, **params)
+    if is_remote_device(device):
+        runner = lambda: run_remote_reconstruction(device, model_type, image_path, os.path.join(output_dir, mesh_rel),
+                                                   on_progress=on_progress, rgba_path=rgba(), cancel=cancel)
+
+    # 사다리의 r번째 단계에서 성공한 결과는 ladder[r:]로 실행한 결과와 같으므로 그 키로 저장해 두고,
+    # 첫 설정의 결과가 없으면 낮은 단계의 결과를 재사용 (메모리가 부족한 이미지의 실패할 첫 단계를 매번 다시 하지 않도록)
+    image_hash = hash_file(image_path)
+    ladder = params["ladder"]
+    rung_keys = [RESULT_CACHE.make_key(image_hash, model_type, {**params, "ladder": ladder[rung:]})
+                 for rung in range(len(ladder))]
+    key = rung_keys[0]
+    lower = None
+    if not RESULT_CACHE.contains(key):
+        lower = next((k for k in rung_keys[1:] if RESULT_CACHE.contains(k)), None)
+    result = RESULT_CACHE.get(lower) if lower is not None else None
+    source = "cache"
+    for attempt in range(0 if result is not None else 2):
+        result, source = RESULT_CACHE.get_or_compute(
+            key, runner,
+            # OOM으로 낮춘 설정의 결과는 아래에서 그 단계의 키로 저장
+            cacheable=lambda r: (r.get("success") and os.path.exists(r.get("mesh_path", ""))
+                                 and not (r.get("oom_fallback") or {}).get("rung")),
+            files_of=lambda r: {"mesh.glb": r["mesh_path"]},
+            cancel=cancel
+        )
+        # 합류한 작업이 취소되어 결과가 없으면 이 작업이 직접 다시 실행 (기다리다 시간 초과되면 다시 합류하지 않음)
+        if result is not None or source == "timeout" or (cancel is not None and cancel.is_cancelled()):
+            break
+    if source == "computed" and result.get("success") and os.path.exists(result.get("mesh_path", "")):
+        fallback = result.get("oom_fallback") or {}
+        rung = fallback.get("rung")
+        # 원격 워커가 다른 사다리로 실행했으면 설정이 같은 단계일 때만 저장
+        if rung and rung < len(ladder) and fallback.get("settings") == ladder[rung]:
+            RESULT_CACHE.put(rung_keys[rung], result, {"mesh.glb": result["mesh_path"]})
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+    if result is None:
+        if source == "timeout":
+            return {"success": False, "error": "동일한 요청의 재구성 작업을 기다리다 시간이 초과되었습니다"}
+        return {"success": False, "error": "동일한 요청의 재구성 작업이 실패했습니다"}
+    if source != "computed" and result.get("success"):
+        # 캐시/합류한 결과는 이 작업의 출력 경로로 연결해 다운로드 경로를 그대로 유지
+        mesh_path = os.path.join(output_dir, mesh_rel)
+        # 캐시에 저장되지 않은 결과(낮은 OOM 단계, 저장 실패/즉시 삭제)에 합류했으면 첫 요청의 출력 파일에서 복사
+        link_or_copy(result.get("files", {}).get("mesh.glb") or result["mesh_path"], mesh_path)
+        result["mesh_path"] = mesh_path
+    result.pop("files", None)
+    result["cached"] = source != "computed"
+    print(f"[INFO] Reconstruction ({model_type}) source: {source}", file=sys.stderr)
+    return result
+
+# 메시 파일 내용 해시 (LOD 캐시 키, 다운로드 ETag). 같은 파일을 다시 읽지 않도록 (경로, inode, 수정 시각, 크기)별로 기억
+_mesh_hashes = {}
+_mesh_hashes_lock = threading.Lock()
+LOD_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lod")
+
+def mesh_hash(mesh_path):
+    st = os.stat(mesh_path)
+    ident = (mesh_path, st.st_ino, st.st_mtime_ns, st.st_size)
+    with _mesh_hashes_lock:
+        digest = _mesh_hashes.get(ident)
+    if digest is None:
+        digest = hash_file(mesh_path)
+        with _mesh_hashes_lock:
+            if len(_mesh_hashes) > 4096:
+                _mesh_hashes.clear()
+            _mesh_hashes[ident] = digest
+    return digest
+
+def get_lod(mesh_path, level, task_id=None, model=""):
+    """mesh_path의 level 단계 LOD 파일 경로 (메시 옆 lod/<단계>_<캐시 키>.glb). 만들 수 없으면 None
+
+    처음 요청될 때 만들고, 같은 메시+단계의 결과는 결과 캐시로 task 사이에서도 재사용 (동시 요청은 하나로 합침)
+    """
+    if level == "full":
+        return mesh_path
+    # 캐시 키에 메시 해시와 LOD 설정이 들어가므로 메시나 설정이 바뀌면 파일 이름도 바뀜
+    key = RESULT_CACHE.make_key(mesh_hash(mesh_path), "lod", lod.lod_params(level))
+    lod_dir = os.path.join(os.path.dirname(mesh_path), "lod")
+    lod_path = os.path.join(lod_dir, f"{level}_{key[:32]}.glb")
+    if os.path.exists(lod_path):
+        return lod_path
+    os.makedirs(lod_dir, exist_ok=True)
+
+    def compute():
+        with timed("lod_build", task_id, model):
+            return lod.build_lod(mesh_path, level, lod_path)
+
+    result, source = RESULT_CACHE.get_or_compute(
+        key, compute,
+        cacheable=lambda r: r.get("success") and os.path.exists(r.get("path", "")),
+        files_of=lambda r: {"lod.glb": r["path"]},
+        timeout=600
+    )
+    if not result or not result.get("success"):
+        print(f"[LOD] Failed to build {level} LOD of {mesh_path}: {(result or {}).get('error')}", file=sys.stderr)
+        return None
+    if source != "computed":
+        src = result.get("files", {}).get("lod.glb") or result.get("path")
+        if not src or not os.path.exists(src):
+            return None
+        link_or_copy(src, lod_path)
+    # 같은 경로의 이전 메시(또는 이전 설정)로 만든 LOD 정리
+    for name in os.listdir(lod_dir):
+        if name.startswith(f"{level}_") and name != os.path.basename(lod_path):
+            os.remove(os.path.join(lod_dir, name))
+    if task_id is not None:
+        # 디렉토리 크기가 바뀌었으므로 GC가 다시 재도록 (완료 시점에 잰 값은 LOD를 빼고 잰 값)
+        TASK_INDEX.update(task_id, disk_bytes=None)
+    return lod_path
+
+def prebuild_lods(task_id, model_type, mesh_path):
+    """재구성 직후 모든 LOD 단계를 백그라운드에서 만들어 둠 (갤러리의 첫 요청부터 작은 파일을 바로 보냄)"""
+    def run():
+        for level in lod.LOD_LEVELS:
+            # 만드는 사이 task가 정리되었으면 중단
+            if TASK_INDEX.get(task_id) is None or not os.path.exists(mesh_path):
+                return
+            try:
+                get_lod(mesh_path, level, task_id, model_type)
+            except OSError as e:
+                print(f"[LOD] Prebuild failed for {task_id}: {e}", file=sys.stderr)
+                return
+
+    if PREBUILD_LODS:
+        LOD_POOL.submit(run)
+
+def resident_workers():
+    """상태를 보고할 상주 워커 {이름: ResidentWorker}"""
+    workers = {"clip": CLIP_WORKER}
+    workers.update({f"{kind}-{device}": w for (kind, device), w in list(_resident_workers.items())})
+    return workers
+
+def health_body(worker_status=None):
+    """/api/health 응답 본문. worker_status: 미리 조회한 {"clip": status()} (None이면 여기서 ping)"""
+    return {
+        "status": "ok",
+        "workers": worker_status or {"clip": CLIP_WORKER.status()},
+        "prefilter": prefilter.STATS.snapshot(),
+        "cache": RESULT_CACHE.stats(),
+        "tasks": TASK_INDEX.stats(),
+        "embeddings": EMBEDDING_STORE.stats(),
+        "workspace_gc": WORKSPACE_REAPER.stats(),
+        "jobs": JOB_QUEUE.stats(),
+        "scheduler": SCHEDULER.snapshot(),
+        "remote_workers": REMOTE_WORKERS.snapshot()
+    }
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "ok"})
+    return jsonify(health_body())
+
+def collect_gauges(worker_status=None):
+    """스크레이프 시점의 상태 값 (대기열, 실행 중 작업, 캐시, 디스크, 워커)
+
+    worker_status: 미리 조회한 {이름: 상주 워커 status()} (None이면 여기서 워커마다 ping)
+    """
+    jobs = JOB_QUEUE.stats()
+    cache = RESULT_CACHE.stats()
+    prefilter_stats = prefilter.STATS.snapshot()
+    scheduler = SCHEDULER.snapshot()
+    gc_stats = WORKSPACE_REAPER.stats()
+    remote_workers = REMOTE_WORKERS.snapshot()
+    workers = worker_status or {name: w.status() for name, w in resident_workers().items()}
+    return [
+        ("pipeline_queue_depth", "Reconstruction jobs waiting for a GPU", [({}, jobs["queued"])]),
+        ("pipeline_jobs_in_flight", "Reconstruction jobs currently running", [({}, jobs["running"])]),
+        ("pipeline_jobs", "Jobs known to the queue by status", [({"status": k}, v) for k, v in jobs.items()]),
+        ("pipeline_tasks", "Tasks in the workspace index by stage",
+         [({"stage": k}, v) for k, v in TASK_INDEX.stats().items()]),
+        ("pipeline_embedding_vectors", "Searchable CLIP embeddings linked to finished outputs",
+         [({}, EMBEDDING_STORE.stats()["vectors"])]),
+        ("pipeline_cache_entries", "Result cache entries", [({}, cache["entries"])]),
+        ("pipeline_cache_bytes", "Result cache size in bytes", [({}, cache["bytes"])]),
+        ("pipeline_cache_lookups_total", "Result cache lookups since start",
+         [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"]),
+          ({"result": "merged"}, cache["merged"])]),
+        ("pipeline_cache_hit_ratio", "Result cache hit ratio since start", [({}, cache["hit_rate"])]),
+        ("pipeline_prefilter_images_total", "Images checked by the prefilter since start",
+         [({"result": "checked"}, prefilter_stats["images"]),
+          ({"result": "early_reject"}, prefilter_stats["early_rejects"])]),
+        ("pipeline_workspace_bytes", "Disk usage of the task workspace", [({}, WORKSPACE_SIZE.bytes())]),
+        ("pipeline_workspace_reclaimed_bytes_total", "Bytes freed by the workspace reaper",
+         [({"reason": k}, v) for k, v in gc_stats["reclaimed_bytes"].items()]),
+        ("pipeline_workspace_deleted_tasks_total", "Task directories removed by the workspace reaper",
+         [({"reason": k}, v) for k, v in gc_stats["deleted_tasks"].items()]),
+        ("pipeline_remote_workers", "Registered remote reconstruction workers by health",
+         [({"healthy": str(h).lower()}, sum(1 for w in remote_workers.values() if w["healthy"] == h))
+          for h in (True, False)]),
+        ("pipeline_gpu_memory_reserved_gb", "GPU memory reserved by the scheduler",
+         [({"device": d}, v["memory_used_gb"]) for d, v in scheduler["devices"].items()]),
+        ("pipeline_worker_ready", "Resident worker readiness (1 = ready)",
+         [({"worker": name}, int(bool(w["ready"]))) for name, w in workers.items()]),
+        ("pipeline_worker_restarts_total", "Resident worker restarts",
+         [({"worker": name}, w["restarts"]) for name, w in workers.items()]),
+    ]
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 텍스트 형식 지표. ?format=json 이면 단계별 요약 + task별 단계 시간, ?task_id=... 이면 해당 task만"""
+    task_id = request.args.get('task_id')
+    if task_id:
+        timings = TASK_TIMINGS.get(task_id)
+        if timings is None:
+            return jsonify({"error": "작업을 찾을 수 없습니다"}), 404
+        return jsonify({"task_id": task_id, **timings})
+    if request.args.get('format') == 'json':
+        return jsonify(metrics_json(request.args.get('limit', 100, type=int)))
+    return Response(metrics_text(), mimetype=METRICS_MIMETYPE)
+
+METRICS_MIMETYPE = "text/plain; version=0.0.4"
+
+def metrics_json(limit=100, worker_status=None):
+    """/api/metrics?format=json 본문 (worker_status는 collect_gauges 참고)"""
+    return {
+        "stages": STAGE_SECONDS.summary(),
+        "gauges": {name: [{"labels": labels, "value": value} for labels, value in samples]
+                   for name, _, samples in collect_gauges(worker_status)},
+        "tasks": TASK_TIMINGS.snapshot(limit=limit)
+    }
+
+def metrics_text(worker_status=None):
+    """/api/metrics Prometheus 텍스트 본문 (worker_status는 collect_gauges 참고)"""
+    lines = []
+    for metric in (STAGE_SECONDS, JOB_PEAK_MEMORY, STAGE_PEAK_MEMORY, OOM_FALLBACKS, JOBS_FINISHED, FILTER_RESULTS,
+                   SPECULATION_RESULTS):
+        lines.extend(metric.render())
+    lines.extend(render_gauges(collect_gauges(worker_status)))
+    return "\n".join(lines) + "\n"
+
+def find_task_image(task_dir):
+    """작업 디렉토리의 입력 이미지 경로 (없으면 None). 인덱스 이전 작업을 가져올 때만 사용"""
+    image_files = [f for f in os.listdir(task_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    return os.path.join(task_dir, image_files[0]) if image_files else None
+
+def record_job_failure(job, error_msg):
+    """실패한 작업의 task를 failed로 표시하고 진행 스트림을 닫음"""
+    task_id = job["task_id"]
+    JOBS_FINISHED.inc(model=job["model"], status="failed")
+    TASK_INDEX.update(task_id, stage="failed", model=job["model"], error=error_msg, disk_bytes=None,
+                      timings=TASK_TIMINGS.get(task_id))
+    PROGRESS.publish(task_id, "failed", job_id=job["job_id"], model=job["model"], error=error_msg)
+
+def run_reconstruction_job(job, cancel):
+    """작업 큐 워커에서 실행: 작업 이미지로 3D 재구성 후 완료 응답 본문을 돌려줌"""
+    task_id = job["task_id"]
+    model_type = job["model"]
+    task_dir = os.path.join(WORKSPACE_DIR, task_id)
+
+    def failure(error_msg):
+        print(f"[ERROR] Reconstruction failed: {error_msg}", file=sys.stderr)
+        record_job_failure(job, error_msg)
+        return {
+            "success": False,
+            "task_id": task_id,
+            "stage": "reconstruction",
+            "model": model_type,
+            "reconstruction_error": error_msg,
+            "error": error_msg
+        }
+
+    if cancel.is_cancelled():
+        return {"success": False, "cancelled": True, "task_id": task_id, "error": "작업이 취소되었습니다"}
+    task = TASK_INDEX.get(task_id)
+    image_path = task["image_path"] if task else None
+    if not image_path or not os.path.exists(image_path):
+        return failure("이미지 파일을 찾을 수 없습니다")
+
+    print(f"[INFO] Starting reconstruction: {task_id} (model: {model_type}, GPU {job['device']})", file=sys.stderr)
+    PROGRESS.publish(task_id, "running", job_id=job["job_id"], model=model_type, device=job["device"])
+    TASK_INDEX.update(task_id, stage="reconstructing", model=model_type)
+    observe_stage("queue_wait", job["started_at"] - job["created_at"], task_id, model_type)
+    output_dir = os.path.join(task_dir, f"{model_type}_output")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 러너 단계 이벤트 사이 간격을 단계별 시간으로 기록.
+    # 첫 이벤트 전 구간은 단발 실행이면 프로세스 기동(spawn), 상주 워커면 요청 전달이라 기록하지 않음
+    clock = StageClock(lambda stage, seconds: observe_stage(stage, seconds, task_id, model_type))
+    clock.enter("dispatch")
+    relay = PROGRESS.relay(task_id)
+
+    def on_progress(event):
+        if cancel.is_cancelled():
+            return  # 취소 후 러너가 멈추기 전까지 보낸 이벤트
+        stage = event.get("stage")
+        if clock.stage == "dispatch":
+            if stage == "model_load":
+                clock.rename("spawn")
+            else:
+                clock.discard()
+        clock.enter(stage)
+        relay(event)
+
+    def get_rgba():
+        # /api/process에서 판정과 함께 미리 해 둔 배경 제거가 있으면 그 결과를, 없으면 여기서 실행
+        # (원격 워커로 보내는 작업은 워커가 자기 GPU에서 배경 제거)
+        rgba_path = take_speculative_rgba(task_id)
+        if rgba_path is None and USE_SHARED_REMOVER and not is_remote_device(job["device"]):
+            on_progress({"stage": "background_removal"})
+            rgba_path = remove_background(image_path, image_hash=task["image_hash"])
+            clock.enter("dispatch")  # 이후 러너 기동/요청 전달 구간은 다시 첫 러너 이벤트 기준으로 분류
+        cancel.raise_if_cancelled()
+        return rgba_path
+
+    # 모델 선택 (fast/quality), 같은 이미지의 결과가 캐시에 있으면 재사용
+    try:
+        with timed("reconstruction", task_id, model_type):
+            result = run_reconstruction(model_type, image_path, output_dir, device=job["device"],
+                                        on_progress=on_progress, get_rgba=get_rgba, cancel=cancel)
+    except Cancelled:
+        # task 상태와 진행 이벤트는 취소 시점에 on_job_cancelled에서 기록
+        clock.discard()
+        print(f"[INFO] Reconstruction cancelled: {task_id} (model: {model_type})", file=sys.stderr)
+        return {"success": False, "cancelled": True, "task_id": task_id, "error": "작업이 취소되었습니다"}
+    except WorkerLost as e:
+        clock.discard()
+        if job.get("restarts", 0) >= JOB_MAX_REQUEUES:
+            return failure(f"재구성 워커 오류: {e}")
+        # 워커가 작업 도중 죽음: 다른 장치에서 처음부터 다시 실행하도록 대기열로 돌림
+        print(f"[WARN] Requeueing {job['job_id']} after worker loss: {e}", file=sys.stderr)
+        JOBS_FINISHED.inc(model=model_type, status="requeued")
+        TASK_INDEX.update(task_id, stage="queued", model=model_type)
+        PROGRESS.publish(task_id, "queued", job_id=job["job_id"], model=model_type, requeued=True, reason=str(e))
+        return {"success": False, "requeue": True, "task_id": task_id, "error": str(e)}
+    if clock.stage == "dispatch":
+        clock.discard()
+    clock.finish()
+    cancel_speculative_bg_removal(task_id)  # 캐시된 결과를 써서 배경 제거가 필요 없었던 경우
+    print(f"[DEBUG] Result from {model_type}: {result}", file=sys.stderr)
+
+    peak = result.get("peak_memory") if not result.get("cached") else None
+    if peak:
+        for kind, value in peak.items():
+            if kind != "stages":
+                JOB_PEAK_MEMORY.observe(value, model=model_type, kind=kind)
+        for stage, usage in (peak.get("stages") or {}).items():
+            for kind, value in usage.items():
+                STAGE_PEAK_MEMORY.observe(value, model=model_type, stage=stage, kind=kind)
+        TASK_TIMINGS.record(task_id, **{f"{model_type}_peak_memory": peak})
+    fallback = result.get("oom_fallback") if not result.get("cached") else None
+    if fallback:
+        rung = fallback.get("rung")
+        OOM_FALLBACKS.inc(model=model_type, rung="exhausted" if rung is None else rung)
+        TASK_TIMINGS.record(task_id, **{f"{model_type}_oom_fallback": fallback})
+        if rung:
+            print(f"[OOM] {task_id} ({model_type}) succeeded at rung {rung}: {fallback.get('settings')}",
+                  file=sys.stderr)
+
+    if not result.get("success"):
+        return failure(result.get("error", "알 수 없는 오류"))
+
+    mesh_path = result.get("mesh_path")
+    if not mesh_path or not os.path.exists(mesh_path):
+        print(f"[ERROR] Mesh file not found: {mesh_path}", file=sys.stderr)
+        return failure("생성된 3D 모델 파일을 찾을 수 없습니다")
+
+    JOBS_FINISHED.inc(model=model_type, status="cached" if result.get("cached") else "done")
+    TASK_INDEX.set_output(task_id, model_type, mesh_path, cached=result.get("cached", False))
+    EMBEDDING_STORE.commit(task_id, model_type)
+    prebuild_lods(task_id, model_type, mesh_path)
+    TASK_INDEX.update(task_id, timings=TASK_TIMINGS.get(task_id))
+    PROGRESS.publish(task_id, "done", job_id=job["job_id"], model=model_type, cached=result.get("cached", False))
+    return {
+        "success": True,
+        "task_id": task_id,
+        "stage": "completed",
+        "model": model_type,
+        "mesh_path": mesh_path,
+        "cached": result.get("cached", False),
+        "oom_rung": (fallback or {}).get("rung")
+    }
+
+def on_job_cancelled(job):
+    """작업 취소 직후: task를 cancelled로 표시하고 진행 스트림을 닫음 (러너 종료는 작업 스레드에서 진행)"""
+    task_id = job["task_id"]
+    JOBS_FINISHED.inc(model=job["model"], status="cancelled")
+    if job.get("started_at") is None:
+        # 실행 전에 취소되면 작업 스레드가 없으므로 미리 해 둔 배경 제거도 여기서 정리
+        cancel_speculative_bg_removal(task_id)
+    with TASKS_LOCK:
+        if TASK_INDEX.get(task_id) is not None and not JOB_QUEUE.has_active(task_id):
+            TASK_INDEX.update(task_id, stage="cancelled", model=job["model"], error=job["error"], disk_bytes=None)
+    PROGRESS.publish(task_id, "cancelled", job_id=job["job_id"], model=job["model"], error=job["error"])
+
+def on_job_error(job):
+    """run_reconstruction_job이 예외로 끝난 작업: failed 이벤트가 없으면 SSE가 keep-alive만 보내고 GC도 task를 정리하지 않음"""
+    cancel_speculative_bg_removal(job["task_id"])
+    record_job_failure(job, f"재구성 오류: {job['error']}")
+
+def forget_task(task_id):
+    """만료/용량 초과로 지워진 task의 부가 상태 정리"""
+    cancel_speculative_bg_removal(task_id)
+    EMBEDDING_STORE.remove(task_id)
+
+SCHEDULER = GpuScheduler(GPU_DEVICES)
+REMOTE_WORKERS = WorkerRegistry(SCHEDULER, heartbeat_seconds=WORKER_HEARTBEAT_SECONDS,
+                                timeout_seconds=WORKER_TIMEOUT_SECONDS)
+JOB_QUEUE = JobQueue(JOBS_DIR, run_reconstruction_job, SCHEDULER, on_cancel=on_job_cancelled,
+                     on_error=on_job_error, abandon_after=CLIENT_ABANDON_SECONDS, abandon_running_after=CLIENT_ABANDON_RUNNING_SECONDS)
+WORKSPACE_REAPER = WorkspaceReaper(
+    TASK_INDEX, WORKSPACE_DIR,
+    is_busy=JOB_QUEUE.has_active,
+    lock=TASKS_LOCK,
+    on_delete=forget_task,
+    ttl_seconds=WORKSPACE_TTL_SECONDS,
+    quota_bytes=WORKSPACE_QUOTA_BYTES,
+    interval_seconds=WORKSPACE_GC_INTERVAL_SECONDS
+)
+
+def submit_reconstruction(task_id, model_type):
+    """재구성 작업 등록 + 진행 스트림에 대기 이벤트 기록 (이미 등록된 작업이면 그 작업을 돌려줌)"""
+    JOB_QUEUE.start()
+    with TASKS_LOCK:
+        job = JOB_QUEUE.submit(task_id, model_type)
+        if job["status"] == "queued":
+            TASK_INDEX.update(task_id, stage="queued", model=model_type)
+    if job["status"] == "queued" and not PROGRESS.has_job(task_id, job["job_id"]):
+        PROGRESS.publish(task_id, "queued", job_id=job["job_id"], model=model_type, position=job["position"])
+    return job
+
+def job_response(job):
+    """작업 상태 응답 (queued/running/done/failed + 대기 순번)"""
+    return {
+        "job_id": job["job_id"],
+        "task_id": job["task_id"],
+        "model": job["model"],
+        "stage": "completed" if job["status"] == "done" else job["status"],
+        "status": job["status"],
+        "position": job["position"],
+        "device": job.get("device"),
+        "expected_start": job["expected_start"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "result": job["result"],
+        "error": job["error"]
+    }
+
+def is_loopback(addr):
+    try:
+        ip = ipaddress.ip_address(addr or "")
+    except ValueError:
+        return False
+    return ip.is_loopback or (ip.version == 6 and ip.ipv4_mapped is not None and ip.ipv4_mapped.is_loopback)
+
+def worker_authorized():
+    """워커 API 인증. 등록된 URL로 사용자 업로드가 전달되므로, 토큰을 설정하지 않았으면 같은 호스트의 워커만 허용"""
+    if WORKER_AUTH_TOKEN:
+        return token_matches(request.headers.get(WORKER_TOKEN_HEADER), WORKER_AUTH_TOKEN)
+    return is_loopback(request.remote_addr)
+
+def worker_unauthorized():
+    if WORKER_AUTH_TOKEN:
+        return jsonify({"error": "워커 토큰이 맞지 않습니다"}), 403
+    return jsonify({"error": "다른 호스트의 워커는 서버에 PIPELINE_WORKER_TOKEN을 설정해야 등록할 수 있습니다"}), 403
+
+@app.route('/api/workers/register', methods=['POST'])
+def register_worker():
+    """원격 재구성 워커 등록 (reconstruction_worker.py가 시작할 때, heartbeat에 404를 받았을 때 호출)"""
+    if not worker_authorized():
+        return worker_unauthorized()
+    try:
+        worker = REMOTE_WORKERS.register(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    JOB_QUEUE.start()
+    JOB_QUEUE.wake()
+    return jsonify({**worker, "heartbeat_seconds": REMOTE_WORKERS.heartbeat_seconds,
+                    "timeout_seconds": REMOTE_WORKERS.timeout_seconds})
+
+@app.route('/api/workers/<worker_id>/heartbeat', methods=['POST'])
+def worker_heartbeat(worker_id):
+    """워커 상태 보고 (running, healthy 등). 모르는 워커면 404 -> 워커가 다시 등록"""
+    if not worker_authorized():
+        return worker_unauthorized()
+    if not REMOTE_WORKERS.heartbeat(worker_id, request.get_json(silent=True) or {}):
+        return jsonify({"error": "등록되지 않은 워커입니다"}), 404
+    JOB_QUEUE.wake()
+    return jsonify({"ok": True})
+
+@app.route('/api/workers/<worker_id>', methods=['DELETE'])
+def deregister_worker(worker_id):
+    """워커 등록 해제 (워커 종료 시). 이 워커에서 실행 중이던 작업은 다른 장치로 다시 대기"""
+    if not worker_authorized():
+        return worker_unauthorized()
+    if not REMOTE_WORKERS.remove(worker_id, reason="워커가 등록을 해제함"):
+        return jsonify({"error": "등록되지 않은 워커입니다"}), 404
+    return jsonify({"message": "등록 해제 완료"})
+
+@app.route('/api/workers', methods=['GET'])
+def list_workers():
+    """등록된 원격 재구성 워커 목록 (모드, 용량, 마지막 heartbeat 이후 시간, 전달 중인 작업 수)"""
+    return jsonify({"workers": REMOTE_WORKERS.snapshot()})
 
 @app.route('/api/reconstruct/<task_id>', methods=['POST'])
 def reconstruct_only(task_id):
-    """필터링 건너뛰고 3D 재구성만 수행"""
-    task_dir = os.path.join(WORKSPACE_DIR, task_id)
-    if not os.path.exists(task_dir):
-        return jsonify({"error": "작업을 찾을 수 없습니다"}), 404
-    
+    """필터링 건너뛰고 3D 재구성 작업을 큐에 등록 (진행 상태는 /api/jobs/<job_id>로 조회)"""
     # 모델 선택 (fast/quality)
     model_type = request.json.get('model', 'fast') if request.is_json else 'fast'
+    if model_type != 'quality':
+        model_type = 'fast'
     
-    try:
-        image_files = [f for f in os.listdir(task_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-        if not image_files:
+    # 조회와 등록 사이에 GC가 task를 지우지 않도록 같은 잠금 안에서 처리
+    with TASKS_LOCK:
+        task = TASK_INDEX.get(task_id)
+        if not task:
+            return jsonify({"error": "작업을 찾을 수 없습니다"}), 404
+        if not task["image_path"]:
             return jsonify({"error": "이미지 파일을 찾을 수 없습니다"}), 404
-        
-        image_path = os.path.join(task_dir, image_files[0])
-        print(f"[INFO] Starting reconstruction: {task_id} (model: {model_type})", file=sys.stderr)
-        
-        output_dir = os.path.join(task_dir, f"{model_type}_output")
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 모델 선택
-        if model_type == 'quality':
-            result = run_trellis(image_path, output_dir)
-        else:  # fast (기본값)
-            result = run_spar3d(image_path, output_dir)
-        
-        print(f"[DEBUG] Result from {model_type}: {result}", file=sys.stderr)
-        
-        if not result.get("success"):
-            error_msg = result.get("error", "알 수 없는 오류")
-            print(f"[ERROR] Reconstruction failed: {error_msg}", file=sys.stderr)
-            return jsonify({
-                "task_id": task_id,
-                "stage": "reconstruction",
-                "model": model_type,
-                "reconstruction_error": error_msg
-            }), 500
-        
-        mesh_path = result.get("mesh_path")
-        if not mesh_path or not os.path.exists(mesh_path):
-            print(f"[ERROR] Mesh file not found: {mesh_path}", file=sys.stderr)
-            return jsonify({
-                "task_id": task_id,
-                "stage": "reconstruction",
-                "model": model_type,
-                "reconstruction_error": "생성된 3D 모델 파일을 찾을 수 없습니다"
-            }), 500
-        
-        return jsonify({
+        job = submit_reconstruction(task_id, model_type)
+    print(f"[INFO] Queued reconstruction job {job['job_id']} for {task_id} (model: {model_type}, position: {job['position']})", file=sys.stderr)
+    return jsonify(job_response(job)), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """재구성 작업 상태 조회"""
+    JOB_QUEUE.touch(job_id)
+    job = JOB_QUEUE.get(job_id)
+    if not job:
+        return jsonify({"error": "작업을 찾을 수 없습니다"}), 404
+    return jsonify(job_response(job))
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """대기 중이거나 실행 중인 재구성 작업 취소 (러너 프로세스 트리 종료, GPU 슬롯 즉시 반납)"""
+    cancelled, job = JOB_QUEUE.cancel(job_id, reason="사용자가 작업을 취소했습니다")
+    if job is None:
+        return jsonify({"error": "작업을 찾을 수 없습니다"}), 404
+    if not cancelled:
+        return jsonify({**job_response(job), "error": "이미 끝난 작업입니다"}), 409
+    return jsonify(job_response(job))
+
+def last_event_id(value):
+    try:
+        return int(value or 0)
+    except ValueError:
+        return 0
+
+def progress_stream_over(task_id):
+    """새 이벤트가 없을 때 진행 스트림을 닫을지: 이미 끝났거나 진행할 작업이 없는 task면 더 기다리지 않음"""
+    return PROGRESS.is_finished(task_id) or (PROGRESS.last_id(task_id) == 0 and not JOB_QUEUE.has_active(task_id))
+
+def sse_message(event):
+    return f"id: {event['id']}\nevent: progress\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@app.route('/api/tasks/<task_id>/events', methods=['GET'])
+def task_events(task_id):
+    """재구성 단계별 진행 상황 스트림 (Server-Sent Events)
+
+    재연결 시 Last-Event-ID 이후 이벤트부터 다시 보내고, 완료/실패 이벤트 후 스트림을 닫음
+    """
+    if TASK_INDEX.get(task_id) is None:
+        return jsonify({"error": "작업을 찾을 수 없습니다"}), 404
+    last_id = last_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id"))
+
+    def generate():
+        after_id = last_id
+        yield "retry: 3000\n\n"
+        while True:
+            # 스트림이 열려 있는 동안은 클라이언트가 작업을 지켜보는 중 (끊기고 폴링도 없으면 CLIENT_ABANDON_* 뒤 작업을 취소)
+            JOB_QUEUE.touch_task(task_id)
+            events = PROGRESS.wait(task_id, after_id, timeout=PROGRESS_KEEPALIVE_SECONDS)
+            if not events:
+                if progress_stream_over(task_id):
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                after_id = event["id"]
+                yield sse_message(event)
+            if events[-1]["stage"] in TERMINAL_STAGES:
+                return
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def upload_error(filenames):
+    """업로드 파일 이름 검사 (문제가 있으면 오류 메시지)"""
+    for filename in filenames:
+        if filename == '':
+            return "파일이 선택되지 않았습니다"
+        if not allowed_file(filename):
+            return "지원하지 않는 파일 형식입니다"
+    return None
+
+def new_task(filename):
+    """업로드 이미지 하나의 작업 디렉토리 생성. 반환: (task_id, task_dir, image_path)"""
+    task_id = str(uuid.uuid4())
+    task_dir = os.path.join(WORKSPACE_DIR, task_id)
+    os.makedirs(task_dir, exist_ok=True)
+    return task_id, task_dir, os.path.join(task_dir, secure_filename(filename))
+
+def register_upload(task_id, image_path):
+    """저장한 업로드 이미지를 task로 등록. 반환: 이미지 해시"""
+    image_hash = hash_file(image_path)
+    TASK_INDEX.create(task_id, image_path, image_hash)
+    return image_hash
+
+def discard_tasks(tasks):
+    """처리 중 오류가 난 업로드의 작업 디렉토리와 부가 상태 삭제"""
+    for task_id, task_dir, _ in tasks:
+        cancel_speculative_bg_removal(task_id)
+        shutil.rmtree(task_dir, ignore_errors=True)
+        TASK_INDEX.delete(task_id)
+        EMBEDDING_STORE.remove(task_id)
+
+def record_filter_results(task_ids, filter_results, seconds):
+    """판정 결과를 task 상태에 기록 (배치로 보낸 경우 task별 시간은 배치 전체 시간)"""
+    for task_id, filter_result in zip(task_ids, filter_results):
+        TASK_TIMINGS.record(task_id, "filter", seconds)
+        TASK_INDEX.update(task_id, stage="filtered", filter_status=filter_result.get("status"))
+
+def filter_response(task_ids, filter_results):
+    if len(task_ids) == 1:
+        return {"task_id": task_ids[0], "filter_result": filter_results[0]}
+    return {
+        "results": [
+            {"task_id": task_id, "filter_result": filter_result}
+            for task_id, filter_result in zip(task_ids, filter_results)
+        ]
+    }
+
+def process_after_filter(task_id, filter_result):
+    """/api/process 판정 이후: 통과하면 재구성 작업 등록. 반환: (응답 본문, 상태 코드)"""
+    print(f"[INFO] CLIP result: {filter_result}", file=sys.stderr)
+    # accept가 아니면 3D 재구성 하지 않음
+    if filter_result.get("status") != "accept":
+        print(f"[INFO] Image rejected at filtering stage: {filter_result.get('status')}", file=sys.stderr)
+        cancel_speculative_bg_removal(task_id)
+        return {
             "task_id": task_id,
-            "stage": "completed",
-            "model": model_type,
-            "mesh_path": mesh_path
-        })
-        
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"[ERROR] Exception in reconstruct: {str(e)}", file=sys.stderr)
-        return jsonify({"error": str(e)}), 500
+            "stage": "filtering",
+            "filter_result": filter_result,
+            "message": "이미지가 필터링을 통과하지 못했습니다"
+        }, 200
+
+    # 2단계: SPAR3D 3D 재구성 (작업 큐에 등록, 결과는 /api/jobs/<job_id>로 조회)
+    job = submit_reconstruction(task_id, 'fast')
+    print(f"[INFO] Queued SPAR3D reconstruction job {job['job_id']} for task {task_id}", file=sys.stderr)
+    response = job_response(job)
+    response["filter_result"] = filter_result
+    response["message"] = "3D 재구성 작업이 등록되었습니다"
+    return response, 202
 
 @app.route('/api/filter', methods=['POST'])
 def filter_image():
-    """이미지 필터링만 수행"""
+    """이미지 필터링만 수행 (image 필드를 여러 개 보내면 한 배치로 필터링)"""
     if 'image' not in request.files:
         return jsonify({"error": "이미지 파일이 필요합니다"}), 400
     
-    file = request.files['image']
-    if file.filename == '':
-        return jsonify({"error": "파일이 선택되지 않았습니다"}), 400
-    
-    if not allowed_file(file.filename):
-        return jsonify({"error": "지원하지 않는 파일 형식입니다"}), 400
-    
-    # 임시 디렉토리 생성
-    task_id = str(uuid.uuid4())
-    task_dir = os.path.join(WORKSPACE_DIR, task_id)
-    os.makedirs(task_dir, exist_ok=True)
+    files = request.files.getlist('image')
+    error = upload_error([file.filename for file in files])
+    if error:
+        return jsonify({"error": error}), 400
     
+    # 이미지마다 작업 디렉토리 생성 (재구성은 이미지 단위로 요청됨)
+    tasks = []
+    image_hashes = []
     try:
-        # 파일 저장
-        filename = secure_filename(file.filename)
-        image_path = os.path.join(task_dir, filename)
-        file.save(image_path)
-        
-        # CLIP 필터링 실행
-        filter_result = run_clip_filter_subprocess(image_path)
+        for file in files:
+            task_id, task_dir, image_path = new_task(file.filename)
+            tasks.append((task_id, task_dir, image_path))
+            with timed("upload_save", task_id):
+                file.save(image_path)
+            image_hashes.append(register_upload(task_id, image_path))
         
-        return jsonify({
-            "task_id": task_id,
-            "filter_result": filter_result
-        })
+        # 사전 필터 + CLIP 필터링 실행
+        task_ids = [task_id for task_id, _, _ in tasks]
+        started = time.monotonic()
+        filter_results = filter_images([image_path for _, _, image_path in tasks], image_hashes, task_ids)
+        record_filter_results(task_ids, filter_results, time.monotonic() - started)
         
     except Exception as e:
         # 에러 발생 시 임시 디렉토리 삭제
-        shutil.rmtree(task_dir, ignore_errors=True)
+        discard_tasks(tasks)
         return jsonify({"error": str(e)}), 500
+    
+    return jsonify(filter_response(task_ids, filter_results))
 
 @app.route('/api/process', methods=['POST'])
 def process_image():
-    """전체 파이프라인 수행: 필터링 + 3D 재구성"""
+    """전체 파이프라인 수행: 필터링 + 3D 재구성 작업 등록"""
     if 'image' not in request.files:
         return jsonify({"error": "이미지 파일이 필요합니다"}), 400
     
     file = request.files['image']
-    if file.filename == '':
-        return jsonify({"error": "파일이 선택되지 않았습니다"}), 400
-    
-    if not allowed_file(file.filename):
-        return jsonify({"error": "지원하지 않는 파일 형식입니다"}), 400
+    error = upload_error([file.filename])
+    if error:
+        return jsonify({"error": error}), 400
     
     # 임시 디렉토리 생성
-    task_id = str(uuid.uuid4())
-    task_dir = os.path.join(WORKSPACE_DIR, task_id)
-    os.makedirs(task_dir, exist_ok=True)
+    task = new_task(file.filename)
+    task_id, _, image_path = task
     
     try:
         # 파일 저장
-        filename = secure_filename(file.filename)
-        image_path = os.path.join(task_dir, filename)
-        file.save(image_path)
+        with timed("upload_save", task_id):
+            file.save(image_path)
+        image_hash = register_upload(task_id, image_path)
+        # 통과하는 업로드가 대부분이므로 판정을 기다리는 동안 배경 제거를 미리 시작
+        start_speculative_bg_removal(task_id, image_path, image_hash)
         
         # 1단계: CLIP 필터링
         print(f"[INFO] Starting CLIP filtering for task {task_id}", file=sys.stderr)
-        filter_result = run_clip_filter_subprocess(image_path)
-        print(f"[INFO] CLIP result: {filter_result}", file=sys.stderr)
-        
-        # accept가 아니면 3D 재구성 하지 않음
-        if filter_result.get("status") != "accept":
-            print(f"[INFO] Image rejected at filtering stage: {filter_result.get('status')}", file=sys.stderr)
-            return jsonify({
-                "task_id": task_id,
-                "stage": "filtering",
-                "filter_result": filter_result,
-                "message": "이미지가 필터링을 통과하지 못했습니다"
-            })
-        
-        # 2단계: SPAR3D 3D 재구성
-        print(f"[INFO] Starting SPAR3D reconstruction for task {task_id}", file=sys.stderr)
-        spar3d_output_dir = os.path.join(task_dir, "spar3d_output")
-        os.makedirs(spar3d_output_dir, exist_ok=True)
-        
-        spar3d_result = run_spar3d(image_path, spar3d_output_dir)
-        print(f"[INFO] SPAR3D result: {spar3d_result}", file=sys.stderr)
-        
-        if not spar3d_result["success"]:
-            return jsonify({
-                "task_id": task_id,
-                "stage": "reconstruction",
-                "filter_result": filter_result,
-                "reconstruction_error": spar3d_result["error"]
-            }), 500
-        
-        # 성공
-        return jsonify({
-            "task_id": task_id,
-            "stage": "completed",
-            "filter_result": filter_result,
-            "mesh_path": spar3d_result["mesh_path"],
-            "message": "3D 재구성이 완료되었습니다"
-        })
+        started = time.monotonic()
+        filter_result = filter_images([image_path], [image_hash], [task_id])[0]
+        record_filter_results([task_id], [filter_result], time.monotonic() - started)
+        body, status = process_after_filter(task_id, filter_result)
+        return jsonify(body), status
         
     except Exception as e:
         # 에러 발생 시 임시 디렉토리 삭제
-        shutil.rmtree(task_dir, ignore_errors=True)
+        discard_tasks([task])
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/download/<task_id>', methods=['GET'])
 def download_model(task_id):
-    """생성된 3D 모델 다운로드"""
-    # fast_output(SPAR3D) 또는 quality_output(Trellis) 또는 spar3d_output/sf3d_output(레거시) 경로 시도
-    possible_paths = [
-        os.path.join(WORKSPACE_DIR, task_id, "fast_output", "0", "mesh.glb"),
-        os.path.join(WORKSPACE_DIR, task_id, "quality_output", "mesh.glb"),
-        os.path.join(WORKSPACE_DIR, task_id, "spar3d_output", "0", "mesh.glb"),
-        os.path.join(WORKSPACE_DIR, task_id, "sf3d_output", "0", "mesh.glb"),
-    ]
-    
-    mesh_path = None
-    for path in possible_paths:
-        if os.path.exists(path):
-            mesh_path = path
-            break
-    
-    if not mesh_path:
+    """생성된 3D 모델 다운로드
+
+    ?model=fast|quality (지정하지 않으면 가장 최근 결과), ?lod=full|high|medium|low (기본 full: 원본).
+    내용 해시 ETag로 조건부 요청(If-None-Match -> 304)과 Range 요청(206)을 지원하고,
+    실제로 보낸 단계는 X-Model-LOD 헤더에 담음 (LOD를 만들 수 없으면 원본)
+    """
+    level = request.args.get('lod', 'full')
+    if level not in lod.LOD_NAMES:
+        return jsonify({"error": f"lod는 {', '.join(lod.LOD_NAMES)} 중 하나여야 합니다"}), 400
+    JOB_QUEUE.touch_task(task_id)  # 완료될 때까지 다운로드를 반복 시도하는 클라이언트도 지켜보는 중
+    model = request.args.get('model')
+    mesh_path = TASK_INDEX.mesh_path(task_id, model)
+    if not mesh_path or not os.path.exists(mesh_path):
         return jsonify({"error": "파일을 찾을 수 없습니다"}), 404
-    
-    return send_file(
-        mesh_path,
+    TASK_INDEX.touch(task_id)
+
+    path = get_lod(mesh_path, level, task_id, model or "")
+    if path is None:
+        path, level = mesh_path, "full"
+    # 원본은 메시 해시, LOD는 파일 이름의 캐시 키(메시 해시 + LOD 설정)
+    etag = f"{mesh_hash(mesh_path)[:32]}-full" if level == "full" else os.path.splitext(os.path.basename(path))[0]
+    response = send_file(
+        path,
         mimetype='model/gltf-binary',
         as_attachment=True,
-        download_name='model.glb'
+        download_name='model.glb' if level == "full" else f'model_{level}.glb',
+        conditional=True,
+        etag=etag
     )
+    response.headers["X-Model-LOD"] = level
+    response.headers.setdefault("Accept-Ranges", "bytes")  # werkzeug는 Range 요청에만 붙임
+    return response
 
 @app.route('/api/cleanup/<task_id>', methods=['DELETE'])
 def cleanup_task(task_id):
     """작업 디렉토리 정리"""
     task_dir = os.path.join(WORKSPACE_DIR, task_id)
     
-    if os.path.exists(task_dir):
+    with TASKS_LOCK:
+        if TASK_INDEX.get(task_id) is None:
+            return jsonify({"error": "작업을 찾을 수 없습니다"}), 404
+        if JOB_QUEUE.has_active(task_id):
+            return jsonify({"error": "재구성 작업이 진행 중인 작업은 정리할 수 없습니다"}), 409
+        cancel_speculative_bg_removal(task_id)
         shutil.rmtree(task_dir, ignore_errors=True)
-        return jsonify({"message": "정리 완료"})
-    else:
-        return jsonify({"error": "작업을 찾을 수 없습니다"}), 404
+        TASK_INDEX.delete(task_id)
+        EMBEDDING_STORE.remove(task_id)
+    return jsonify({"message": "정리 완료"})
+
+def start_background_services():
+    """상주 워커를 미리 띄우고 (첫 요청부터 모델 로딩 비용 없음) 재시작 전 남은 작업 큐를 재개"""
+    if TASK_INDEX.needs_import():
+        TASK_INDEX.import_workspace(WORKSPACE_DIR, find_task_image)
+    WORKSPACE_REAPER.start()
+    CLIP_WORKER.start()
+    CLIP_WORKER.watch()
+    atexit.register(CLIP_WORKER.stop)
+    if USE_SHARED_REMOVER and GPU_DEVICES:
+        remover_worker().start()
+    atexit.register(lambda: [worker.stop() for worker in list(_resident_workers.values())])
+    JOB_QUEUE.start()
 
 if __name__ == '__main__':
+    # debug reloader는 이 모듈을 두 번 실행하므로 실제 서빙 프로세스에서만 워커를 띄움
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
     app.run(host='0.0.0.0', port=5000, debug=True)
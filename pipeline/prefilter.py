@@ -0,0 +1,195 @@
+"""CLIP 사전 필터: 픽셀 통계만으로 손상/흐림/저해상도 이미지를 모델 로딩 없이 조기 반려 (early_reject)
+
+PROMPTS_MAP의 0번(손상/로딩 중단), 1번(흐림/저해상도) 카테고리 중 확실한 경우만 잡고,
+애매한 이미지는 그대로 CLIP으로 넘깁니다.
+
+투명 픽셀은 배경으로 보고(흰 배경에 합성), 하단 단색 띠는 배경색과 다른 색이 디코딩된 내용 아래에서
+갑자기 시작할 때만 로딩 중단으로 판단합니다. 검은/회색 스튜디오 배경이나 투명 배경 누끼 이미지는 통과합니다.
+"""
+
+import threading
+import time
+
+import numpy as np
+from PIL import Image, ImageFile
+
+MIN_RESOLUTION = 224          # 짧은 변 최소 픽셀 수 (CLIP 입력 크기. 이보다 작으면 CLIP도 확대된 이미지를 보게 됨)
+WORK_SIZE = 512               # 통계 계산용 축소 크기 (긴 변 기준)
+SOLID_BAND_FRACTION = 0.3     # 하단 단색 띠가 이 비율 이상이면 로딩 중단으로 판단
+SOLID_TOLERANCE = 2           # 단색으로 보는 픽셀값 범위
+SOLID_BACKGROUND_MATCH = 0.05  # 띠 위 내용의 테두리에서 띠와 같은 색의 비율이 이 이상이면 배경색으로 보고 통과
+BLUR_TILE = 64                # 선명도 측정 타일 크기
+BLUR_THRESHOLD = 30.0         # 가장 선명한 타일의 Laplacian 분산이 이보다 작으면 흐림
+
+REJECT_INFO = {
+    "corrupt": ("파일 데이터 손상 (로딩 중단/깨짐)", "👉 정상적인 이미지 파일이 아닙니다(손상/오류)."),
+    "blurry": ("심한 흐림 또는 저해상도", "👉 사진이 너무 흐립니다. 초점을 맞추고 밝은 곳에서 다시 촬영해주세요."),
+}
+
+CHECKS = ("truncated", "resolution", "solid_block", "blur")
+
+
+class PrefilterStats:
+    """검사별 실행 횟수, 반려 횟수, 누적 소요 시간"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.early_rejects = 0
+        self.checks = {name: {"runs": 0, "hits": 0, "total_ms": 0.0} for name in CHECKS}
+
+    def record(self, name, hit, elapsed):
+        with self._lock:
+            entry = self.checks[name]
+            entry["runs"] += 1
+            entry["hits"] += int(hit)
+            entry["total_ms"] += elapsed * 1000
+
+    def record_image(self, rejected):
+        with self._lock:
+            self.images += 1
+            self.early_rejects += int(rejected)
+
+    def snapshot(self):
+        with self._lock:
+            checks = {}
+            for name, entry in self.checks.items():
+                runs = entry["runs"]
+                checks[name] = {
+                    "runs": runs,
+                    "hits": entry["hits"],
+                    "hit_rate": entry["hits"] / runs if runs else 0.0,
+                    "avg_ms": entry["total_ms"] / runs if runs else 0.0,
+                }
+            return {
+                "images": self.images,
+                "early_rejects": self.early_rejects,
+                "clip_calls_avoided": self.early_rejects,
+                "checks": checks,
+            }
+
+
+STATS = PrefilterStats()
+
+
+def settings():
+    """판정에 영향을 주는 임계값 (필터 결과 캐시 키에 포함)"""
+    return {
+        "min_resolution": MIN_RESOLUTION,
+        "work_size": WORK_SIZE,
+        "solid_band_fraction": SOLID_BAND_FRACTION,
+        "solid_tolerance": SOLID_TOLERANCE,
+        "solid_background_match": SOLID_BACKGROUND_MATCH,
+        "blur_tile": BLUR_TILE,
+        "blur_threshold": BLUR_THRESHOLD,
+    }
+
+
+def _early_reject(kind, check, detail):
+    reason, guide = REJECT_INFO[kind]
+    return {
+        "status": "early_reject",
+        "reason": reason,
+        "guide": guide,
+        "reasons": [detail],
+        "check": check
+    }
+
+
+def _load(image_path):
+    """이미지를 끝까지 디코딩 (잘린 파일이면 OSError). JPEG은 draft 모드로 축소 디코딩
+
+    반환: (원본 크기, RGB 픽셀(int16), 투명 픽셀 마스크 또는 None). 투명 픽셀은 흰 배경에 합성
+    """
+    ImageFile.LOAD_TRUNCATED_IMAGES = False
+    with Image.open(image_path) as img:
+        original_size = img.size
+        img.draft("RGB", (WORK_SIZE, WORK_SIZE))
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    img.thumbnail((WORK_SIZE, WORK_SIZE))
+    if not has_alpha:
+        return original_size, np.asarray(img, dtype=np.int16), None
+    background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+    alpha = np.asarray(img.getchannel("A"))
+    pixels = np.asarray(Image.alpha_composite(background, img).convert("RGB"), dtype=np.int16)
+    return original_size, pixels, alpha == 0
+
+
+def _solid_bottom_band(pixels, transparent=None):
+    """하단부터 이어지는 단색 행(전체 폭이 같은 색)의 높이 비율과 색. 로딩 중단으로 볼 띠가 아니면 (0.0, None)
+
+    - 띠가 투명 픽셀이면 배경
+    - 이미지 전체가 단색이면 띠 위에 디코딩된 내용이 없으므로 제외 (흐림 검사에서 걸러짐)
+    - 띠 위 내용의 테두리(위/아래 행, 좌우 열)에 같은 색이 이어지면 배경색 (스튜디오 배경, 흰 배경 제품 사진)
+    """
+    row_range = (pixels.max(axis=1) - pixels.min(axis=1)).max(axis=1)
+    uniform = row_range <= SOLID_TOLERANCE
+    color = pixels[-1, 0, :]
+    same_color = (np.abs(pixels[:, 0, :] - color) <= SOLID_TOLERANCE).all(axis=1)
+    band = (uniform & same_color)[::-1]
+    if band.all():
+        return 0.0, None
+    run = int(np.argmin(band))
+    if run == 0 or (transparent is not None and transparent[-run:].any()):
+        return 0.0, None
+    content = pixels[:-run]
+    frame = np.concatenate([content[0], content[-1], content[:, 0], content[:, -1]])
+    background_match = (np.abs(frame - color) <= SOLID_TOLERANCE).all(axis=1).mean()
+    if background_match >= SOLID_BACKGROUND_MATCH:
+        return 0.0, None
+    return run / len(band), color
+
+
+def _max_tile_laplacian_var(gray):
+    """타일별 Laplacian 분산 중 최댓값 (배경이 단순한 제품 사진도 객체 부분은 선명하므로 최댓값 사용)"""
+    lap = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+           - 4 * gray[1:-1, 1:-1])
+    h, w = lap.shape
+    th, tw = max(h // BLUR_TILE, 1), max(w // BLUR_TILE, 1)
+    tile_h, tile_w = h // th, w // tw
+    tiles = lap[:th * tile_h, :tw * tile_w].reshape(th, tile_h, tw, tile_w)
+    return float(tiles.var(axis=(1, 3)).max())
+
+
+def prefilter_image(image_path):
+    """조기 반려 사유가 있으면 early_reject 결과(dict), 통과하면 None"""
+    result = _run_checks(image_path)
+    STATS.record_image(result is not None)
+    return result
+
+
+def _run_checks(image_path):
+    start = time.perf_counter()
+    try:
+        original_size, pixels, transparent = _load(image_path)
+    except Exception as e:
+        STATS.record("truncated", True, time.perf_counter() - start)
+        return _early_reject("corrupt", "truncated", f"이미지를 끝까지 읽을 수 없습니다 ({e})")
+    STATS.record("truncated", False, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    short_side = min(original_size)
+    hit = short_side < MIN_RESOLUTION
+    STATS.record("resolution", hit, time.perf_counter() - start)
+    if hit:
+        return _early_reject("blurry", "resolution",
+                             f"해상도가 너무 낮습니다 ({original_size[0]}x{original_size[1]}, 최소 {MIN_RESOLUTION}px)")
+
+    start = time.perf_counter()
+    fraction, _ = _solid_bottom_band(pixels, transparent)
+    hit = fraction >= SOLID_BAND_FRACTION
+    STATS.record("solid_block", hit, time.perf_counter() - start)
+    if hit:
+        return _early_reject("corrupt", "solid_block",
+                             f"이미지 하단 {fraction:.0%}가 단색으로 채워져 있습니다 (로딩 중단)")
+
+    start = time.perf_counter()
+    gray = pixels.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    sharpness = _max_tile_laplacian_var(gray)
+    hit = sharpness < BLUR_THRESHOLD
+    STATS.record("blur", hit, time.perf_counter() - start)
+    if hit:
+        return _early_reject("blurry", "blur", f"초점이 맞지 않은 흐린 사진입니다 (선명도 {sharpness:.1f})")
+
+    return None
@@ -0,0 +1,288 @@
+"""재구성 단계별 진행 이벤트
+
+- 러너 쪽 (run_spar3d.py, run_trellis.py): report_progress(stage)로 이벤트 발생.
+  상주 워커 요청 중이면 소켓으로, 단발 실행이면 stdout에 "[PROGRESS] {json}" 한 줄로 내보냄
+- 서버 쪽: ProgressHub가 작업(task)별 이벤트를 모아 SSE 구독자에게 전달
+
+러너 환경에서도 import 되므로 표준 라이브러리만 사용합니다.
+"""
+
+import contextlib
+import json
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from cancellation import Cancelled, kill_process_tree
+from worker_ipc import emit_event
+
+PROGRESS_PREFIX = "[PROGRESS] "
+
+# 러너가 보고하는 단계 (프론트엔드 표시용 이름)
+STAGE_LABELS = {
+    "queued": "대기 중",
+    "running": "작업 시작",
+    "model_load": "모델 로딩",
+    "background_removal": "배경 제거",
+    "inference": "3D 추론",
+    "remesh": "메쉬 정리",
+    "texture_bake": "텍스처 베이킹",
+    "glb_export": "GLB 변환",
+    "oom_retry": "메모리 부족, 낮은 설정으로 재시도",
+    "done": "완료",
+    "failed": "실패",
+    "cancelled": "취소됨",
+}
+TERMINAL_STAGES = ("done", "failed", "cancelled")
+
+
+def report_progress(stage, **data):
+    """러너에서 단계 시작을 알림 (이전 단계의 최대 메모리 사용량 구간도 여기서 나뉨)"""
+    if stage not in _UNMEASURED_STAGES:
+        _enter_stage(stage)
+    event = {"stage": stage, "time": time.time(), **data}
+    if not emit_event(event):
+        print(PROGRESS_PREFIX + json.dumps(event, ensure_ascii=False), flush=True)
+
+
+# 단계별 최대 메모리: report_progress()가 단계를 바꿀 때마다 GPU/호스트 최대값 기록을 초기화하고 직전 단계 값을 보관
+_UNMEASURED_STAGES = ("oom_retry",)
+_stage_peaks = {}  # stage -> {"gpu_bytes", "rss_bytes"} (같은 단계를 다시 실행하면 마지막 실행 값)
+_current_stage = None
+# reset_peak_memory() 이후 지나간 단계를 합친 최대값
+# (VmHWM 초기화는 ru_maxrss도 함께 초기화하므로 호스트 최대값도 직접 모음)
+_gpu_peak = 0
+_rss_peak = 0
+
+
+def _torch_cuda():
+    """이미 import된 torch의 cuda 모듈 (torch가 없거나 GPU가 없으면 None)"""
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return None
+    return torch.cuda
+
+
+def _read_rss_hwm():
+    """현재 구간의 호스트 최대 RSS (/proc/self/status VmHWM, Linux 외에는 None)"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            match = re.search(r"^VmHWM:\s+(\d+) kB", f.read(), re.MULTILINE)
+    except OSError:
+        return None
+    return int(match.group(1)) * 1024 if match else None
+
+
+def _reset_rss_hwm():
+    # "5"를 쓰면 VmHWM이 현재 RSS로 초기화됨 (Linux 4.0+)
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _measure_stage():
+    usage = {}
+    cuda = _torch_cuda()
+    if cuda is not None:
+        usage["gpu_bytes"] = cuda.max_memory_allocated()
+    rss = _read_rss_hwm()
+    if rss is not None:
+        usage["rss_bytes"] = rss
+    return usage
+
+
+def _enter_stage(stage):
+    global _current_stage, _gpu_peak, _rss_peak
+    if _current_stage is not None:
+        usage = _stage_peaks[_current_stage] = _measure_stage()
+        _gpu_peak = max(_gpu_peak, usage.get("gpu_bytes", 0))
+        _rss_peak = max(_rss_peak, usage.get("rss_bytes", 0))
+    _current_stage = stage
+    cuda = _torch_cuda()
+    if cuda is not None:
+        cuda.reset_peak_memory_stats()
+    _reset_rss_hwm()
+
+
+def reset_peak_memory():
+    """작업 시작 전에 최대 메모리 기록(전체, 단계별)을 초기화 (torch를 import하지 않은 프로세스는 GPU 값 없음)"""
+    global _current_stage, _gpu_peak, _rss_peak
+    _stage_peaks.clear()
+    _current_stage = None
+    _gpu_peak = _rss_peak = 0
+    cuda = _torch_cuda()
+    if cuda is not None:
+        cuda.reset_peak_memory_stats()
+    _reset_rss_hwm()
+
+
+def peak_memory():
+    """러너 프로세스의 최대 메모리 {"rss_bytes", "gpu_bytes", "stages": {stage: {"gpu_bytes", "rss_bytes"}}}
+
+    모두 reset_peak_memory() 이후 기준. /proc이 없는 환경의 rss_bytes는 프로세스 시작 이후 최대값
+    """
+    import resource
+    stages = {stage: dict(peaks) for stage, peaks in _stage_peaks.items()}
+    current = _measure_stage()
+    if _current_stage is not None:
+        stages[_current_stage] = current
+    usage = {}
+    if "rss_bytes" in current:
+        usage["rss_bytes"] = max(_rss_peak, current["rss_bytes"])
+    else:
+        usage["rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    if "gpu_bytes" in current:
+        usage["gpu_bytes"] = max(_gpu_peak, current["gpu_bytes"])
+    if stages:
+        usage["stages"] = stages
+    return usage
+
+
+def parse_progress_line(line):
+    """단발 실행 로그의 한 줄에서 진행 이벤트를 꺼냄 (진행 줄이 아니면 None)"""
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(PROGRESS_PREFIX):])
+    except ValueError:
+        return None
+
+
+class ProgressHub:
+    """task별 진행 이벤트 기록. 구독자는 마지막으로 받은 이벤트 번호 이후를 기다림"""
+
+    def __init__(self, retention_seconds=3600):
+        self.retention_seconds = retention_seconds
+        self._events = {}  # task_id -> [event, ...]
+        self._finished_at = {}
+        self._cond = threading.Condition()
+        self._listeners = []
+
+    def publish(self, task_id, stage, **data):
+        event = {"stage": stage, "label": STAGE_LABELS.get(stage, stage), "time": time.time(), **data}
+        with self._cond:
+            events = self._events.setdefault(task_id, [])
+            if stage not in TERMINAL_STAGES:
+                # 같은 task로 재구성을 다시 요청한 경우 이전 종료 표시를 지움
+                self._finished_at.pop(task_id, None)
+            event["id"] = len(events) + 1
+            events.append(event)
+            if stage in TERMINAL_STAGES:
+                self._finished_at[task_id] = event["time"]
+            self._prune_locked()
+            self._cond.notify_all()
+        for listener in list(self._listeners):
+            listener(task_id)
+        return event
+
+    def add_listener(self, callback):
+        """이벤트가 기록될 때마다 callback(task_id) 호출 (비동기 서버가 이벤트 루프의 구독자를 깨우는 데 사용)
+
+        publish한 스레드에서 바로 호출하므로 callback은 오래 걸리지 않아야 함
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with contextlib.suppress(ValueError):
+            self._listeners.remove(callback)
+
+    def relay(self, task_id):
+        """러너 이벤트({"stage": ...})를 이 task로 전달하는 콜백"""
+        def on_progress(event):
+            event = dict(event)
+            stage = event.pop("stage", "unknown")
+            event.pop("time", None)
+            self.publish(task_id, stage, **event)
+        return on_progress
+
+    def wait(self, task_id, after_id=0, timeout=15):
+        """after_id 이후 이벤트 목록 (없으면 timeout까지 대기 후 빈 목록)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                events = self._events.get(task_id, [])
+                if len(events) > after_id:
+                    return [dict(e) for e in events[after_id:]]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+
+    def has_job(self, task_id, job_id):
+        """이 작업(job)의 이벤트가 이미 기록되었는지"""
+        with self._cond:
+            return any(e.get("job_id") == job_id for e in self._events.get(task_id, []))
+
+    def last_id(self, task_id):
+        with self._cond:
+            return len(self._events.get(task_id, []))
+
+    def is_finished(self, task_id):
+        with self._cond:
+            return task_id in self._finished_at
+
+    def _prune_locked(self):
+        cutoff = time.time() - self.retention_seconds
+        for task_id in [t for t, finished in self._finished_at.items() if finished < cutoff]:
+            self._events.pop(task_id, None)
+            self._finished_at.pop(task_id, None)
+
+
+def stream_subprocess(cmd, log_path, on_progress=None, timeout=None, cancel=None, **popen_kwargs):
+    """자식 프로세스 출력을 한 줄씩 로그 파일에 쓰면서 진행 이벤트를 전달. 반환: returncode
+
+    timeout을 넘기면 프로세스 트리를 종료하고 subprocess.TimeoutExpired를 발생
+    cancel: CancelToken. 취소되면 프로세스 트리를 종료하고 Cancelled 발생
+    """
+    with open(log_path, "w", encoding="utf-8", errors="replace") as log:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            bufsize=1,
+            start_new_session=True,  # 러너가 띄운 자식까지 프로세스 그룹째 종료하기 위해
+            **popen_kwargs
+        )
+        timer = None
+        timed_out = threading.Event()
+        if timeout is not None:
+            def _kill():
+                timed_out.set()
+                kill_process_tree(proc.pid)
+            timer = threading.Timer(timeout, _kill)
+            timer.daemon = True
+            timer.start()
+        unregister = cancel.on_cancel(lambda: kill_process_tree(proc.pid)) if cancel is not None else None
+        try:
+            for line in proc.stdout:
+                log.write(line)
+                log.flush()
+                event = parse_progress_line(line)
+                if event is not None and on_progress is not None:
+                    on_progress(event)
+            returncode = proc.wait()
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if unregister is not None:
+                unregister()
+    if cancel is not None and cancel.is_cancelled():
+        raise Cancelled()
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    return returncode
+
+
+def read_log_tail(log_path, limit=500):
+    try:
+        with open(log_path, encoding="utf-8", errors="replace") as f:
+            return f.read()[-limit:]
+    except OSError as e:
+        print(f"[WARN] Cannot read log {log_path}: {e}", file=sys.stderr)
+        return ""
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""원격 재구성 워커: 이 호스트의 GPU 하나로 파이프라인 서버가 보내는 재구성 작업을 실행
+
+    PIPELINE_SPAR3D_ENV=... PIPELINE_TRELLIS_ENV=... python reconstruction_worker.py \\
+        --server http://main-host:5000 --device 1 --port 6001 --advertise-url http://gpu-host:6001 \\
+        --modes fast,quality --memory-gb 24 --slots 1
+
+- 시작하면 서버의 /api/workers/register에 모드/메모리/슬롯을 등록하고 heartbeat를 보냄
+  (서버가 모르는 워커라고 답하면 (서버 재시작, heartbeat 만료) 다시 등록)
+- 작업 전달 프로토콜은 remote_workers.py 참고. 재구성은 pipeline_server.run_reconstruction을 그대로 써서
+  상주 워커, 배경 제거, 결과 캐시가 이 호스트에서도 서버와 똑같이 동작
+- 서버와의 실행 연결이 끊기면 (서버 쪽 취소, 서버 종료) 실행 중인 러너를 종료
+- 상태(결과 캐시, 상주 워커 소켓 등)는 --state-dir에 저장 (같은 호스트의 서버/다른 워커와 겹치지 않게 워커별로 분리)
+"""
+
+import argparse
+import json
+import os
+import queue
+import re
+import shutil
+import signal
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cancellation import CancelToken, Cancelled
+from remote_workers import WORKER_TOKEN_HEADER, WORKER_MODES, KEEPALIVE_SECONDS, token_matches
+
+ps = None  # pipeline_server (상태 디렉토리를 정한 뒤 import)
+
+_JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+_INPUT_NAMES = ("image.png", "image.jpg", "image.jpeg", "rgba.png")
+FINISHED_JOB_TTL_SECONDS = 3600  # 서버가 가져가지 않은(DELETE 전에 서버가 죽은) 작업 파일 보관 시간
+
+
+class WorkerAgent:
+    def __init__(self, args):
+        self.args = args
+        self.worker_id = args.worker_id
+        self.jobs_dir = os.path.join(args.state_dir, "jobs")
+        self.heartbeat_seconds = 5
+        self.draining = False
+        self._jobs = {}  # job_id -> {"cancel", "thread", "running", "result", "finished_at"}
+        self._lock = threading.Lock()
+        # 이전 프로세스가 받았던 작업은 서버가 이미 다른 장치로 다시 보냈으므로 버림
+        shutil.rmtree(self.jobs_dir, ignore_errors=True)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    # ---------- 서버 등록 / heartbeat ----------
+
+    def _post(self, path, payload, method="POST"):
+        """서버 요청. 반환: (status, 응답 JSON). 연결 실패는 (0, {})"""
+        headers = {"Content-Type": "application/json"}
+        if self.args.token:
+            headers[WORKER_TOKEN_HEADER] = self.args.token
+        req = urllib.request.Request(self.args.server.rstrip("/") + path, method=method, headers=headers,
+                                     data=json.dumps(payload).encode("utf-8"))
+        try:
+            with urllib.request.urlopen(req, timeout=10) as resp:
+                return resp.status, json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            return e.code, {}
+        except (urllib.error.URLError, OSError, ValueError):
+            return 0, {}
+
+    def register(self):
+        """등록될 때까지 재시도 (서버가 아직 안 떠 있을 수 있음)"""
+        payload = {
+            "worker_id": self.worker_id,
+            "url": self.args.advertise_url,
+            "host": socket.gethostname(),
+            "modes": self.args.modes,
+            "memory_gb": self.args.memory_gb,
+            "slots": self.args.slots
+        }
+        while True:
+            status, body = self._post("/api/workers/register", payload)
+            if status == 200:
+                self.heartbeat_seconds = body.get("heartbeat_seconds", self.heartbeat_seconds)
+                print(f"[WORKER] Registered as {self.worker_id} with {self.args.server}", file=sys.stderr)
+                return
+            if 400 <= status < 500:
+                raise SystemExit(f"서버가 등록을 거부했습니다 ({status})")
+            time.sleep(2)
+
+    def heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            status, _ = self._post(f"/api/workers/{self.worker_id}/heartbeat", self.status())
+            if status == 404:
+                self.register()
+            elif status != 200:
+                print(f"[WORKER] Heartbeat failed (status {status})", file=sys.stderr)
+            self.reap()
+
+    def reap(self):
+        """끝난 뒤 오래 가져가지 않은 작업 파일 삭제"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [job_id for job_id, job in self._jobs.items()
+                     if not job["running"] and now - job["finished_at"] > FINISHED_JOB_TTL_SECONDS]
+        for job_id in stale:
+            self.cancel_job(job_id)
+
+    def deregister(self):
+        self._post(f"/api/workers/{self.worker_id}", {}, method="DELETE")
+
+    def status(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["running"])
+        return {
+            "healthy": not self.draining,
+            "reason": "종료 중" if self.draining else None,
+            "running": running,
+            "slots": self.args.slots,
+            "resident": {f"{kind}-{device}": worker.status()
+                         for (kind, device), worker in list(ps._resident_workers.items())}
+        }
+
+    # ---------- 작업 ----------
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def start_job(self, job_id, model, on_event):
+        """작업 스레드 시작. 반환: (작업 정보, 오류 메시지). on_event(None)은 작업이 끝났다는 뜻"""
+        image_path = next((os.path.join(self.job_dir(job_id), name) for name in _INPUT_NAMES[:3]
+                           if os.path.exists(os.path.join(self.job_dir(job_id), name))), None)
+        if image_path is None:
+            return None, "입력 이미지가 없습니다"
+        job = {"cancel": CancelToken(), "running": True, "result": None}
+        job["thread"] = threading.Thread(target=self._run_job, args=(job, model, image_path, on_event),
+                                         name=f"remote-job-{job_id[:8]}", daemon=True)
+        with self._lock:
+            if sum(1 for other in self._jobs.values() if other["running"]) >= self.args.slots:
+                return None, "실행 슬롯이 모두 사용 중입니다"
+            if job_id in self._jobs:
+                return None, "이미 실행한 작업입니다"
+            self._jobs[job_id] = job
+        job["thread"].start()
+        return job, None
+
+    def _run_job(self, job, model, image_path, on_event):
+        job_dir = os.path.dirname(image_path)
+        rgba_input = os.path.join(job_dir, "rgba.png")
+
+        def get_rgba():
+            if os.path.exists(rgba_input):
+                return rgba_input
+            if not ps.USE_SHARED_REMOVER:
+                return None
+            on_event({"stage": "background_removal"})
+            rgba_path = ps.remove_background(image_path)
+            job["cancel"].raise_if_cancelled()
+            return rgba_path
+
+        try:
+            result = ps.run_reconstruction(model, image_path, os.path.join(job_dir, f"{model}_output"),
+                                           device=self.args.device, on_progress=on_event, get_rgba=get_rgba,
+                                           cancel=job["cancel"])
+            mesh_path = result.get("mesh_path")
+            if result.get("success") and mesh_path and os.path.exists(mesh_path):
+                result["mesh_bytes"] = os.path.getsize(mesh_path)
+                result["mesh_sha256"] = ps.hash_file(mesh_path)
+            elif result.get("success"):
+                result = {"success": False, "error": "생성된 3D 모델 파일을 찾을 수 없습니다"}
+        except Cancelled:
+            result = {"success": False, "cancelled": True, "error": "작업이 취소되었습니다"}
+        except Exception as e:
+            result = {"success": False, "error": f"원격 워커 오류: {e}"}
+        result["worker_id"] = self.worker_id
+        with self._lock:
+            job["result"] = result
+            job["running"] = False
+            job["finished_at"] = time.monotonic()
+        on_event(None)  # 끝: 응답 스트림이 keepalive 대기 없이 결과를 바로 보냄
+
+    def cancel_job(self, job_id):
+        """실행 중이면 러너를 종료하고 작업 파일 삭제"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            job["cancel"].cancel()
+            if job["thread"].is_alive():
+                job["thread"].join(timeout=30)
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def cancel_all(self):
+        with self._lock:
+            job_ids = list(self._jobs)
+        for job_id in job_ids:
+            self.cancel_job(job_id)
+
+    def mesh_path(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            result = job["result"] if job else None
+        return (result or {}).get("mesh_path")
+
+
+def make_handler(agent):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def _json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route(self):
+            """(job_id, 나머지 경로) 또는 인증/경로 오류면 응답을 보내고 None"""
+            if agent.args.token and not token_matches(self.headers.get(WORKER_TOKEN_HEADER), agent.args.token):
+                self._json(403, {"error": "워커 토큰이 맞지 않습니다"})
+                return None
+            parts = self.path.split("?")[0].strip("/").split("/")
+            if len(parts) < 2 or parts[0] != "jobs" or not _JOB_ID_RE.fullmatch(parts[1]):
+                self._json(404, {"error": "없는 경로입니다"})
+                return None
+            return parts[1], parts[2:]
+
+        def do_GET(self):
+            if self.path == "/health":
+                return self._json(200, {"worker_id": agent.worker_id, **agent.status()})
+            route = self._route()
+            if route is None:
+                return
+            job_id, rest = route
+            mesh_path = agent.mesh_path(job_id) if rest == ["mesh"] else None
+            if not mesh_path or not os.path.exists(mesh_path):
+                return self._json(404, {"error": "결과 파일이 없습니다"})
+            self.send_response(200)
+            self.send_header("Content-Type", "model/gltf-binary")
+            self.send_header("Content-Length", str(os.path.getsize(mesh_path)))
+            self.end_headers()
+            with open(mesh_path, "rb") as f:
+                shutil.copyfileobj(f, self.wfile, 1 << 20)
+
+        def do_PUT(self):
+            route = self._route()
+            if route is None:
+                return
+            job_id, rest = route
+            if len(rest) != 2 or rest[0] != "inputs" or rest[1] not in _INPUT_NAMES:
+                return self._json(400, {"error": f"입력 파일 이름은 {', '.join(_INPUT_NAMES)} 중 하나여야 합니다"})
+            remaining = int(self.headers.get("Content-Length") or 0)
+            os.makedirs(agent.job_dir(job_id), exist_ok=True)
+            path = os.path.join(agent.job_dir(job_id), rest[1])
+            with open(path + ".part", "wb") as f:
+                while remaining > 0:
+                    chunk = self.rfile.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            if remaining:
+                os.remove(path + ".part")
+                return self._json(400, {"error": "업로드가 중간에 끊겼습니다"})
+            os.replace(path + ".part", path)
+            self._json(200, {"path": rest[1]})
+
+        def do_POST(self):
+            route = self._route()
+            if route is None:
+                return
+            job_id, rest = route
+            if rest != ["run"]:
+                return self._json(404, {"error": "없는 경로입니다"})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            except ValueError:
+                return self._json(400, {"error": "JSON 본문이 필요합니다"})
+            model = body.get("model", "fast")
+            if model not in agent.args.modes:
+                return self._json(400, {"error": f"이 워커는 {model} 모드를 실행하지 않습니다"})
+            if agent.draining:
+                return self._json(503, {"error": "워커가 종료 중입니다"})
+            events = queue.Queue()
+            job, error = agent.start_job(job_id, model, events.put)
+            if job is None:
+                return self._json(409, {"error": error})
+
+            # 응답 길이를 모르는 스트림이므로 HTTP/1.0 방식으로 연결을 닫아 끝을 알림
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                while True:
+                    try:
+                        event = events.get(timeout=KEEPALIVE_SECONDS)
+                        if event is None:
+                            break
+                        message = {"event": event}
+                    except queue.Empty:
+                        message = {"keepalive": True}
+                    self.wfile.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                self.wfile.write(json.dumps({"result": job["result"]}, ensure_ascii=False).encode("utf-8") + b"\n")
+            except OSError:
+                # 서버가 연결을 끊음 (취소, 서버 종료): 러너를 멈춰 GPU를 바로 돌려줌
+                print(f"[WORKER] Server disconnected from job {job_id}, cancelling", file=sys.stderr)
+                job["cancel"].cancel()
+
+        def do_DELETE(self):
+            route = self._route()
+            if route is None:
+                return
+            job_id, rest = route
+            if rest:
+                return self._json(404, {"error": "없는 경로입니다"})
+            agent.cancel_job(job_id)
+            self._json(200, {"deleted": job_id})
+
+    return Handler
+
+
+def main(argv=None, configure=None):
+    """configure(ps): pipeline_server를 import 한 뒤 러너 경로 등을 바꿀 때 (loadtest.py의 stub 워커)"""
+    global ps
+    parser = argparse.ArgumentParser(description="원격 재구성 워커")
+    parser.add_argument("--server", required=True, help="파이프라인 서버 주소 (http://host:5000)")
+    parser.add_argument("--device", default="0", help="이 워커가 쓸 GPU (CUDA_VISIBLE_DEVICES 값)")
+    parser.add_argument("--modes", default=",".join(WORKER_MODES), help="실행할 모드 (쉼표로 구분)")
+    parser.add_argument("--memory-gb", type=float, default=24)
+    parser.add_argument("--slots", type=int, default=1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=6001)
+    parser.add_argument("--advertise-url", help="서버가 이 워커에 접속할 주소 (기본: http://<hostname>:<port>)")
+    parser.add_argument("--worker-id", help="기본: <hostname>-gpu<device>")
+    parser.add_argument("--state-dir", help="결과 캐시/상주 워커 소켓/작업 파일 (기본: ~/.cache/pipeline_worker/<id>)")
+    parser.add_argument("--token", default=os.environ.get("PIPELINE_WORKER_TOKEN"),
+                        help="서버와 같은 워커 토큰 (기본: PIPELINE_WORKER_TOKEN)")
+    parser.add_argument("--no-preload", action="store_true", help="상주 워커를 첫 작업 때 띄움")
+    args = parser.parse_args(argv)
+    args.modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in args.modes if m not in WORKER_MODES]
+    if unknown or not args.modes:
+        parser.error(f"알 수 없는 모드: {unknown}")
+    args.worker_id = args.worker_id or f"{socket.gethostname()}-gpu{args.device}"
+    args.advertise_url = args.advertise_url or f"http://{socket.gethostname()}:{args.port}"
+    args.state_dir = args.state_dir or os.path.join(os.path.expanduser("~"), ".cache", "pipeline_worker",
+                                                    args.worker_id)
+
+    # 서버와 같은 호스트여도 서버의 작업 큐/캐시 파일을 건드리지 않도록 워커 전용 디렉토리 사용
+    os.environ["PIPELINE_SERVICE_DIR"] = args.state_dir
+    os.environ.pop("PIPELINE_RUN_DIR", None)
+    os.environ["PIPELINE_GPU_DEVICES"] = json.dumps([{"id": args.device, "memory_gb": args.memory_gb,
+                                                      "slots": args.slots}])
+    import pipeline_server
+    ps = pipeline_server
+    if configure is not None:
+        configure(ps)
+
+    agent = WorkerAgent(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(agent))
+    server.daemon_threads = True
+
+    def shutdown(*_):
+        # 새 작업을 받지 않고 등록을 풀고 실행 중인 작업을 멈춤 (서버가 다른 장치로 다시 보냄)
+        agent.draining = True
+        agent.deregister()
+        agent.cancel_all()
+        for worker in list(ps._resident_workers.values()):
+            worker.stop()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    if not args.no_preload:
+        kinds = [kind for kind, mode in (("spar3d", "fast"), ("trellis", "quality")) if mode in args.modes]
+        if ps.USE_SHARED_REMOVER:
+            kinds.append("remover")
+        for kind in kinds:
+            ps.get_resident_worker(kind, args.device).start()
+    agent.register()
+    threading.Thread(target=agent.heartbeat_loop, name="worker-heartbeat", daemon=True).start()
+    print(f"[WORKER] Serving {args.worker_id} on {args.host}:{args.port} (GPU {args.device}, "
+          f"modes: {','.join(args.modes)})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""원격 재구성 워커 등록부와 작업 전달
+
+GPU/호스트마다 하나씩 띄운 재구성 워커(reconstruction_worker.py)가 서버에 등록하고 주기적으로 heartbeat를 보냅니다.
+- 등록된 워커는 스케줄러에 "worker:<id>" 장치로 추가되어, 알린 모드/메모리/슬롯 안에서만 작업을 배정받음
+- heartbeat가 끊기면 장치에서 빼고 그 워커로 전달 중인 작업의 연결을 끊어 작업 스레드가 바로 알게 함
+  (작업은 WorkerLost로 끝나고 서버가 다른 장치로 다시 대기열에 넣음). unhealthy를 보고한 워커는 새 작업만 받지 않음
+- run_remote(): 입력 이미지(+RGBA)를 워커로 올리고, 진행 이벤트를 받아 넘기고, 결과 GLB를 내려받음
+
+워커 쪽 HTTP 프로토콜 (모든 요청에 WORKER_TOKEN_HEADER, 토큰을 설정한 경우):
+    PUT    /jobs/<id>/inputs/<파일 이름>   입력 파일 업로드 (image.*, rgba.png)
+    POST   /jobs/<id>/run                 {"model"} -> 줄 단위 JSON: {"event"} / {"keepalive"} / 마지막 {"result"}
+    GET    /jobs/<id>/mesh                결과 GLB
+    DELETE /jobs/<id>                     실행 중이면 러너 종료 후 작업 파일 삭제
+
+서버와 워커 양쪽에서 import 하므로 표준 라이브러리만 사용합니다.
+"""
+
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import re
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+
+WORKER_DEVICE_PREFIX = "worker:"
+WORKER_TOKEN_HEADER = "X-Worker-Token"
+WORKER_MODES = ("fast", "quality")
+KEEPALIVE_SECONDS = 5  # 워커가 실행 중 연결 유지용 줄을 보내는 간격
+_WORKER_ID_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,63}")
+
+
+class WorkerLost(Exception):
+    """작업을 맡은 원격 워커에 작업을 전달하지 못했거나 작업 도중 연결이 끊김 (다른 장치에서 다시 실행할 대상)
+
+    unreachable: 워커 프로세스/호스트에 닿지 않음 (거절 응답이 아니라 연결 실패, 응답 없음)
+    """
+
+    def __init__(self, message, unreachable=True):
+        super().__init__(message)
+        self.unreachable = unreachable
+
+
+def device_id(worker_id):
+    return WORKER_DEVICE_PREFIX + worker_id
+
+
+def is_remote_device(device):
+    return str(device or "").startswith(WORKER_DEVICE_PREFIX)
+
+
+def token_matches(received, token):
+    """WORKER_TOKEN_HEADER 값 비교 (응답 시간으로 토큰을 추측하지 못하도록 상수 시간)"""
+    return hmac.compare_digest((received or "").encode("utf-8"), token.encode("utf-8"))
+
+
+class WorkerRegistry:
+    def __init__(self, scheduler, heartbeat_seconds=5, timeout_seconds=20, clock=time.monotonic):
+        """scheduler: 등록된 워커를 장치로 추가/제거할 GpuScheduler
+
+        heartbeat_seconds: 워커에 알려 주는 heartbeat 간격
+        timeout_seconds: 이 시간 동안 heartbeat가 없으면 워커가 죽은 것으로 봄
+        """
+        self.scheduler = scheduler
+        self.heartbeat_seconds = heartbeat_seconds
+        self.timeout_seconds = timeout_seconds
+        self.clock = clock
+        self._workers = {}
+        self._streams = {}  # worker_id -> {stream_id: 연결 끊기 함수}
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def register(self, info):
+        """워커 등록 (같은 id로 다시 등록하면 정보 갱신). 반환: 워커 정보. 잘못된 등록 요청은 ValueError"""
+        url = str(info.get("url") or "").rstrip("/")
+        if urllib.parse.urlsplit(url).scheme not in ("http", "https"):
+            raise ValueError("워커 url이 필요합니다 (http://host:port)")
+        modes = list(info.get("modes") or WORKER_MODES)
+        unknown = [m for m in modes if m not in WORKER_MODES]
+        if unknown:
+            raise ValueError(f"알 수 없는 모드: {unknown}")
+        try:
+            slots = int(info.get("slots", 1))
+            memory_gb = float(info["memory_gb"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("memory_gb와 slots는 숫자여야 합니다")
+        if slots < 1 or memory_gb <= 0:
+            raise ValueError("memory_gb와 slots는 0보다 커야 합니다")
+        worker_id = str(info.get("worker_id") or uuid.uuid4().hex[:12])
+        if not _WORKER_ID_RE.fullmatch(worker_id):
+            raise ValueError("worker_id는 영문/숫자/._- 64자 이하여야 합니다")
+
+        with self._lock:
+            previous = self._workers.get(worker_id)
+            worker = {
+                "worker_id": worker_id,
+                "device": device_id(worker_id),
+                "url": url,
+                "host": str(info.get("host") or urllib.parse.urlsplit(url).hostname),
+                "modes": modes,
+                "slots": slots,
+                "memory_gb": memory_gb,
+                "healthy": True,
+                "status": {},
+                "registered_at": time.time(),
+                "last_heartbeat": self.clock()
+            }
+            self._workers[worker_id] = worker
+            self.scheduler.add_device(worker["device"], memory_gb, slots, modes)
+            # 같은 id로 다시 등록했다면 워커가 재시작된 것이므로 이전 프로세스로 보낸 작업은 끝나지 않음
+            streams = self._streams.pop(worker_id, {}) if previous is not None else {}
+            view = dict(worker)
+        self._close(streams.values())
+        print(f"[WORKERS] Registered {worker_id} at {url} (modes: {','.join(modes)}, slots: {slots}, "
+              f"{memory_gb:g} GB)", file=sys.stderr)
+        self.start()
+        return view
+
+    def heartbeat(self, worker_id, status=None):
+        """heartbeat 기록. 모르는 워커(만료, 서버 재시작)면 False — 워커가 다시 등록해야 함"""
+        status = status or {}
+        with self._lock:
+            worker = self._workers.get(worker_id)
+            if worker is None:
+                return False
+            worker["last_heartbeat"] = self.clock()
+            worker["status"] = status
+            healthy = bool(status.get("healthy", True))
+            if healthy != worker["healthy"]:
+                worker["healthy"] = healthy
+                if healthy:
+                    self.scheduler.add_device(worker["device"], worker["memory_gb"], worker["slots"],
+                                              worker["modes"])
+                else:
+                    self.scheduler.remove_device(worker["device"])
+        if not healthy:
+            print(f"[WORKERS] {worker_id} reported unhealthy: {status.get('reason')}", file=sys.stderr)
+        return True
+
+    def remove(self, worker_id, reason="등록 해제"):
+        """워커를 장치에서 빼고 전달 중인 작업의 연결을 끊음. 반환: 등록되어 있었는지"""
+        with self._lock:
+            worker = self._workers.pop(worker_id, None)
+            streams = self._streams.pop(worker_id, {})
+            if worker is not None:
+                self.scheduler.remove_device(worker["device"])
+        if worker is None:
+            return False
+        print(f"[WORKERS] Removed {worker_id} ({reason}, {len(streams)} job(s) in flight)", file=sys.stderr)
+        self._close(streams.values())
+        return True
+
+    def get(self, device):
+        """스케줄러 장치 id에 해당하는 워커 정보 (원격 장치가 아니거나 등록이 풀렸으면 None)"""
+        if not is_remote_device(device):
+            return None
+        with self._lock:
+            worker = self._workers.get(device[len(WORKER_DEVICE_PREFIX):])
+            return dict(worker) if worker else None
+
+    def track(self, worker_id, close):
+        """워커로 전달 중인 작업 연결 등록 (워커가 사라지면 close() 호출). 반환: 등록 해제 함수"""
+        stream_id = uuid.uuid4().hex
+        with self._lock:
+            if worker_id in self._workers:
+                self._streams.setdefault(worker_id, {})[stream_id] = close
+                return lambda: self._untrack(worker_id, stream_id)
+        close()
+        return lambda: None
+
+    def _untrack(self, worker_id, stream_id):
+        with self._lock:
+            self._streams.get(worker_id, {}).pop(stream_id, None)
+
+    @staticmethod
+    def _close(closers):
+        for close in closers:
+            try:
+                close()
+            except OSError:
+                pass
+
+    def start(self):
+        """heartbeat 만료 감시 스레드 시작 (여러 번 호출해도 한 번만)"""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch_loop, name="worker-heartbeat-watch", daemon=True)
+            self._watcher.start()
+
+    def _watch_loop(self):
+        while True:
+            time.sleep(min(self.heartbeat_seconds, self.timeout_seconds / 2))
+            now = self.clock()
+            with self._lock:
+                expired = [w for w, info in self._workers.items()
+                           if now - info["last_heartbeat"] > self.timeout_seconds]
+            for worker_id in expired:
+                self.remove(worker_id, reason=f"{self.timeout_seconds}초 동안 heartbeat 없음")
+
+    def snapshot(self):
+        now = self.clock()
+        with self._lock:
+            return {
+                worker_id: {
+                    **{k: v for k, v in info.items() if k != "last_heartbeat"},
+                    "in_flight": len(self._streams.get(worker_id, {})),
+                    "heartbeat_age_seconds": round(now - info["last_heartbeat"], 1)
+                }
+                for worker_id, info in self._workers.items()
+            }
+
+
+# ---------- 작업 전달 (서버 -> 워커) ----------
+
+def _connection(url, timeout):
+    parts = urllib.parse.urlsplit(url)
+    cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    return cls(parts.hostname, parts.port, timeout=timeout), parts.path.rstrip("/")
+
+
+def _request(url, method, path, body=None, headers=None, timeout=60):
+    """짧은 요청 한 번. 반환: (status, body bytes). 연결 실패는 OSError"""
+    conn, prefix = _connection(url, timeout)
+    try:
+        conn.request(method, prefix + path, body=body, headers=headers or {})
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def run_remote(worker, model, image_path, mesh_path, rgba_path=None, on_progress=None, cancel=None,
+               registry=None, auth_token=None, timeout=1800, idle_timeout=30):
+    """원격 워커에서 재구성: 입력 업로드 -> 실행(진행 이벤트 스트림) -> 결과 GLB를 mesh_path로 내려받기
+
+    반환: 워커의 결과 dict (성공이면 "mesh_path"가 이 호스트의 mesh_path).
+    워커에 닿지 않거나 도중에 연결이 끊기면 WorkerLost, 취소되면 러너를 멈추게 하고 Cancelled
+    idle_timeout: 이 시간 동안 워커에서 아무 줄도 오지 않으면 끊긴 것으로 봄 (워커는 KEEPALIVE_SECONDS마다 보냄)
+    """
+    headers = {WORKER_TOKEN_HEADER: auth_token} if auth_token else {}
+    job_path = f"/jobs/{uuid.uuid4().hex}"
+    url = worker["url"]
+    try:
+        inputs = [("image" + os.path.splitext(image_path)[1].lower(), image_path)]
+        if rgba_path:
+            inputs.append(("rgba.png", rgba_path))
+        for name, path in inputs:
+            with open(path, "rb") as f:
+                status, body = _request(url, "PUT", f"{job_path}/inputs/{name}", f,
+                                        {**headers, "Content-Length": str(os.path.getsize(path))})
+            if status != 200:
+                raise WorkerLost(f"입력 업로드 실패 ({status}): {body[:200]!r}", unreachable=False)
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+
+        result = _stream_run(worker, job_path, model, headers, on_progress, cancel, registry, timeout, idle_timeout)
+        if not result.get("success"):
+            return result
+        _download(url, f"{job_path}/mesh", mesh_path, headers, result.get("mesh_sha256"))
+        result["mesh_path"] = mesh_path
+        return result
+    except OSError as e:
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        raise WorkerLost(f"{worker['worker_id']} 연결 오류: {e}") from e
+    finally:
+        # 끝났거나 취소/실패한 작업의 파일 정리 (실행 중이면 워커가 러너를 종료)
+        try:
+            _request(url, "DELETE", job_path, headers=headers, timeout=10)
+        except OSError:
+            pass
+
+
+def _stream_run(worker, job_path, model, headers, on_progress, cancel, registry, timeout, idle_timeout):
+    conn, prefix = _connection(worker["url"], idle_timeout)
+    body = json.dumps({"model": model}).encode("utf-8")
+    conn.request("POST", f"{prefix}{job_path}/run", body=body,
+                 headers={**headers, "Content-Type": "application/json"})
+    sock = conn.sock
+
+    def abort():
+        # 다른 스레드에서 막혀 있는 readline()을 깨움
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    untrack = registry.track(worker["worker_id"], abort) if registry is not None else (lambda: None)
+    unregister = cancel.on_cancel(abort) if cancel is not None else (lambda: None)
+    deadline = time.monotonic() + timeout
+    try:
+        resp = conn.getresponse()
+        if resp.status != 200:
+            raise WorkerLost(f"{worker['worker_id']} 실행 요청 거부 ({resp.status}): {resp.read()[:200]!r}",
+                             unreachable=False)
+        while time.monotonic() < deadline:
+            line = resp.readline()
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            if not line:
+                raise WorkerLost(f"{worker['worker_id']} 작업 도중 연결이 끊김")
+            message = json.loads(line)
+            if "result" in message:
+                return message["result"]
+            if "event" in message and on_progress is not None:
+                on_progress(message["event"])
+        return {"success": False, "error": f"원격 재구성 시간 초과 ({timeout}초)"}
+    except socket.timeout:
+        raise WorkerLost(f"{worker['worker_id']}에서 {idle_timeout}초 동안 응답 없음")
+    except ValueError as e:
+        raise WorkerLost(f"{worker['worker_id']} 응답 형식 오류: {e}")
+    finally:
+        unregister()
+        untrack()
+        conn.close()
+
+
+def _download(url, path, dest, headers, expected_sha256=None):
+    """결과 파일을 dest로 내려받음 (받는 도중 끊기면 기존 파일을 건드리지 않음)"""
+    conn, prefix = _connection(url, 60)
+    tmp = f"{dest}.{uuid.uuid4().hex[:8]}.part"
+    try:
+        conn.request("GET", prefix + path, headers=headers)
+        resp = conn.getresponse()
+        if resp.status != 200:
+            raise WorkerLost(f"결과 다운로드 실패 ({resp.status})", unreachable=False)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(tmp, "wb") as f:
+            for chunk in iter(lambda: resp.read(1 << 20), b""):
+                f.write(chunk)
+        if expected_sha256 and _sha256(tmp) != expected_sha256:
+            raise WorkerLost("결과 파일 해시가 맞지 않음 (전송 중 손상)", unreachable=False)
+        os.replace(tmp, dest)
+    finally:
+        conn.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
@@ -0,0 +1,203 @@
+"""내용 주소 기반 결과 캐시: (이미지 해시, 단계, 파라미터) -> 필터 판정 / 생성된 mesh.glb
+
+- 같은 키로 동시에 들어온 요청은 하나의 작업으로 합쳐짐 (single-flight). 합류한 요청은 시간 제한/취소가 있음
+- 전체 크기가 max_bytes를 넘으면 가장 오래 쓰지 않은 항목부터 삭제 (LRU)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+WAIT_TIMEOUT_SECONDS = 3600  # 합류한 요청이 첫 요청의 결과를 기다리는 기본 최대 시간
+WAIT_POLL_SECONDS = 1.0       # 기다리는 동안 취소 여부를 확인하는 간격
+
+
+def hash_file(path):
+    """이미지 바이트의 sha256"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def link_or_copy(src, dst):
+    """같은 파일시스템이면 하드링크, 아니면 복사"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class ResultCache:
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> 항목 크기 (오래 안 쓴 순서)
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+        self.wait_timeouts = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def make_key(image_hash, stage, params=None):
+        raw = json.dumps([image_hash, stage, params or {}], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _load(self):
+        """재시작 시 디스크의 캐시 항목을 마지막 사용 시각 순으로 복원"""
+        found = []
+        for key in os.listdir(self.cache_dir):
+            meta = os.path.join(self._entry_dir(key), "result.json")
+            if not os.path.exists(meta):
+                # 쓰다 만 임시 디렉토리 정리
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                continue
+            found.append((os.path.getmtime(meta), key, self._dir_size(self._entry_dir(key))))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+
+    @staticmethod
+    def _dir_size(path):
+        return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+    def contains(self, key):
+        """조회 통계와 LRU 순서를 건드리지 않고 저장 여부만 확인"""
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """캐시된 결과(dict) 또는 None. 저장된 파일은 result["files"]에 캐시 내 절대 경로로 담김"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        entry_dir = self._entry_dir(key)
+        meta = os.path.join(entry_dir, "result.json")
+        try:
+            with open(meta, encoding="utf-8") as f:
+                stored = json.load(f)
+            os.utime(meta)
+        except OSError:
+            # 다른 스레드가 방금 삭제한 경우
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        result = stored["result"]
+        result["files"] = {name: os.path.join(entry_dir, name) for name in stored.get("files", [])}
+        return result
+
+    def put(self, key, result, files=None):
+        """결과와 파일({저장 이름: 원본 경로})을 캐시에 저장"""
+        files = files or {}
+        tmp_dir = self._entry_dir(f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            for name, src in files.items():
+                link_or_copy(src, os.path.join(tmp_dir, name))
+            with open(os.path.join(tmp_dir, "result.json"), "w", encoding="utf-8") as f:
+                json.dump({"result": result, "files": sorted(files), "created_at": time.time()},
+                          f, ensure_ascii=False)
+            with self._lock:
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                os.replace(tmp_dir, self._entry_dir(key))
+                self._entries[key] = self._dir_size(self._entry_dir(key))
+                self._entries.move_to_end(key)
+                self._evict_locked()
+        except Exception as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            print(f"[CACHE] Failed to store {key[:12]}: {e}", file=sys.stderr)
+
+    def _evict_locked(self):
+        total = sum(self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute, cacheable=lambda r: True, files_of=None,
+                       timeout=WAIT_TIMEOUT_SECONDS, cancel=None):
+        """캐시 조회 -> 없으면 compute() 실행 후 저장. 같은 키의 동시 요청은 첫 요청의 결과를 기다림
+
+        timeout: 합류한 요청이 기다리는 최대 시간(초). 넘으면 (None, "timeout")
+        cancel: 합류한 요청이 기다리는 동안 취소되면 바로 (None, "merged") (cancellation.CancelToken)
+        반환: (result, source) — source는 "computed", "cache", "merged", "timeout" 중 하나.
+        합류한 요청의 result는 첫 요청이 실패(예외)했거나 취소/시간 초과되면 None. 캐시에 저장되지 않은 결과를
+        받으면 첫 요청 결과의 복사본이고 "files"가 없음
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached, "cache"
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = {"done": threading.Event(), "result": None}
+                self._inflight[key] = flight
+            else:
+                self.merged += 1
+
+        if not owner:
+            deadline = time.monotonic() + timeout
+            while not flight["done"].wait(min(WAIT_POLL_SECONDS, max(0.0, deadline - time.monotonic()))):
+                if cancel is not None and cancel.is_cancelled():
+                    return None, "merged"
+                if time.monotonic() >= deadline:
+                    with self._lock:
+                        self.wait_timeouts += 1
+                    print(f"[CACHE] Gave up waiting for {key[:12]} after {timeout}s", file=sys.stderr)
+                    return None, "timeout"
+            cached = self.get(key)
+            if cached is None and flight["result"] is not None:
+                # 캐시에 저장되지 않은 결과: 합류한 요청마다 따로 고칠 수 있게 복사본을 넘김 ("files" 없음)
+                cached = dict(flight["result"])
+            return cached, "merged"
+
+        try:
+            result = compute()
+            # 합류한 요청에는 호출자가 고치기 전의 스냅샷을 넘김
+            flight["result"] = dict(result) if isinstance(result, dict) else result
+            if cacheable(result):
+                self.put(key, result, files_of(result) if files_of else None)
+            return result, "computed"
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight["done"].set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "merged": self.merged,
+                "wait_timeouts": self.wait_timeouts,
+                "evictions": self.evictions,
+                "inflight": len(self._inflight)
+            }
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""배경 제거 실행 스크립트 (SPAR3D_ENV에서 실행, transparent_background 필요)
+
+- 상주 모드: --serve <socket> 배경 제거기를 한 번만 로드하고 소켓으로 요청을 받음.
+  SPAR3D와 Trellis가 같은 RGBA 결과를 쓰도록 서버가 재구성 전에 따로 호출
+- 단발 모드: --input/--output 한 장 처리
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from progress import report_progress
+
+REMOVER_MODES = ("base", "fast", "base-nightly")
+
+
+def load_remover(mode, device):
+    from transparent_background import Remover
+    report_progress("model_load")
+    return Remover(mode=mode, device=device)
+
+
+# 한 모델을 여러 요청 스레드가 함께 쓰므로 추론은 순서대로
+REMOVER_LOCK = threading.Lock()
+
+
+def remove_background(remover, image_path, output_path=None):
+    """배경 제거 -> RGBA 이미지. output_path를 주면 PNG로 저장 (임시 파일에 쓴 뒤 교체)"""
+    original_image = Image.open(image_path).convert("RGB")
+    with REMOVER_LOCK:
+        rgba = remover.process(original_image, type='rgba')
+    if output_path:
+        tmp = f"{output_path}.{os.getpid()}.tmp.png"
+        rgba.save(tmp)
+        os.replace(tmp, output_path)
+    return rgba
+
+
+def serve(socket_path, mode, device):
+    from worker_ipc import serve as serve_requests
+
+    load_started = time.time()
+    remover = load_remover(mode, device)
+    load_seconds = time.time() - load_started
+
+    def handle_request(req):
+        if req.get("op") != "remove_background":
+            raise ValueError(f"알 수 없는 요청: {req.get('op')}")
+        try:
+            remove_background(remover, req["image_path"], req["output_path"])
+            return {"success": True, "output_path": req["output_path"], "mode": mode}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    serve_requests(socket_path, handle_request, info={"load_seconds": load_seconds, "mode": mode})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", help="Input image path")
+    parser.add_argument("--output", help="RGBA PNG output path")
+    parser.add_argument("--mode", default="base", choices=REMOVER_MODES)
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--serve", metavar="SOCKET_PATH", help="상주 워커 모드")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.mode, args.device)
+        sys.exit(0)
+    if not args.input or not args.output:
+        parser.error("--input and --output are required (or use --serve)")
+    remove_background(load_remover(args.mode, args.device), args.input, args.output)
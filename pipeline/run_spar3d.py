@@ -1,8 +1,11 @@
 import argparse
+import json
 import os
 import torch
 import sys
 import gc
+import threading
+import time
 from PIL import Image
 
 # [메모리 최적화]
@@ -15,89 +18,171 @@ os.environ["HUGGINGFACE_HUB_TOKEN"] = hf_token
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from progress import report_progress, reset_peak_memory, peak_memory
+from oom_ladder import SPAR3D_LADDER, run_ladder
+from run_remover import load_remover, remove_background
+
 try:
     from spar3d.system import SPAR3D
-    from transparent_background import Remover
 except ImportError:
     sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
     from spar3d.system import SPAR3D
-    from transparent_background import Remover
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("image_path", type=str)
-    parser.add_argument("--output-dir", type=str, required=True)
-    parser.add_argument("--device", type=str, default="cuda")
-    
-    # ✅ [컨트롤 타워] 모든 설정을 여기서 관리
-    parser.add_argument("--texture-resolution", type=int, default=4096) # 해상도
-    parser.add_argument("--remesh_option", type=str, default="triangle")
-    parser.add_argument("--reduction_count_type", type=str, default="vertex")
-    parser.add_argument("--target_count", type=int, default=50000) # 점 개수
+def load_models(device, with_remover=True):
+    """배경 제거기와 SPAR3D 모델 로드 (상주 모드에서는 한 번만 호출)
 
-    args = parser.parse_args()
-    os.makedirs(args.output_dir, exist_ok=True)
-    
-    torch.cuda.empty_cache()
-    gc.collect()
-    
-    print(f"[SPAR3D] Loading Model... (Res: {args.texture_resolution}, Verts: {args.target_count})")
-    
-    device = torch.device(args.device)
-    
+    상주 모드는 서버가 공용 배경 제거 워커(run_remover.py)의 결과를 넘겨주므로 배경 제거기를 미리 올리지 않음
+    """
+    report_progress("model_load")
     # 배경 제거기 로드
-    print(f"[SPAR3D] Removing Background...")
-    remover = Remover(mode='base', device='cuda')
+    remover = load_remover('base', device) if with_remover else None
     
     # 3D 모델 로드
     model = SPAR3D.from_pretrained(
         "stabilityai/stable-point-aware-3d",
         config_name="config.yaml",
         weight_name="model.safetensors"
-    ).to(device)
+    ).to(torch.device(device))
     model.eval()
-    
-    print(f"[SPAR3D] Processing Image from {args.image_path}...")
-    
-    # 배경 제거 실행
-    original_image = Image.open(args.image_path).convert("RGB")
-    input_image = remover.process(original_image, type='rgba')
-    
+    return model, remover
+
+
+
+def generate_mesh(model, input_image, texture_resolution, remesh_option, target_count,
+                  reduction_count_type="vertex"):
+    """배경이 제거된 이미지 -> 3D 메쉬 (run_image 안에서 추론, remesh, 텍스처 베이킹이 한 번에 진행됨)"""
     # 옵션 매핑
-    if args.reduction_count_type == "vertex":
-        vertex_count = args.target_count
-    elif args.reduction_count_type == "faces":
-        vertex_count = args.target_count // 2
+    if reduction_count_type == "vertex":
+        vertex_count = target_count
+    elif reduction_count_type == "faces":
+        vertex_count = target_count // 2
     else:
         vertex_count = -1 
 
-    print(f"[SPAR3D] Generating 3D Mesh...")
-    
-    try:
-        with torch.no_grad():
-            with torch.amp.autocast('cuda'): 
-                result = model.run_image(
-                    input_image, 
-                    bake_resolution=args.texture_resolution,
-                    remesh=args.remesh_option,
-                    vertex_count=vertex_count
-                )
-    except RuntimeError as e:
-        if "out of memory" in str(e):
-            print("⚠️ OOM Error! Still running out of memory.")
-            torch.cuda.empty_cache()
-            raise e
-        else:
-            raise e
+    print(f"[SPAR3D] Generating 3D Mesh (Res: {texture_resolution}, Remesh: {remesh_option}, Verts: {target_count})...")
+    report_progress("inference", includes=["remesh", "texture_bake"])
+    with torch.no_grad():
+        with torch.amp.autocast('cuda'): 
+            result = model.run_image(
+                input_image, 
+                bake_resolution=texture_resolution,
+                remesh=remesh_option,
+                vertex_count=vertex_count
+            )
     
     if isinstance(result, tuple):
-        mesh = result[0]
+        return result[0]
+    return result
+
+
+def reconstruct(model, remover, image_path, save_path, ladder=SPAR3D_LADDER, rgba_path=None):
+    """배경 제거 -> 3D 메쉬 생성 -> GLB 저장 (rgba_path가 있으면 배경 제거를 건너뜀)
+
+    remover: 배경 제거기 또는 필요할 때 불러오는 함수 (rgba_path가 있으면 호출하지 않음)
+    ladder: generate_mesh 설정 목록. OOM이면 다음 설정으로 다시 생성 (oom_ladder.py)
+    반환: (save_path, 성공한 단계 보고서)
+    """
+    print(f"[SPAR3D] Processing Image from {image_path}...")
+    
+    if rgba_path and os.path.exists(rgba_path):
+        print(f"[SPAR3D] Using background-removed image {rgba_path}")
+        input_image = Image.open(rgba_path).convert("RGBA")
     else:
-        mesh = result
+        # 배경 제거 실행
+        print(f"[SPAR3D] Removing Background...")
+        report_progress("background_removal")
+        input_image = remove_background(remover() if callable(remover) else remover, image_path)
+    
+    mesh, fallback = run_ladder(ladder, lambda settings: generate_mesh(model, input_image, **settings))
     
-    save_path = os.path.join(args.output_dir, "mesh.glb")
+    report_progress("glb_export")
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
     mesh.export(save_path)
-    print(f"[SPAR3D] Success! Saved to {save_path}")
+    print(f"[SPAR3D] Success! Saved to {save_path} (rung {fallback['rung']}: {fallback['settings']})")
+    return save_path, fallback
+
+
+def serve(socket_path, device):
+    """상주 모드: 모델과 배경 제거기를 한 번만 로드하고 소켓으로 작업을 받음"""
+    from worker_ipc import serve as serve_requests, client_gone
+    
+    print(f"[SPAR3D] Loading Model (resident mode)...")
+    load_started = time.time()
+    model, _ = load_models(device, with_remover=False)
+    load_seconds = time.time() - load_started
+    lock = threading.Lock()
+    remover = []
+
+    def get_remover():
+        # 공용 배경 제거 결과 없이 요청이 온 경우(배경 제거 워커 장애 등)에만 로드
+        if not remover:
+            remover.append(load_remover('base', device))
+        return remover[0]
+    
+    def handle_request(req):
+        if req.get("op") != "reconstruct":
+            raise ValueError(f"알 수 없는 요청: {req.get('op')}")
+        # GPU 하나에 모델 하나이므로 작업은 순서대로 처리
+        with lock:
+            if client_gone():
+                # 잠금을 기다리는 동안 취소된 요청
+                return {"success": False, "error": "취소된 요청"}
+            reset_peak_memory()
+            try:
+                mesh_path, fallback = reconstruct(
+                    model, get_remover, req["image_path"], req["mesh_path"],
+                    ladder=req.get("ladder") or SPAR3D_LADDER,
+                    rgba_path=req.get("rgba_path")
+                )
+                return {"success": True, "mesh_path": mesh_path, "peak_memory": peak_memory(),
+                        "oom_fallback": fallback}
+            except Exception as e:
+                return {"success": False, "error": str(e), "peak_memory": peak_memory(),
+                        "oom_fallback": getattr(e, "oom_fallback", None)}
+            finally:
+                # 프로세스를 재시작하는 대신 작업 사이에 캐시된 할당만 해제
+                gc.collect()
+                torch.cuda.empty_cache()
+    
+    serve_requests(socket_path, handle_request, info={"load_seconds": load_seconds})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image_path", type=str, nargs="?")
+    parser.add_argument("--output-dir", type=str)
+    parser.add_argument("--device", type=str, default="cuda")
+    parser.add_argument("--serve", type=str, metavar="SOCKET_PATH", help="상주 워커 모드")
+    
+    # ✅ [컨트롤 타워] 모든 설정을 여기서 관리
+    parser.add_argument("--texture-resolution", type=int, default=4096) # 해상도
+    parser.add_argument("--remesh_option", type=str, default="triangle")
+    parser.add_argument("--reduction_count_type", type=str, default="vertex")
+    parser.add_argument("--target_count", type=int, default=50000) # 점 개수
+    parser.add_argument("--ladder", type=json.loads,
+                        help="OOM fallback 설정 목록 (JSON, 주면 위의 개별 설정 대신 사용)")
+
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.device)
+        return
+    if not args.image_path or not args.output_dir:
+        parser.error("image_path and --output-dir are required (or use --serve)")
+    os.makedirs(args.output_dir, exist_ok=True)
+    
+    torch.cuda.empty_cache()
+    gc.collect()
+    
+    ladder = args.ladder or [{
+        "texture_resolution": args.texture_resolution,
+        "remesh_option": args.remesh_option,
+        "reduction_count_type": args.reduction_count_type,
+        "target_count": args.target_count
+    }]
+    print(f"[SPAR3D] Loading Model... (Res: {ladder[0]['texture_resolution']}, Verts: {ladder[0]['target_count']})")
+    model, remover = load_models(args.device)
+    
+    reconstruct(model, remover, args.image_path, os.path.join(args.output_dir, "mesh.glb"), ladder=ladder)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
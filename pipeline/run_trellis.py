@@ -1,101 +1,203 @@
 #!/usr/bin/env python3
-"""Trellis 3D 재구성 실행 스크립트"""
+"""Trellis 3D 재구성 실행 스크립트 (TRELLIS_ENV에서 실행)
+
+- 단발 모드: --input/--output_dir 한 장을 이 프로세스 안에서 추론과 GLB 변환 (OOM fallback, 단계별 진행/메모리 보고)
+- 단발 모드 + --script: TRELLIS.2의 trellis2_run.py를 그대로 실행 (OOM fallback/진행 보고 없음)
+- 상주 모드: --serve <socket> 파이프라인을 한 번만 로드하고 소켓으로 작업을 받음
+
+결과 JSON은 --result_file에 기록합니다.
+모델 로드와 후처리(mesh.simplify -> o_voxel.postprocess.to_glb -> glb.export)는 TRELLIS.2 README의 예제와 같은 순서/인자를
+쓰고, 설정값은 oom_ladder.TRELLIS_LADDER가 정합니다 (첫 단계는 예제의 값, 둘째 단계는 이 스크립트가 원래 쓰던 메모리 절약 값).
+"""
 import argparse
-import sys
+import gc
 import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from progress import report_progress, reset_peak_memory, peak_memory
+from oom_ladder import TRELLIS_LADDER, run_ladder
+
+TRELLIS2_DIR = os.environ.get("TRELLIS_DIR", "/workspace/tobigs/TRELLIS.2")
+TRELLIS2_SCRIPT = os.path.join(TRELLIS2_DIR, "trellis2_run.py")
+TRELLIS2_MODEL = os.environ.get("TRELLIS_MODEL", "microsoft/TRELLIS.2-4B")
+HF_CACHE = os.environ.get("HF_HOME", "/workspace/tobigs/.hf_cache")
+
+
+def setup_env():
+    """torch/trellis2 import 전에 필요한 환경 변수와 경로 설정"""
+    os.environ.setdefault("ATTN_BACKEND", "xformers")
+    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+    os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+    # HuggingFace 캐시 경로
+    os.makedirs(HF_CACHE, exist_ok=True)
+    os.environ.setdefault("HF_HOME", HF_CACHE)
+    os.environ.setdefault("TRANSFORMERS_CACHE", f"{HF_CACHE}/transformers")
+    os.environ.setdefault("HF_DATASETS_CACHE", HF_CACHE)
+    os.environ.setdefault("HF_HUB_CACHE", HF_CACHE)
+    os.environ.setdefault("HUGGINGFACE_HUB_CACHE", HF_CACHE)
+    # 토큰
+    hf_token = os.environ.get("HF_TOKEN") or os.environ.get("HUGGINGFACE_HUB_TOKEN")
+    if hf_token:
+        os.environ["HF_TOKEN"] = hf_token
+        os.environ["HUGGINGFACE_HUB_TOKEN"] = hf_token
+    if TRELLIS2_DIR not in sys.path:
+        sys.path.insert(0, TRELLIS2_DIR)
+
+
+def load_pipeline():
+    from trellis2.pipelines import Trellis2ImageTo3DPipeline
+    report_progress("model_load")
+    print(f"[INFO] Loading {TRELLIS2_MODEL}...", file=sys.stderr)
+    pipe = Trellis2ImageTo3DPipeline.from_pretrained(TRELLIS2_MODEL)
+    pipe.cuda()
+    return pipe
+
+
+def export_glb(mesh, glb_output, simplify_target, decimation_target, texture_size, remesh):
+    """simplify -> GLB 변환 (to_glb 안에서 decimation과 텍스처 베이킹이 함께 진행됨)"""
+    import o_voxel
+
+    if hasattr(mesh, "simplify"):
+        report_progress("remesh")
+        mesh.simplify(simplify_target)
+
+    print(f"[INFO] Exporting GLB (simplify {simplify_target}, decimation {decimation_target}, "
+          f"texture {texture_size}, remesh {remesh})...", file=sys.stderr)
+    report_progress("glb_export", includes=["texture_bake"])
+    glb = o_voxel.postprocess.to_glb(
+        vertices=mesh.vertices,
+        faces=mesh.faces,
+        attr_volume=mesh.attrs,
+        coords=mesh.coords,
+        attr_layout=mesh.layout,
+        voxel_size=mesh.voxel_size,
+        aabb=[[-0.5, -0.5, -0.5], [0.5, 0.5, 0.5]],
+        decimation_target=decimation_target,
+        texture_size=texture_size,
+        remesh=remesh,
+        remesh_band=1 if remesh else 0,
+        remesh_project=0,
+        verbose=False
+    )
+    glb.export(glb_output, extension_webp=False)
+
+
+def reconstruct(pipe, image_path, output_dir, rgba_path=None, ladder=TRELLIS_LADDER):
+    """추론 -> simplify -> GLB 변환을 한 프로세스 안에서 수행
+
+    rgba_path: 서버가 미리 배경을 제거한 이미지. 알파 채널이 있으면 파이프라인 전처리가 배경 제거를 건너뜀
+    ladder: export_glb 설정 목록. 변환 중 OOM이면 추론 결과는 그대로 두고 다음 설정으로 다시 변환 (oom_ladder.py)
+    """
+    import torch
+    from PIL import Image
+
+    if rgba_path and os.path.exists(rgba_path):
+        print(f"[INFO] Using background-removed image {rgba_path}", file=sys.stderr)
+        img = Image.open(rgba_path).convert("RGBA")
+    else:
+        img = Image.open(image_path)
+    report_progress("inference")
+    out = pipe.run(img)
+    mesh = out[0] if isinstance(out, (list, tuple)) else out
+
+    print(f"[INFO] Inference complete. GPU Memory Used: {torch.cuda.memory_allocated(0) / 1024**3:.2f} GB", file=sys.stderr)
+
+    # GPU 메모리 정리 (GLB 변환 전)
+    print(f"[INFO] Clearing GPU cache for GLB export...", file=sys.stderr)
+    torch.cuda.empty_cache()
+    gc.collect()
+
+    os.makedirs(output_dir, exist_ok=True)
+    glb_output = os.path.join(output_dir, "mesh.glb")
+    _, fallback = run_ladder(ladder, lambda settings: export_glb(mesh, glb_output, **settings))
+    return {"success": True, "mesh_path": glb_output, "oom_fallback": fallback}
+
+
+def run_job(pipe, image_path, output_dir, rgba_path=None, ladder=TRELLIS_LADDER):
+    """작업 하나 실행. 실패해도 예외 대신 결과 dict를 돌려주고, 다음 작업을 위해 캐시 메모리 해제"""
+    import torch
+    reset_peak_memory()
+    try:
+        result = reconstruct(pipe, image_path, output_dir, rgba_path, ladder)
+    except Exception as e:
+        result = {"success": False, "error": str(e), "oom_fallback": getattr(e, "oom_fallback", None)}
+    result["peak_memory"] = peak_memory()
+    gc.collect()
+    torch.cuda.empty_cache()
+    return result
+
+
+def run_script(image_path, output_dir):
+    """기존 trellis2_run.py로 한 장 처리 (--out_prefix <output_dir>/mesh -> mesh.glb). OOM fallback 사다리는 적용되지 않음"""
+    os.makedirs(output_dir, exist_ok=True)
+    glb_output = os.path.join(output_dir, "mesh.glb")
+    cmd = [sys.executable, TRELLIS2_SCRIPT, "--input", image_path, "--out_prefix", os.path.join(output_dir, "mesh")]
+    print(f"[INFO] Running: {' '.join(cmd)}", file=sys.stderr)
+    report_progress("inference", includes=["model_load", "remesh", "glb_export"])
+    # 스크립트의 출력은 이 프로세스의 로그로 그대로 보냄 (stdout은 결과 JSON 전용이므로 stderr로)
+    returncode = subprocess.run(cmd, cwd=TRELLIS2_DIR, stdout=sys.stderr).returncode
+    if returncode != 0:
+        return {"success": False, "error": f"trellis2_run.py 종료 코드 {returncode}"}
+    if not os.path.exists(glb_output):
+        return {"success": False, "error": f"trellis2_run.py가 {glb_output}을 만들지 않았습니다"}
+    return {"success": True, "mesh_path": glb_output}
+
+
+def serve(socket_path):
+    """상주 모드: 파이프라인을 메모리에 유지하고 작업을 순서대로 처리"""
+    from worker_ipc import serve as serve_requests, client_gone
+
+    load_started = time.time()
+    pipe = load_pipeline()
+    load_seconds = time.time() - load_started
+    lock = threading.Lock()
+
+    def handle_request(req):
+        if req.get("op") != "reconstruct":
+            raise ValueError(f"알 수 없는 요청: {req.get('op')}")
+        with lock:
+            if client_gone():
+                # 잠금을 기다리는 동안 취소된 요청
+                return {"success": False, "error": "취소된 요청"}
+            return run_job(pipe, req["image_path"], req["output_dir"], req.get("rgba_path"),
+                           req.get("ladder") or TRELLIS_LADDER)
+
+    serve_requests(socket_path, handle_request, info={"load_seconds": load_seconds})
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input", required=True, help="Input image path")
-    parser.add_argument("--output_dir", required=True, help="Output directory")
+    parser.add_argument("--input", help="Input image path")
+    parser.add_argument("--output_dir", help="Output directory")
+    parser.add_argument("--rgba", help="배경을 제거한 RGBA 이미지 (있으면 배경 제거 생략)")
+    parser.add_argument("--result_file", help="결과 JSON을 기록할 경로 (stdout 로그와 분리)")
+    parser.add_argument("--serve", metavar="SOCKET_PATH", help="상주 워커 모드")
+    parser.add_argument("--script", action="store_true",
+                        help="이 프로세스 대신 trellis2_run.py로 처리 (--rgba, --ladder는 무시)")
+    parser.add_argument("--ladder", type=json.loads, help="OOM fallback 설정 목록 (JSON, 기본값 oom_ladder.TRELLIS_LADDER)")
     args = parser.parse_args()
 
+    setup_env()
+    if args.serve:
+        serve(args.serve)
+        sys.exit(0)
+    if not args.input or not args.output_dir:
+        parser.error("--input and --output_dir are required (or use --serve)")
+
     try:
-        import os
-        import subprocess
-        import sys
-        # 경로 세팅
-        trellis2_dir = "/workspace/tobigs/TRELLIS.2"
-        trellis2_script = os.path.join(trellis2_dir, "trellis2_run.py")
-        conda_prefix = "/workspace/tobigs/miniconda3"
-        conda_env = "trellis311"
-        # 환경 변수 세팅
-        env = os.environ.copy()
-        env["ATTN_BACKEND"] = "xformers"
-        env["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
-        env["OPENCV_IO_ENABLE_OPENEXR"] = "1"
-        # HuggingFace 캐시 경로
-        hf_cache = "/workspace/tobigs/.hf_cache"
-        os.makedirs(hf_cache, exist_ok=True)
-        env["HF_HOME"] = hf_cache
-        env["TRANSFORMERS_CACHE"] = f"{hf_cache}/transformers"
-        env["HF_DATASETS_CACHE"] = hf_cache
-        env["HF_HUB_CACHE"] = hf_cache
-        env["HUGGINGFACE_HUB_CACHE"] = hf_cache
-        # 토큰
-        hf_token = env.get("HF_TOKEN") or env.get("HUGGINGFACE_HUB_TOKEN")
-        env["HUGGINGFACE_HUB_TOKEN"] = hf_token
-        env["HF_TOKEN"] = hf_token
-
-        # miniconda 환경의 python을 직접 실행
-        trellis_python = "/workspace/tobigs/miniconda3/envs/trellis311/bin/python"
-        cmd = [
-            trellis_python,
-            trellis2_script,
-            "--input", args.input,
-            "--out_prefix", os.path.join(args.output_dir, "mesh")
-        ]
-        print(f"[INFO] Running: {' '.join(cmd)}", file=sys.stderr)
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True, cwd=trellis2_dir)
-        print(result.stdout)
-        if result.returncode != 0:
-            print(result.stderr, file=sys.stderr)
-            print(json.dumps({"success": False, "error": result.stderr}), file=sys.stderr)
-            sys.exit(1)
-        # mesh.glb 경로 반환
-        glb_path = os.path.join(args.output_dir, "mesh.glb")
-        print(json.dumps({"success": True, "mesh_path": glb_path}))
-        with torch.cuda.device(device):
-            out = pipe.run(img)
-        
-        mesh = out[0] if isinstance(out, (list, tuple)) else out
-        
-        print(f"[INFO] Inference complete. GPU Memory Used: {torch.cuda.memory_allocated(0) / 1024**3:.2f} GB", file=sys.stderr)
-        
-        # GPU 메모리 정리 (GLB 변환 전)
-        print(f"[INFO] Clearing GPU cache for GLB export...", file=sys.stderr)
-        torch.cuda.empty_cache()
-        import gc
-        gc.collect()
-        
-        # Simplify mesh (더 적극적으로)
-        if hasattr(mesh, "simplify"):
-            mesh.simplify(8388608)  # 16M -> 8M (메모리 절약)
-        
-        # Export GLB
-        os.makedirs(args.output_dir, exist_ok=True)
-        glb_output = os.path.join(args.output_dir, "mesh.glb")
-        
-        print(f"[INFO] Exporting GLB (memory-optimized settings)...", file=sys.stderr)
-        glb = o_voxel.postprocess.to_glb(
-            vertices=mesh.vertices,
-            faces=mesh.faces,
-            attr_volume=mesh.attrs,
-            coords=mesh.coords,
-            attr_layout=mesh.layout,
-            voxel_size=mesh.voxel_size,
-            aabb=[[-0.5, -0.5, -0.5], [0.5, 0.5, 0.5]],
-            decimation_target=500_000,  # 1M -> 500K (메모리 절약)
-            texture_size=2048,  # 4096 -> 2048 (메모리 절약)
-            remesh=False,  # remesh 비활성화 (메모리 많이 사용)
-            remesh_band=0,
-            remesh_project=0,
-            verbose=False
-        )
-        glb.export(glb_output, extension_webp=False)
-        
-        print(json.dumps({"success": True, "mesh_path": glb_output}))
-        
+        if args.script:
+            result = run_script(args.input, args.output_dir)
+        else:
+            result = run_job(load_pipeline(), args.input, args.output_dir, args.rgba, args.ladder or TRELLIS_LADDER)
     except Exception as e:
-        print(json.dumps({"success": False, "error": str(e)}), file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+        result = {"success": False, "error": str(e)}
+
+    if args.result_file:
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+    print(json.dumps(result, ensure_ascii=False))
+    sys.exit(0 if result.get("success") else 1)
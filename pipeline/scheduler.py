@@ -0,0 +1,210 @@
+"""GPU 자원 기반 재구성 작업 스케줄러
+
+- 장치별 메모리/슬롯 용량 안에 들어갈 때만 작업을 시작 (admission control)
+- 짧은 fast(SPAR3D) 작업을 긴 quality(Trellis) 작업보다 먼저 실행하되,
+  기다린 시간만큼 우선순위를 올려(aging) 긴 작업이 굶지 않도록 함
+- 맨 앞 작업이 자리가 없어 막히면 그 작업이 들어갈 장치를 예약하고,
+  예약 시각 전에 끝나는 작업만 그 장치에 끼워 넣음 (backfill)
+- 대기 작업마다 예상 시작 시각을 계산
+- 원격 재구성 워커는 등록/해제될 때 장치로 추가/제거되며, 지원하는 모드의 작업만 배정됨
+- 장치마다 모드별 상주 워커(SPAR3D/Trellis)가 하나씩이고 요청을 순서대로 처리하므로,
+  같은 모드의 작업은 장치당 per_device개까지만 실행 (워커 잠금을 기다리다 시간 초과되는 일이 없도록)
+
+장치 용량과 작업 시간은 모두 주입 가능하므로 GPU 없는 환경에서도 가짜 장치로 동작을 확인할 수 있습니다.
+"""
+
+import threading
+import time
+
+# 모드별 GPU 메모리 사용량, 예상 소요 시간, 장치당 동시 실행 수 (상주 워커 동시 처리 수)
+MODE_PROFILES = {
+    "fast": {"memory_gb": 12, "expected_seconds": 60, "per_device": 1},
+    "quality": {"memory_gb": 24, "expected_seconds": 600, "per_device": 1},
+}
+
+
+class GpuScheduler:
+    def __init__(self, devices, profiles=None, aging_rate=1.0, clock=time.time):
+        """devices: [{"id": "0", "memory_gb": 32, "slots": 2}, ...] ("modes"가 있으면 그 모드의 작업만 실행)
+
+        aging_rate: 1초 기다릴 때마다 우선순위 점수(예상 소요 초)에서 빼는 값
+        """
+        self.devices = {}
+        for d in devices:
+            self.devices[str(d["id"])] = self._device(d["memory_gb"], d.get("slots", 1), d.get("modes"))
+        self.profiles = profiles or MODE_PROFILES
+        self.aging_rate = aging_rate
+        self.clock = clock
+        self._running = {}  # job_id -> {"device", "mode", "memory_gb", "started_at", "expected_seconds"}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _device(memory_gb, slots, modes):
+        return {"memory_gb": memory_gb, "slots": slots, "modes": tuple(modes) if modes else None}
+
+    def add_device(self, device_id, memory_gb, slots=1, modes=None):
+        """장치 추가 (같은 id가 있으면 용량/모드 갱신). 실행 중 작업의 배정은 그대로 유지"""
+        with self._lock:
+            self.devices[str(device_id)] = self._device(memory_gb, slots, modes)
+
+    def remove_device(self, device_id):
+        """장치 제거: 이후 새 작업을 배정하지 않음 (이미 실행 중인 작업은 release()될 때까지 기록이 남음)"""
+        with self._lock:
+            return self.devices.pop(str(device_id), None) is not None
+
+    def supports(self, device_id, mode):
+        device = self.devices.get(device_id)
+        return device is not None and (device["modes"] is None or mode in device["modes"])
+
+    def profile(self, mode):
+        return self.profiles.get(mode, self.profiles["fast"])
+
+    def priority(self, job, now):
+        """낮을수록 먼저 실행: 예상 소요 시간 - 대기 시간 * aging_rate"""
+        waited = now - job["created_at"]
+        return self.profile(job["model"])["expected_seconds"] - waited * self.aging_rate
+
+    def order(self, jobs, now=None):
+        now = self.clock() if now is None else now
+        return sorted(jobs, key=lambda job: (self.priority(job, now), job["created_at"]))
+
+    def _usage_locked(self, device_id):
+        allocations = [r for r in self._running.values() if r["device"] == device_id]
+        return sum(r["memory_gb"] for r in allocations), len(allocations)
+
+    def _mode_limit(self, mode):
+        return self.profile(mode).get("per_device")
+
+    def _fits_locked(self, device_id, memory_gb, mode):
+        if not self.supports(device_id, mode):
+            return False
+        device = self.devices[device_id]
+        used, count = self._usage_locked(device_id)
+        if count >= device["slots"]:
+            return False
+        limit = self._mode_limit(mode)
+        if limit is not None and sum(1 for r in self._running.values()
+                                     if r["device"] == device_id and r["mode"] == mode) >= limit:
+            return False
+        # 어떤 장치보다도 큰 작업은 장치가 완전히 비었을 때 단독으로 실행
+        if memory_gb > device["memory_gb"]:
+            return count == 0
+        return used + memory_gb <= device["memory_gb"]
+
+    def _place_locked(self, memory_gb, mode):
+        """들어갈 수 있는 장치 중 남는 메모리가 가장 적은 곳 (best-fit)"""
+        candidates = [d for d in self.devices if self._fits_locked(d, memory_gb, mode)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda d: self.devices[d]["memory_gb"] - self._usage_locked(d)[0])
+
+    def pick(self, pending_jobs):
+        """지금 시작할 작업과 장치 (없으면 (None, None)). 반환된 작업은 바로 실행 중으로 기록됨"""
+        with self._lock:
+            now = self.clock()
+            reservation = None
+            for job in self.order(pending_jobs, now):
+                profile = self.profile(job["model"])
+                device_id = self._place_locked(profile["memory_gb"], job["model"])
+                if device_id is not None and reservation is not None:
+                    reserved_device, reserved_start = reservation
+                    # 막힌 앞 작업의 예약 장치에는 예약 시각 전에 끝나는 작업만 끼워 넣음
+                    if device_id == reserved_device and now + profile["expected_seconds"] > reserved_start:
+                        others = [d for d in self.devices
+                                  if d != reserved_device and self._fits_locked(d, profile["memory_gb"], job["model"])]
+                        device_id = others[0] if others else None
+                if device_id is not None:
+                    self._running[job["job_id"]] = {
+                        "device": device_id,
+                        "mode": job["model"],
+                        "memory_gb": profile["memory_gb"],
+                        "started_at": now,
+                        "expected_seconds": profile["expected_seconds"]
+                    }
+                    return job, device_id
+                if reservation is None:
+                    reservation = self._earliest_slot_locked(profile["memory_gb"], job["model"], now)
+            return None, None
+
+    def release(self, job_id):
+        with self._lock:
+            self._running.pop(job_id, None)
+
+    def _allocations_locked(self, now):
+        """실행 중 작업의 예상 점유 구간 (예상 시간을 넘긴 작업은 곧 끝난다고 가정, 제거된 장치의 작업은 제외)"""
+        allocations = {d: [] for d in self.devices}
+        for r in self._running.values():
+            if r["device"] not in allocations:
+                continue
+            end = max(r["started_at"] + r["expected_seconds"], now + 1)
+            allocations[r["device"]].append((now, end, r["memory_gb"], r["mode"]))
+        return allocations
+
+    def _fits_interval(self, device_id, allocations, start, duration, memory_gb, mode):
+        device = self.devices[device_id]
+        limit = self._mode_limit(mode)
+        end = start + duration
+        points = [start] + [a[0] for a in allocations if start < a[0] < end]
+        for t in points:
+            active = [a for a in allocations if a[0] <= t < a[1]]
+            if len(active) >= device["slots"]:
+                return False
+            if limit is not None and sum(1 for a in active if a[3] == mode) >= limit:
+                return False
+            used = sum(a[2] for a in active)
+            if memory_gb > device["memory_gb"]:
+                if active:
+                    return False
+            elif used + memory_gb > device["memory_gb"]:
+                return False
+        return True
+
+    def _simulate_locked(self, allocations, memory_gb, mode, duration, now):
+        """allocations 위에서 작업이 가장 일찍 시작할 수 있는 (장치, 시각). 이 모드를 실행할 장치가 없으면 None"""
+        best = None
+        for device_id, device_allocations in allocations.items():
+            if not self.supports(device_id, mode):
+                continue
+            candidates = sorted({now} | {a[1] for a in device_allocations if a[1] > now})
+            for t in candidates:
+                if self._fits_interval(device_id, device_allocations, t, duration, memory_gb, mode):
+                    if best is None or t < best[1]:
+                        best = (device_id, t)
+                    break
+        return best
+
+    def _earliest_slot_locked(self, memory_gb, mode, now):
+        return self._simulate_locked(self._allocations_locked(now), memory_gb, mode, 0, now)
+
+    def estimate_start_times(self, pending_jobs):
+        """대기 작업별 예상 시작 시각 {job_id: epoch seconds} (우선순위 순서대로 배치했다고 가정)"""
+        with self._lock:
+            now = self.clock()
+            allocations = self._allocations_locked(now)
+            estimates = {}
+            for job in self.order(pending_jobs, now):
+                profile = self.profile(job["model"])
+                placed = self._simulate_locked(allocations, profile["memory_gb"], job["model"],
+                                               profile["expected_seconds"], now)
+                if placed is None:
+                    estimates[job["job_id"]] = None
+                    continue
+                device_id, start = placed
+                allocations[device_id].append((start, start + profile["expected_seconds"], profile["memory_gb"],
+                                               job["model"]))
+                estimates[job["job_id"]] = start
+            return estimates
+
+    def snapshot(self):
+        with self._lock:
+            devices = {}
+            for device_id, device in self.devices.items():
+                used, count = self._usage_locked(device_id)
+                devices[device_id] = {
+                    "memory_gb": device["memory_gb"],
+                    "memory_used_gb": used,
+                    "slots": device["slots"],
+                    "modes": list(device["modes"]) if device["modes"] else None,
+                    "running": count
+                }
+            return {"devices": devices, "running": {k: dict(v) for k, v in self._running.items()}}
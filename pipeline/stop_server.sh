@@ -2,5 +2,9 @@
 # pipeline_service 서버 종료 스크립트
 
 pkill -9 -f pipeline_server
+# 상주 워커는 별도 세션에서 실행되므로 따로 종료
+pkill -f "clip_filter.py --serve"
+pkill -f "run_spar3d.py --serve"
+pkill -f "run_trellis.py --serve"
 
 echo "pipeline_server.py 프로세스가 종료되었습니다."
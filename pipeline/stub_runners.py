@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""부하 테스트용 가짜 CLIP / SPAR3D / Trellis / 배경 제거 러너 (GPU, 모델 없이 CPU에서 실행)
+
+실제 러너와 같은 명령행과 소켓 프로토콜을 따르므로 pipeline_server.py가 그대로 사용할 수 있습니다.
+- 상주 모드: --serve SOCKET 하나로 filter / filter_batch / remove_background / reconstruct 요청을 모두 처리
+  (reconstruct 요청에 mesh_path가 있으면 SPAR3D, output_dir이 있으면 Trellis 형식)
+- 단발 모드: clip_filter.py / run.py(SPAR3D) / run_trellis.py와 같은 인자
+
+지연 시간, 메모리 사용량, 실패율은 환경 변수로 설정합니다 (STUB_DEFAULTS 참고).
+STUB_TEXTURE_LIMIT를 주면 텍스처 해상도가 그보다 큰 OOM 사다리 단계는 메모리 부족으로 실패합니다.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+
+from progress import report_progress, reset_peak_memory, peak_memory
+from oom_ladder import SPAR3D_LADDER, TRELLIS_LADDER, run_ladder
+
+STUB_DEFAULTS = {
+    "STUB_LOAD_MS": 500,        # 워커 기동 시 모델 로딩 시간
+    "STUB_CLIP_MS": 20,         # 배치 하나당 CLIP 추론 시간
+    "STUB_SPAR3D_MS": 2000,
+    "STUB_TRELLIS_MS": 8000,
+    "STUB_JITTER": 0.2,         # 지연 시간 ±비율
+    "STUB_MEMORY_MB": 64,       # 재구성 중 잡아 두는 메모리
+    "STUB_GLB_KB": 512,         # 생성하는 GLB 크기
+    "STUB_ACCEPT_RATE": 0.8,    # CLIP 합격 비율
+    "STUB_FAILURE_RATE": 0.0,   # 재구성 실패 비율 (결과 success: false)
+    "STUB_CRASH_RATE": 0.0,     # 재구성 중 프로세스가 죽는 비율 (워커 재시작 경로 확인용)
+    "STUB_TEXTURE_LIMIT": 0,    # 이보다 큰 텍스처 설정은 OOM (0이면 제한 없음, OOM fallback 확인용)
+}
+
+
+def setting(name):
+    return float(os.environ.get(name, STUB_DEFAULTS[name]))
+
+
+def simulate(ms):
+    jitter = setting("STUB_JITTER")
+    time.sleep(max(0.0, ms * random.uniform(1 - jitter, 1 + jitter)) / 1000)
+
+
+def write_glb(path, size_kb):
+    """삼각형 하나짜리 유효한 GLB에 버퍼를 덧붙여 size_kb 크기로 저장"""
+    positions = struct.pack("<9f", 0, 0, 0, 1, 0, 0, 0, 1, 0)
+    padding = max(0, int(size_kb * 1024) - len(positions) - 512)
+    binary = positions + bytes(padding)
+    binary += b"\0" * (-len(binary) % 4)
+    gltf = {
+        "asset": {"version": "2.0", "generator": "stub_runners"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0}}]}],
+        "accessors": [{"bufferView": 0, "componentType": 5126, "count": 3, "type": "VEC3",
+                       "min": [0, 0, 0], "max": [1, 1, 0]}],
+        "bufferViews": [{"buffer": 0, "byteOffset": 0, "byteLength": len(positions)}],
+        "buffers": [{"byteLength": len(binary)}],
+    }
+    json_chunk = json.dumps(gltf).encode("utf-8")
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    total = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sII", b"glTF", 2, total))
+        f.write(struct.pack("<I4s", len(json_chunk), b"JSON") + json_chunk)
+        f.write(struct.pack("<I4s", len(binary), b"BIN\0") + binary)
+
+
+def stub_embedding(image_path, dim=512):
+    """이미지 바이트로 정해지는 가짜 임베딩 (같은 이미지는 같은 벡터)"""
+    with open(image_path, "rb") as f:
+        rng = random.Random(hashlib.sha256(f.read()).hexdigest())
+    return [round(rng.gauss(0, 1) / dim ** 0.5, 5) for _ in range(dim)]
+
+
+def clip_verdict(image_path):
+    if not os.path.exists(image_path):
+        return {"status": "error", "reason": f"파일 없음: {image_path}"}
+    if random.random() < setting("STUB_ACCEPT_RATE"):
+        result = {"status": "accept", "reason": "3D 생성 진행 가능", "guide": "stub"}
+    else:
+        result = {"status": "reject", "reason": "배경에 구조물이 많음", "guide": "stub"}
+    result["embedding"] = stub_embedding(image_path)
+    return result
+
+
+def remove_background(image_path, output_path):
+    """배경 제거 흉내: 지연 후 입력 이미지를 그대로 복사"""
+    simulate(setting("STUB_SPAR3D_MS") * 0.1)
+    with open(image_path, "rb") as src, open(output_path, "wb") as dst:
+        dst.write(src.read())
+    return {"success": True, "output_path": output_path}
+
+
+def generate(model, settings):
+    """사다리 한 단계 흉내: 추론 지연/메모리를 흉내 내고, 텍스처가 STUB_TEXTURE_LIMIT보다 크면 OOM"""
+    report_progress("inference")
+    ballast = bytearray(int(setting("STUB_MEMORY_MB") * 1024 * 1024))
+    for i in range(0, len(ballast), 4096):
+        ballast[i] = 1  # 실제로 페이지를 잡도록 씀
+    simulate(setting("STUB_SPAR3D_MS" if model == "fast" else "STUB_TRELLIS_MS") * 0.8)
+    if random.random() < setting("STUB_CRASH_RATE"):
+        os._exit(137)
+    texture = settings.get("texture_resolution", settings.get("texture_size", 0))
+    limit = setting("STUB_TEXTURE_LIMIT")
+    if limit and texture > limit:
+        raise RuntimeError(f"CUDA out of memory (stub: texture {texture} > {limit:g})")
+
+
+def reconstruct(model, image_path, mesh_path, rgba_path=None, ladder=None):
+    """단계 이벤트를 보내며 지연/메모리를 흉내 내고 GLB를 씀"""
+    reset_peak_memory()
+    if model == "fast" and not (rgba_path and os.path.exists(rgba_path)):
+        report_progress("background_removal")
+        simulate(setting("STUB_SPAR3D_MS") * 0.1)
+    ladder = ladder or (SPAR3D_LADDER if model == "fast" else TRELLIS_LADDER)
+    try:
+        _, fallback = run_ladder(ladder, lambda settings: generate(model, settings))
+    except RuntimeError as e:
+        return {"success": False, "error": str(e), "peak_memory": peak_memory(),
+                "oom_fallback": getattr(e, "oom_fallback", None)}
+    report_progress("glb_export")
+    simulate(setting("STUB_SPAR3D_MS" if model == "fast" else "STUB_TRELLIS_MS") * 0.1)
+    if random.random() < setting("STUB_FAILURE_RATE"):
+        return {"success": False, "error": "stub failure", "peak_memory": peak_memory()}
+    if not os.path.exists(image_path):
+        return {"success": False, "error": f"입력 이미지 없음: {image_path}", "peak_memory": peak_memory()}
+    write_glb(mesh_path, setting("STUB_GLB_KB"))
+    return {"success": True, "mesh_path": mesh_path, "peak_memory": peak_memory(), "oom_fallback": fallback}
+
+
+def serve(socket_path):
+    from worker_ipc import serve as serve_requests, client_gone
+
+    load_started = time.time()
+    report_progress("model_load")
+    simulate(setting("STUB_LOAD_MS"))
+    load_seconds = time.time() - load_started
+    clip_lock = threading.Lock()
+    gpu_lock = threading.Lock()
+
+    def handle_request(req):
+        op = req.get("op")
+        if op in ("filter", "filter_batch"):
+            paths = [req["image_path"]] if op == "filter" else req["image_paths"]
+            with clip_lock:
+                simulate(setting("STUB_CLIP_MS"))
+                results = [clip_verdict(p) for p in paths]
+            return results[0] if op == "filter" else results
+        if op == "remove_background":
+            return remove_background(req["image_path"], req["output_path"])
+        if op == "reconstruct":
+            # 실제 워커처럼 GPU 하나에서 작업을 순서대로 처리
+            with gpu_lock:
+                if client_gone():
+                    return {"success": False, "error": "취소된 요청"}
+                if "mesh_path" in req:
+                    return reconstruct("fast", req["image_path"], req["mesh_path"], req.get("rgba_path"),
+                                       req.get("ladder"))
+                return reconstruct("quality", req["image_path"], os.path.join(req["output_dir"], "mesh.glb"),
+                                   ladder=req.get("ladder"))
+        raise ValueError(f"알 수 없는 요청: {op}")
+
+    serve_requests(socket_path, handle_request, info={"load_seconds": load_seconds})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image_path", nargs="?")
+    parser.add_argument("--serve", metavar="SOCKET_PATH")
+    # 단발 SPAR3D (run.py) 인자
+    parser.add_argument("--output-dir")
+    parser.add_argument("--texture-resolution", type=int, default=1024)
+    # 단발 Trellis (run_trellis.py) 인자
+    parser.add_argument("--input")
+    parser.add_argument("--output_dir")
+    parser.add_argument("--result_file")
+    parser.add_argument("--ladder", type=json.loads)
+    parser.add_argument("--script", action="store_true")
+    # 실제 러너가 받는 나머지 인자는 무시
+    args, _ = parser.parse_known_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+    simulate(setting("STUB_LOAD_MS"))
+    if args.input:
+        # --script: trellis2_run.py처럼 고정된 설정 하나로 실행 (OOM fallback 없음)
+        ladder = TRELLIS_LADDER[1:2] if args.script else args.ladder
+        result = reconstruct("quality", args.input, os.path.join(args.output_dir, "mesh.glb"), ladder=ladder)
+        if args.result_file:
+            with open(args.result_file, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+        print(json.dumps(result, ensure_ascii=False))
+        sys.exit(0 if result["success"] else 1)
+    if args.output_dir is not None:
+        # run.py처럼 설정 하나로 실행하고 실패하면 로그에 에러를 남김 (사다리는 서버가 단계마다 다시 실행)
+        result = reconstruct("fast", args.image_path, os.path.join(args.output_dir, "0", "mesh.glb"),
+                             ladder=[{"texture_resolution": args.texture_resolution}])
+        if not result["success"]:
+            print(f"Error: {result['error']}")
+        sys.exit(0 if result["success"] else 1)
+    if args.image_path:
+        simulate(setting("STUB_CLIP_MS"))
+        print(json.dumps(clip_verdict(args.image_path), ensure_ascii=False))
+        return
+    parser.error("image_path, --input or --serve is required")
+
+
+if __name__ == "__main__":
+    main()
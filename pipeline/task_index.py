@@ -0,0 +1,186 @@
+"""작업(task) 인덱스: WORKSPACE_DIR 안의 SQLite 파일에 task별 상태와 경로를 기록
+
+엔드포인트가 디스크를 뒤지지 않고(os.listdir / os.path.exists 탐색) 기본 키 조회 한 번으로
+입력 이미지, 단계, 결과 파일 경로를 찾을 수 있게 합니다.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    image_path TEXT,
+    image_hash TEXT,
+    image_bytes INTEGER,
+    stage TEXT NOT NULL,
+    filter_status TEXT,
+    model TEXT,
+    error TEXT,
+    timings TEXT,
+    disk_bytes INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    task_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    mesh_path TEXT NOT NULL,
+    mesh_bytes INTEGER,
+    cached INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (task_id, model)
+);
+CREATE INDEX IF NOT EXISTS tasks_stage ON tasks (stage, updated_at);
+CREATE INDEX IF NOT EXISTS tasks_accessed ON tasks (accessed_at);
+"""
+
+# 레거시 디렉토리 가져오기에 쓰는 모델별 결과 경로 (spar3d/sf3d는 이전 버전 이름)
+LEGACY_OUTPUTS = [
+    ("fast", os.path.join("fast_output", "0", "mesh.glb")),
+    ("quality", os.path.join("quality_output", "mesh.glb")),
+    ("fast", os.path.join("spar3d_output", "0", "mesh.glb")),
+    ("fast", os.path.join("sf3d_output", "0", "mesh.glb")),
+]
+
+TASK_FIELDS = ("image_path", "image_hash", "image_bytes", "stage", "filter_status", "model", "error", "disk_bytes")
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+class TaskIndex:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if "disk_bytes" not in columns:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN disk_bytes INTEGER")
+
+    def needs_import(self):
+        """기존 작업 디렉토리를 아직 가져오지 않았는지 (PRAGMA user_version으로 표시)"""
+        return self._execute("PRAGMA user_version")[0][0] == 0
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def create(self, task_id, image_path, image_hash=None, stage="uploaded"):
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO tasks (task_id, image_path, image_hash, image_bytes, stage, "
+            "created_at, updated_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (task_id, image_path, image_hash, _file_size(image_path), stage, now, now, now)
+        )
+
+    def update(self, task_id, timings=None, **fields):
+        """단계/필터 결과/오류 등 갱신. timings(dict)는 JSON으로 저장"""
+        unknown = set(fields) - set(TASK_FIELDS)
+        if unknown:
+            raise ValueError(f"알 수 없는 필드: {sorted(unknown)}")
+        if timings is not None:
+            fields["timings"] = json.dumps(timings, ensure_ascii=False)
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._execute(f"UPDATE tasks SET {assignments} WHERE task_id = ?", (*fields.values(), task_id))
+
+    def set_output(self, task_id, model, mesh_path, cached=False):
+        """재구성 결과 기록 + task를 completed로 표시"""
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO outputs (task_id, model, mesh_path, mesh_bytes, cached, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (task_id, model, mesh_path, _file_size(mesh_path), int(cached), now)
+                )
+                self._conn.execute(
+                    "UPDATE tasks SET stage = 'completed', model = ?, error = NULL, disk_bytes = NULL, updated_at = ? "
+                    "WHERE task_id = ?",
+                    (model, now, task_id)
+                )
+
+    def touch(self, task_id):
+        """마지막 사용 시각 갱신 (다운로드 등)"""
+        self._execute("UPDATE tasks SET accessed_at = ? WHERE task_id = ?", (time.time(), task_id))
+
+    def get(self, task_id):
+        """task 정보(dict, outputs 포함) 또는 None"""
+        rows = self._execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,))
+        if not rows:
+            return None
+        task = dict(rows[0])
+        task["timings"] = json.loads(task["timings"]) if task["timings"] else None
+        task["outputs"] = {
+            row["model"]: dict(row)
+            for row in self._execute("SELECT * FROM outputs WHERE task_id = ? ORDER BY created_at", (task_id,))
+        }
+        return task
+
+    def mesh_path(self, task_id, model=None):
+        """task의 결과 파일 경로 (model을 주지 않으면 가장 최근 결과)"""
+        if model:
+            rows = self._execute("SELECT mesh_path FROM outputs WHERE task_id = ? AND model = ?", (task_id, model))
+        else:
+            rows = self._execute(
+                "SELECT mesh_path FROM outputs WHERE task_id = ? ORDER BY created_at DESC LIMIT 1", (task_id,))
+        return rows[0]["mesh_path"] if rows else None
+
+    def delete(self, task_id):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute("DELETE FROM outputs WHERE task_id = ?", (task_id,))
+                self._conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def list_tasks(self, stages=None):
+        """GC용 task 목록 (오래 안 쓴 순서). stages를 주면 해당 단계만"""
+        sql = ("SELECT task_id, stage, filter_status, image_bytes, disk_bytes, updated_at, accessed_at, "
+               "MAX(updated_at, accessed_at) AS last_used FROM tasks")
+        params = ()
+        if stages:
+            sql += f" WHERE stage IN ({', '.join('?' for _ in stages)})"
+            params = tuple(stages)
+        return [dict(row) for row in self._execute(sql + " ORDER BY last_used", params)]
+
+    def stats(self):
+        rows = self._execute("SELECT stage, COUNT(*) AS n FROM tasks GROUP BY stage")
+        return {row["stage"]: row["n"] for row in rows}
+
+    def import_workspace(self, workspace_dir, find_image):
+        """인덱스가 없던 시절의 작업 디렉토리를 가져옴 (needs_import()가 참일 때 한 번만 호출)"""
+        imported = 0
+        for entry in os.scandir(workspace_dir):
+            if not entry.is_dir() or self.get(entry.name) is not None:
+                continue
+            image_path = find_image(entry.path)
+            if image_path is None:
+                continue
+            self.create(entry.name, image_path)
+            for model, rel in LEGACY_OUTPUTS:
+                mesh_path = os.path.join(entry.path, rel)
+                if os.path.exists(mesh_path) and self.mesh_path(entry.name, model) is None:
+                    self.set_output(entry.name, model, mesh_path)
+            mtime = entry.stat().st_mtime
+            self._execute("UPDATE tasks SET created_at = ?, updated_at = ?, accessed_at = ? WHERE task_id = ?",
+                          (mtime, mtime, mtime, entry.name))
+            imported += 1
+        self._execute("PRAGMA user_version = 1")
+        if imported:
+            print(f"[INDEX] Imported {imported} existing task(s) from {workspace_dir}", file=sys.stderr)
+        return imported
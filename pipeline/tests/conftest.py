@@ -0,0 +1,18 @@
+"""pipeline/ 모듈을 패키지 없이 import 하므로 (서버/러너와 같은 방식) pipeline/을 경로에 추가"""
+
+import os
+import sys
+
+import pytest
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """pipeline_server 모듈 (로드할 때 PIPELINE_SERVICE_DIR 아래에 작업/캐시 디렉토리를 만드므로 임시 디렉토리로)"""
+    pytest.importorskip("flask_cors")
+    os.environ["PIPELINE_SERVICE_DIR"] = str(tmp_path_factory.mktemp("service"))
+    import pipeline_server
+    return pipeline_server
@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("a2wsgi")
+pytest.importorskip("httpx")
+
+
+@pytest.fixture
+def client(server):
+    from starlette.testclient import TestClient
+    import async_server
+
+    with TestClient(async_server.create_app(start_services=False)) as client:
+        yield client
+
+
+@pytest.fixture
+def task_id(server, tmp_path):
+    task_id = f"async-{os.urandom(4).hex()}"
+    image_path = tmp_path / "input.png"
+    image_path.write_bytes(b"image")
+    server.TASK_INDEX.create(task_id, str(image_path))
+    yield task_id
+    server.TASK_INDEX.delete(task_id)
+
+
+def sse_stages(lines):
+    return [json.loads(line[len("data: "):])["stage"] for line in lines if line.startswith("data: ")]
+
+
+def test_health_and_metrics(client, server):
+    body = client.get("/api/health").json()
+    assert body["status"] == "ok" and "ready" in body["workers"]["clip"]
+    assert {"cache", "tasks", "jobs", "scheduler"} <= set(body)
+
+    server.observe_stage("inference", 1.5, "async-metrics", "fast")
+    text = client.get("/api/metrics")
+    assert text.headers["content-type"].startswith("text/plain")
+    assert "pipeline_stage_seconds" in text.text
+    assert client.get("/api/metrics?format=json&limit=x").json()["tasks"]["async-metrics"]["stages"]
+    assert client.get("/api/metrics?task_id=async-metrics").json()["stages"]["inference"] == pytest.approx(1.5)
+    assert client.get("/api/metrics?task_id=missing").status_code == 404
+
+
+def test_job_status_matches_flask(client, server, task_id):
+    job = server.JOB_QUEUE.submit(task_id, "fast")
+    try:
+        body = client.get(f"/api/jobs/{job['job_id']}").json()
+        assert body["job_id"] == job["job_id"] and body["status"] == "queued"
+        flask_body = server.app.test_client().get(f"/api/jobs/{job['job_id']}").get_json()
+        assert set(body) == set(flask_body)
+    finally:
+        server.JOB_QUEUE.cancel(job["job_id"])
+    assert client.get("/api/jobs/no-such-job").status_code == 404
+
+
+def test_events_stream_wakes_on_publish_and_ends_on_terminal(client, server, task_id):
+    server.PROGRESS.publish(task_id, "queued")
+
+    def publish_later():
+        server.PROGRESS.publish(task_id, "inference")
+        server.PROGRESS.publish(task_id, "done")
+
+    # 스트림이 기다리는 중(keep-alive 간격 전)에 다른 스레드에서 기록한 이벤트가 바로 전달되어야 함
+    timer = threading.Timer(0.2, publish_later)
+    timer.start()
+    response = client.get(f"/api/tasks/{task_id}/events")
+    timer.join()
+    assert response.headers["content-type"].startswith("text/event-stream")
+    lines = response.text.splitlines()
+    assert lines[0] == "retry: 3000" and ": keep-alive" not in lines
+    assert sse_stages(lines) == ["queued", "inference", "done"]
+
+    resumed = client.get(f"/api/tasks/{task_id}/events?last_event_id=2")
+    assert sse_stages(resumed.text.splitlines()) == ["done"]
+    assert client.get("/api/tasks/no-such-task/events").status_code == 404
+
+
+def test_upload_validation_and_flask_fallthrough(client):
+    assert client.post("/api/filter").status_code == 400
+    response = client.post("/api/process", files={"image": ("notes.txt", b"text", "text/plain")})
+    assert response.status_code == 400 and response.json()["error"]
+    # 비동기 경로가 없는 요청은 Flask 앱이 처리
+    assert client.get("/api/download/no-such-task").status_code == 404
@@ -0,0 +1,103 @@
+import os
+import types
+
+import pytest
+
+import bulk_ingest
+from bulk_ingest import Manifest, DONE, FAILED, REJECTED
+
+
+def write(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def fake_server(verdicts, fail=()):
+    """filter_images/run_reconstruction 대역 (파일 이름으로 판정, fail에 있는 이미지는 재구성 실패)"""
+    calls = {"filter": [], "reconstruct": []}
+
+    def filter_images(image_paths, image_hashes):
+        calls["filter"].extend(os.path.basename(p) for p in image_paths)
+        return [{"status": verdicts.get(os.path.basename(p), "accept")} for p in image_paths]
+
+    def run_reconstruction(model, image_path, work_dir, device=None, get_rgba=None):
+        calls["reconstruct"].append(os.path.basename(image_path))
+        if os.path.basename(image_path) in fail:
+            return {"success": False, "error": "boom"}
+        return {"success": True, "mesh_path": write(os.path.join(work_dir, "mesh.glb"), b"glb")}
+
+    ps = types.SimpleNamespace(
+        GPU_DEVICES=[{"id": "0", "memory_gb": 48, "slots": 2}],
+        filter_images=filter_images,
+        run_reconstruction=run_reconstruction,
+        remove_background=lambda *args: None,
+    )
+    return ps, calls
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    input_dir = tmp_path / "in"
+    for name in ("a.png", "sub/b.jpg", "sub/c.png", ".hidden/d.png", "notes.txt"):
+        write(input_dir / name, name.encode())
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    return str(input_dir), str(output_dir)
+
+
+def ingest(ps, input_dir, output_dir, retry_failed=False):
+    manifest = Manifest(os.path.join(output_dir, bulk_ingest.MANIFEST_NAME), input_dir, "fast")
+    rel_paths = bulk_ingest.find_images(input_dir, lambda name: name.endswith((".png", ".jpg")))
+    hashes = {p: open(os.path.join(input_dir, p), "rb").read().hex() for p in rel_paths}
+    to_filter, to_reconstruct = bulk_ingest.plan(manifest, rel_paths, hashes, "fast", retry_failed)
+    accepted = bulk_ingest.run_filter(ps, manifest, input_dir, to_filter, batch_size=2)
+    bulk_ingest.run_reconstructions(ps, manifest, input_dir, output_dir, to_reconstruct + accepted, "fast", 2)
+    return manifest
+
+
+def test_filters_then_reconstructs_accepted_images(dirs):
+    input_dir, output_dir = dirs
+    ps, calls = fake_server({"c.png": "reject"}, fail=("b.jpg",))
+    manifest = ingest(ps, input_dir, output_dir)
+    assert calls["filter"] == ["a.png", "b.jpg", "c.png"]
+    assert sorted(calls["reconstruct"]) == ["a.png", "b.jpg"]
+    items = manifest.items
+    assert items["a.png"]["status"] == DONE
+    assert open(items["a.png"]["mesh_path"], "rb").read() == b"glb"
+    assert items["a.png"]["mesh_path"] == bulk_ingest.mesh_destination(output_dir, "a.png", "fast")
+    assert items[os.path.join("sub", "b.jpg")]["status"] == FAILED
+    assert items[os.path.join("sub", "c.png")]["status"] == REJECTED
+    assert manifest.data["summary"] == {DONE: 1, FAILED: 1, REJECTED: 1}
+
+
+def test_rerun_resumes_and_only_retries_what_is_needed(dirs):
+    input_dir, output_dir = dirs
+    ps, _ = fake_server({"c.png": "error"}, fail=("b.jpg",))
+    ingest(ps, input_dir, output_dir)
+
+    # 다시 실행: 완료/실패/반려는 건너뛰고 필터 오류만 다시 판정
+    ps, calls = fake_server({})
+    manifest = ingest(ps, input_dir, output_dir)
+    assert calls["filter"] == ["c.png"] and calls["reconstruct"] == ["c.png"]
+    assert manifest.items[os.path.join("sub", "b.jpg")]["status"] == FAILED
+
+    # 실패 재시도와 내용이 바뀐 이미지의 재판정
+    write(os.path.join(input_dir, "a.png"), b"changed")
+    ps, calls = fake_server({})
+    manifest = ingest(ps, input_dir, output_dir, retry_failed=True)
+    assert calls["filter"] == ["a.png"]
+    assert sorted(calls["reconstruct"]) == ["a.png", "b.jpg"]
+    assert {item["status"] for item in manifest.items.values()} == {DONE}
+
+
+def test_reconstructs_again_when_mesh_is_missing(dirs):
+    input_dir, output_dir = dirs
+    ps, _ = fake_server({})
+    manifest = ingest(ps, input_dir, output_dir)
+    os.remove(manifest.items["a.png"]["mesh_path"])
+    ps, calls = fake_server({})
+    manifest = ingest(ps, input_dir, output_dir)
+    assert calls["filter"] == [] and calls["reconstruct"] == ["a.png"]
+    assert os.path.exists(manifest.items["a.png"]["mesh_path"])
@@ -0,0 +1,58 @@
+import importlib
+import os
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("clip")
+
+
+@pytest.fixture(scope="module")
+def clip_filter(tmp_path_factory):
+    """CPU에서 모델을 한 번 로드 (텍스트 임베딩 캐시는 임시 디렉토리에)"""
+    cache_dir = str(tmp_path_factory.mktemp("clip_text_cache"))
+    saved = {k: os.environ.get(k) for k in ("CLIP_TEXT_CACHE_DIR", "CLIP_DEVICE")}
+    os.environ.update(CLIP_TEXT_CACHE_DIR=cache_dir, CLIP_DEVICE="cpu")
+    try:
+        module = importlib.import_module("clip_filter")
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    assert module.TEXT_FEATURES_CACHE_DIR == cache_dir
+    return module
+
+
+def test_first_load_writes_cache(clip_filter):
+    path = clip_filter.text_features_path()
+    assert os.path.exists(path)
+    cached = np.load(path)
+    assert cached.shape == tuple(clip_filter.FINAL_TEXT_FEATURES.shape)
+    np.testing.assert_allclose(cached, clip_filter.encode_prompts().float().numpy(), atol=1e-5)
+
+
+def test_cached_features_skip_text_encoder(clip_filter, monkeypatch):
+    def encode_prompts():
+        raise AssertionError("캐시가 있으면 텍스트 인코더를 실행하지 않아야 함")
+
+    monkeypatch.setattr(clip_filter, "encode_prompts", encode_prompts)
+    features = clip_filter.load_text_features()
+    assert features.dtype == clip_filter.model.dtype
+    assert torch.allclose(features.float(), clip_filter.FINAL_TEXT_FEATURES.float())
+
+
+def test_prompt_change_uses_new_key_and_corrupt_cache_is_rebuilt(clip_filter, monkeypatch):
+    path = clip_filter.text_features_path()
+    prompts = {**clip_filter.PROMPTS_MAP, 5: clip_filter.PROMPTS_MAP[5] + ["A single object on a plain table."]}
+    monkeypatch.setattr(clip_filter, "PROMPTS_MAP", prompts)
+    assert clip_filter.text_features_path() != path
+    monkeypatch.undo()
+
+    with open(path, "wb") as f:
+        f.write(b"not a npy file")
+    features = clip_filter.load_text_features()
+    assert torch.allclose(features.float(), clip_filter.FINAL_TEXT_FEATURES.float(), atol=1e-5)
+    np.testing.assert_allclose(np.load(path), features.float().numpy(), atol=1e-5)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import embedding_store
+from embedding_store import EmbeddingStore
+
+
+def unit(*values):
+    return np.array(values, dtype=np.float32)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EmbeddingStore(str(tmp_path / "embeddings"), initial_capacity=2)
+
+
+def test_only_committed_vectors_are_searchable(store):
+    store.stage("a", unit(1, 0, 0))
+    assert store.search([unit(1, 0, 0)]) == [[]]
+    assert store.commit("a", "fast")
+    assert store.commit("missing", "fast") is False
+    assert store.search([unit(1, 0, 0)]) == [[{"task_id": "a", "model": "fast", "similarity": 1.0}]]
+    assert store.stats()["vectors"] == 1 and store.stats()["pending"] == 1
+
+
+def test_search_ranks_by_cosine_and_applies_threshold(store):
+    for task_id, vector in (("x", unit(1, 0, 0)), ("near", unit(0.9, 0.1, 0)), ("y", unit(0, 1, 0))):
+        store.stage(task_id, vector)
+        store.commit(task_id, "fast")
+    hits = store.search([unit(2, 0, 0), unit(0, 0, 1)], k=2, threshold=0.5)
+    assert [h["task_id"] for h in hits[0]] == ["x", "near"]
+    assert hits[1] == []
+
+
+def test_search_across_chunks_keeps_global_top_k(store, monkeypatch):
+    monkeypatch.setattr(embedding_store, "SEARCH_CHUNK_ROWS", 2)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(7, 8)).astype(np.float32)
+    for i, vector in enumerate(vectors):
+        store.stage(f"t{i}", vector)
+        store.commit(f"t{i}", "fast")
+    query = vectors[3] + 0.01
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = [f"t{i}" for i in np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:3]]
+    assert [h["task_id"] for h in store.search([query], k=3)[0]] == expected
+
+
+def test_recommit_and_remove_hide_old_rows(store):
+    store.stage("a", unit(1, 0))
+    store.commit("a", "fast")
+    store.commit("a", "fast")
+    assert len(store.search([unit(1, 0)], k=5)[0]) == 1
+    store.commit("a", "quality")
+    assert {h["model"] for h in store.search([unit(1, 0)], k=5)[0]} == {"fast", "quality"}
+    store.remove("a")
+    assert store.search([unit(1, 0)]) == [[]]
+    assert store.stats()["pending"] == 0
+
+
+def test_rejects_other_dimensions(store):
+    store.stage("a", unit(1, 0, 0))
+    with pytest.raises(ValueError):
+        store.stage("b", unit(1, 0))
+    assert store.search([unit(1, 0)]) == [[]]
+
+
+def test_reopen_restores_vectors_and_tombstones(tmp_path):
+    path = str(tmp_path / "embeddings")
+    store = EmbeddingStore(path, initial_capacity=2)
+    for task_id, vector in (("a", unit(1, 0)), ("b", unit(0, 1)), ("c", unit(1, 1))):
+        store.stage(task_id, vector)
+        store.commit(task_id, "fast")
+    store.remove("b")
+    reopened = EmbeddingStore(path, initial_capacity=2)
+    assert reopened.dim == 2 and reopened.stats()["vectors"] == 2
+    assert [h["task_id"] for h in reopened.search([unit(0, 1)], k=3)[0]] == ["c", "a"]
@@ -0,0 +1,230 @@
+import threading
+import time
+
+import pytest
+
+from job_queue import JobQueue, QUEUED, RUNNING, DONE, FAILED, CANCELLED
+from scheduler import GpuScheduler
+
+ONE_GPU = [{"id": "0", "memory_gb": 32, "slots": 2}]
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class Runner:
+    """run_job 대역: 작업마다 release(job_id)될 때까지 멈춰 있고 정해 둔 결과를 돌려줌"""
+
+    def __init__(self, result=None):
+        self.result = result or {"success": True}
+        self.started = []
+        self._gates = {}
+        self._lock = threading.Lock()
+
+    def _gate(self, job_id):
+        with self._lock:
+            return self._gates.setdefault(job_id, threading.Event())
+
+    def release(self, job_id):
+        self._gate(job_id).set()
+
+    def __call__(self, job, cancel):
+        self.started.append(job["job_id"])
+        gate = self._gate(job["job_id"])
+        cancel.on_cancel(gate.set)
+        gate.wait(5)
+        cancel.raise_if_cancelled()
+        return dict(self.result)
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    def make(runner, devices=ONE_GPU, **kwargs):
+        return JobQueue(str(tmp_path / "jobs"), runner, GpuScheduler(devices), **kwargs)
+    return make
+
+
+def test_submit_returns_existing_active_job(make_queue):
+    queue = make_queue(Runner())
+    first = queue.submit("task", "fast")
+    assert queue.submit("task", "fast")["job_id"] == first["job_id"]
+    assert queue.submit("task", "quality")["job_id"] != first["job_id"]
+    assert first["status"] == QUEUED and first["position"] == 1
+
+
+def test_job_runs_to_done(make_queue):
+    runner = Runner({"success": True, "mesh_path": "m.glb"})
+    queue = make_queue(runner)
+    queue.start()
+    job = queue.submit("task", "fast")
+    assert wait_for(lambda: queue.get(job["job_id"])["status"] == RUNNING)
+    assert queue.get(job["job_id"])["device"] == "0"
+    runner.release(job["job_id"])
+    assert wait_for(lambda: queue.get(job["job_id"])["status"] == DONE)
+    assert queue.get(job["job_id"])["result"]["mesh_path"] == "m.glb"
+    assert queue.scheduler.snapshot()["running"] == {}
+
+
+def test_failed_result_records_error(make_queue):
+    runner = Runner({"success": False, "error": "boom"})
+    queue = make_queue(runner)
+    queue.start()
+    job = queue.submit("task", "fast")
+    runner.release(job["job_id"])
+    assert wait_for(lambda: queue.get(job["job_id"])["status"] == FAILED)
+    assert queue.get(job["job_id"])["error"] == "boom"
+
+
+def test_requeue_result_puts_job_back(make_queue):
+    calls = []
+
+    def run_job(job, cancel):
+        calls.append(job["job_id"])
+        return {"requeue": True, "error": "worker lost"} if len(calls) == 1 else {"success": True}
+
+    queue = make_queue(run_job)
+    queue.start()
+    job = queue.submit("task", "fast")
+    assert wait_for(lambda: queue.get(job["job_id"])["status"] == DONE)
+    assert calls == [job["job_id"], job["job_id"]]
+    assert queue.get(job["job_id"])["restarts"] == 1
+
+
+def test_cancel_queued_and_running_jobs(make_queue):
+    runner = Runner()
+    cancelled = []
+    queue = make_queue(runner, devices=[{"id": "0", "memory_gb": 32, "slots": 1}], on_cancel=cancelled.append)
+    queue.start()
+    running = queue.submit("a", "fast")
+    queued = queue.submit("b", "fast")
+    assert wait_for(lambda: queue.get(running["job_id"])["status"] == RUNNING)
+
+    ok, view = queue.cancel(queued["job_id"])
+    assert ok and view["status"] == CANCELLED
+    ok, view = queue.cancel(running["job_id"], reason="stop")
+    assert ok and view["status"] == CANCELLED and view["error"] == "stop"
+    # 러너가 멈추기 전에 슬롯을 바로 반납
+    assert queue.scheduler.snapshot()["running"] == {}
+    assert queue.cancel(running["job_id"])[0] is False
+    assert queue.cancel("missing") == (False, None)
+    assert [job["job_id"] for job in cancelled] == [queued["job_id"], running["job_id"]]
+    time.sleep(0.05)
+    assert queue.get(running["job_id"])["status"] == CANCELLED
+
+
+def test_restart_requeues_jobs_that_were_running(tmp_path, make_queue):
+    queue = make_queue(Runner())
+    job = queue.submit("task", "fast")
+    with queue._cond:
+        queue._jobs[job["job_id"]]["status"] = RUNNING
+        queue._save(queue._jobs[job["job_id"]])
+    restored = make_queue(Runner())
+    view = restored.get(job["job_id"])
+    assert view["status"] == QUEUED and view["restarts"] == 1 and view["position"] == 1
+
+
+def test_expected_start_follows_running_job(make_queue):
+    runner = Runner()
+    queue = make_queue(runner, devices=[{"id": "0", "memory_gb": 32, "slots": 1}])
+    queue.start()
+    first = queue.submit("a", "fast")
+    assert wait_for(lambda: queue.get(first["job_id"])["status"] == RUNNING)
+    second = queue.get(queue.submit("b", "fast")["job_id"])
+    assert second["position"] == 1
+    assert second["expected_start"] == pytest.approx(queue.get(first["job_id"])["started_at"] + 60, abs=1)
+    runner.release(first["job_id"])
+    runner.release(second["job_id"])
+
+
+def test_only_queued_jobs_are_abandoned_by_default(make_queue):
+    runner = Runner()
+    queue = make_queue(runner, devices=[{"id": "0", "memory_gb": 32, "slots": 1}], abandon_after=60)
+    queue.start()
+    running = queue.submit("a", "quality")
+    queued = queue.submit("b", "quality")
+    assert wait_for(lambda: queue.get(running["job_id"])["status"] == RUNNING)
+    queue.touch(running["job_id"])
+    queue.touch_task("b")
+    now = time.monotonic()
+    assert queue.abandoned_jobs(now + 30) == []
+    assert queue.abandoned_jobs(now + 61) == [(queued["job_id"], 60)]
+    runner.release(running["job_id"])
+
+
+def test_running_jobs_use_per_mode_window(make_queue):
+    runner = Runner()
+    queue = make_queue(runner, devices=[{"id": "0", "memory_gb": 48, "slots": 2}],
+                       abandon_after=60, abandon_running_after={"fast": 300})
+    queue.start()
+    fast = queue.submit("a", "fast")
+    quality = queue.submit("b", "quality")
+    assert wait_for(lambda: queue.stats()[RUNNING] == 2)
+    queue.touch_task("a")
+    queue.touch_task("b")
+    now = time.monotonic()
+    assert queue.abandoned_jobs(now + 120) == []
+    assert queue.abandoned_jobs(now + 301) == [(fast["job_id"], 300)]
+    runner.release(fast["job_id"])
+    runner.release(quality["job_id"])
+
+
+def test_server_defaults_cancel_abandoned_running_jobs(server, make_queue):
+    windows = server.CLIENT_ABANDON_RUNNING_SECONDS
+    assert 0 < windows["fast"] < windows["quality"]
+    runner = Runner()
+    queue = make_queue(runner, devices=[{"id": "0", "memory_gb": 48, "slots": 2}],
+                       abandon_after=server.CLIENT_ABANDON_SECONDS, abandon_running_after=windows)
+    queue.start()
+    fast = queue.submit("a", "fast")
+    quality = queue.submit("b", "quality")
+    assert wait_for(lambda: queue.stats()[RUNNING] == 2)
+    queue.touch_task("a")
+    queue.touch_task("b")
+    now = time.monotonic()
+    assert queue.abandoned_jobs(now + windows["fast"] - 1) == []
+    assert queue.abandoned_jobs(now + windows["fast"] + 1) == [(fast["job_id"], windows["fast"])]
+    abandoned = queue.abandoned_jobs(now + windows["quality"] + 1)
+    assert sorted(abandoned) == sorted([(fast["job_id"], windows["fast"]), (quality["job_id"], windows["quality"])])
+    for job_id, window in abandoned:
+        queue.cancel(job_id, reason="client gone")
+    # 취소된 작업은 러너가 끝나기를 기다리지 않고 GPU 슬롯을 반납
+    assert wait_for(lambda: queue.scheduler.snapshot()["running"] == {})
+    assert queue.get(fast["job_id"])["status"] == CANCELLED
+    assert queue.get(quality["job_id"])["status"] == CANCELLED
+
+
+def test_runner_exception_becomes_failure(make_queue):
+    def run_job(job, cancel):
+        raise RuntimeError("boom")
+
+    errors = []
+    queue = make_queue(run_job, on_error=errors.append)
+    queue.start()
+    job = queue.submit("task", "fast")
+    assert wait_for(lambda: queue.get(job["job_id"])["status"] == FAILED)
+    assert queue.get(job["job_id"])["error"] == "boom"
+    assert queue.scheduler.snapshot()["running"] == {}
+    assert wait_for(lambda: len(errors) == 1)
+    assert errors[0]["job_id"] == job["job_id"] and errors[0]["status"] == FAILED
+
+
+def test_runner_exception_finishes_task_and_progress_stream(server, make_queue, tmp_path):
+    def run_job(job, cancel):
+        raise RuntimeError("boom")
+
+    image = tmp_path / "image.png"
+    image.write_bytes(b"image")
+    server.TASK_INDEX.create("crashing-task", str(image), stage="reconstructing")
+    queue = make_queue(run_job, on_error=server.on_job_error)
+    queue.start()
+    queue.submit("crashing-task", "fast")
+    assert wait_for(lambda: server.PROGRESS.is_finished("crashing-task"))
+    task = server.TASK_INDEX.get("crashing-task")
+    assert task["stage"] == "failed" and "boom" in task["error"]
+    assert server.PROGRESS.wait("crashing-task", 0, timeout=0)[-1]["stage"] == "failed"
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+trimesh = pytest.importorskip("trimesh")
+pytest.importorskip("fast_simplification")
+
+
+@pytest.fixture
+def task(server):
+    """완료된 fast 결과(면 20480개)가 있는 task"""
+    task_id = f"lod-{os.urandom(4).hex()}"
+    task_dir = os.path.join(server.WORKSPACE_DIR, task_id)
+    mesh_path = os.path.join(task_dir, "fast_output", "0", "mesh.glb")
+    os.makedirs(os.path.dirname(mesh_path))
+    trimesh.creation.icosphere(subdivisions=5).export(mesh_path)
+    image_path = os.path.join(task_dir, "input.png")
+    with open(image_path, "wb") as f:
+        f.write(b"image")
+    server.TASK_INDEX.create(task_id, image_path)
+    server.TASK_INDEX.set_output(task_id, "fast", mesh_path)
+    yield task_id, mesh_path
+    server.TASK_INDEX.delete(task_id)
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+def test_full_download_supports_etag_and_ranges(client, task):
+    task_id, mesh_path = task
+    response = client.get(f"/api/download/{task_id}")
+    assert response.status_code == 200
+    assert response.data == open(mesh_path, "rb").read()
+    assert response.headers["X-Model-LOD"] == "full"
+    assert response.headers["Accept-Ranges"] == "bytes"
+    etag = response.headers["ETag"]
+    assert etag.endswith('-full"')
+
+    assert client.get(f"/api/download/{task_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    partial = client.get(f"/api/download/{task_id}", headers={"Range": "bytes=0-99"})
+    assert partial.status_code == 206
+    assert partial.data == response.data[:100]
+    assert partial.headers["Content-Range"] == f"bytes 0-99/{len(response.data)}"
+    # 이어받기 도중 파일이 바뀌었으면(If-Range 불일치) 전체를 다시 보냄
+    stale = client.get(f"/api/download/{task_id}", headers={"Range": "bytes=100-", "If-Range": '"stale"'})
+    assert stale.status_code == 200 and stale.data == response.data
+
+
+def test_lod_download_is_smaller_and_has_its_own_etag(server, client, task):
+    task_id, _ = task
+    full = client.get(f"/api/download/{task_id}")
+    low = client.get(f"/api/download/{task_id}?lod=low")
+    assert low.status_code == 200
+    assert low.headers["X-Model-LOD"] == "low"
+    assert len(low.data) < len(full.data)
+    assert low.headers["ETag"] != full.headers["ETag"]
+    assert client.get(f"/api/download/{task_id}?lod=low",
+                      headers={"If-None-Match": low.headers["ETag"]}).status_code == 304
+    partial = client.get(f"/api/download/{task_id}?lod=low", headers={"Range": "bytes=-16"})
+    assert partial.status_code == 206 and partial.data == low.data[-16:]
+    # LOD 파일이 생겼으므로 GC가 task 크기를 다시 재도록 지워 둠
+    assert server.TASK_INDEX.get(task_id)["disk_bytes"] is None
+
+
+def test_download_rejects_unknown_lod_and_task(client, task):
+    task_id, _ = task
+    assert client.get(f"/api/download/{task_id}?lod=tiny").status_code == 400
+    assert client.get("/api/download/no-such-task").status_code == 404
@@ -0,0 +1,88 @@
+import pytest
+
+from metrics import Histogram, Counter, TaskTimings, StageClock, DirectorySizeProbe, render_gauges
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram("stage_seconds", "Stage latency", buckets=(1, 5), label_names=("stage",))
+    for value in (0.5, 2, 10):
+        hist.observe(value, stage="inference")
+    lines = hist.render()
+    assert lines[:2] == ["# HELP stage_seconds Stage latency", "# TYPE stage_seconds histogram"]
+    assert 'stage_seconds_bucket{stage="inference",le="1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="inference",le="5"} 2' in lines
+    assert 'stage_seconds_bucket{stage="inference",le="+Inf"} 3' in lines
+    assert 'stage_seconds_sum{stage="inference"} 12.5' in lines
+    assert 'stage_seconds_count{stage="inference"} 3' in lines
+    assert hist.summary() == {"inference": {"count": 3, "sum": 12.5, "mean": 12.5 / 3}}
+
+
+def test_counter_and_label_escaping():
+    counter = Counter("jobs_total", "Jobs", label_names=("status",))
+    counter.inc(status="done")
+    counter.inc(2, status='bad "quote"')
+    assert counter.value(status="done") == 1
+    assert counter.value(status="missing") == 0
+    assert 'jobs_total{status="bad \\"quote\\""} 2' in counter.render()
+
+
+def test_render_gauges_types_and_skips_missing_values():
+    lines = render_gauges([
+        ("queue_depth", "Queued jobs", [({"model": "fast"}, 3), ({"model": "quality"}, None)]),
+        ("cache_hits_total", "Cache hits", [({}, 7)]),
+    ])
+    assert "# TYPE queue_depth gauge" in lines
+    assert 'queue_depth{model="fast"} 3' in lines
+    assert not any("quality" in line for line in lines)
+    assert "# TYPE cache_hits_total counter" in lines and "cache_hits_total 7" in lines
+
+
+def test_task_timings_sum_repeated_stages_and_evict_oldest():
+    timings = TaskTimings(max_tasks=2)
+    timings.record("a", "inference", 1.0)
+    timings.record("a", "inference", 0.5, model="fast")
+    assert timings.get("a")["stages"] == {"inference": 1.5}
+    assert timings.get("a")["model"] == "fast"
+    timings.record("b", "upload", 0.1)
+    timings.record("c", "upload", 0.1)
+    assert timings.get("a") is None
+    assert list(timings.snapshot()) == ["c", "b"]
+
+
+def test_stage_clock_reports_previous_stage():
+    now = [0.0]
+    seen = []
+    clock = StageClock(lambda stage, seconds: seen.append((stage, seconds)), clock=lambda: now[0])
+    clock.enter("dispatch")
+    now[0] = 1.0
+    clock.rename("spawn")
+    clock.enter("inference")
+    now[0] = 4.0
+    clock.enter("glb_export")
+    clock.discard()
+    clock.finish()
+    assert seen == [("spawn", 1.0), ("inference", 3.0)]
+
+
+def test_directory_size_probe_caches_for_ttl(tmp_path):
+    (tmp_path / "a.bin").write_bytes(b"x" * 10)
+    probe = DirectorySizeProbe(str(tmp_path), ttl_seconds=60)
+    assert probe.bytes() == 10
+    (tmp_path / "b.bin").write_bytes(b"x" * 5)
+    assert probe.bytes() == 10
+    assert DirectorySizeProbe(str(tmp_path), ttl_seconds=0).bytes() == 15
+
+
+def test_metrics_endpoint(server):
+    client = server.app.test_client()
+    server.observe_stage("inference", 2.0, "metrics-task", "fast")
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "# TYPE pipeline_stage_seconds histogram" in response.get_data(as_text=True)
+
+    body = client.get("/api/metrics?format=json").get_json()
+    assert {"stages", "gauges", "tasks"} <= set(body)
+    assert body["tasks"]["metrics-task"]["stages"]["inference"] == pytest.approx(2.0)
+    assert client.get("/api/metrics?task_id=metrics-task").get_json()["stages"]["inference"] == pytest.approx(2.0)
+    assert client.get("/api/metrics?task_id=missing").status_code == 404
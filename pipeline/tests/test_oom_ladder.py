@@ -0,0 +1,96 @@
+import pytest
+
+from oom_ladder import SPAR3D_LADDER, TRELLIS_LADDER, is_oom, is_oom_text, run_ladder
+
+LADDER = ({"texture": 2048}, {"texture": 1024}, {"texture": 512})
+
+
+class OutOfMemoryError(RuntimeError):
+    """torch.cuda.OutOfMemoryError와 같은 이름"""
+
+
+def attempt_until(ok_texture, error=lambda: RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")):
+    calls = []
+
+    def attempt(settings):
+        calls.append(settings)
+        if settings["texture"] > ok_texture:
+            raise error()
+        return f"mesh@{settings['texture']}"
+
+    return attempt, calls
+
+
+def test_first_rung_success():
+    attempt, calls = attempt_until(4096)
+    result, report = run_ladder(LADDER, attempt)
+    assert result == "mesh@2048"
+    assert report == {"rung": 0, "rungs": 3, "settings": {"texture": 2048}, "attempts": []}
+    assert len(calls) == 1
+
+
+def test_oom_steps_down(capsys):
+    attempt, calls = attempt_until(1024)
+    result, report = run_ladder(LADDER, attempt)
+    assert result == "mesh@1024"
+    assert report["rung"] == 1 and report["settings"] == {"texture": 1024}
+    assert [a["rung"] for a in report["attempts"]] == [0]
+    assert "out of memory" in report["attempts"][0]["error"]
+    assert "peak_memory" in report["attempts"][0]
+    assert '"stage": "oom_retry"' in capsys.readouterr().out
+
+
+def test_settings_are_copies():
+    def attempt(settings):
+        settings["texture"] = 0
+        return "ok"
+
+    run_ladder(LADDER, attempt)
+    assert LADDER[0] == {"texture": 2048}
+
+
+def test_other_errors_propagate_without_retry():
+    attempt, calls = attempt_until(0, error=lambda: ValueError("bad mesh"))
+    with pytest.raises(ValueError):
+        run_ladder(LADDER, attempt)
+    assert len(calls) == 1
+
+
+def test_last_rung_oom_reraises_with_report():
+    attempt, calls = attempt_until(0, error=lambda: OutOfMemoryError("allocation failed"))
+    with pytest.raises(OutOfMemoryError) as excinfo:
+        run_ladder(LADDER, attempt)
+    report = excinfo.value.oom_fallback
+    assert report["rung"] is None and report["rungs"] == 3
+    assert [a["settings"] for a in report["attempts"]] == list(LADDER)
+    assert len(calls) == 3
+
+
+def test_empty_ladder():
+    with pytest.raises(ValueError):
+        run_ladder((), lambda settings: None)
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (MemoryError(), True),
+    (OutOfMemoryError("x"), True),
+    (RuntimeError("CUBLAS_STATUS_ALLOC_FAILED when calling cublasCreate"), True),
+    (RuntimeError("std::bad_alloc"), True),
+    (RuntimeError("shape mismatch"), False),
+])
+def test_is_oom(exc, expected):
+    assert is_oom(exc) is expected
+
+
+def test_is_oom_text_is_case_insensitive():
+    assert is_oom_text("torch.OutOfMemoryError: CUDA OUT OF MEMORY")
+    assert not is_oom_text("Traceback: KeyError")
+
+
+@pytest.mark.parametrize("ladder, key", [
+    (SPAR3D_LADDER, "texture_resolution"),
+    (TRELLIS_LADDER, "simplify_target"),
+])
+def test_default_ladders_step_down(ladder, key):
+    values = [settings[key] for settings in ladder]
+    assert values == sorted(values, reverse=True)
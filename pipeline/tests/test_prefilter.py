@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import prefilter
+
+H, W = 600, 800
+
+
+def texture(h, w, seed=0):
+    return (np.random.default_rng(seed).random((h, w, 3)) * 255).astype(np.uint8)
+
+
+def save(tmp_path, pixels, name="image.png", mode=None):
+    path = tmp_path / name
+    Image.fromarray(pixels, mode).save(path)
+    return str(path)
+
+
+def studio(background):
+    """단색 배경 가운데 위쪽에 물체가 떠 있는 제품 사진"""
+    pixels = np.full((H, W, 3), background, np.uint8)
+    pixels[100:300, 200:600] = texture(200, 400)
+    return pixels
+
+
+def test_sharp_photo_passes(tmp_path):
+    assert prefilter.prefilter_image(save(tmp_path, texture(H, W))) is None
+
+
+def test_truncated_file_is_corrupt(tmp_path):
+    path = tmp_path / "cut.jpg"
+    Image.fromarray(texture(H, W)).save(path, quality=95)
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+    result = prefilter.prefilter_image(str(path))
+    assert result["status"] == "early_reject"
+    assert result["check"] == "truncated"
+
+
+def test_low_resolution_is_rejected(tmp_path):
+    result = prefilter.prefilter_image(save(tmp_path, texture(200, 300)))
+    assert result["check"] == "resolution"
+
+
+def test_clip_input_size_is_enough(tmp_path):
+    assert prefilter.prefilter_image(save(tmp_path, texture(prefilter.MIN_RESOLUTION, 300))) is None
+
+
+@pytest.mark.parametrize("color", [0, 128])
+def test_solid_band_below_content_is_truncation(tmp_path, color):
+    pixels = texture(H, W)
+    pixels[350:] = color
+    result = prefilter.prefilter_image(save(tmp_path, pixels))
+    assert result["check"] == "solid_block"
+    assert result["reason"] == prefilter.REJECT_INFO["corrupt"][0]
+
+
+@pytest.mark.parametrize("background", [0, 128, 255])
+def test_studio_background_is_not_truncation(tmp_path, background):
+    assert prefilter.prefilter_image(save(tmp_path, studio(background))) is None
+
+
+def test_object_spanning_full_width_on_dark_floor(tmp_path):
+    pixels = np.zeros((H, W, 3), np.uint8)
+    pixels[150:350] = texture(200, W)
+    assert prefilter.prefilter_image(save(tmp_path, pixels)) is None
+
+
+def test_transparent_cutout_passes(tmp_path):
+    pixels = np.zeros((H, W, 4), np.uint8)
+    pixels[100:300, 200:600, :3] = texture(200, 400)
+    pixels[100:300, 200:600, 3] = 255
+    assert prefilter.prefilter_image(save(tmp_path, pixels, mode="RGBA")) is None
+
+
+def test_transparent_bottom_band_is_background(tmp_path):
+    pixels = np.zeros((H, W, 4), np.uint8)
+    pixels[:350, :, :3] = texture(350, W)
+    pixels[:350, :, 3] = 255
+    assert prefilter.prefilter_image(save(tmp_path, pixels, mode="RGBA")) is None
+
+
+def test_blurry_photo_is_rejected(tmp_path):
+    gradient = np.linspace(0, 255, W, dtype=np.float32)
+    pixels = np.repeat(np.tile(gradient, (H, 1))[:, :, None], 3, axis=2).astype(np.uint8)
+    result = prefilter.prefilter_image(save(tmp_path, pixels))
+    assert result["check"] == "blur"
+
+
+def test_stats_count_checks_and_rejects():
+    stats = prefilter.PrefilterStats()
+    stats.record("blur", True, 0.002)
+    stats.record("blur", False, 0.004)
+    stats.record_image(True)
+    snapshot = stats.snapshot()
+    assert snapshot["images"] == 1
+    assert snapshot["early_rejects"] == 1
+    assert snapshot["checks"]["blur"]["hit_rate"] == 0.5
+    assert snapshot["checks"]["blur"]["avg_ms"] == pytest.approx(3.0)
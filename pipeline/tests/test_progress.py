@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+
+from progress import ProgressHub, parse_progress_line, stream_subprocess
+
+
+def test_hub_numbers_events_and_marks_terminal():
+    hub = ProgressHub()
+    hub.publish("t1", "inference", job_id="j1")
+    hub.publish("t1", "done")
+    events = hub.wait("t1", timeout=0)
+    assert [(e["id"], e["stage"], e["label"]) for e in events] == [(1, "inference", "3D 추론"), (2, "done", "완료")]
+    assert hub.wait("t1", after_id=2, timeout=0) == []
+    assert hub.is_finished("t1") and hub.has_job("t1", "j1") and not hub.has_job("t1", "j2")
+    # 같은 task를 다시 재구성하면 종료 표시가 지워짐
+    hub.publish("t1", "queued")
+    assert not hub.is_finished("t1") and hub.last_id("t1") == 3
+
+
+def test_hub_prunes_finished_tasks_after_retention():
+    hub = ProgressHub(retention_seconds=-1)
+    hub.publish("old", "failed")
+    hub.publish("new", "running")
+    assert hub.last_id("old") == 0 and hub.last_id("new") == 1
+
+
+def test_relay_and_listeners():
+    hub = ProgressHub()
+    woken = []
+    hub.add_listener(woken.append)
+    hub.relay("t1")({"stage": "remesh", "time": 0, "step": 2})
+    event = hub.wait("t1", timeout=0)[0]
+    assert event["stage"] == "remesh" and event["step"] == 2 and event["time"] > 0
+    assert woken == ["t1"]
+
+
+def test_stream_subprocess_relays_progress_lines(tmp_path):
+    script = ("import json; print('loading'); "
+              "print('[PROGRESS] ' + json.dumps({'stage': 'inference'})); print('[PROGRESS] {bad')")
+    events = []
+    log_path = str(tmp_path / "run.log")
+    assert stream_subprocess([sys.executable, "-c", script], log_path, on_progress=events.append) == 0
+    assert events == [{"stage": "inference"}]
+    assert "loading" in open(log_path).read()
+    assert parse_progress_line("plain line") is None
+
+
+def sse_events(body):
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_events_endpoint_replays_after_last_event_id(server, tmp_path):
+    task_id = f"sse-{os.urandom(4).hex()}"
+    image_path = tmp_path / "input.png"
+    image_path.write_bytes(b"image")
+    server.TASK_INDEX.create(task_id, str(image_path))
+    for stage in ("queued", "inference", "done"):
+        server.PROGRESS.publish(task_id, stage)
+    client = server.app.test_client()
+    try:
+        response = client.get(f"/api/tasks/{task_id}/events")
+        assert response.mimetype == "text/event-stream"
+        body = response.get_data(as_text=True)
+        assert body.startswith("retry: 3000")
+        assert [e["stage"] for e in sse_events(body)] == ["queued", "inference", "done"]
+
+        resumed = client.get(f"/api/tasks/{task_id}/events", headers={"Last-Event-ID": "2"})
+        assert [e["stage"] for e in sse_events(resumed.get_data(as_text=True))] == ["done"]
+        assert client.get("/api/tasks/no-such-task/events").status_code == 404
+    finally:
+        server.TASK_INDEX.delete(task_id)
@@ -0,0 +1,129 @@
+import time
+import types
+
+import pytest
+
+from remote_workers import WorkerRegistry, device_id, is_remote_device
+from scheduler import GpuScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def registry(clock):
+    return WorkerRegistry(GpuScheduler([]), heartbeat_seconds=0.01, timeout_seconds=20, clock=clock)
+
+
+def worker_info(**overrides):
+    return {"worker_id": "w1", "url": "http://gpu-2:6001/", "modes": ["fast"], "memory_gb": 24, "slots": 1,
+            **overrides}
+
+
+def test_register_adds_scheduler_device(registry):
+    worker = registry.register(worker_info())
+    assert worker["device"] == device_id("w1") and is_remote_device(worker["device"])
+    assert worker["url"] == "http://gpu-2:6001"
+    assert registry.scheduler.supports(worker["device"], "fast")
+    assert not registry.scheduler.supports(worker["device"], "quality")
+    assert registry.get(worker["device"])["worker_id"] == "w1"
+    assert registry.get("0") is None
+
+
+@pytest.mark.parametrize("overrides", [
+    {"url": "gpu-2:6001"},
+    {"modes": ["turbo"]},
+    {"memory_gb": "lots"},
+    {"slots": 0},
+    {"worker_id": "../etc"},
+])
+def test_register_rejects_invalid_info(registry, overrides):
+    with pytest.raises(ValueError):
+        registry.register(worker_info(**overrides))
+
+
+def test_heartbeat_health_toggles_device(registry):
+    device = registry.register(worker_info())["device"]
+    assert registry.heartbeat("unknown") is False
+    assert registry.heartbeat("w1", {"healthy": False, "reason": "disk full"}) is True
+    assert device not in registry.scheduler.devices
+    assert registry.snapshot()["w1"]["healthy"] is False
+    registry.heartbeat("w1", {"healthy": True})
+    assert device in registry.scheduler.devices
+
+
+def test_remove_closes_in_flight_streams(registry):
+    closed = []
+    registry.register(worker_info())
+    registry.track("w1", lambda: closed.append("a"))
+    untrack = registry.track("w1", lambda: closed.append("b"))
+    untrack()
+    assert registry.snapshot()["w1"]["in_flight"] == 1
+    assert registry.remove("w1") is True
+    assert closed == ["a"]
+    assert registry.remove("w1") is False
+    # 이미 빠진 워커로 보내려던 연결은 바로 끊음
+    registry.track("w1", lambda: closed.append("late"))
+    assert closed == ["a", "late"]
+
+
+def test_reregister_drops_streams_of_previous_process(registry):
+    closed = []
+    registry.register(worker_info())
+    registry.track("w1", lambda: closed.append("old"))
+    registry.register(worker_info(memory_gb=48))
+    assert closed == ["old"]
+    assert registry.scheduler.devices[device_id("w1")]["memory_gb"] == 48
+
+
+def test_missing_heartbeats_expire_worker(registry, clock):
+    registry.register(worker_info())
+    clock.now += 10
+    registry.heartbeat("w1")
+    clock.now += 15
+    time.sleep(0.05)
+    assert "w1" in registry.snapshot()
+    clock.now += 10
+    deadline = time.monotonic() + 5
+    while "w1" in registry.snapshot() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "w1" not in registry.snapshot()
+    assert device_id("w1") not in registry.scheduler.devices
+
+
+@pytest.fixture
+def register(server, monkeypatch):
+    """/api/workers/register를 주어진 주소/토큰으로 호출 (서버의 실제 등록부와 작업 대기열은 건드리지 않음)"""
+    monkeypatch.setattr(server, "REMOTE_WORKERS", WorkerRegistry(GpuScheduler([]), heartbeat_seconds=60))
+    monkeypatch.setattr(server, "JOB_QUEUE", types.SimpleNamespace(start=lambda: None, wake=lambda: None))
+    client = server.app.test_client()
+
+    def call(remote_addr, token=None):
+        headers = {server.WORKER_TOKEN_HEADER: token} if token is not None else {}
+        return client.post("/api/workers/register", json=worker_info(), headers=headers,
+                           environ_base={"REMOTE_ADDR": remote_addr}).status_code
+    return call
+
+
+@pytest.mark.parametrize("remote_addr, status", [("127.0.0.1", 200), ("::1", 200), ("::ffff:127.0.0.1", 200),
+                                                 ("10.0.0.5", 403)])
+def test_registration_without_token_is_loopback_only(server, register, monkeypatch, remote_addr, status):
+    monkeypatch.setattr(server, "WORKER_AUTH_TOKEN", None)
+    assert register(remote_addr) == status
+
+
+def test_registration_with_token_requires_it_from_any_host(server, register, monkeypatch):
+    monkeypatch.setattr(server, "WORKER_AUTH_TOKEN", "secret")
+    assert register("10.0.0.5", "secret") == 200
+    assert register("10.0.0.5", "wrong") == 403
+    assert register("127.0.0.1") == 403
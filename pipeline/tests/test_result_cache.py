@@ -0,0 +1,267 @@
+import os
+import threading
+import time
+
+import pytest
+
+import result_cache
+from cancellation import CancelToken
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+
+
+def start_owner(cache, key, release, result):
+    """release가 set될 때까지 compute()를 붙잡고 있는 첫 요청"""
+    started = threading.Event()
+    outcome = {}
+
+    def compute():
+        started.set()
+        release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def run():
+        try:
+            outcome["value"] = cache.get_or_compute(key, compute)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(5)
+    return thread, outcome
+
+
+def test_key_depends_on_hash_stage_and_params():
+    key = ResultCache.make_key("abc", "filter", {"model": "ViT-B/32", "threshold": 0.2})
+    assert key == ResultCache.make_key("abc", "filter", {"threshold": 0.2, "model": "ViT-B/32"})
+    assert key != ResultCache.make_key("abd", "filter", {"model": "ViT-B/32", "threshold": 0.2})
+    assert key != ResultCache.make_key("abc", "fast", {"model": "ViT-B/32", "threshold": 0.2})
+    assert key != ResultCache.make_key("abc", "filter", {"model": "ViT-B/32", "threshold": 0.25})
+
+
+def test_put_get_roundtrip_with_files(cache, tmp_path):
+    mesh = tmp_path / "mesh.glb"
+    mesh.write_bytes(b"glb")
+    cache.put("k", {"success": True}, files={"mesh.glb": str(mesh)})
+    result = cache.get("k")
+    assert result["success"] is True
+    with open(result["files"]["mesh.glb"], "rb") as f:
+        assert f.read() == b"glb"
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=2500)
+    blob = tmp_path / "blob"
+    blob.write_bytes(b"x" * 1000)
+    cache.put("a", {}, files={"blob": str(blob)})
+    cache.put("b", {}, files={"blob": str(blob)})
+    assert cache.get("a") is not None  # b가 가장 오래 안 쓴 항목이 됨
+    cache.put("c", {}, files={"blob": str(blob)})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert not os.path.exists(os.path.join(cache.cache_dir, "b"))
+
+
+def test_restores_entries_and_drops_partial_writes(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    ResultCache(cache_dir, 1 << 20).put("a", {"v": 1})
+    os.makedirs(os.path.join(cache_dir, ".tmp-partial"))
+    restored = ResultCache(cache_dir, 1 << 20)
+    assert restored.get("a") == {"v": 1, "files": {}}
+    assert not os.path.exists(os.path.join(cache_dir, ".tmp-partial"))
+
+
+def test_get_or_compute_caches_only_cacheable_results(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"status": "error"}
+
+    cacheable = lambda r: r["status"] != "error"
+    assert cache.get_or_compute("k", compute, cacheable) == ({"status": "error"}, "computed")
+    assert cache.get_or_compute("k", compute, cacheable) == ({"status": "error"}, "computed")
+    assert len(calls) == 2
+    cache.get_or_compute("ok", lambda: {"status": "accept"}, cacheable)
+    assert cache.get_or_compute("ok", compute, cacheable) == ({"status": "accept", "files": {}}, "cache")
+
+
+def test_concurrent_requests_merge_into_one_compute(cache):
+    release = threading.Event()
+    owner, outcome = start_owner(cache, "k", release, {"status": "accept"})
+    merged = {}
+    waiter = threading.Thread(target=lambda: merged.update(value=cache.get_or_compute("k", lambda: 1 / 0)))
+    waiter.start()
+    time.sleep(0.1)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+    assert outcome["value"] == ({"status": "accept"}, "computed")
+    assert merged["value"] == ({"status": "accept", "files": {}}, "merged")
+    assert cache.stats()["merged"] == 1
+
+
+def test_waiter_gets_copy_of_uncached_result(cache):
+    release = threading.Event()
+    started = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return {"success": True, "mesh_path": "/owner/mesh.glb"}
+
+    outcome = {}
+    owner = threading.Thread(target=lambda: outcome.update(
+        value=cache.get_or_compute("k", compute, cacheable=lambda r: False)))
+    owner.start()
+    assert started.wait(5)
+    merged = {}
+    waiter = threading.Thread(target=lambda: merged.update(value=cache.get_or_compute("k", lambda: 1 / 0)))
+    waiter.start()
+    time.sleep(0.1)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+    result, source = merged["value"]
+    assert source == "merged" and result == {"success": True, "mesh_path": "/owner/mesh.glb"}
+    result["mesh_path"] = "/waiter/mesh.glb"
+    assert outcome["value"][0]["mesh_path"] == "/owner/mesh.glb"
+
+
+def test_reconstruction_joins_uncached_lower_rung_result(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "RESULT_CACHE", ResultCache(str(tmp_path / "cache"), max_bytes=1 << 20))
+    image = tmp_path / "input.png"
+    image.write_bytes(b"same image")
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+
+    def fake_trellis(image_path, output_dir, rgba_path=None, **kwargs):
+        calls.append(output_dir)
+        started.set()
+        release.wait(5)
+        mesh_path = os.path.join(output_dir, "mesh.glb")
+        os.makedirs(output_dir, exist_ok=True)
+        with open(mesh_path, "wb") as f:
+            f.write(b"glb")
+        # 낮은 OOM 단계의 결과: 캐시에 저장되지 않음
+        return {"success": True, "mesh_path": mesh_path, "oom_fallback": {"rung": 1}}
+
+    monkeypatch.setattr(server, "run_trellis", fake_trellis)
+    outcome = {}
+    owner = threading.Thread(target=lambda: outcome.update(
+        owner=server.run_reconstruction("quality", str(image), str(tmp_path / "a"))))
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=lambda: outcome.update(
+        waiter=server.run_reconstruction("quality", str(image), str(tmp_path / "b"))))
+    waiter.start()
+    time.sleep(0.1)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+    assert len(calls) == 1
+    assert outcome["owner"]["mesh_path"] == str(tmp_path / "a" / "mesh.glb")
+    assert outcome["owner"]["cached"] is False
+    assert outcome["waiter"]["mesh_path"] == str(tmp_path / "b" / "mesh.glb")
+    assert outcome["waiter"]["cached"] is True
+    assert (tmp_path / "b" / "mesh.glb").read_bytes() == b"glb"
+
+
+def test_reconstruction_reuses_lower_rung_result(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "RESULT_CACHE", ResultCache(str(tmp_path / "cache"), max_bytes=1 << 20))
+    image = tmp_path / "input.png"
+    image.write_bytes(b"large image")
+    calls = []
+
+    def fake_trellis(image_path, output_dir, ladder=None, **kwargs):
+        calls.append(ladder)
+        mesh_path = os.path.join(output_dir, "mesh.glb")
+        os.makedirs(output_dir, exist_ok=True)
+        with open(mesh_path, "wb") as f:
+            f.write(b"glb")
+        return {"success": True, "mesh_path": mesh_path,
+                "oom_fallback": {"rung": 1, "rungs": len(ladder), "settings": ladder[1]}}
+
+    monkeypatch.setattr(server, "run_trellis", fake_trellis)
+    first = server.run_reconstruction("quality", str(image), str(tmp_path / "a"))
+    assert first["cached"] is False
+    # 첫 설정은 다시 메모리 부족일 것이므로 두 번째 요청은 실행하지 않고 낮은 단계의 결과를 재사용
+    second = server.run_reconstruction("quality", str(image), str(tmp_path / "b"))
+    assert len(calls) == 1
+    assert second["cached"] is True and second["oom_fallback"]["rung"] == 1
+    assert (tmp_path / "b" / "mesh.glb").read_bytes() == b"glb"
+
+
+def test_waiter_gets_none_when_owner_fails(cache):
+    release = threading.Event()
+    owner, outcome = start_owner(cache, "k", release, RuntimeError("boom"))
+    merged = {}
+    waiter = threading.Thread(target=lambda: merged.update(value=cache.get_or_compute("k", lambda: 1 / 0)))
+    waiter.start()
+    time.sleep(0.1)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+    assert isinstance(outcome["error"], RuntimeError)
+    assert merged["value"] == (None, "merged")
+
+
+def test_waiter_times_out(cache, monkeypatch):
+    monkeypatch.setattr(result_cache, "WAIT_POLL_SECONDS", 0.05)
+    release = threading.Event()
+    owner, outcome = start_owner(cache, "k", release, {"v": 1})
+    try:
+        assert cache.get_or_compute("k", lambda: 1 / 0, timeout=0.2) == (None, "timeout")
+        assert cache.stats()["wait_timeouts"] == 1
+    finally:
+        release.set()
+        owner.join(5)
+    assert outcome["value"] == ({"v": 1}, "computed")
+
+
+def test_waiter_leaves_when_cancelled(cache, monkeypatch):
+    monkeypatch.setattr(result_cache, "WAIT_POLL_SECONDS", 0.05)
+    release = threading.Event()
+    owner, _ = start_owner(cache, "k", release, {"v": 1})
+    cancel = CancelToken()
+    threading.Timer(0.1, cancel.cancel).start()
+    started = time.monotonic()
+    try:
+        assert cache.get_or_compute("k", lambda: 1 / 0, timeout=30, cancel=cancel) == (None, "merged")
+        assert time.monotonic() - started < 5
+    finally:
+        release.set()
+        owner.join(5)
+
+
+def test_filter_cache_key_covers_verdict_inputs(server, monkeypatch):
+    key = server.filter_cache_key("abc")
+    assert key == server.filter_cache_key("abc")
+    changes = [
+        (server, "CLIP_PROMPTS_HASH", "other"),
+        (server.clip_prompts, "HUMAN_THRESHOLD", 0.3),
+        (server.prefilter, "BLUR_THRESHOLD", 10.0),
+        (server, "CLIP_INFERENCE", {"device": "cpu", "cpu_mode": "onnx"}),
+    ]
+    for module, name, value in changes:
+        with monkeypatch.context() as m:
+            m.setattr(module, name, value)
+            assert server.filter_cache_key("abc") != key, name
+
+
+def test_filter_cache_key_is_fixed_after_clip_worker_starts(server):
+    key = server.filter_cache_key("abc")
+    other = "cpu" if server.CLIP_DEVICE == "cuda" else "cuda"
+    server.record_worker_startup("clip", 1.0, {"device": other, "cpu_mode": "onnx", "load_seconds": 0.5})
+    assert server.filter_cache_key("abc") == key
@@ -0,0 +1,104 @@
+import os
+import sys
+import types
+
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image
+
+import run_trellis
+from oom_ladder import TRELLIS_LADDER
+
+
+class OutOfMemoryError(RuntimeError):
+    pass
+
+
+class FakeMesh:
+    vertices = faces = attrs = coords = layout = "v"
+    voxel_size = 1 / 512
+
+    def __init__(self):
+        self.simplified = []
+
+    def simplify(self, target):
+        self.simplified.append(target)
+
+
+class FakePipeline:
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.images = []
+
+    def run(self, img):
+        self.images.append(img.mode)
+        return [self.mesh]
+
+
+@pytest.fixture
+def o_voxel(monkeypatch):
+    """TRELLIS.2 환경의 torch/o_voxel 대신: to_glb 인자를 기록하고 oom_rungs 단계에서는 OOM"""
+    calls = []
+    module = types.SimpleNamespace(oom_rungs=set(), calls=calls)
+
+    def to_glb(**kwargs):
+        calls.append(kwargs)
+        if len(calls) - 1 in module.oom_rungs:
+            raise OutOfMemoryError("CUDA out of memory")
+
+        class Glb:
+            def export(self, path, extension_webp):
+                with open(path, "wb") as f:
+                    f.write(b"glb")
+        return Glb()
+
+    cuda = types.SimpleNamespace(is_available=lambda: False, memory_allocated=lambda device: 0,
+                                 empty_cache=lambda: None)
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(cuda=cuda))
+    monkeypatch.setitem(sys.modules, "o_voxel", types.SimpleNamespace(postprocess=types.SimpleNamespace(to_glb=to_glb)))
+    return module
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "input.png"
+    Image.new("RGB", (8, 8)).save(path)
+    return str(path)
+
+
+def test_run_job_exports_glb_with_first_rung(o_voxel, image, tmp_path):
+    mesh = FakeMesh()
+    result = run_trellis.run_job(FakePipeline(mesh), image, str(tmp_path / "out"))
+    assert result["success"]
+    assert open(result["mesh_path"], "rb").read() == b"glb"
+    assert result["oom_fallback"]["rung"] == 0
+    assert mesh.simplified == [TRELLIS_LADDER[0]["simplify_target"]]
+    kwargs = o_voxel.calls[0]
+    assert (kwargs["decimation_target"], kwargs["texture_size"], kwargs["remesh"], kwargs["remesh_band"]) == \
+        (1000000, 4096, True, 1)
+
+
+def test_run_job_falls_back_on_oom_without_rerunning_inference(o_voxel, image, tmp_path):
+    o_voxel.oom_rungs = {0}
+    mesh = FakeMesh()
+    pipe = FakePipeline(mesh)
+    result = run_trellis.run_job(pipe, image, str(tmp_path / "out"))
+    assert result["success"] and result["oom_fallback"]["rung"] == 1
+    assert len(pipe.images) == 1
+    assert mesh.simplified == [16777216, 8388608]
+    kwargs = o_voxel.calls[1]
+    assert (kwargs["decimation_target"], kwargs["texture_size"], kwargs["remesh"], kwargs["remesh_band"]) == \
+        (500000, 2048, False, 0)
+
+
+def test_run_job_uses_rgba_and_reports_failure(o_voxel, image, tmp_path):
+    rgba = tmp_path / "rgba.png"
+    Image.new("RGBA", (8, 8)).save(rgba)
+    o_voxel.oom_rungs = set(range(len(TRELLIS_LADDER)))
+    pipe = FakePipeline(FakeMesh())
+    result = run_trellis.run_job(pipe, image, str(tmp_path / "out"), rgba_path=str(rgba))
+    assert pipe.images == ["RGBA"]
+    assert not result["success"]
+    assert result["oom_fallback"]["rung"] is None
+    assert not os.path.exists(tmp_path / "out" / "mesh.glb")
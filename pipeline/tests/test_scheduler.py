@@ -0,0 +1,138 @@
+import pytest
+
+from scheduler import GpuScheduler, MODE_PROFILES
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def job(job_id, model="fast", created_at=1000.0):
+    return {"job_id": job_id, "model": model, "created_at": created_at}
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_one_job_per_mode_per_device(clock):
+    # 상주 워커는 모드별로 하나라 같은 모드의 두 번째 작업은 메모리가 남아도 기다림
+    scheduler = GpuScheduler([{"id": "0", "memory_gb": 48, "slots": 3}], clock=clock)
+    assert scheduler.pick([job("a")]) == (job("a"), "0")
+    assert scheduler.pick([job("b")]) == (None, None)
+    assert scheduler.pick([job("q", "quality")]) == (job("q", "quality"), "0")
+    scheduler.release("a")
+    assert scheduler.pick([job("b")]) == (job("b"), "0")
+
+
+def test_memory_and_slots_limit_admission(clock):
+    profiles = {"fast": {"memory_gb": 12, "expected_seconds": 60}}
+    scheduler = GpuScheduler([{"id": "0", "memory_gb": 32, "slots": 3}], profiles=profiles, clock=clock)
+    assert scheduler.pick([job("a")])[1] == "0"
+    assert scheduler.pick([job("b")])[1] == "0"
+    assert scheduler.pick([job("c")]) == (None, None)  # 36GB > 32GB
+    assert scheduler.snapshot()["devices"]["0"]["memory_used_gb"] == 24
+
+    slots = GpuScheduler([{"id": "0", "memory_gb": 100, "slots": 1}], profiles=profiles, clock=clock)
+    slots.pick([job("a")])
+    assert slots.pick([job("b")]) == (None, None)
+
+
+def test_best_fit_device(clock):
+    scheduler = GpuScheduler([{"id": "big", "memory_gb": 48, "slots": 2},
+                              {"id": "small", "memory_gb": 16, "slots": 2}], clock=clock)
+    assert scheduler.pick([job("a")])[1] == "small"
+    assert scheduler.pick([job("q", "quality")])[1] == "big"
+
+
+def test_device_modes(clock):
+    scheduler = GpuScheduler([{"id": "0", "memory_gb": 48, "slots": 2, "modes": ["fast"]}], clock=clock)
+    assert scheduler.pick([job("q", "quality")]) == (None, None)
+    assert scheduler.estimate_start_times([job("q", "quality")]) == {"q": None}
+    assert scheduler.pick([job("q", "quality"), job("a")]) == (job("a"), "0")
+
+
+def test_oversized_job_runs_alone(clock):
+    scheduler = GpuScheduler([{"id": "0", "memory_gb": 16, "slots": 2}], clock=clock)
+    assert scheduler.pick([job("q", "quality")]) == (job("q", "quality"), "0")
+    assert scheduler.pick([job("a")]) == (None, None)
+
+
+def test_add_and_remove_device(clock):
+    scheduler = GpuScheduler([], clock=clock)
+    assert scheduler.pick([job("a")]) == (None, None)
+    scheduler.add_device("worker:w1", 24, slots=1, modes=["fast"])
+    assert scheduler.pick([job("a")]) == (job("a"), "worker:w1")
+    assert scheduler.remove_device("worker:w1") is True
+    assert scheduler.remove_device("worker:w1") is False
+    assert scheduler.pick([job("b")]) == (None, None)
+    assert "a" in scheduler.snapshot()["running"]
+
+
+def test_aging_lets_long_waiting_quality_jobs_go_first(clock):
+    scheduler = GpuScheduler([{"id": "0", "memory_gb": 48, "slots": 2}], clock=clock)
+    fresh_fast = job("f", "fast", created_at=clock.now)
+    quality = job("q", "quality", created_at=clock.now)
+    assert [j["job_id"] for j in scheduler.order([quality, fresh_fast])] == ["f", "q"]
+    clock.now += 600
+    fresh_fast = job("f2", "fast", created_at=clock.now)
+    assert [j["job_id"] for j in scheduler.order([fresh_fast, quality])] == ["q", "f2"]
+    assert scheduler.priority(quality, clock.now) == MODE_PROFILES["quality"]["expected_seconds"] - 600
+
+
+def test_backfill_only_jobs_that_end_before_reservation(clock):
+    profiles = {
+        "fast": {"memory_gb": 8, "expected_seconds": 30},
+        "quality": {"memory_gb": 24, "expected_seconds": 600},
+        "slow": {"memory_gb": 8, "expected_seconds": 900},
+    }
+    scheduler = GpuScheduler([{"id": "0", "memory_gb": 32, "slots": 4}], profiles=profiles, clock=clock)
+    scheduler.pick([job("s1", "fast")])
+    scheduler.pick([job("s2", "fast")])
+    # big은 30초 뒤 작은 작업이 끝나야 들어가므로 그 시각을 예약. slow는 예약을 넘기므로 끼워 넣지 않음
+    big = job("b", "quality", created_at=clock.now - 1000)
+    assert scheduler.pick([big, job("slow", "slow")]) == (None, None)
+    assert scheduler.pick([big, job("slow", "slow"), job("s3", "fast")]) == (job("s3", "fast"), "0")
+
+
+def test_backfill_uses_other_device_for_long_jobs(clock):
+    profiles = {
+        "fast": {"memory_gb": 8, "expected_seconds": 30},
+        "quality": {"memory_gb": 24, "expected_seconds": 600},
+        "slow": {"memory_gb": 8, "expected_seconds": 900},
+    }
+    scheduler = GpuScheduler([{"id": "0", "memory_gb": 32, "slots": 4},
+                              {"id": "1", "memory_gb": 40, "slots": 1, "modes": ["fast", "slow"]}],
+                             profiles=profiles, clock=clock)
+    assert scheduler.pick([job("s1", "fast")])[1] == "0"
+    assert scheduler.pick([job("s2", "fast")])[1] == "0"
+    # slow가 가장 잘 맞는 장치는 quality가 예약한 0번이지만 예약을 넘기므로 1번으로
+    quality = job("q", "quality", created_at=clock.now - 1000)
+    assert scheduler.pick([quality, job("slow", "slow")]) == (job("slow", "slow"), "1")
+
+
+def test_expected_start_times(clock):
+    scheduler = GpuScheduler([{"id": "0", "memory_gb": 48, "slots": 2}], clock=clock)
+    scheduler.pick([job("running")])
+    estimates = scheduler.estimate_start_times([job("a"), job("b"), job("q", "quality")])
+    assert estimates == {"a": clock.now + 60, "b": clock.now + 120, "q": clock.now}
+
+
+def test_overdue_running_job_is_expected_to_end_soon(clock):
+    scheduler = GpuScheduler([{"id": "0", "memory_gb": 48, "slots": 2}], clock=clock)
+    scheduler.pick([job("running")])
+    clock.now += 500
+    assert scheduler.estimate_start_times([job("a")]) == {"a": clock.now + 1}
+
+
+def test_removed_device_is_not_estimated(clock):
+    scheduler = GpuScheduler([{"id": "0", "memory_gb": 48, "slots": 2},
+                              {"id": "1", "memory_gb": 48, "slots": 2}], clock=clock)
+    scheduler.pick([job("running")])
+    scheduler.remove_device(scheduler.snapshot()["running"]["running"]["device"])
+    assert scheduler.estimate_start_times([job("a")]) == {"a": clock.now}
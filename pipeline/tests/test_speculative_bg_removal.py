@@ -0,0 +1,89 @@
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+from result_cache import ResultCache
+
+
+class FakeRemover:
+    """배경 제거 워커 대역: gate가 열릴 때까지 기다렸다가 입력 이미지를 output_path로 복사"""
+
+    def __init__(self, ready=True):
+        self.ready = ready
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def is_ready(self):
+        return self.ready
+
+    def call(self, req, timeout=None, **kwargs):
+        self.calls.append(req)
+        self.gate.wait(5)
+        shutil.copy(req["image_path"], req["output_path"])
+        return {"success": True, "output_path": req["output_path"]}
+
+
+@pytest.fixture
+def remover(server, monkeypatch, tmp_path):
+    worker = FakeRemover()
+    device = server.GPU_DEVICES[0]["id"]
+    monkeypatch.setattr(server, "_resident_workers", {("remover", device): worker})
+    monkeypatch.setattr(server, "RESULT_CACHE", ResultCache(str(tmp_path / "cache"), max_bytes=1 << 20))
+    monkeypatch.setattr(server, "SPECULATIVE_BG_REMOVAL", True)
+    monkeypatch.setattr(server, "USE_SHARED_REMOVER", True)
+    return worker
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "task" / "input.png"
+    path.parent.mkdir()
+    path.write_bytes(os.urandom(64))
+    return str(path)
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def outcome(server, name):
+    return server.SPECULATION_RESULTS.value(outcome=name)
+
+
+def test_reconstruction_takes_speculative_result(server, remover, image):
+    used = outcome(server, "used")
+    server.start_speculative_bg_removal("spec-used", image)
+    rgba_path = server.take_speculative_rgba("spec-used", timeout=5)
+    assert rgba_path and os.path.exists(rgba_path)
+    assert len(remover.calls) == 1
+    assert outcome(server, "used") == used + 1
+    # 한 번 가져가면 다시 기다리지 않음
+    assert server.take_speculative_rgba("spec-used", timeout=5) is None
+
+
+def test_skipped_when_remover_is_not_ready(server, remover, image):
+    remover.ready = False
+    skipped = outcome(server, "skipped")
+    server.start_speculative_bg_removal("spec-skipped", image)
+    assert server.take_speculative_rgba("spec-skipped", timeout=5) is None
+    assert remover.calls == []
+    assert outcome(server, "skipped") == skipped + 1
+
+
+def test_rejected_task_wastes_running_removal(server, remover, image):
+    wasted = outcome(server, "wasted")
+    remover.gate.clear()
+    server.start_speculative_bg_removal("spec-wasted", image)
+    wait_until(lambda: remover.calls)
+    # 실행 중에 task가 거절되면 결과는 버려지고 wasted로 집계됨
+    server.cancel_speculative_bg_removal("spec-wasted")
+    remover.gate.set()
+    wait_until(lambda: outcome(server, "wasted") == wasted + 1)
+    assert outcome(server, "wasted") == wasted + 1
+    assert server.take_speculative_rgba("spec-wasted", timeout=5) is None
@@ -0,0 +1,93 @@
+import os
+import time
+
+import pytest
+
+from task_index import TaskIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    return TaskIndex(str(tmp_path / "tasks.db"))
+
+
+def write(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_create_update_get(index, tmp_path):
+    image = write(tmp_path / "t1" / "input.png", b"12345")
+    index.create("t1", image, image_hash="abc")
+    task = index.get("t1")
+    assert task["stage"] == "uploaded" and task["image_bytes"] == 5 and task["image_hash"] == "abc"
+    assert task["outputs"] == {} and task["timings"] is None
+
+    index.update("t1", stage="filtered", filter_status="accept", timings={"clip": 0.1})
+    task = index.get("t1")
+    assert task["stage"] == "filtered" and task["filter_status"] == "accept"
+    assert task["timings"] == {"clip": 0.1}
+    assert index.get("missing") is None
+    with pytest.raises(ValueError):
+        index.update("t1", mesh_path="nope")
+
+
+def test_set_output_and_mesh_path(index, tmp_path):
+    index.create("t1", write(tmp_path / "t1" / "input.png"))
+    index.update("t1", error="old", disk_bytes=10)
+    fast = write(tmp_path / "t1" / "fast.glb", b"fast")
+    index.set_output("t1", "fast", fast)
+    time.sleep(0.01)
+    quality = write(tmp_path / "t1" / "quality.glb", b"quality")
+    index.set_output("t1", "quality", quality, cached=True)
+
+    task = index.get("t1")
+    assert task["stage"] == "completed" and task["model"] == "quality"
+    assert task["error"] is None and task["disk_bytes"] is None
+    assert task["outputs"]["quality"]["cached"] == 1 and task["outputs"]["fast"]["mesh_bytes"] == 4
+    assert index.mesh_path("t1") == quality
+    assert index.mesh_path("t1", "fast") == fast
+    assert index.mesh_path("t1", "other") is None
+
+
+def test_delete_and_stats(index, tmp_path):
+    index.create("t1", write(tmp_path / "t1" / "input.png"))
+    index.create("t2", write(tmp_path / "t2" / "input.png"), stage="filtered")
+    index.set_output("t1", "fast", write(tmp_path / "t1" / "mesh.glb"))
+    assert index.stats() == {"completed": 1, "filtered": 1}
+    index.delete("t1")
+    assert index.get("t1") is None and index.mesh_path("t1") is None
+    assert [t["task_id"] for t in index.list_tasks(stages=["filtered"])] == ["t2"]
+
+
+def test_list_tasks_orders_by_last_use(index, tmp_path):
+    for task_id in ("a", "b", "c"):
+        index.create(task_id, write(tmp_path / task_id / "input.png"))
+        time.sleep(0.01)
+    index.touch("a")
+    assert [t["task_id"] for t in index.list_tasks()] == ["b", "c", "a"]
+
+
+def test_import_workspace_once(tmp_path):
+    workspace = tmp_path / "workspace"
+    write(workspace / "legacy" / "input.png")
+    write(workspace / "legacy" / "spar3d_output" / "0" / "mesh.glb")
+    write(workspace / "legacy" / "quality_output" / "mesh.glb")
+    (workspace / "no-image").mkdir()
+    index = TaskIndex(str(tmp_path / "tasks.db"))
+    assert index.needs_import()
+
+    def find_image(task_dir):
+        path = os.path.join(task_dir, "input.png")
+        return path if os.path.exists(path) else None
+
+    assert index.import_workspace(str(workspace), find_image) == 1
+    assert not index.needs_import()
+    task = index.get("legacy")
+    assert task["stage"] == "completed"
+    assert set(task["outputs"]) == {"fast", "quality"}
+    assert index.get("no-image") is None
+    # 다시 열어도 가져오기를 반복하지 않음
+    assert not TaskIndex(str(tmp_path / "tasks.db")).needs_import()
@@ -0,0 +1,112 @@
+import sys
+import textwrap
+
+import pytest
+
+from conftest import PIPELINE_DIR
+from worker_ipc import ResidentWorker, WorkerError
+
+WORKER_SCRIPT = textwrap.dedent("""
+    import os
+    import sys
+    import time
+    sys.path.insert(0, {pipeline_dir!r})
+    from worker_ipc import serve, emit_event
+
+    def handle(req):
+        if req["op"] == "echo":
+            return {{"echo": req["value"]}}
+        if req["op"] == "slow":
+            if req.get("progress"):
+                emit_event({{"stage": "inference"}})
+            time.sleep(req["seconds"])
+            return {{"done": True}}
+        if req["op"] == "die":
+            os._exit(1)
+
+    serve(sys.argv[1], handle)
+""")
+
+
+@pytest.fixture
+def worker(tmp_path):
+    script = tmp_path / "worker.py"
+    script.write_text(WORKER_SCRIPT.format(pipeline_dir=PIPELINE_DIR))
+    socket_path = str(tmp_path / "worker.sock")
+    worker = ResidentWorker("test", [sys.executable, str(script), socket_path], socket_path=socket_path,
+                            startup_timeout=20)
+    yield worker
+    worker.stop()
+
+
+def test_call_returns_result(worker):
+    assert worker.call({"op": "echo", "value": 3}) == {"echo": 3}
+    assert worker.status()["ready"] is True
+
+
+def test_timeout_is_in_flight(worker):
+    worker.wait_ready()
+    pid = worker.status()["pid"]
+    with pytest.raises(WorkerError) as excinfo:
+        worker.call({"op": "slow", "seconds": 3}, timeout=0.5)
+    assert excinfo.value.in_flight is True
+    # 시작 전(진행 이벤트 없음)이면 워커는 그대로 둠
+    assert worker.status()["pid"] == pid
+
+
+def test_timeout_after_start_kills_worker(worker):
+    events = []
+    with pytest.raises(WorkerError) as excinfo:
+        worker.call({"op": "slow", "seconds": 30, "progress": True}, timeout=1, on_event=events.append)
+    assert excinfo.value.in_flight is True
+    assert events and events[0]["stage"] == "inference"
+    # GPU를 잡고 있던 요청을 끝내기 위해 워커를 종료 (감시 스레드가 다시 띄움)
+    assert worker.status()["pid"] is None
+
+
+def test_dead_worker_is_not_in_flight(worker):
+    with pytest.raises(WorkerError) as excinfo:
+        worker.call({"op": "die"}, timeout=10)
+    assert excinfo.value.in_flight is False
+    assert worker.restarts == 1
+
+
+class FailingWorker:
+    def __init__(self, error):
+        self.error = error
+
+    def call(self, *args, **kwargs):
+        raise self.error
+
+
+@pytest.mark.parametrize("kind", ["spar3d", "trellis"])
+@pytest.mark.parametrize("in_flight, falls_back", [(True, False), (False, True)])
+def test_reconstruction_falls_back_only_when_worker_is_gone(server, monkeypatch, tmp_path, kind, in_flight,
+                                                           falls_back):
+    fallbacks = []
+    monkeypatch.setattr(server, "get_resident_worker",
+                        lambda *_: FailingWorker(WorkerError("boom", in_flight=in_flight)))
+    monkeypatch.setattr(server, f"run_{kind}_subprocess",
+                        lambda *args, **kwargs: fallbacks.append(args) or {"success": True})
+    monkeypatch.setattr(server, "USE_RESIDENT_SPAR3D", True)
+    monkeypatch.setattr(server, "USE_RESIDENT_TRELLIS", True)
+    monkeypatch.setattr(server, "TRELLIS_DIR", str(tmp_path))
+    result = getattr(server, f"run_{kind}")(str(tmp_path / "image.png"), str(tmp_path / "out"))
+    assert bool(fallbacks) is falls_back
+    assert result["success"] is falls_back
+
+
+@pytest.mark.parametrize("in_process", [True, False])
+def test_background_removal_runs_only_when_trellis_uses_it(server, monkeypatch, tmp_path, in_process):
+    monkeypatch.setattr(server, "RESULT_CACHE", server.ResultCache(str(tmp_path / "cache"), max_bytes=1 << 20))
+    monkeypatch.setattr(server, "TRELLIS_IN_PROCESS", in_process)
+    image = tmp_path / "image.png"
+    image.write_bytes(b"image")
+    seen = []
+    monkeypatch.setattr(server, "run_trellis",
+                        lambda *args, rgba_path=None, **kwargs: seen.append(rgba_path) or {"success": False})
+    removals = []
+    server.run_reconstruction("quality", str(image), str(tmp_path / "out"),
+                              get_rgba=lambda: removals.append(1) or "rgba.png")
+    assert seen == (["rgba.png"] if in_process else [None])
+    assert len(removals) == int(in_process)
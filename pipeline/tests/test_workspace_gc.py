@@ -0,0 +1,113 @@
+import os
+import time
+
+import pytest
+
+from task_index import TaskIndex
+from workspace_gc import WorkspaceReaper, DEFAULT_TTL_SECONDS
+
+HOUR = 60 * 60
+
+
+class Clock:
+    """time.time()에서 offset만큼 지난 시각 (TaskIndex는 실제 시각으로 기록하므로)"""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def __call__(self):
+        return time.time() + self.offset
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    path = tmp_path / "workspace"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def index(workspace):
+    return TaskIndex(str(workspace / "tasks.db"))
+
+
+def make_task(index, workspace, task_id, stage, size=10):
+    task_dir = workspace / task_id
+    task_dir.mkdir()
+    image = task_dir / "input.png"
+    image.write_bytes(b"x" * size)
+    index.create(task_id, str(image), stage=stage)
+    return task_dir
+
+
+def make_reaper(index, workspace, busy=(), **kwargs):
+    return WorkspaceReaper(index, str(workspace), is_busy=lambda task_id: task_id in busy, **kwargs)
+
+
+def test_ttl_reaps_expired_tasks_by_stage(index, workspace):
+    clock = Clock()
+    make_task(index, workspace, "rejected", "uploaded")
+    index.update("rejected", stage="filtered", filter_status="reject")
+    make_task(index, workspace, "filtered", "filtered")
+    index.update("filtered", filter_status="accept")
+    make_task(index, workspace, "completed", "completed")
+    reaper = make_reaper(index, workspace, clock=clock)
+
+    clock.offset = 2 * HOUR
+    assert reaper.run_once()[0] == 1
+    assert index.get("rejected") is None and not (workspace / "rejected").exists()
+    assert index.get("filtered") is not None and index.get("completed") is not None
+
+    clock.offset = DEFAULT_TTL_SECONDS["completed"] + HOUR
+    assert reaper.run_once()[0] == 2
+    assert reaper.stats()["deleted_tasks"]["ttl"] == 3
+
+
+def test_stuck_active_stages_expire_unless_busy(index, workspace):
+    clock = Clock()
+    make_task(index, workspace, "stuck", "reconstructing")
+    make_task(index, workspace, "running", "reconstructing")
+    make_task(index, workspace, "waiting", "queued")
+    reaper = make_reaper(index, workspace, busy={"running"}, clock=clock)
+
+    clock.offset = HOUR
+    assert reaper.run_once()[0] == 0
+    clock.offset = DEFAULT_TTL_SECONDS["reconstructing"] + HOUR
+    reaper.run_once()
+    assert index.get("stuck") is None and index.get("waiting") is None
+    assert index.get("running") is not None
+
+
+def test_orphan_directories_expire(index, workspace):
+    clock = Clock()
+    (workspace / "orphan").mkdir()
+    reaper = make_reaper(index, workspace, clock=clock)
+    assert reaper.run_once()[0] == 0
+    clock.offset = DEFAULT_TTL_SECONDS["uploaded"] + HOUR
+    assert reaper.run_once()[0] == 1
+    assert not (workspace / "orphan").exists()
+
+
+def test_quota_removes_least_recently_used_finished_tasks(index, workspace):
+    for task_id, stage in (("old", "completed"), ("active", "reconstructing"), ("new", "completed")):
+        make_task(index, workspace, task_id, stage, size=1000)
+        time.sleep(0.01)
+    reaper = make_reaper(index, workspace, quota_bytes=2500)
+    assert reaper.run_once()[0] == 1
+    assert index.get("old") is None
+    assert index.get("active") is not None and index.get("new") is not None
+    assert reaper.stats()["deleted_tasks"]["quota"] == 1
+
+
+def test_finished_size_is_remeasured_after_reset(index, workspace):
+    task_dir = make_task(index, workspace, "done", "completed", size=1000)
+    reaper = make_reaper(index, workspace, quota_bytes=10 ** 9)
+    reaper.run_once()
+    assert index.get("done")["disk_bytes"] == 1000
+    # 완료 뒤에 만든 LOD: 서버가 disk_bytes를 지우면 다음 정리 때 다시 잼
+    (task_dir / "lod.glb").write_bytes(b"x" * 500)
+    reaper.run_once()
+    assert index.get("done")["disk_bytes"] == 1000
+    index.update("done", disk_bytes=None)
+    reaper.run_once()
+    assert index.get("done")["disk_bytes"] == 1500
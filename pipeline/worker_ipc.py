@@ -0,0 +1,371 @@
+"""상주 워커 IPC: 유닉스 소켓 위 JSON 한 줄 요청/응답 + 워커 프로세스 관리
+
+워커 스크립트(clip_filter.py 등)는 각자의 가상환경에서 실행되므로 이 모듈은 표준 라이브러리만 사용합니다.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+from cancellation import Cancelled, kill_process_tree
+
+
+class WorkerError(Exception):
+    """상주 워커 호출 실패 (기동 실패, 연결 끊김, 시간 초과 등)
+
+    in_flight: 워커가 살아 있어 요청이 아직 처리 중일 수 있음 (시간 초과, 살아 있는 워커와의 연결 끊김).
+    이때 같은 GPU에서 단발 실행으로 대체하면 모델을 하나 더 올리게 되므로 호출 측은 실패로 처리
+    """
+
+    def __init__(self, message, in_flight=False):
+        super().__init__(message)
+        self.in_flight = in_flight
+
+
+_request_context = threading.local()
+
+
+def emit_event(event):
+    """처리 중인 요청의 클라이언트에게 중간 이벤트(진행 상황 등)를 보냄. 요청 처리 중이 아니면 False"""
+    wfile = getattr(_request_context, "wfile", None)
+    if wfile is None:
+        return False
+    try:
+        wfile.write(json.dumps({"event": event}, ensure_ascii=False).encode("utf-8") + b"\n")
+        wfile.flush()
+    except OSError:
+        pass  # 클라이언트가 먼저 끊은 경우 작업은 계속 진행
+    return True
+
+
+def client_gone():
+    """처리 중인 요청의 클라이언트가 연결을 끊었는지 (취소된 요청을 잠금 대기 후 건너뛰는 데 사용)"""
+    conn = getattr(_request_context, "connection", None)
+    if conn is None:
+        return False
+    try:
+        return conn.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
+
+
+def _shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def request(socket_path, payload, timeout=60, on_event=None, cancel=None):
+    """워커에 요청 하나를 보내고 결과(dict)를 돌려받음. 중간 이벤트는 on_event(event)로 전달
+
+    cancel: CancelToken. 취소되면 연결을 끊고 Cancelled 발생
+    """
+    deadline = time.monotonic() + timeout
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        unregister = cancel.on_cancel(lambda: _shutdown(sock)) if cancel is not None else None
+        try:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            reader = sock.makefile("rb")
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout("timed out")
+                sock.settimeout(remaining)
+                line = reader.readline()
+                if not line:
+                    if cancel is not None and cancel.is_cancelled():
+                        raise Cancelled()
+                    raise ConnectionError("워커 연결이 끊어졌습니다")
+                response = json.loads(line)
+                if "event" not in response:
+                    break
+                if on_event is not None:
+                    on_event(response["event"])
+        except OSError:
+            if cancel is not None and cancel.is_cancelled():
+                raise Cancelled()
+            raise
+        finally:
+            if unregister is not None:
+                unregister()
+    if not response.get("ok"):
+        raise WorkerError(response.get("error", "알 수 없는 워커 오류"))
+    return response.get("result")
+
+
+async def request_async(socket_path, payload, timeout=60, on_event=None):
+    """request()의 asyncio 버전 (비동기 서버에서 응답을 기다리는 동안 스레드를 잡지 않음)"""
+    async def exchange():
+        reader, writer = await asyncio.open_unix_connection(socket_path, limit=1 << 24)
+        try:
+            writer.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("워커 연결이 끊어졌습니다")
+                response = json.loads(line)
+                if "event" not in response:
+                    return response
+                if on_event is not None:
+                    on_event(response["event"])
+        finally:
+            writer.close()
+
+    try:
+        response = await asyncio.wait_for(exchange(), timeout)
+    except asyncio.TimeoutError:
+        raise socket.timeout("timed out")
+    if not response.get("ok"):
+        raise WorkerError(response.get("error", "알 수 없는 워커 오류"))
+    return response.get("result")
+
+
+def serve(socket_path, handler, info=None):
+    """워커 쪽 서버: 요청 한 줄(JSON)마다 handler(dict) -> dict 를 호출해 결과를 한 줄로 응답
+
+    info: ping 응답에 함께 담을 값 (모델 로딩 시간 등)
+    """
+
+    class _Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            if not line:
+                return
+            try:
+                req = json.loads(line)
+                if req.get("op") == "ping":
+                    result = {**(info or {}), "ready": True, "pid": os.getpid(), "ready_at": ready_at}
+                else:
+                    _request_context.wfile = self.wfile
+                    _request_context.connection = self.connection
+                    result = handler(req)
+                response = {"ok": True, "result": result}
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            finally:
+                _request_context.wfile = None
+                _request_context.connection = None
+            try:
+                self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            except OSError:
+                pass  # 취소 등으로 클라이언트가 먼저 끊은 경우
+
+    class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    # 모델 로딩이 끝난 뒤 호출되므로 기동 시간(프로세스 시작 -> 준비 완료) 측정에 사용
+    ready_at = time.time()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with _Server(socket_path, _Handler) as server:
+        print(f"[WORKER] Listening on {socket_path} (pid {os.getpid()})", file=sys.stderr)
+        server.serve_forever()
+
+
+class ResidentWorker:
+    """별도 인터프리터로 띄운 상주 워커 프로세스를 관리 (기동, 준비 확인, 죽으면 재시작)"""
+
+    def __init__(self, name, cmd, socket_path, cwd=None, env=None, log_path=None,
+                 startup_timeout=180, check_interval=5, on_ready=None):
+        """on_ready(name, seconds, pong): 새로 띄운 프로세스가 준비되면 기동 시간(프로세스 시작 + 모델 로딩)과
+        워커의 ping 응답(serve()의 info 포함)으로 호출"""
+        self.name = name
+        self.cmd = cmd
+        self.socket_path = socket_path
+        self.cwd = cwd
+        self.env = env
+        self.log_path = log_path
+        self.startup_timeout = startup_timeout
+        self.check_interval = check_interval
+        self.on_ready = on_ready
+        self.restarts = 0
+        self.startup_seconds = None
+        self._spawned_at = None
+        self._proc = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._monitor = None
+
+    def _alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self):
+        """워커 프로세스가 없거나 죽었으면 새로 띄움 (준비될 때까지 기다리지 않음)"""
+        with self._lock:
+            if self._alive():
+                return
+            if self._proc is not None:
+                self.restarts += 1
+                print(f"[WORKER] {self.name} exited (code {self._proc.returncode}), restarting...", file=sys.stderr)
+            os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            log = open(self.log_path, "ab") if self.log_path else subprocess.DEVNULL
+            try:
+                self._proc = subprocess.Popen(
+                    self.cmd,
+                    cwd=self.cwd,
+                    env=self.env,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    start_new_session=True
+                )
+            finally:
+                if log is not subprocess.DEVNULL:
+                    log.close()
+            self._stopped = False
+            self._spawned_at = time.time()
+            print(f"[INFO] Started {self.name} worker (pid {self._proc.pid})", file=sys.stderr)
+
+    def watch(self):
+        """백그라운드 스레드에서 주기적으로 상태를 확인하고 죽은 워커를 재시작"""
+        if self._monitor is not None:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(self.check_interval)
+                if not self._stopped and not self._alive():
+                    try:
+                        self.start()
+                    except Exception as e:
+                        print(f"[WORKER] {self.name} restart failed: {e}", file=sys.stderr)
+
+        self._monitor = threading.Thread(target=_loop, name=f"{self.name}-monitor", daemon=True)
+        self._monitor.start()
+
+    def is_ready(self):
+        """readiness 체크: 프로세스가 살아 있고 ping에 응답하는지"""
+        if not self._alive():
+            return False
+        try:
+            pong = request(self.socket_path, {"op": "ping"}, timeout=2)
+        except (OSError, ValueError, WorkerError):
+            return False
+        if pong.get("ready") and "ready_at" in pong:
+            with self._lock:
+                spawned_at, self._spawned_at = self._spawned_at, None
+            if spawned_at is not None:
+                self.startup_seconds = max(0.0, pong["ready_at"] - spawned_at)
+                if self.on_ready is not None:
+                    self.on_ready(self.name, self.startup_seconds, pong)
+        return bool(pong.get("ready"))
+
+    def wait_ready(self, timeout=None):
+        """준비될 때까지 대기. 기동 중에 프로세스가 죽으면 바로 False (호출 측에서 대체 경로 사용)"""
+        deadline = time.time() + (self.startup_timeout if timeout is None else timeout)
+        try:
+            self.start()
+        except OSError as e:
+            raise WorkerError(f"{self.name} 워커를 시작할 수 없습니다: {e}")
+        while time.time() < deadline:
+            if self.is_ready():
+                return True
+            if not self._alive():
+                return False
+            time.sleep(0.5)
+        return False
+
+    def call(self, payload, timeout=60, on_event=None, cancel=None):
+        """요청 실행. 처리 중 워커가 죽으면 한 번 재시작 후 다시 시도
+
+        cancel: CancelToken. 취소되면 Cancelled 발생. 워커가 이미 이 요청을 처리 중이면(진행 이벤트를 받았으면)
+        GPU에서 돌고 있는 작업을 멈출 방법이 없으므로 워커 프로세스 트리를 종료 (감시 스레드가 다시 띄움),
+        아직 잠금을 기다리는 중이면 연결만 끊어 워커가 건너뛰게 함
+        """
+        started = threading.Event()
+
+        def relay(event):
+            started.set()
+            if on_event is not None:
+                on_event(event)
+
+        def abort():
+            if started.is_set():
+                print(f"[WORKER] Killing {self.name} to cancel a running request", file=sys.stderr)
+                self.kill()
+
+        unregister = cancel.on_cancel(abort) if cancel is not None else None
+        try:
+            return self._call(payload, timeout, relay, cancel)
+        except WorkerError as e:
+            if e.in_flight and started.is_set():
+                # 결과를 더 기다리지 않으므로 GPU를 잡고 있는 요청을 끝냄 (다음 작업이 워커 잠금 뒤에서 밀리지 않도록)
+                print(f"[WORKER] Killing {self.name} after an abandoned request: {e}", file=sys.stderr)
+                self.kill()
+            raise
+        finally:
+            if unregister is not None:
+                unregister()
+
+    async def call_async(self, payload, timeout=60, on_event=None):
+        """call()의 asyncio 버전: 워커가 떠 있으면 이벤트 루프에서 바로 요청하고,
+        기동/재시작을 기다려야 하거나 연결이 실패하면 스레드에서 call()로 처리 (재시작 후 재시도 포함)"""
+        if self._alive() and os.path.exists(self.socket_path):
+            try:
+                return await request_async(self.socket_path, payload, timeout=timeout, on_event=on_event)
+            except socket.timeout:
+                raise WorkerError(f"{self.name} 워커 응답 시간 초과 ({timeout}초)", in_flight=True)
+            except (OSError, ValueError) as e:
+                print(f"[WORKER] {self.name} async request failed ({e}), retrying via call()", file=sys.stderr)
+        return await asyncio.to_thread(self.call, payload, timeout, on_event)
+
+    def _call(self, payload, timeout, on_event, cancel):
+        for attempt in range(2):
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            if not self.wait_ready():
+                raise WorkerError(f"{self.name} 워커가 준비되지 않았습니다 ({self.startup_timeout}초)")
+            try:
+                return request(self.socket_path, payload, timeout=timeout, on_event=on_event, cancel=cancel)
+            except socket.timeout:
+                raise WorkerError(f"{self.name} 워커 응답 시간 초과 ({timeout}초)", in_flight=True)
+            except (OSError, ValueError) as e:
+                # 연결이 끊긴 직후에는 아직 종료 처리 전일 수 있으므로 잠시 기다려 확인
+                try:
+                    self._proc.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    pass
+                if self._alive() or attempt == 1:
+                    raise WorkerError(f"{self.name} 워커 통신 실패: {e}", in_flight=self._alive())
+                print(f"[WORKER] {self.name} died during request, retrying...", file=sys.stderr)
+
+    def kill(self):
+        """워커 프로세스 트리를 바로 종료 (처리 중인 요청은 연결 끊김으로 실패, 감시 스레드가 다시 띄움)"""
+        with self._lock:
+            if self._alive():
+                kill_process_tree(self._proc.pid)
+                try:
+                    self._proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    pass
+
+    def stop(self):
+        self._stopped = True
+        with self._lock:
+            if self._alive():
+                self._proc.terminate()
+                try:
+                    self._proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self._proc.kill()
+
+    def status(self):
+        return {
+            "ready": self.is_ready(),
+            "pid": self._proc.pid if self._alive() else None,
+            "restarts": self.restarts,
+            "startup_seconds": self.startup_seconds
+        }
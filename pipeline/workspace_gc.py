@@ -0,0 +1,173 @@
+"""작업 디렉토리 정리(GC): 단계별 보관 기간(TTL)과 전체 디스크 한도
+
+- 단계별 TTL이 지난 task는 삭제 (마지막 사용 = 갱신/다운로드 중 늦은 시각 기준)
+- 전체 크기가 quota_bytes를 넘으면 끝난 task(completed / failed / cancelled / rejected)를 오래 안 쓴 순서로 삭제
+- 대기 중이거나 실행 중인 작업이 있는 task는 절대 삭제하지 않음 (queued/reconstructing TTL은 작업 없이 멈춘 task만 정리)
+- 끝난 task의 크기(disk_bytes)는 한 번 재서 저장하고, 서버가 종료 이벤트나 LOD 생성 뒤 지우면 다시 잼
+- 인덱스에 없는 디렉토리(업로드 도중 서버가 죽은 경우 등)도 TTL이 지나면 삭제
+"""
+
+import os
+import shutil
+import sys
+import threading
+import time
+
+# 단계별 보관 기간 (초). 여기 없는 단계는 TTL로 삭제하지 않음
+DEFAULT_TTL_SECONDS = {
+    "uploaded": 60 * 60,            # 업로드 후 필터링 결과가 기록되지 않은 task
+    "rejected": 60 * 60,            # 필터에서 반려된 task (reject / early_reject / error)
+    "filtered": 24 * 60 * 60,       # 필터 통과 후 재구성 요청을 기다리는 task
+    "failed": 24 * 60 * 60,
+    "cancelled": 24 * 60 * 60,
+    "completed": 3 * 24 * 60 * 60,
+    # 서버가 작업 도중 죽는 등으로 종료 단계가 기록되지 않은 task (작업이 남아 있으면 is_busy로 건너뜀)
+    "queued": 24 * 60 * 60,
+    "reconstructing": 24 * 60 * 60,
+}
+# 디스크 한도 초과 시 삭제 대상이 되는 (끝난) 단계
+FINISHED_STAGES = ("completed", "failed", "cancelled", "rejected")
+REJECTED_FILTER_STATUSES = ("reject", "early_reject", "error")
+
+
+def reclaimable_size(path):
+    """삭제 시 실제로 비워지는 바이트 (결과 캐시와 하드링크로 공유하는 파일은 제외)"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if st.st_nlink <= 1:
+                total += st.st_size
+    return total
+
+
+class WorkspaceReaper:
+    def __init__(self, index, workspace_dir, is_busy, lock=None, ttl_seconds=None, quota_bytes=None,
+                 interval_seconds=300, clock=time.time, on_delete=None):
+        """is_busy(task_id): 대기/실행 중 작업이 있으면 참
+
+        lock: 재구성 등록과 삭제가 겹치지 않도록 서버와 공유하는 잠금
+        on_delete(task_id): task를 지운 뒤 호출 (인덱스 밖에 task 정보를 둔 저장소 정리용)
+        """
+        self.index = index
+        self.workspace_dir = workspace_dir
+        self.is_busy = is_busy
+        self.lock = lock or threading.Lock()
+        self.ttl_seconds = dict(DEFAULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds)
+        self.quota_bytes = quota_bytes
+        self.interval_seconds = interval_seconds
+        self.clock = clock
+        self.on_delete = on_delete
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self.reclaimed_bytes = {"ttl": 0, "quota": 0, "orphan": 0}
+        self.deleted_tasks = {"ttl": 0, "quota": 0, "orphan": 0}
+        self.last_run = None
+
+    @staticmethod
+    def gc_stage(task):
+        """TTL 분류용 단계 (필터에서 반려된 task는 rejected로 구분)"""
+        if task["stage"] == "filtered" and task["filter_status"] in REJECTED_FILTER_STATUSES:
+            return "rejected"
+        return task["stage"]
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="workspace-gc", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[GC] Workspace sweep failed: {e}", file=sys.stderr)
+            time.sleep(self.interval_seconds)
+
+    def _delete(self, task_id, reason):
+        """잠금을 잡은 상태에서 작업 중 여부를 다시 확인하고 삭제. 반환: 비운 바이트 (삭제 안 했으면 None)"""
+        with self.lock:
+            if self.is_busy(task_id):
+                return None
+            task_dir = os.path.join(self.workspace_dir, task_id)
+            reclaimed = reclaimable_size(task_dir)
+            shutil.rmtree(task_dir, ignore_errors=True)
+            self.index.delete(task_id)
+            if self.on_delete is not None:
+                self.on_delete(task_id)
+        with self._stats_lock:
+            self.reclaimed_bytes[reason] += reclaimed
+            self.deleted_tasks[reason] += 1
+        return reclaimed
+
+    def _task_bytes(self, task):
+        """task 디렉토리 크기. 끝난 task는 한 번 재서 인덱스에 저장하고, 진행 중인 task는 입력 이미지 크기로 어림"""
+        if task["disk_bytes"] is not None:
+            return task["disk_bytes"]
+        if self.gc_stage(task) not in FINISHED_STAGES:
+            return task["image_bytes"] or 0
+        size = reclaimable_size(os.path.join(self.workspace_dir, task["task_id"]))
+        self.index.update(task["task_id"], disk_bytes=size)
+        return size
+
+    def run_once(self):
+        """한 번 정리. 반환: 이번에 삭제한 task 수와 비운 바이트"""
+        now = self.clock()
+        deleted, reclaimed = 0, 0
+
+        # 1) 단계별 TTL
+        remaining = []
+        for task in self.index.list_tasks():
+            ttl = self.ttl_seconds.get(self.gc_stage(task))
+            if ttl is not None and now - task["last_used"] > ttl:
+                freed = self._delete(task["task_id"], "ttl")
+                if freed is not None:
+                    deleted, reclaimed = deleted + 1, reclaimed + freed
+                    continue
+            remaining.append(task)
+
+        # 2) 인덱스에 없는 디렉토리
+        known = {task["task_id"] for task in remaining}
+        orphan_ttl = self.ttl_seconds.get("uploaded")
+        if orphan_ttl is not None:
+            for entry in os.scandir(self.workspace_dir):
+                if not entry.is_dir() or entry.name in known or self.index.get(entry.name) is not None:
+                    continue
+                if now - entry.stat().st_mtime > orphan_ttl:
+                    freed = self._delete(entry.name, "orphan")
+                    if freed is not None:
+                        deleted, reclaimed = deleted + 1, reclaimed + freed
+
+        # 3) 디스크 한도: 끝난 task를 오래 안 쓴 순서로 삭제 (remaining은 last_used 오름차순)
+        if self.quota_bytes is not None:
+            sizes = {task["task_id"]: self._task_bytes(task) for task in remaining}
+            total = sum(sizes.values())
+            for task in remaining:
+                if total <= self.quota_bytes:
+                    break
+                if self.gc_stage(task) not in FINISHED_STAGES:
+                    continue
+                freed = self._delete(task["task_id"], "quota")
+                if freed is not None:
+                    total -= sizes[task["task_id"]]
+                    deleted, reclaimed = deleted + 1, reclaimed + freed
+
+        with self._stats_lock:
+            self.last_run = {"finished_at": self.clock(), "deleted": deleted, "reclaimed_bytes": reclaimed}
+        if deleted:
+            print(f"[GC] Removed {deleted} task(s), reclaimed {reclaimed / 1024 ** 2:.1f} MiB", file=sys.stderr)
+        return deleted, reclaimed
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "reclaimed_bytes": dict(self.reclaimed_bytes),
+                "deleted_tasks": dict(self.deleted_tasks),
+                "quota_bytes": self.quota_bytes,
+                "ttl_seconds": dict(self.ttl_seconds),
+                "last_run": dict(self.last_run) if self.last_run else None
+            }
@@ -133,16 +133,17 @@ export default function UploadWithPipelinePage() {
     
     try {
       try {
-        const response = await fetch(`/api/pipeline/reconstruct/${taskId}`, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ model: selectedModel }),
-          signal: controller.signal, // 취소 신호 연결
-        });
-
-        if (!response.ok) throw new Error('서버응답 오류. 폴링 모드로 전환합니다.');
-
-        const result: ProcessResponse = await response.json();
+        // 작업 등록 후 완료될 때까지 작업 상태를 폴링 (세부 단계는 SSE로 수신)
+        const result: ProcessResponse = await pipelineService.reconstructOnly(
+          taskId,
+          selectedModel,
+          (stage, message) => {
+            if (stage === 'queued') setProgressMessage(message);
+            else if (stage === 'reconstruction') setProgressMessage(`${modelName} 모델로 3D 모델 생성 중...`);
+            else if (stage === 'progress') setProgressMessage(`${modelName} 모델로 3D 모델 생성 중... (${message})`);
+          },
+          controller.signal, // 취소 신호 연결
+        );
         setProcessResult(result);
 
         if (result.stage === 'completed' && result.task_id) {
@@ -150,6 +151,8 @@ export default function UploadWithPipelinePage() {
           const modelBlob = await pipelineService.downloadModel(result.task_id);
           setModelBlob(modelBlob);
           pipelineService.cleanup(result.task_id).catch(console.error);
+        } else if (result.reconstruction_error) {
+          alert('3D 재구성 실패: ' + result.reconstruction_error);
         }
       } catch (fetchError: any) {
         if (fetchError.name === 'AbortError') return;
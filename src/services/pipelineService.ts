@@ -7,18 +7,48 @@ const API_BASE_URL = '/api/pipeline';
 export interface FilterResult {
   status: 'early_reject' | 'reject' | 'major_revision' | 'minor_revision' | 'accept' | 'error';
   reasons?: string[];
+  // 거의 같은 이미지로 이미 만든 결과 (재구성 대신 /download/<task_id>?model=<model>로 재사용 가능)
+  similar_meshes?: { task_id: string; model: 'fast' | 'quality'; similarity: number }[];
 }
 
 export interface ProcessResponse {
   task_id: string;
-  stage: 'filtering' | 'reconstruction' | 'completed';
-  filter_result: FilterResult;
+  stage: 'filtering' | 'queued' | 'running' | 'reconstruction' | 'completed' | 'failed' | 'cancelled';
+  filter_result?: FilterResult;
+  job_id?: string;
   mesh_path?: string;
   reconstruction_error?: string;
   message?: string;
   error?: string;
 }
 
+export interface JobStatus {
+  job_id: string;
+  task_id: string;
+  model: 'fast' | 'quality';
+  stage: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+  status: 'queued' | 'running' | 'done' | 'failed' | 'cancelled';
+  position: number;
+  result: ProcessResponse | null;
+  error: string | null;
+}
+
+// 다운로드할 상세 단계 (full: 원본, high/medium/low: 면 수·텍스처를 줄이고 정점을 양자화한 변형)
+export type ModelLod = 'full' | 'high' | 'medium' | 'low';
+
+export interface ProgressEvent {
+  id: number;
+  stage: string;
+  label: string;
+  time: number;
+  job_id?: string;
+  position?: number;
+  error?: string;
+}
+
+const JOB_POLL_INTERVAL_MS = 3000;
+const LIVE_STAGES = ['model_load', 'background_removal', 'inference', 'remesh', 'texture_bake', 'glb_export'];
+
 class PipelineService {
   /**
    * 헬스 체크
@@ -54,12 +84,118 @@ class PipelineService {
   }
 
   /**
-   * 필터링 후 3D 재구성만 수행 (필터링 건너뛰기) - 폴링 방식
+   * 재구성 단계별 진행 이벤트 구독 (SSE). 반환된 함수를 호출하면 구독 해제
+   */
+  subscribeProgress(taskId: string, onEvent: (event: ProgressEvent) => void): () => void {
+    if (typeof EventSource === 'undefined') return () => {};
+
+    const source = new EventSource(`${API_BASE_URL}/tasks/${taskId}/events`);
+    source.addEventListener('progress', (e) => {
+      const event: ProgressEvent = JSON.parse((e as MessageEvent).data);
+      onEvent(event);
+      if (event.stage === 'done' || event.stage === 'failed' || event.stage === 'cancelled') source.close();
+    });
+    return () => source.close();
+  }
+
+  /**
+   * 재구성 작업이 끝날 때까지 상태를 폴링 (taskId를 주면 SSE로 세부 단계도 전달)
+   */
+  async waitForJob(
+    jobId: string,
+    onProgress?: (stage: string, message: string) => void,
+    signal?: AbortSignal,
+    taskId?: string
+  ): Promise<ProcessResponse> {
+    let liveStage = false;
+    const unsubscribe = taskId
+      ? this.subscribeProgress(taskId, (event) => {
+          if (!LIVE_STAGES.includes(event.stage)) return;
+          liveStage = true;
+          onProgress?.('progress', `${event.label} 중...`);
+        })
+      : () => {};
+
+    try {
+      return await this.pollJob(jobId, () => liveStage, onProgress, signal);
+    } catch (error) {
+      // 사용자가 취소하면 서버의 재구성 작업도 멈춰 GPU를 돌려줌
+      if (error instanceof DOMException && error.name === 'AbortError') {
+        this.cancelJob(jobId).catch(console.error);
+      }
+      throw error;
+    } finally {
+      unsubscribe();
+    }
+  }
+
+  /**
+   * 재구성 작업 취소 (대기 중이면 대기열에서 빼고, 실행 중이면 러너 프로세스를 종료)
+   */
+  async cancelJob(jobId: string): Promise<void> {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}/cancel`, { method: 'POST' });
+    // 409: 이미 끝난 작업
+    if (!response.ok && response.status !== 409) {
+      console.error('Cancel failed for job:', jobId);
+    }
+  }
+
+  private async pollJob(
+    jobId: string,
+    hasLiveStage: () => boolean,
+    onProgress?: (stage: string, message: string) => void,
+    signal?: AbortSignal
+  ): Promise<ProcessResponse> {
+    while (true) {
+      const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`, { signal });
+      if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.error || '작업 상태 조회 실패');
+      }
+
+      const job: JobStatus = await response.json();
+      if (job.status === 'done' && job.result) {
+        return job.result;
+      }
+      if (job.status === 'failed') {
+        return job.result ?? { task_id: job.task_id, stage: 'reconstruction', reconstruction_error: job.error ?? undefined };
+      }
+      if (job.status === 'cancelled') {
+        return { task_id: job.task_id, stage: 'cancelled', message: job.error ?? undefined };
+      }
+      if (job.status === 'queued') {
+        onProgress?.('queued', `대기 중... (${job.position}번째)`);
+      } else if (!hasLiveStage()) {
+        onProgress?.('reconstruction', '3D 재구성 중...');
+      }
+
+      // 대기가 끝나면 abort 리스너를 떼어 폴링할 때마다 signal에 리스너가 쌓이지 않게 함
+      await new Promise<void>((resolve, reject) => {
+        const onAbort = () => {
+          clearTimeout(timer);
+          reject(new DOMException('Aborted', 'AbortError'));
+        };
+        const timer = setTimeout(() => {
+          signal?.removeEventListener('abort', onAbort);
+          resolve();
+        }, JOB_POLL_INTERVAL_MS);
+        if (signal?.aborted) {
+          onAbort();
+          return;
+        }
+        signal?.addEventListener('abort', onAbort, { once: true });
+      });
+    }
+  }
+
+  /**
+   * 필터링 후 3D 재구성만 수행 (필터링 건너뛰기) - 작업 등록 후 폴링 방식
    */
   async reconstructOnly(
     taskId: string,
     modelType: 'fast' | 'quality' = 'fast',
-    onProgress?: (stage: string, message: string) => void
+    onProgress?: (stage: string, message: string) => void,
+    signal?: AbortSignal
   ): Promise<ProcessResponse> {
     const modelName = modelType === 'quality' ? 'Trellis (Quality)' : 'StableFast3D (Fast)';
     const estimatedTime = modelType === 'quality' ? '5-15분' : '1-3분';
@@ -71,6 +207,7 @@ class PipelineService {
         'Content-Type': 'application/json',
       },
       body: JSON.stringify({ model: modelType }),
+      signal,
     });
 
     if (!response.ok) {
@@ -78,7 +215,8 @@ class PipelineService {
       throw new Error(error.error || '재구성 실패');
     }
 
-    const result: ProcessResponse = await response.json();
+    const job: JobStatus = await response.json();
+    const result = await this.waitForJob(job.job_id, onProgress, signal, taskId);
 
     if (result.stage === 'completed') {
       onProgress?.('completed', '3D 재구성 완료!');
@@ -111,22 +249,38 @@ class PipelineService {
       throw new Error(error.error || '처리 실패');
     }
 
-    const result: ProcessResponse = await response.json();
+    let result: ProcessResponse = await response.json();
+
+    if (result.stage === 'filtering') {
+      onProgress?.('filtering', '필터링 단계에서 중단됨');
+      return result;
+    }
+
+    if (result.job_id) {
+      const filterResult = result.filter_result;
+      result = { ...(await this.waitForJob(result.job_id, onProgress, undefined, result.task_id)), filter_result: filterResult };
+    }
 
     if (result.stage === 'completed') {
       onProgress?.('completed', '3D 재구성 완료!');
-    } else if (result.stage === 'filtering') {
-      onProgress?.('filtering', '필터링 단계에서 중단됨');
     }
 
     return result;
   }
 
+  /**
+   * 생성된 3D 모델 URL (카드/썸네일은 low·medium, 뷰어는 full)
+   * 서버가 ETag를 주므로 useGLTF 등에서 그대로 쓰면 브라우저 캐시로 재검증만 함
+   */
+  modelUrl(taskId: string, lod: ModelLod = 'full'): string {
+    return lod === 'full' ? `${API_BASE_URL}/download/${taskId}` : `${API_BASE_URL}/download/${taskId}?lod=${lod}`;
+  }
+
   /**
    * 생성된 3D 모델 다운로드
    */
-  async downloadModel(taskId: string): Promise<Blob> {
-    const response = await fetch(`${API_BASE_URL}/download/${taskId}`);
+  async downloadModel(taskId: string, lod: ModelLod = 'full'): Promise<Blob> {
+    const response = await fetch(this.modelUrl(taskId, lod));
 
     if (!response.ok) {
       const error = await response.json();